@@ -191,6 +191,46 @@ class PortfolioAnalyzer:
             'risk_score': min(10, max(1, int(volatility * 2)))  # 1-10のスコア
         }
     
+    def calculate_indicators(self, closes: List[float]) -> Dict:
+        """
+        終値の系列からテクニカル指標を計算
+        Args:
+            closes: 終値のリスト（古い順）
+        Returns:
+            Dict: テクニカル指標
+        """
+        if not closes:
+            return {}
+
+        import statistics
+
+        def sma(period: int) -> Optional[float]:
+            return sum(closes[-period:]) / period if len(closes) >= period else None
+
+        daily_returns = [
+            (closes[i] / closes[i - 1] - 1) * 100
+            for i in range(1, len(closes)) if closes[i - 1]
+        ]
+
+        # RSI（14日、単純平均）
+        rsi = None
+        if len(closes) > 14:
+            diffs = [closes[i] - closes[i - 1] for i in range(len(closes) - 14, len(closes))]
+            gains = sum(d for d in diffs if d > 0) / 14
+            losses = sum(-d for d in diffs if d < 0) / 14
+            rsi = 100.0 if losses == 0 else 100 - (100 / (1 + gains / losses))
+
+        return {
+            'latest_close': closes[-1],
+            'sma_5': sma(5),
+            'sma_25': sma(25),
+            'rsi_14': rsi,
+            'volatility': statistics.stdev(daily_returns) if len(daily_returns) > 1 else 0,
+            'period_return_percent': (closes[-1] / closes[0] - 1) * 100 if closes[0] else 0,
+            'period_high': max(closes),
+            'period_low': min(closes)
+        }
+
     def generate_report(self, analysis: Dict) -> str:
         """
         分析結果のレポートを生成
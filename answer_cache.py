@@ -0,0 +1,278 @@
+import hashlib
+import random
+import re
+import threading
+import time
+import unicodedata
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+import config
+from cache import make_cache
+
+JST = timezone(timedelta(hours=9))
+
+# MinHashの置換に使うメルセンヌ素数
+_MERSENNE_PRIME = (1 << 61) - 1
+_MENTION_PATTERN = re.compile(r'<[@#!][^>]*>')
+
+
+def normalize_question(question: str) -> str:
+    """
+    質問文を比較用に正規化（全角半角・大文字小文字・記号・空白・メンションの違いを吸収）
+    Args:
+        question: 質問内容
+    Returns:
+        str: 正規化済みの文字列
+    """
+    text = _MENTION_PATTERN.sub('', question or '')
+    text = unicodedata.normalize('NFKC', text).lower()
+    return ''.join(ch for ch in text if unicodedata.category(ch)[0] in ('L', 'N'))
+
+
+def char_ngrams(text: str, n: int = 2) -> Set[str]:
+    """文字n-gramの集合（短い文字列はそのまま1要素）"""
+    if len(text) <= n:
+        return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class MinHasher:
+    """文字n-gram集合のMinHash署名を計算"""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._perms = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, shingles: Set[str]) -> Tuple[int, ...]:
+        hashes = [
+            int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'big')
+            for s in shingles
+        ]
+        if not hashes:
+            return tuple([_MERSENNE_PRIME] * self.num_perm)
+        return tuple(
+            min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+            for a, b in self._perms
+        )
+
+
+class AnswerCache:
+    """
+    Slack Q&Aの回答キャッシュ
+    正規化した質問の文字n-gramをMinHash + LSHで索引し、言い回しが近い質問に同じ回答を返す
+    回答は市場日とポートフォリオのバージョンごとに分け、期限切れや別スコープの回答は使わない
+    shared_store（make_cacheのキャッシュ）を渡した場合は回答とLSHのバケットをそこに保存し、
+    CACHE_BACKEND=sqlite ではワーカープロセス間で共有する（ヒット率がプロセス数で割られないようにする）
+    """
+
+    # 共有時にLSHのバケットごとに保持する回答IDの上限
+    SHARED_BUCKET_SIZE = 32
+
+    def __init__(self, ttl_seconds: Optional[float] = None, threshold: Optional[float] = None,
+                 max_entries: int = 512, num_perm: int = 64, bands: int = 16, shared_store=None):
+        self.ttl_seconds = config.ANSWER_CACHE_TTL if ttl_seconds is None else ttl_seconds
+        self.threshold = config.ANSWER_CACHE_SIMILARITY if threshold is None else threshold
+        self.max_entries = max_entries
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._hasher = MinHasher(num_perm)
+        self.shared_store = shared_store
+        self._scope: Optional[Tuple[str, str]] = None
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], Set[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._stats = {'lookups': 0, 'hits': 0, 'misses': 0, 'saved_latency_ms': 0.0}
+
+    @staticmethod
+    def current_market_day() -> str:
+        """日本時間の日付（市場日）"""
+        return datetime.now(JST).strftime('%Y-%m-%d')
+
+    def _band_keys(self, signature: Tuple[int, ...]) -> List[Tuple[int, Tuple[int, ...]]]:
+        return [
+            (band, signature[band * self.rows:(band + 1) * self.rows])
+            for band in range(self.bands)
+        ]
+
+    def _switch_scope(self, scope: Tuple[str, str]):
+        """市場日またはポートフォリオが変わったら古い回答を破棄（ロック取得済みで呼ぶこと）"""
+        if scope != self._scope:
+            self._scope = scope
+            self._entries.clear()
+            self._buckets.clear()
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        for key in entry['band_keys']:
+            bucket = self._buckets.get(key)
+            if bucket:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def lookup(self, question: str, portfolio_version: str = 'none',
+               market_day: Optional[str] = None) -> Optional[str]:
+        """
+        近い質問のキャッシュ済み回答を取得
+        Args:
+            question: 質問内容
+            portfolio_version: ポートフォリオのバージョン
+            market_day: 市場日（省略時は日本時間の今日）
+        Returns:
+            str: キャッシュ済みの回答（なければNone）
+        """
+        normalized = normalize_question(question)
+        shingles = char_ngrams(normalized)
+        signature = self._hasher.signature(shingles)
+        scope = (market_day or self.current_market_day(), portfolio_version)
+        now = time.time()
+        if self.shared_store is not None:
+            return self._lookup_shared(shingles, signature, scope)
+
+        with self._lock:
+            self._stats['lookups'] += 1
+            self._switch_scope(scope)
+
+            candidates: Set[int] = set()
+            for key in self._band_keys(signature):
+                candidates |= self._buckets.get(key, set())
+
+            best_id, best_score = None, 0.0
+            for entry_id in candidates:
+                entry = self._entries[entry_id]
+                if entry['expires_at'] <= now:
+                    self._remove(entry_id)
+                    continue
+                # 候補はLSHで絞り込み、最終判定は実際のJaccard係数で行う
+                union = len(shingles | entry['shingles'])
+                score = len(shingles & entry['shingles']) / union if union else 0.0
+                if score > best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is not None and best_score >= self.threshold:
+                entry = self._entries[best_id]
+                self._entries.move_to_end(best_id)
+                self._stats['hits'] += 1
+                self._stats['saved_latency_ms'] += entry['latency_ms']
+                return entry['answer']
+
+            self._stats['misses'] += 1
+            return None
+
+    def store(self, question: str, answer: str, latency_ms: float = 0.0,
+              portfolio_version: str = 'none', market_day: Optional[str] = None):
+        """
+        回答をキャッシュに保存
+        Args:
+            question: 質問内容
+            answer: 回答
+            latency_ms: 回答の生成にかかった時間（ヒット時に節約時間として集計）
+            portfolio_version: ポートフォリオのバージョン
+            market_day: 市場日（省略時は日本時間の今日）
+        """
+        normalized = normalize_question(question)
+        if not normalized or not answer:
+            return
+        shingles = char_ngrams(normalized)
+        signature = self._hasher.signature(shingles)
+        band_keys = self._band_keys(signature)
+        scope = (market_day or self.current_market_day(), portfolio_version)
+        if self.shared_store is not None:
+            self._store_shared(shingles, band_keys, scope, answer, latency_ms)
+            return
+
+        with self._lock:
+            self._switch_scope(scope)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                'shingles': shingles,
+                'band_keys': band_keys,
+                'answer': answer,
+                'latency_ms': latency_ms,
+                'expires_at': time.time() + self.ttl_seconds
+            }
+            for key in band_keys:
+                self._buckets.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    @staticmethod
+    def _shared_bucket_key(scope: Tuple[str, str], band_key: Tuple[int, Tuple[int, ...]]) -> str:
+        """共有ストアのバケットのキー（スコープを含めるため、別スコープの回答は引き当てない）"""
+        digest = hashlib.blake2b(repr(band_key).encode('utf-8'), digest_size=8).hexdigest()
+        return f"bucket|{scope[0]}|{scope[1]}|{band_key[0]}|{digest}"
+
+    def _lookup_shared(self, shingles: Set[str], signature: Tuple[int, ...],
+                       scope: Tuple[str, str]) -> Optional[str]:
+        """共有ストアから近い質問の回答を取得（期限切れの回答はストアのTTLで消える）"""
+        candidates: Set[str] = set()
+        for key in self._band_keys(signature):
+            candidates.update(self.shared_store.get(self._shared_bucket_key(scope, key)) or ())
+
+        best, best_score = None, 0.0
+        for entry_id in candidates:
+            entry = self.shared_store.get(f"entry|{entry_id}")
+            if entry is None:
+                continue
+            union = len(shingles | entry['shingles'])
+            score = len(shingles & entry['shingles']) / union if union else 0.0
+            if score > best_score:
+                best, best_score = entry, score
+
+        with self._lock:
+            self._stats['lookups'] += 1
+            if best is not None and best_score >= self.threshold:
+                self._stats['hits'] += 1
+                self._stats['saved_latency_ms'] += best['latency_ms']
+                return best['answer']
+            self._stats['misses'] += 1
+            return None
+
+    def _store_shared(self, shingles: Set[str], band_keys: List[Tuple[int, Tuple[int, ...]]],
+                      scope: Tuple[str, str], answer: str, latency_ms: float):
+        """共有ストアに回答を保存し、各バンドのバケットに回答IDを追加"""
+        entry_id = uuid.uuid4().hex
+        self.shared_store.set(f"entry|{entry_id}",
+                       {'shingles': shingles, 'answer': answer, 'latency_ms': latency_ms},
+                       ttl=self.ttl_seconds)
+        for key in band_keys:
+            # 複数のワーカーが同時に保存してもIDが失われないよう、追加はストア側でアトミックに行う
+            self.shared_store.append(self._shared_bucket_key(scope, key), entry_id,
+                                     limit=self.SHARED_BUCKET_SIZE, ttl=self.ttl_seconds)
+
+    def stats(self) -> Dict:
+        """ヒット率と節約できた応答時間（共有時もヒット率はこのプロセスの集計）"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries) if self.shared_store is None else len(self.shared_store)
+        stats['hit_rate'] = stats['hits'] / stats['lookups'] if stats['lookups'] else 0.0
+        stats['saved_latency_ms'] = round(stats['saved_latency_ms'], 1)
+        return stats
+
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache:
+    """プロセス共有のAnswerCacheを取得（CACHE_BACKEND=sqliteの場合はワーカープロセス間で共有）"""
+    global _answer_cache
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            store = None
+            if config.CACHE_BACKEND == 'sqlite':
+                # 回答1件あたり本体とバンドごとのバケットを保存する
+                store = make_cache('answers', ttl_seconds=config.ANSWER_CACHE_TTL, max_entries=512 * 17)
+            _answer_cache = AnswerCache(shared_store=store)
+        return _answer_cache
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+アプリケーションのログ出力
+レベル付きのログを非同期キュー（QueueHandler）経由で別スレッドから標準出力に書き出す
+Lambda上は既定でINFO以上（段階ごとの要約）をJSONで出力し、ローカルは銘柄ごとの詳細（DEBUG）も従来の形式で表示する
+銘柄ごとの詳細ログは sampled() で LOG_SAMPLE_RATE の割合に間引く（間引いた分はレコードも作らない）
+
+使用方法:
+    from app_logging import get_logger, sampled
+    logger = get_logger(__name__)
+    if logger.isEnabledFor(logging.DEBUG) and sampled():
+        logger.debug("7203.T: ¥3,000", extra={'fields': {'symbol': '7203.T'}})
+    logger.info("株価取得完了", extra={'fields': {'symbols': 120, 'failed': 0}})
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+
+import config
+
+ROOT_LOGGER = 'kabukan'
+
+_state = {'listener': None, 'queue': None, 'sample_rate': 1.0}
+_setup_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """1行1レコードのJSON（fields の内容を展開して出力）"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """書き込み時点の sys.stdout に出力（テストやベンチマークでの差し替えに追従）"""
+
+    def emit(self, record: logging.LogRecord):
+        self.stream = sys.stdout
+        super().emit(record)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """キューが満杯の場合は待たずにレコードを捨てる（呼び出し元をブロックしない）"""
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 同じプロセス内のキューのため、メッセージの組み立てとレコードの複製は書き出し側のスレッドに任せる
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DroppingQueueHandler.dropped += 1
+
+
+def _configure(level: Optional[str], fmt: Optional[str], sample_rate: Optional[float]):
+    _stop_listener()
+    handler = _StdoutHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if (fmt or config.LOG_FORMAT) == 'json' else logging.Formatter('%(message)s'))
+
+    log_queue = queue.Queue(maxsize=config.LOG_QUEUE_SIZE)
+    queue_handler = _DroppingQueueHandler(log_queue)
+
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.handlers = [queue_handler]
+    logger.setLevel((level or config.LOG_LEVEL).upper())
+    logger.propagate = False
+
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    listener.start()
+    _state.update(listener=listener, queue=log_queue,
+                  sample_rate=config.LOG_SAMPLE_RATE if sample_rate is None else sample_rate)
+
+
+def setup_logging(level: Optional[str] = None, fmt: Optional[str] = None, sample_rate: Optional[float] = None):
+    """
+    ログ出力を設定（再度呼び出すと設定し直す）
+    Args:
+        level: ログレベル（省略時は LOG_LEVEL）
+        fmt: json / text（省略時は LOG_FORMAT）
+        sample_rate: 銘柄ごとの詳細ログを出力する割合（省略時は LOG_SAMPLE_RATE）
+    """
+    with _setup_lock:
+        _configure(level, fmt, sample_rate)
+
+
+def _stop_listener():
+    listener = _state['listener']
+    if listener is not None:
+        listener.stop()
+        _state.update(listener=None, queue=None)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    アプリケーションのロガーを取得（初回に出力を設定）
+    Args:
+        name: モジュール名（__name__）
+    Returns:
+        logging.Logger: ロガー
+    """
+    if _state['listener'] is None:
+        with _setup_lock:
+            if _state['listener'] is None:
+                _configure(None, None, None)
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def sampled() -> bool:
+    """
+    銘柄ごとの詳細ログを出力するかどうか（LOG_SAMPLE_RATE の割合で True）
+    Returns:
+        bool: 出力する場合はTrue
+    """
+    rate = _state['sample_rate']
+    return rate >= 1 or random.random() < rate
+
+
+def flush():
+    """キューに溜まったログを書き出すまで待つ（Lambdaの実行終了前に呼び出す）"""
+    log_queue = _state['queue']
+    if log_queue is not None:
+        log_queue.join()
+    sys.stdout.flush()
+
+
+atexit.register(_stop_listener)
@@ -0,0 +1,673 @@
+#!/usr/bin/env python3
+"""
+オフラインのベンチマーク
+日本株と米国株を混在させた合成ポートフォリオ（10〜10,000銘柄）を生成し、
+記録済みのYahoo Finance・Google Sheets・Geminiの応答をローカルの代替サーバーから返して、
+段階ごと（取得・評価額計算・分析・レポート生成・プロンプト生成）の所要時間を計測する
+ネットワークには接続しない。結果はJSONに保存し、変更前後の比較に使う
+
+使用方法:
+    python benchmark.py
+    python benchmark.py --sizes 10 100 --repeat 5 --output benchmarks/results/before.json
+    python benchmark.py --compare benchmarks/results/before.json benchmarks/results/after.json
+"""
+
+import argparse
+import contextlib
+import copy
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import threading
+import time
+import tracemalloc
+import zlib
+from collections import Counter
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import unquote, urlparse
+
+import requests
+
+import config
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(BASE_DIR, 'benchmarks', 'fixtures')
+RESULTS_DIR = os.path.join(BASE_DIR, 'benchmarks', 'results')
+BUDGETS_PATH = os.path.join(BASE_DIR, 'benchmarks', 'budgets.json')
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+SHEETS_API_HOST = 'https://sheets.googleapis.com'
+SECTORS = ['輸送用機器', '電気機器', '情報・通信業', '銀行業', '医薬品', '小売業', 'Technology', 'Healthcare',
+           'Financial Services', 'Consumer Cyclical']
+
+# 計測する段階（実行順）
+STAGES = ['fetch.sheets', 'fetch.quotes', 'fetch.fx', 'valuation', 'analysis', 'report', 'prompt', 'advice']
+# 上流への通信を伴わない段階（性能予算の確認に使う）
+LOCAL_STAGES = ['valuation', 'analysis', 'report', 'prompt']
+
+
+def _us_ticker(index: int) -> str:
+    """通し番号から4文字の米国株風ティッカーを生成（AAAA, AAAB, ...）"""
+    letters = ''
+    for _ in range(4):
+        index, rem = divmod(index, 26)
+        letters = chr(ord('A') + rem) + letters
+    return letters
+
+
+def generate_portfolio(size: int, usd_ratio: float = 0.4, seed: int = 0) -> List[Dict]:
+    """
+    合成ポートフォリオを生成
+    Args:
+        size: 銘柄数
+        usd_ratio: 米国株の割合
+        seed: 乱数シード（同じ値なら同じポートフォリオ）
+    Returns:
+        List[Dict]: 保有銘柄（symbol, quantity, sector）
+    """
+    rng = random.Random(seed)
+    usd_count = int(round(size * usd_ratio))
+    holdings = []
+    for i in range(size):
+        if (i * usd_count) // size != ((i + 1) * usd_count) // size:
+            # 米国株を全体に均等に散らばるように配置
+            holdings.append({'symbol': _us_ticker(i), 'quantity': rng.randint(1, 200)})
+        else:
+            holdings.append({'symbol': f"{1301 + i}.T", 'quantity': rng.randint(1, 30) * 100})
+        holdings[-1]['sector'] = SECTORS[rng.randrange(len(SECTORS))]
+    return holdings
+
+
+def _price_factor(symbol: str) -> float:
+    """銘柄コードから決まる価格の倍率（0.2〜4.2倍）"""
+    return 0.2 + (zlib.crc32(symbol.encode()) % 1000) / 250
+
+
+def synthetic_quotes(holdings: List[Dict]) -> Dict[str, Dict]:
+    """
+    代替サーバーを使わずに銘柄ごとの株価情報を生成（通信を伴わない段階の計測用）
+    Args:
+        holdings: generate_portfolio の結果
+    Returns:
+        Dict: 銘柄ごとの株価情報
+    """
+    quotes = {}
+    for stock in holdings:
+        symbol = stock['symbol']
+        currency = 'JPY' if symbol.endswith('.T') else 'USD'
+        factor = _price_factor(symbol)
+        current_price = round((2855.5 if currency == 'JPY' else 252.29) * factor, 2)
+        change_percent = (zlib.crc32(symbol[::-1].encode()) % 1000) / 100 - 5
+        previous_price = current_price / (1 + change_percent / 100)
+        quotes[symbol] = {
+            'current_price': current_price,
+            'previous_price': previous_price,
+            'change': current_price - previous_price,
+            'change_percent': change_percent,
+            'company_name': f"{symbol} Holdings",
+            'currency': currency
+        }
+    return quotes
+
+
+def _load_fixture(name: str) -> Dict:
+    with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+        return json.load(f)
+
+
+class FixtureServer:
+    """
+    記録済みの応答を返すYahoo Finance・Google Sheets・Gemini APIの代替サーバー
+    銘柄ごとのチャート応答は記録済みの応答の価格を銘柄コードから決まる倍率で変えて生成する
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.charts = {
+            'JPY': _load_fixture('yahoo_chart_jpy.json'),
+            'USD': _load_fixture('yahoo_chart_usd.json')
+        }
+        self.sheets_metadata = _load_fixture('sheets_metadata.json')
+        self.sheets_values = _load_fixture('sheets_values.json')
+        self.gemini = json.dumps(_load_fixture('gemini_generate_content.json'), ensure_ascii=False).encode('utf-8')
+        self.fx = json.dumps(_load_fixture('yahoo_chart_usdjpy.json')).encode('utf-8')
+        self.requests = Counter()
+        self._responses: Dict[str, bytes] = {}
+        self._metadata = b'{}'
+        self._values = b'{}'
+        self._lock = threading.Lock()
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                path = unquote(urlparse(self.path).path)
+                if path.startswith('/v8/finance/chart/'):
+                    fixture._count('yahoo.chart')
+                    self._reply(*fixture._chart(path.rsplit('/', 1)[-1]))
+                elif path.startswith('/v4/spreadsheets/'):
+                    fixture._count('sheets')
+                    self._reply(200, fixture._values if '/values/' in path else fixture._metadata)
+                else:
+                    self._reply(404, b'{}')
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if ':generateContent' in self.path:
+                    fixture._count('gemini')
+                    self._reply(200, fixture.gemini)
+                else:
+                    self._reply(404, b'{}')
+
+            def _reply(self, status: int, payload: bytes):
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=UTF-8')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _count(self, name: str):
+        with self._lock:
+            self.requests[name] += 1
+
+    def reset_counts(self):
+        with self._lock:
+            self.requests.clear()
+
+    def set_portfolio(self, holdings: List[Dict]):
+        """
+        応答するポートフォリオを設定（Sheetsの行と銘柄ごとのチャート応答を事前に生成）
+        Args:
+            holdings: generate_portfolio の結果
+        """
+        responses = {'USDJPY=X': self.fx}
+        rows = [list(self.sheets_values['values'][0])]
+        for stock in holdings:
+            symbol = stock['symbol']
+            currency = 'JPY' if symbol.endswith('.T') else 'USD'
+            responses[symbol] = json.dumps(self._scaled_chart(symbol, currency)).encode('utf-8')
+            # Sheetsには日本株の証券コードを数値で入力している
+            code = int(symbol[:-2]) if currency == 'JPY' else symbol
+            rows.append([code, stock['quantity'], stock.get('sector', '')])
+
+        metadata = copy.deepcopy(self.sheets_metadata)
+        metadata['sheets'][0]['properties']['gridProperties']['rowCount'] = max(1000, len(rows))
+        values = dict(self.sheets_values, values=rows)
+        self._responses = responses
+        self._metadata = json.dumps(metadata, ensure_ascii=False).encode('utf-8')
+        self._values = json.dumps(values, ensure_ascii=False).encode('utf-8')
+
+    def _scaled_chart(self, symbol: str, currency: str) -> Dict:
+        chart = copy.deepcopy(self.charts[currency])
+        factor = _price_factor(symbol)
+        result = chart['chart']['result'][0]
+        meta = result['meta']
+        meta['symbol'] = symbol
+        meta['longName'] = meta['shortName'] = f"{symbol} Holdings"
+        meta['regularMarketPrice'] = round(meta['regularMarketPrice'] * factor, 2)
+        quote = result['indicators']['quote'][0]
+        for key in ('open', 'high', 'low', 'close'):
+            quote[key] = [None if value is None else round(value * factor, 2) for value in quote[key]]
+        result['indicators']['adjclose'][0]['adjclose'] = quote['close']
+        return chart
+
+    def _chart(self, symbol: str):
+        payload = self._responses.get(symbol)
+        if payload is None:
+            return 404, json.dumps({'chart': {'result': None, 'error': {
+                'code': 'Not Found', 'description': 'No data found, symbol may be delisted'}}}).encode('utf-8')
+        return 200, payload
+
+
+class _FixtureSession(requests.Session):
+    """Google Sheets APIへのリクエストを代替サーバーに向けるセッション"""
+
+    def __init__(self, base_url: str):
+        super().__init__()
+        self.base_url = base_url
+
+    def request(self, method, url, *args, **kwargs):
+        return super().request(method, url.replace(SHEETS_API_HOST, self.base_url), *args, **kwargs)
+
+
+@contextlib.contextmanager
+def offline_config(server: FixtureServer):
+    """設定を代替サーバー向けに切り替え（終了時に元に戻す）"""
+    import model_router
+    overrides = {
+        'YAHOO_CHART_BASE_URL': f"{server.base_url}/v8/finance/chart/",
+        'GEMINI_API_ENDPOINT': server.base_url,
+        'GOOGLE_API_KEY': 'benchmark',
+        'SPREADSHEET_ID': 'benchmark',
+        'MODEL_ROUTING': False,
+        'LLM_MAP_REDUCE': False
+    }
+    saved = {key: getattr(config, key) for key in overrides}
+    for key, value in overrides.items():
+        setattr(config, key, value)
+    # 実際のエンドポイントで初期化済みのGeminiクライアントを使わない
+    model_router._gemini_configured = False
+    model_router._models.clear()
+    try:
+        yield
+    finally:
+        for key, value in saved.items():
+            setattr(config, key, value)
+        model_router._gemini_configured = False
+        model_router._models.clear()
+
+
+@contextlib.contextmanager
+def _quiet():
+    """計測中の進捗表示を捨てる（書式化の処理は計測に含める）"""
+    import app_logging
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        try:
+            yield
+        finally:
+            # 非同期に書き出すログも捨てる先に出し切る
+            app_logging.flush()
+
+
+def _fixture_fetcher(server: FixtureServer):
+    import gspread
+    from data_fetcher import DataFetcher
+    fetcher = DataFetcher(connect_sheets=False)
+    fetcher.sheets_client = gspread.Client(auth=None, session=_FixtureSession(server.base_url))
+    return fetcher
+
+
+def run_once(server: FixtureServer) -> Dict:
+    """
+    代替サーバーに設定済みのポートフォリオで全段階を1回実行
+    Args:
+        server: 代替サーバー
+    Returns:
+        Dict: 段階ごとの所要時間（ミリ秒）・リクエスト数・出力の大きさ
+    """
+    from analyzer import PortfolioAnalyzer
+    from data_fetcher import build_portfolio_with_prices
+    from mcp_client import MCPClient
+
+    timings = {}
+
+    def timed(name, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        timings[name] = (time.perf_counter() - start) * 1000
+        return result
+
+    server.reset_counts()
+    fetcher = _fixture_fetcher(server)
+    analyzer = PortfolioAnalyzer()
+    with _quiet():
+        portfolio = timed('fetch.sheets', fetcher.get_portfolio_from_sheets)
+        stock_prices = timed('fetch.quotes', fetcher.get_stock_prices, [stock['symbol'] for stock in portfolio])
+        usd_jpy_rate = timed('fetch.fx', fetcher.get_usd_jpy_rate)
+        portfolio_data = timed('valuation', build_portfolio_with_prices, portfolio, stock_prices, usd_jpy_rate)
+        analysis = timed('analysis', analyzer.analyze_portfolio, portfolio_data)
+        report = timed('report', analyzer.generate_report, analysis)
+        with MCPClient() as mcp:
+            prompt = timed('prompt', mcp._format_portfolio_for_analysis, portfolio_data)
+            advice = timed('advice', mcp.get_investment_advice, portfolio_data, 'daily')
+
+    return {
+        'timings_ms': timings,
+        'requests': dict(server.requests),
+        'holdings_loaded': len(portfolio),
+        'quotes_loaded': len(stock_prices),
+        'report_chars': len(report),
+        'prompt_chars': len(prompt),
+        'advice_ok': bool(advice)
+    }
+
+
+def measure_local_stages(size: int, repeat: int = 5, seed: int = 0) -> Dict[str, Dict]:
+    """
+    通信を伴わない段階の所要時間とメモリ確保量のピークを計測
+    所要時間は tracemalloc を止めた状態で繰り返した中央値、ピークは tracemalloc で1回計測した値
+    Args:
+        size: 銘柄数
+        repeat: 所要時間の計測回数
+        seed: 合成ポートフォリオの乱数シード
+    Returns:
+        Dict: 段階ごとの所要時間（median_ms）とピーク（peak_mb）
+    """
+    from analyzer import PortfolioAnalyzer
+    from data_fetcher import build_portfolio_with_prices
+    from mcp_client import MCPClient
+
+    holdings = generate_portfolio(size, seed=seed)
+    portfolio = [{'symbol': stock['symbol'], 'quantity': stock['quantity']} for stock in holdings]
+    quotes = synthetic_quotes(holdings)
+    analyzer = PortfolioAnalyzer()
+    formatter = MCPClient()
+    portfolio_data = build_portfolio_with_prices(portfolio, quotes, 150.0)
+    analysis = analyzer.analyze_portfolio(portfolio_data)
+    stages = {
+        'valuation': lambda: build_portfolio_with_prices(portfolio, quotes, 150.0),
+        'analysis': lambda: analyzer.analyze_portfolio(portfolio_data),
+        'report': lambda: analyzer.generate_report(analysis),
+        'prompt': lambda: formatter._format_portfolio_for_analysis(portfolio_data)
+    }
+
+    measured = {}
+    for name in LOCAL_STAGES:
+        func = stages[name]
+        func()  # 初回の遅延インポートなどを除く
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - start) * 1000)
+
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            func()
+            peak = tracemalloc.get_traced_memory()[1] - before
+        finally:
+            tracemalloc.stop()
+        measured[name] = {'median_ms': round(statistics.median(samples), 3), 'peak_mb': round(peak / 2 ** 20, 3)}
+    return measured
+
+
+# ログ出力のオーバーヘッドを比較する設定（名前, レベル, 形式, 銘柄ごとの詳細ログの出力割合）
+LOGGING_VARIANTS = [
+    ('info', 'INFO', 'json', 1.0),
+    ('debug_text', 'DEBUG', 'text', 1.0),
+    ('debug_json', 'DEBUG', 'json', 1.0),
+    ('debug_json_sampled', 'DEBUG', 'json', 0.1)
+]
+
+
+def _synthetic_quote_fetcher(quotes: Dict[str, Dict]):
+    """株価の取得だけを合成データに置き換えたDataFetcher（キャッシュ・計測・ログ出力は本番と同じ）"""
+    from data_fetcher import DataFetcher
+
+    class SyntheticQuoteFetcher(DataFetcher):
+        def _fetch_stock_price_from_yahoo_api(self, symbol):
+            return quotes.get(symbol)
+    return SyntheticQuoteFetcher(connect_sheets=False)
+
+
+def measure_logging_overhead(symbols: int = 1000, repeat: int = 5, seed: int = 0) -> Dict[str, Dict]:
+    """
+    株価取得（get_stock_prices）のログ出力のオーバーヘッドを計測
+    ログを出力しない場合との差を、呼び出し元の待ち時間（caller）と書き出し完了まで（drained）で示す
+    print は従来の銘柄ごとのprint()を同じ件数だけ実行した場合
+    Args:
+        symbols: 銘柄数
+        repeat: 繰り返し回数（中央値を採用）
+        seed: 合成ポートフォリオの乱数シード
+    Returns:
+        Dict: 方式ごとの1,000銘柄あたりのオーバーヘッド（ミリ秒）
+    """
+    import app_logging
+    from data_fetcher import _format_quote
+
+    holdings = generate_portfolio(symbols, seed=seed)
+    quotes = synthetic_quotes(holdings)
+    symbol_list = [stock['symbol'] for stock in holdings]
+    fetcher = _synthetic_quote_fetcher(quotes)
+    scale = 1000 / symbols
+
+    def run(level, fmt, sample_rate):
+        app_logging.setup_logging(level=level, fmt=fmt, sample_rate=sample_rate)
+        callers, drained = [], []
+        for _ in range(repeat):
+            with _quiet():
+                start = time.perf_counter()
+                fetcher.get_stock_prices(symbol_list)
+                callers.append((time.perf_counter() - start) * 1000)
+                app_logging.flush()
+                drained.append((time.perf_counter() - start) * 1000)
+        return statistics.median(callers), statistics.median(drained)
+
+    try:
+        base, _ = run('CRITICAL', 'text', 1.0)
+        results = {}
+        for name, level, fmt, sample_rate in LOGGING_VARIANTS:
+            caller, drained = run(level, fmt, sample_rate)
+            results[name] = {'caller_ms': round(max(caller - base, 0) * scale, 3),
+                             'drained_ms': round(max(drained - base, 0) * scale, 3)}
+
+        samples = []
+        for _ in range(repeat):
+            with _quiet():
+                start = time.perf_counter()
+                for symbol in symbol_list:
+                    print(_format_quote(symbol, quotes[symbol]))
+                samples.append((time.perf_counter() - start) * 1000)
+        legacy = round(statistics.median(samples) * scale, 3)
+        results['print'] = {'caller_ms': legacy, 'drained_ms': legacy}
+    finally:
+        app_logging.setup_logging()
+    return results
+
+
+def load_budgets(path: str = BUDGETS_PATH) -> Dict:
+    """性能予算とベースラインを読み込み"""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def check_budgets(measured: Dict[str, Dict], budgets: Dict) -> List[str]:
+    """
+    計測値を性能予算と比較
+    Args:
+        measured: measure_local_stages の結果
+        budgets: load_budgets の結果
+    Returns:
+        List[str]: 予算超過の内容（ベースラインとの差分付き、超過がなければ空）
+    """
+    violations = []
+    for name, budget in budgets['stages'].items():
+        stats = measured.get(name)
+        if stats is None:
+            violations.append(f"{name}: 計測値がありません")
+            continue
+        for key, unit, budget_key, baseline_key in (('median_ms', 'ms', 'budget_ms', 'baseline_ms'),
+                                                    ('peak_mb', 'MB', 'budget_peak_mb', 'baseline_peak_mb')):
+            value = stats[key]
+            if value > budget[budget_key]:
+                baseline = budget.get(baseline_key)
+                diff = f"ベースライン {baseline:,.3f}{unit} の {value / baseline:.1f}倍" if baseline else "ベースラインなし"
+                violations.append(f"{name}: {value:,.3f}{unit} > 予算 {budget[budget_key]:,.3f}{unit}（{diff}）")
+    return violations
+
+
+def write_baseline(measured: Dict[str, Dict], path: str = BUDGETS_PATH):
+    """
+    計測値をベースラインとして保存（予算は変更しない）
+    Args:
+        measured: measure_local_stages の結果
+        path: 性能予算のファイル
+    """
+    budgets = load_budgets(path)
+    for name, stats in measured.items():
+        stage = budgets['stages'].setdefault(name, {})
+        stage['baseline_ms'] = stats['median_ms']
+        stage['baseline_peak_mb'] = stats['peak_mb']
+    budgets['baseline_commit'] = _git_commit()
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(budgets, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+
+
+def _stats(samples: List[float]) -> Dict:
+    return {
+        'median_ms': round(statistics.median(samples), 3),
+        'min_ms': round(min(samples), 3),
+        'max_ms': round(max(samples), 3)
+    }
+
+
+def run_benchmark(sizes: List[int], repeat: int = 3, usd_ratio: float = 0.4, seed: int = 0) -> Dict:
+    """
+    銘柄数ごとにベンチマークを実行
+    Args:
+        sizes: 計測する銘柄数のリスト
+        repeat: 銘柄数ごとの繰り返し回数（中央値を採用）
+        usd_ratio: 米国株の割合
+        seed: 合成ポートフォリオの乱数シード
+    Returns:
+        Dict: 計測結果
+    """
+    from instrumentation import get_instrumentation
+
+    logging_overhead = measure_logging_overhead()
+    for name, stats in logging_overhead.items():
+        print(f"📝 ログ出力 {name}: 1,000銘柄あたり {stats['caller_ms']:,.2f}ms（書き出し完了まで {stats['drained_ms']:,.2f}ms）")
+
+    server = FixtureServer()
+    server.start()
+    results = []
+    try:
+        with offline_config(server):
+            for size in sizes:
+                holdings = generate_portfolio(size, usd_ratio, seed)
+                server.set_portfolio(holdings)
+                runs = []
+                for _ in range(repeat):
+                    get_instrumentation().reset()
+                    runs.append(run_once(server))
+                last = runs[-1]
+                stages = {name: _stats([run['timings_ms'][name] for run in runs]) for name in STAGES}
+                stages['total'] = _stats([sum(run['timings_ms'].values()) for run in runs])
+                results.append({
+                    'holdings': size,
+                    'usd_holdings': sum(1 for stock in holdings if not stock['symbol'].endswith('.T')),
+                    'stages': stages,
+                    'requests': last['requests'],
+                    'holdings_loaded': last['holdings_loaded'],
+                    'quotes_loaded': last['quotes_loaded'],
+                    'report_chars': last['report_chars'],
+                    'prompt_chars': last['prompt_chars'],
+                    'advice_ok': last['advice_ok']
+                })
+                print(f"⏱️ {size:,}銘柄: " + ', '.join(
+                    f"{name} {stages[name]['median_ms']:,.1f}ms" for name in STAGES + ['total']))
+    finally:
+        get_instrumentation().reset()
+        server.stop()
+
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'usd_ratio': usd_ratio,
+        'seed': seed,
+        'results': results,
+        'logging_overhead_per_1000_symbols': logging_overhead
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(before: Dict, after: Dict) -> List[Dict]:
+    """
+    2つの計測結果を銘柄数・段階ごとに比較
+    Args:
+        before: 変更前の計測結果
+        after: 変更後の計測結果
+    Returns:
+        List[Dict]: 段階ごとの中央値と比率
+    """
+    before_by_size = {result['holdings']: result for result in before['results']}
+    rows = []
+    for result in after['results']:
+        previous = before_by_size.get(result['holdings'])
+        if previous is None:
+            continue
+        for name, stats in result['stages'].items():
+            old = previous['stages'].get(name, {}).get('median_ms')
+            if old is None:
+                continue
+            new = stats['median_ms']
+            rows.append({'holdings': result['holdings'], 'stage': name, 'before_ms': old, 'after_ms': new,
+                         'ratio': round(new / old, 3) if old else None})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='オフラインのベンチマーク')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='計測する銘柄数')
+    parser.add_argument('--repeat', type=int, default=3, help='銘柄数ごとの繰り返し回数')
+    parser.add_argument('--usd-ratio', type=float, default=0.4, help='米国株の割合')
+    parser.add_argument('--seed', type=int, default=0, help='合成ポートフォリオの乱数シード')
+    parser.add_argument('--output', help='結果のJSONファイル（省略時は benchmarks/results/ に日時付きで保存）')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='2つの結果ファイルを比較')
+    parser.add_argument('--check-budgets', action='store_true', help='通信を伴わない段階を性能予算と比較')
+    parser.add_argument('--write-baseline', action='store_true', help='通信を伴わない段階の計測値をベースラインとして保存')
+    args = parser.parse_args()
+
+    if args.check_budgets or args.write_baseline:
+        budgets = load_budgets()
+        measured = measure_local_stages(budgets['holdings'])
+        for name, stats in measured.items():
+            print(f"⏱️ {budgets['holdings']:,}銘柄 {name}: {stats['median_ms']:,.3f}ms, ピーク {stats['peak_mb']:,.3f}MB")
+        if args.write_baseline:
+            write_baseline(measured)
+            print(f"📄 ベースラインを更新しました: {BUDGETS_PATH}")
+            return
+        violations = check_budgets(measured, budgets)
+        for violation in violations:
+            print(f"❌ {violation}")
+        if violations:
+            raise SystemExit(1)
+        print("✅ すべての段階が予算内です")
+        return
+
+    if args.compare:
+        with open(args.compare[0], encoding='utf-8') as f:
+            before = json.load(f)
+        with open(args.compare[1], encoding='utf-8') as f:
+            after = json.load(f)
+        for row in compare(before, after):
+            ratio = f"{row['ratio']:.2f}x" if row['ratio'] is not None else '-'
+            print(f"{row['holdings']:>6,}銘柄 {row['stage']:<13} {row['before_ms']:>10,.1f}ms → "
+                  f"{row['after_ms']:>10,.1f}ms ({ratio})")
+        return
+
+    result = run_benchmark(args.sizes, args.repeat, args.usd_ratio, args.seed)
+    output = args.output or os.path.join(RESULTS_DIR, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"📄 結果を保存しました: {output}")
+
+
+if __name__ == '__main__':
+    main()
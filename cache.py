@@ -0,0 +1,256 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+import config
+
+
+class TTLCache:
+    """
+    スレッドセーフなインプロセスTTLキャッシュ
+    ウォームコンテナやBotプロセスの生存期間中、結果を再利用するために使用
+    """
+
+    def __init__(self, ttl_seconds: float = 300, max_entries: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        有効期限内の値を取得
+        Args:
+            key: キャッシュキー
+            default: 見つからない場合の値
+        Returns:
+            Any: キャッシュされた値
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """
+        値を保存（上限を超えた場合は最も古いエントリを削除）
+        Args:
+            key: キャッシュキー
+            value: 保存する値
+            ttl: 有効期間（秒、省略時はデフォルト）
+        """
+        expires_at = time.time() + (self.ttl_seconds if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """
+        キーが存在しない（または期限切れの）場合のみ保存
+        Returns:
+            bool: 保存した場合True
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.time():
+                return False
+            self._entries[key] = (time.time() + (self.ttl_seconds if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return True
+
+    def append(self, key: str, item: Any, limit: Optional[int] = None, ttl: Optional[float] = None) -> list:
+        """
+        リストの値に要素を追加（読み込みから保存までをロック内で行う）
+        Args:
+            key: キャッシュキー
+            item: 追加する要素
+            limit: 保持する要素数の上限（超過分は古いものから削除）
+            ttl: 有効期間（秒、省略時はデフォルト）
+        Returns:
+            list: 追加後のリスト
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            items = list(entry[1]) if entry is not None and entry[0] > time.time() else []
+            items.append(item)
+            if limit:
+                items = items[-limit:]
+            self._entries[key] = (time.time() + (self.ttl_seconds if ttl is None else ttl), items)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return items
+
+    def delete(self, key: str):
+        """エントリを削除"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """全エントリを削除"""
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteCache:
+    """
+    複数のワーカープロセスで共有できるSQLiteベースのTTLキャッシュ
+    TTLCacheと同じインターフェースを持ち、値はpickleで保存する
+    """
+
+    def __init__(self, namespace: str, ttl_seconds: float = 300, max_entries: int = 1024,
+                 path: Optional[str] = None):
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.path = path or config.CACHE_SQLITE_PATH
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB, expires_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        """スレッドごとの接続を取得（WALモードで複数プロセスから同時に読み書きする）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str, default: Any = None) -> Any:
+        row = self._connect().execute(
+            "SELECT value FROM cache WHERE namespace = ? AND key = ? AND expires_at > ?",
+            (self.namespace, key, time.time())
+        ).fetchone()
+        return pickle.loads(row[0]) if row else default
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.time() + (self.ttl_seconds if ttl is None else ttl)
+        self._connect().execute(
+            "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (self.namespace, key, pickle.dumps(value), expires_at)
+        )
+        self._after_write()
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """キーが存在しない（または期限切れの）場合のみ保存（プロセス間でアトミック）"""
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND key = ? AND expires_at <= ?",
+                (self.namespace, key, now)
+            )
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (self.namespace, key, pickle.dumps(value), now + (self.ttl_seconds if ttl is None else ttl))
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._after_write()
+        return cursor.rowcount == 1
+
+    def append(self, key: str, item: Any, limit: Optional[int] = None, ttl: Optional[float] = None) -> list:
+        """リストの値に要素を追加（書き込みロックを取って読み込むため、プロセス間で追加が失われない）"""
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT value FROM cache WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (self.namespace, key, now)
+            ).fetchone()
+            items = list(pickle.loads(row[0])) if row else []
+            items.append(item)
+            if limit:
+                items = items[-limit:]
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (self.namespace, key, pickle.dumps(items), now + (self.ttl_seconds if ttl is None else ttl))
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._after_write()
+        return items
+
+    def delete(self, key: str):
+        self._connect().execute(
+            "DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key)
+        )
+
+    def clear(self):
+        self._connect().execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+
+    def _after_write(self):
+        """一定回数の書き込みごとに期限切れと上限超過のエントリを削除"""
+        self._writes += 1
+        if self._writes % 100:
+            return
+        conn = self._connect()
+        conn.execute("DELETE FROM cache WHERE namespace = ? AND expires_at <= ?", (self.namespace, time.time()))
+        conn.execute(
+            "DELETE FROM cache WHERE namespace = ? AND key NOT IN ("
+            " SELECT key FROM cache WHERE namespace = ? ORDER BY expires_at DESC LIMIT ?)",
+            (self.namespace, self.namespace, self.max_entries)
+        )
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        row = self._connect().execute(
+            "SELECT COUNT(*) FROM cache WHERE namespace = ? AND expires_at > ?", (self.namespace, time.time())
+        ).fetchone()
+        return row[0]
+
+
+def make_cache(namespace: str, ttl_seconds: float = 300, max_entries: int = 1024):
+    """
+    設定に応じたキャッシュを生成
+    CACHE_BACKEND=sqliteの場合は複数ワーカープロセスで共有されるSQLiteキャッシュ、それ以外はプロセス内キャッシュ
+    Args:
+        namespace: キャッシュの名前空間
+        ttl_seconds: デフォルトの有効期間（秒）
+        max_entries: 最大エントリ数
+    Returns:
+        TTLCache | SQLiteCache: キャッシュ
+    """
+    if config.CACHE_BACKEND == 'sqlite':
+        return SQLiteCache(namespace, ttl_seconds=ttl_seconds, max_entries=max_entries)
+    return TTLCache(ttl_seconds=ttl_seconds, max_entries=max_entries)
+
+
+_MISSING = object()
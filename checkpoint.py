@@ -0,0 +1,178 @@
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import config
+from object_store import get_object_store
+from snapshot_store import JST
+
+# 実行の段階（この順に進む）
+STAGES = ['portfolio', 'prices', 'analysis', 'advice', 'slack']
+
+
+def schedule_datetime(event: Dict) -> datetime:
+    """
+    実行のスケジュール時刻（日本時間）
+    EventBridgeのイベント時刻（time）があればそれを使い、再試行でも同じ時刻になるようにする
+    Args:
+        event: Lambdaのイベント
+    Returns:
+        datetime: タイムゾーン付きの日時
+    """
+    if event.get('time'):
+        try:
+            return datetime.fromisoformat(event['time'].replace('Z', '+00:00')).astimezone(JST)
+        except ValueError:
+            print(f"⚠️ イベント時刻を解釈できません: {event['time']}")
+    return datetime.now(JST)
+
+
+def schedule_date(event: Dict) -> str:
+    """
+    実行のスケジュール日（日本時間）
+    Args:
+        event: Lambdaのイベント（schedule_dateで明示的に指定することもできる）
+    Returns:
+        str: YYYY-MM-DD
+    """
+    if event.get('schedule_date'):
+        return event['schedule_date']
+    return schedule_datetime(event).date().isoformat()
+
+
+class RunCheckpoint:
+    """
+    スケジュール日と実行タイプごとのチェックポイント
+    段階ごとの出力を保存し、再試行時は未完了の最初の段階から再開する
+    Slackは投稿済みメッセージのtsを1件ごとに記録し、再試行で二重投稿しない
+    """
+
+    def __init__(self, execution_type: str, run_date: str, store=None, storage: str = 's3'):
+        self.execution_type = execution_type
+        self.run_date = run_date
+        self.store = store or get_object_store()
+        self.storage = storage
+        self.key = f"checkpoints/{execution_type}/{run_date}.json"
+        self._state = self._load()
+
+    def _load(self) -> Dict:
+        try:
+            body = self.store.get(self.key)
+        except Exception as e:
+            print(f"⚠️ チェックポイント読み込みエラー: {e}")
+            body = None
+        if body is None:
+            return {'stages': {}, 'deliveries': {}, 'attempts': 0, 'completed': False}
+        state = json.loads(body)
+        print(f"♻️ チェックポイントから再開: {', '.join(state['stages']) or '未着手'}（{state['attempts']}回目の実行後）")
+        return state
+
+    def _write(self):
+        # 保存に失敗しても実行自体は続ける（再試行時に再開できる範囲が減るだけ）
+        try:
+            self.store.put(self.key, json.dumps(self._state, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        except Exception as e:
+            print(f"⚠️ チェックポイント保存エラー: {e}")
+
+    @property
+    def completed(self) -> bool:
+        """Slack通知まで完了済みか"""
+        return self._state['completed']
+
+    def start_attempt(self):
+        """実行回数を記録"""
+        self._state['attempts'] += 1
+        self._write()
+
+    def get(self, stage: str) -> Optional[Any]:
+        """
+        保存済みの段階の出力
+        Args:
+            stage: 段階名（STAGESのいずれか）
+        Returns:
+            Any: 出力（未完了の場合はNone）
+        """
+        return self._state['stages'].get(stage)
+
+    def save(self, stage: str, output: Any):
+        """
+        段階の出力を保存
+        Args:
+            stage: 段階名
+            output: JSONにできる出力
+        """
+        self._state['stages'][stage] = output
+        self._write()
+
+    def deliveries(self) -> Dict[str, str]:
+        """投稿済みのSlackメッセージ（キー → ts）"""
+        return dict(self._state['deliveries'])
+
+    def record_delivery(self, result: Dict):
+        """
+        Slackへの投稿成功を記録（SlackDeliveryQueueのon_deliveredから1件ごとに呼ばれる）
+        Args:
+            result: 送信結果
+        """
+        self._state['deliveries'][result['key']] = result['ts']
+        self._write()
+
+    def complete(self, slack_result: Dict):
+        """
+        Slack通知まで完了したことを記録
+        Args:
+            slack_result: Slack通知の結果
+        """
+        self._state['stages']['slack'] = slack_result
+        self._state['completed'] = True
+        self._write()
+
+
+class NullCheckpoint:
+    """チェックポイント無効時に使う何も保存しない実装"""
+
+    completed = False
+    storage = 'off'
+
+    def start_attempt(self):
+        pass
+
+    def get(self, stage: str) -> Optional[Any]:
+        return None
+
+    def save(self, stage: str, output: Any):
+        pass
+
+    def deliveries(self) -> Dict[str, str]:
+        return {}
+
+    def record_delivery(self, result: Dict):
+        pass
+
+    def complete(self, slack_result: Dict):
+        pass
+
+
+def open_checkpoint(execution_type: str, event: Dict):
+    """
+    設定に応じたチェックポイントを開く（保存先に接続できない場合はチェックポイントなしで実行）
+    再試行で二重投稿しないためには、再試行が別の実行環境で動いても読めるS3（SNAPSHOT_S3_BUCKET）が必要
+    Lambda上でS3が未設定の場合は警告し、同じ実行環境での再試行にだけ効くローカルのチェックポイントを使う
+    Args:
+        execution_type: 実行タイプ（daily/monthly）
+        event: Lambdaのイベント
+    Returns:
+        RunCheckpoint | NullCheckpoint: チェックポイント（storage は s3 / local / off）
+    """
+    if not config.CHECKPOINT_ENABLED:
+        return NullCheckpoint()
+    storage = 's3' if config.SNAPSHOT_S3_BUCKET else 'local'
+    if storage == 'local' and os.environ.get('AWS_LAMBDA_FUNCTION_NAME'):
+        print("⚠️ SNAPSHOT_S3_BUCKET が未設定のため、チェックポイントは実行環境の /tmp に保存されます"
+              "（別の実行環境で再試行された場合は再開できず、Slackに二重投稿する可能性があります）")
+    try:
+        return RunCheckpoint(execution_type, schedule_date(event), storage=storage)
+    except Exception as e:
+        print(f"⚠️ チェックポイントを使用できません: {e}")
+        return NullCheckpoint()
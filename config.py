@@ -6,6 +6,7 @@ import os
 
 # Google Sheets設定
 GOOGLE_SHEETS_CREDENTIALS_PATH = os.environ.get('GOOGLE_SHEETS_CREDENTIALS_PATH', '/tmp/credentials.json')
+GOOGLE_TOKEN_REFRESH_MARGIN = int(os.environ.get('GOOGLE_TOKEN_REFRESH_MARGIN', '300'))  # アクセストークンを期限切れ前に更新する余裕（秒）
 SPREADSHEET_ID = os.environ.get('SPREADSHEET_ID')
 GOOGLE_SHEETS_SCOPES = [
     'https://www.googleapis.com/auth/spreadsheets',
@@ -14,16 +15,119 @@ GOOGLE_SHEETS_SCOPES = [
 
 # Gemini API設定
 GOOGLE_API_KEY = os.environ.get('GOOGLE_API_KEY')
+GEMINI_API_ENDPOINT = os.environ.get('GEMINI_API_ENDPOINT')  # ベンチマーク時はローカルの代替サーバーを指定（省略時は既定のエンドポイント）
+
+# Geminiモデル選択設定（強い順、カンマ区切り）
+GEMINI_MODEL_TIERS = [m.strip() for m in os.environ.get(
+    'GEMINI_MODEL_TIERS', 'gemini-2.5-pro,gemini-2.5-flash,gemini-2.5-flash-lite'
+).split(',') if m.strip()]
+GEMINI_DEFAULT_LATENCY_MS = [60000, 25000, 10000]  # 実測がない場合の想定応答時間（階層順）
+GEMINI_SAFETY_MARGIN_MS = int(os.environ.get('GEMINI_SAFETY_MARGIN_MS', '30000'))  # Slack送信などに残す時間
+MODEL_ROUTING = os.environ.get('MODEL_ROUTING', 'true').lower() == 'true'
+GEMINI_DEFAULT_MODEL = os.environ.get('GEMINI_DEFAULT_MODEL', 'gemini-2.5-flash')  # モデル選択を使わない場合のモデル
+SLACK_QA_TIME_BUDGET_MS = int(os.environ.get('SLACK_QA_TIME_BUDGET_MS', '90000'))  # Slack質問1件あたりの時間予算
+
+# Gemini map-reduce分析設定
+LLM_MAP_REDUCE = os.environ.get('LLM_MAP_REDUCE', 'false').lower() == 'true'  # 銘柄ごとに分割して並列分析
+LLM_MAP_REDUCE_SHARD_BY = os.environ.get('LLM_MAP_REDUCE_SHARD_BY', 'holding')  # holding または sector
+LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', '8'))  # 同時リクエスト数の上限
+LLM_SHARD_CACHE_TTL = int(os.environ.get('LLM_SHARD_CACHE_TTL', '21600'))  # 部分結果キャッシュの有効期間（秒）
+
+# Slack Q&Aのツール呼び出し（Function Calling）設定
+SLACK_QA_TOOLS = os.environ.get('SLACK_QA_TOOLS', 'true').lower() == 'true'
+
+# Slack Q&A回答キャッシュ設定
+ANSWER_CACHE_ENABLED = os.environ.get('ANSWER_CACHE_ENABLED', 'true').lower() == 'true'
+ANSWER_CACHE_TTL = int(os.environ.get('ANSWER_CACHE_TTL', '1800'))  # 回答の有効期間（秒）
+ANSWER_CACHE_SIMILARITY = float(os.environ.get('ANSWER_CACHE_SIMILARITY', '0.7'))  # 同一質問とみなす類似度（Jaccard）
+
+# Slack Q&Aの会話履歴設定（ユーザー・スレッド単位）
+CONVERSATION_MEMORY = os.environ.get('CONVERSATION_MEMORY', 'true').lower() == 'true'
+CONVERSATION_MAX_USERS = int(os.environ.get('CONVERSATION_MAX_USERS', '500'))  # 履歴を保持するユーザー数（LRU）
+CONVERSATION_MAX_THREADS_PER_USER = int(os.environ.get('CONVERSATION_MAX_THREADS_PER_USER', '5'))  # ユーザーあたりのスレッド数
+CONVERSATION_MAX_TOKENS = int(os.environ.get('CONVERSATION_MAX_TOKENS', '1500'))  # スレッドごとに原文で保持する履歴の上限
+CONVERSATION_SUMMARY_TOKENS = int(os.environ.get('CONVERSATION_SUMMARY_TOKENS', '300'))  # 要約部分の上限
+CONVERSATION_TTL = int(os.environ.get('CONVERSATION_TTL', '86400'))  # CACHE_BACKEND=sqlite で共有する履歴の保持期間（秒）
+
+# 大きなポートフォリオの分散実行設定（off: 単一プロセス / local: プロセスプール / lambda: Lambdaの自己呼び出し）
+SHARD_MODE = os.environ.get('SHARD_MODE', 'off')
+SHARD_SIZE = int(os.environ.get('SHARD_SIZE', '25'))  # シャードあたりの銘柄数
+SHARD_MAX_WORKERS = int(os.environ.get('SHARD_MAX_WORKERS', '8'))  # 同時に処理するシャード数
+SHARD_WORKER_FUNCTION = os.environ.get('SHARD_WORKER_FUNCTION', os.environ.get('AWS_LAMBDA_FUNCTION_NAME', ''))
+
+# 日次スナップショット設定（月次レポートは保存済みのスナップショットから集計する）
+SNAPSHOT_ENABLED = os.environ.get('SNAPSHOT_ENABLED', 'true').lower() == 'true'
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', '/tmp/kabukan_data' if os.environ.get('AWS_LAMBDA_FUNCTION_NAME') else 'data')  # ローカル保存先（S3未設定時）
+SNAPSHOT_S3_BUCKET = os.environ.get('SNAPSHOT_S3_BUCKET')  # 設定時はS3に保存
+SNAPSHOT_S3_PREFIX = os.environ.get('SNAPSHOT_S3_PREFIX', 'kabukan')
+RECORDINGS_PREFIX = os.environ.get('RECORDINGS_PREFIX', 'recordings/')  # Lambdaの実行記録（record_replay）の保存先キー
+CHECKPOINT_ENABLED = os.environ.get('CHECKPOINT_ENABLED', 'true').lower() == 'true'  # 段階ごとのチェックポイント（同じ保存先の checkpoints/ 以下）
+WARMUP_ENABLED = os.environ.get('WARMUP_ENABLED', 'true').lower() == 'true'  # 朝の実行で寄り付き前のウォームアップ結果（warm/ 以下）を使う
+
+# 計測設定（区間ごとの所要時間。Lambda上はEMF、ローカルはトレースファイルに出力）
+INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION_ENABLED', 'true').lower() == 'true'
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'Kabukan')
+TRACE_DIR = os.environ.get('TRACE_DIR', 'traces')
+INSTRUMENTATION_MAX_SPANS = int(os.environ.get('INSTRUMENTATION_MAX_SPANS', '10000'))  # 保持するスパンの上限（古いものから破棄）
+INSTRUMENTATION_RESERVOIR_SIZE = int(os.environ.get('INSTRUMENTATION_RESERVOIR_SIZE', '1000'))  # 区間ごとに保持する所要時間の標本数
+
+# ログ設定（Lambdaは段階ごとの要約のみをJSONで出力、ローカルは銘柄ごとの詳細も従来の形式で表示）
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO' if os.environ.get('AWS_LAMBDA_FUNCTION_NAME') else 'DEBUG').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json' if os.environ.get('AWS_LAMBDA_FUNCTION_NAME') else 'text')
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', '1.0'))  # 銘柄ごとの詳細ログを出力する割合（0〜1）
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))  # 書き出し待ちの上限（超過分は破棄）
+
+# プロファイリング設定（既定は無効。sample: サンプリング / cprofile: cProfile）
+PROFILE_MODE = os.environ.get('PROFILE', '').lower()
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '/tmp/kabukan_profiles' if os.environ.get('AWS_LAMBDA_FUNCTION_NAME') else 'profiles')
+PROFILE_TOP_N = int(os.environ.get('PROFILE_TOP_N', '30'))  # .top.txt に出力する関数の件数
+PROFILE_SAMPLE_INTERVAL_MS = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', '5'))  # サンプリング間隔（ミリ秒）
+
+# 共有キャッシュ設定（memory: プロセス内 / sqlite: 複数ワーカープロセスで共有）
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+CACHE_SQLITE_PATH = os.environ.get('CACHE_SQLITE_PATH', '/tmp/kabukan_cache.sqlite3')
+
+# データ取得キャッシュ設定（秒）
+QUOTE_CACHE_TTL = int(os.environ.get('QUOTE_CACHE_TTL', '60'))
+HISTORY_CACHE_TTL = int(os.environ.get('HISTORY_CACHE_TTL', '3600'))
+PORTFOLIO_CACHE_TTL = int(os.environ.get('PORTFOLIO_CACHE_TTL', '300'))
+
+# Yahoo Finance Chart APIのURL（ベンチマーク時はローカルの代替サーバーを指定）
+YAHOO_CHART_BASE_URL = os.environ.get('YAHOO_CHART_BASE_URL', 'https://query1.finance.yahoo.com/v8/finance/chart/')
+
+# 取引所カレンダー設定（株価キャッシュは引け後に次の立会開始まで保持、日米とも休場の日次実行は省略）
+MARKET_CALENDAR_ENABLED = os.environ.get('MARKET_CALENDAR_ENABLED', 'true').lower() == 'true'
+QUOTE_SETTLE_SECONDS = int(os.environ.get('QUOTE_SETTLE_SECONDS', '1200'))  # 引け後に終値が確定するまでの待ち時間（秒）
 
 # Slack API設定
 SLACK_BOT_TOKEN = os.environ.get('SLACK_BOT_TOKEN')
 SLACK_SIGNING_SECRET = os.environ.get('SLACK_SIGNING_SECRET')
 SLACK_CHANNEL = os.environ.get('SLACK_CHANNEL', 'C095G945ZNE')  # チャンネルID直接指定
+SLACK_API_BASE_URL = os.environ.get('SLACK_API_BASE_URL', 'https://slack.com/api/')  # 負荷試験時はローカルの代替サーバーを指定
+
+# Slack Botイベント処理設定
+SLACK_WORKERS = int(os.environ.get('SLACK_WORKERS', '4'))  # 質問処理のワーカースレッド数
+SLACK_QUEUE_SIZE = int(os.environ.get('SLACK_QUEUE_SIZE', '100'))  # 処理待ちキューの上限
+SLACK_EVENT_DEDUP_TTL = int(os.environ.get('SLACK_EVENT_DEDUP_TTL', '3600'))  # 再送イベントの重複判定期間（秒）
+
+QUICK_QUOTE_BUDGET_MS = int(os.environ.get('QUICK_QUOTE_BUDGET_MS', '2000'))  # /stock 即答でデータ取得を待つ上限（ミリ秒）
+QUICK_QUOTE_DEFERRED_TIMEOUT = float(os.environ.get('QUICK_QUOTE_DEFERRED_TIMEOUT', '30'))  # /stock 遅延応答でデータ取得を待つ上限（秒）
+
+# Slack Bot本番サーバー設定（serve_slack_bot.py）
+SLACK_BOT_BIND = os.environ.get('SLACK_BOT_BIND', f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+SLACK_BOT_PROCESSES = int(os.environ.get('SLACK_BOT_PROCESSES', '2'))  # WSGIワーカープロセス数
+SLACK_BOT_THREADS = int(os.environ.get('SLACK_BOT_THREADS', '8'))  # プロセスあたりのリクエスト処理スレッド数
+SLACK_BOT_GRACEFUL_TIMEOUT = int(os.environ.get('SLACK_BOT_GRACEFUL_TIMEOUT', '120'))  # 停止時に処理中の質問を待つ時間（秒）
+
+# Slack送信設定
+SLACK_POST_INTERVAL = float(os.environ.get('SLACK_POST_INTERVAL', '1.0'))  # 同一チャンネルへの送信間隔（秒）
+SLACK_POST_MAX_RETRIES = int(os.environ.get('SLACK_POST_MAX_RETRIES', '5'))  # 送信失敗時の再送回数
 
 # その他の設定
 WORKSHEET_NAME = 'Sheet1'  # デフォルトのワークシート名（変更可能）
 STOCK_SYMBOL_COLUMN = '証券コード'  # 株式銘柄のカラム名
 QUANTITY_COLUMN = '保有株数'  # 保有数量のカラム名
+SECTOR_COLUMN = 'セクター'  # セクターのカラム名（任意）
 
 # AWS S3設定（Google認証情報用）
 CREDENTIALS_S3_BUCKET = os.environ.get('CREDENTIALS_S3_BUCKET')
@@ -84,6 +84,11 @@ fi
 # .envファイルから環境変数を読み込み
 source .env
 
+# チェックポイント（再試行時の二重投稿防止）はS3がないと別の実行環境から読めない
+if [ -z "${SNAPSHOT_S3_BUCKET:-${CREDENTIALS_S3_BUCKET:-}}" ]; then
+    echo "⚠️ SNAPSHOT_S3_BUCKET が未設定です。チェックポイントが /tmp に保存され、再試行時にSlackへ二重投稿する可能性があります"
+fi
+
 # 環境変数の設定
 ENVIRONMENT_VARS=$(cat <<EOF
 {
@@ -94,7 +99,11 @@ ENVIRONMENT_VARS=$(cat <<EOF
         "SPREADSHEET_ID": "${SPREADSHEET_ID:-}",
         "SLACK_BOT_TOKEN": "${SLACK_BOT_TOKEN:-}",
         "SLACK_SIGNING_SECRET": "${SLACK_SIGNING_SECRET:-}",
-        "SLACK_CHANNEL": "${SLACK_CHANNEL:-}"
+        "SLACK_CHANNEL": "${SLACK_CHANNEL:-}",
+        "SHARD_MODE": "${SHARD_MODE:-off}",
+        "SHARD_SIZE": "${SHARD_SIZE:-25}",
+        "SNAPSHOT_S3_BUCKET": "${SNAPSHOT_S3_BUCKET:-${CREDENTIALS_S3_BUCKET:-}}",
+        "SNAPSHOT_S3_PREFIX": "${SNAPSHOT_S3_PREFIX:-kabukan}"
     }
 }
 EOF
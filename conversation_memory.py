@@ -0,0 +1,195 @@
+import re
+import threading
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional, Tuple
+
+import config
+from cache import make_cache
+
+_SENTENCE_END = re.compile(r'(?<=[。．！？!?\n])')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    トークン数の概算（日本語は1文字約1トークン、英数字は4文字約1トークン）
+    Args:
+        text: テキスト
+    Returns:
+        int: 概算トークン数
+    """
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (len(text) - ascii_chars) + (ascii_chars + 3) // 4
+
+
+def compress_text(text: str, max_chars: int) -> str:
+    """
+    長いテキストを先頭と末尾を残して短縮
+    Args:
+        text: テキスト
+        max_chars: 最大文字数
+    Returns:
+        str: 短縮したテキスト
+    """
+    text = re.sub(r'\s+', ' ', text).strip()
+    if len(text) <= max_chars:
+        return text
+    head = max_chars * 2 // 3
+    tail = max_chars - head
+    return f"{text[:head]} …（{len(text) - max_chars}文字省略）… {text[-tail:]}"
+
+
+def summarize_turn(question: str, answer: str, max_chars: int = 120) -> str:
+    """
+    1往復の会話を1行に要約（質問と回答の冒頭の文を抽出）
+    Args:
+        question: 質問
+        answer: 回答
+        max_chars: 各部分の最大文字数
+    Returns:
+        str: 要約
+    """
+    def first_sentence(text: str) -> str:
+        text = text.replace('```', '').strip()
+        sentence = next((part.strip() for part in _SENTENCE_END.split(text) if part.strip()), '')
+        return compress_text(sentence, max_chars)
+
+    return f"Q: {first_sentence(question)} / A: {first_sentence(answer)}"
+
+
+class _ThreadState:
+    """スレッドごとの会話（古い往復は要約に畳み込む）"""
+
+    __slots__ = ('summary', 'turns', 'tokens')
+
+    def __init__(self):
+        self.summary: Deque[str] = deque()
+        self.turns: Deque[Tuple[str, str, int]] = deque()
+        self.tokens = 0
+
+
+class ConversationMemory:
+    """
+    ユーザー・スレッド単位の会話履歴
+    ユーザー数とユーザーあたりのスレッド数はLRUで上限を設け、スレッドごとの履歴はトークン数で制限する
+    上限を超えた古い往復は要約して保持するため、利用者数が増えてもメモリ使用量は一定に保たれる
+    shared_store（make_cacheのキャッシュ）を渡した場合はスレッドごとの履歴をそこに保存し、
+    CACHE_BACKEND=sqlite ではワーカープロセス間で共有する（続きの質問が別プロセスに届いても文脈を失わない）
+    """
+
+    def __init__(self, max_users: Optional[int] = None, max_threads_per_user: Optional[int] = None,
+                 max_tokens: Optional[int] = None, summary_tokens: Optional[int] = None,
+                 max_turn_chars: int = 1200, shared_store=None):
+        self.max_users = max_users or config.CONVERSATION_MAX_USERS
+        self.max_threads_per_user = max_threads_per_user or config.CONVERSATION_MAX_THREADS_PER_USER
+        self.max_tokens = max_tokens or config.CONVERSATION_MAX_TOKENS
+        self.summary_tokens = summary_tokens or config.CONVERSATION_SUMMARY_TOKENS
+        self.max_turn_chars = max_turn_chars
+        self.shared_store = shared_store
+        self._users: "OrderedDict[str, OrderedDict[str, _ThreadState]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _store_key(user_id: str, thread_key: str) -> str:
+        return f"{user_id}|{thread_key}"
+
+    def _thread(self, user_id: str, thread_key: str, create: bool) -> Optional[_ThreadState]:
+        if self.shared_store is not None:
+            state = self.shared_store.get(self._store_key(user_id, thread_key))
+            if state is None and create:
+                state = _ThreadState()
+            return state
+        threads = self._users.get(user_id)
+        if threads is None:
+            if not create:
+                return None
+            threads = self._users[user_id] = OrderedDict()
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        self._users.move_to_end(user_id)
+        state = threads.get(thread_key)
+        if state is None:
+            if not create:
+                return None
+            state = threads[thread_key] = _ThreadState()
+            while len(threads) > self.max_threads_per_user:
+                threads.popitem(last=False)
+        threads.move_to_end(thread_key)
+        return state
+
+    def context(self, user_id: str, thread_key: str) -> str:
+        """
+        プロンプトに含める会話履歴
+        Args:
+            user_id: ユーザーID
+            thread_key: スレッドキー
+        Returns:
+            str: 要約と直近の往復（履歴がない場合は空文字）
+        """
+        with self._lock:
+            state = self._thread(user_id, thread_key, create=False)
+            if state is None:
+                return ""
+            lines = []
+            if state.summary:
+                lines.append("これまでの要約:")
+                lines.extend(f"- {line}" for line in state.summary)
+            for question, answer, _ in state.turns:
+                lines.append(f"ユーザー: {question}")
+                lines.append(f"アドバイザー: {answer}")
+            return "\n".join(lines)
+
+    def record(self, user_id: str, thread_key: str, question: str, answer: str):
+        """
+        1往復を記録（上限を超えた古い往復は要約に畳み込む）
+        Args:
+            user_id: ユーザーID
+            thread_key: スレッドキー
+            question: 質問
+            answer: 回答
+        """
+        question = compress_text(question, self.max_turn_chars)
+        answer = compress_text(answer, self.max_turn_chars)
+        tokens = estimate_tokens(question) + estimate_tokens(answer)
+        with self._lock:
+            state = self._thread(user_id, thread_key, create=True)
+            state.turns.append((question, answer, tokens))
+            state.tokens += tokens
+            while state.tokens > self.max_tokens and len(state.turns) > 1:
+                old_question, old_answer, old_tokens = state.turns.popleft()
+                state.tokens -= old_tokens
+                state.summary.append(summarize_turn(old_question, old_answer))
+            while state.summary and sum(estimate_tokens(line) for line in state.summary) > self.summary_tokens:
+                state.summary.popleft()
+            if self.shared_store is not None:
+                self.shared_store.set(self._store_key(user_id, thread_key), state)
+
+    def stats(self) -> Dict:
+        """保持しているユーザー・スレッド・往復の数（共有時はスレッド数のみ）"""
+        if self.shared_store is not None:
+            return {'shared': True, 'threads': len(self.shared_store)}
+        with self._lock:
+            threads = [state for user in self._users.values() for state in user.values()]
+            return {
+                'users': len(self._users),
+                'threads': len(threads),
+                'turns': sum(len(state.turns) for state in threads),
+                'summaries': sum(len(state.summary) for state in threads),
+                'tokens': sum(state.tokens for state in threads)
+            }
+
+
+_memory = None
+_memory_lock = threading.Lock()
+
+
+def get_conversation_memory() -> ConversationMemory:
+    """プロセス共有のConversationMemoryを取得（CACHE_BACKEND=sqliteの場合はワーカープロセス間で共有）"""
+    global _memory
+    with _memory_lock:
+        if _memory is None:
+            store = None
+            if config.CACHE_BACKEND == 'sqlite':
+                store = make_cache('conversation', ttl_seconds=config.CONVERSATION_TTL,
+                                   max_entries=config.CONVERSATION_MAX_USERS * config.CONVERSATION_MAX_THREADS_PER_USER)
+            _memory = ConversationMemory(shared_store=store)
+        return _memory
@@ -1,32 +1,164 @@
-import gspread
+import logging
+import os
+import threading
+import time
 import requests
-from google.oauth2.service_account import Credentials
 from typing import List, Dict, Optional
 import config
 import json
 from datetime import datetime, timedelta
+from cache import TTLCache
+from app_logging import get_logger, sampled
+from instrumentation import count, span
+from market_calendar import JST, cache_ttl, market_for_symbol
+
+# プロセス内で共有する取得結果キャッシュ（ウォームコンテナ・Botプロセスで再利用）
+_quote_cache = TTLCache(ttl_seconds=config.QUOTE_CACHE_TTL, max_entries=4096)
+_history_cache = TTLCache(ttl_seconds=config.HISTORY_CACHE_TTL, max_entries=1024)
+
+# プロセス内で共有するGoogle Sheetsクライアント（ウォームコンテナでOAuthトークンを再利用）
+_sheets_auth = {'client': None, 'credentials': None, 'path': None, 'mtime': None}
+_sheets_auth_lock = threading.Lock()
+
+logger = get_logger(__name__)
+
+YAHOO_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+def chart_url(symbol: str) -> str:
+    """Yahoo Finance Chart APIの銘柄ごとのURL"""
+    return f"{config.YAHOO_CHART_BASE_URL.rstrip('/')}/{symbol}"
+
+
+def _format_quote(symbol: str, price_data: Dict) -> str:
+    """銘柄ごとの株価の表示（例: 7203.T: ¥3,000 (+1.23%)）"""
+    if price_data.get('currency', 'USD') == 'JPY':
+        return f"{symbol}: ¥{price_data['current_price']:,.0f} ({price_data['change_percent']:+.2f}%)"
+    return f"{symbol}: ${price_data['current_price']:.2f} ({price_data['change_percent']:+.2f}%)"
+
+
+def _token_expires_soon(credentials) -> bool:
+    """アクセストークンが未取得、または期限切れ間近かどうか"""
+    if not credentials.token or credentials.expiry is None:
+        return True
+    remaining = (credentials.expiry - datetime.utcnow()).total_seconds()
+    return remaining < config.GOOGLE_TOKEN_REFRESH_MARGIN
+
+
+def get_sheets_client(credentials_path: str) -> 'gspread.Client':
+    """
+    プロセス内で共有するGoogle Sheetsクライアントを取得
+    認証情報ファイルが変わらない限りクライアントとアクセストークンを再利用し、
+    トークンの期限切れ前に先行して更新する
+    Args:
+        credentials_path: サービスアカウントの認証情報ファイルのパス
+    Returns:
+        gspread.Client: Google Sheetsクライアント
+    """
+    # gspreadとgoogle-authはSheetsを読む段階まで読み込まない
+    import gspread
+    from google.auth.transport.requests import Request
+    from google.oauth2.service_account import Credentials
+    
+    mtime = os.path.getmtime(credentials_path)
+    with _sheets_auth_lock:
+        if _sheets_auth['client'] is None or _sheets_auth['path'] != credentials_path or _sheets_auth['mtime'] != mtime:
+            credentials = Credentials.from_service_account_file(credentials_path, scopes=config.GOOGLE_SHEETS_SCOPES)
+            _sheets_auth.update({
+                'client': gspread.authorize(credentials),
+                'credentials': credentials,
+                'path': credentials_path,
+                'mtime': mtime
+            })
+            logger.info("Google Sheets接続成功")
+        else:
+            logger.debug("♻️ Google Sheetsクライアントを再利用")
+        
+        credentials = _sheets_auth['credentials']
+        if _token_expires_soon(credentials):
+            credentials.refresh(Request())
+            logger.info(f"🔑 アクセストークンを更新しました（有効期限: {credentials.expiry} UTC）")
+        return _sheets_auth['client']
+
+
+def market_cache_ttl(symbol: str, ttl: float) -> float:
+    """
+    銘柄の市場の立会状況に応じたキャッシュ有効期間
+    立会中は通常のTTL、引け後（終値の確定後）は次の立会開始まで有効とする
+    Args:
+        symbol: 株式銘柄コード
+        ttl: 立会中のTTL（秒）
+    Returns:
+        float: 有効期間（秒）
+    """
+    if not config.MARKET_CALENDAR_ENABLED:
+        return ttl
+    return cache_ttl(market_for_symbol(symbol), datetime.now(JST), ttl, config.QUOTE_SETTLE_SECONDS)
+
+
+def build_portfolio_with_prices(portfolio: List[Dict], stock_prices: Dict[str, Dict], usd_jpy_rate: float) -> Dict:
+    """
+    ポートフォリオと株価情報を統合し、総資産価値を計算（円換算）
+    単一プロセス実行と分散実行（sharded_runner）で同じ計算を使う
+    Args:
+        portfolio: 保有株式のリスト
+        stock_prices: 銘柄ごとの株価情報
+        usd_jpy_rate: USD/JPY為替レート
+    Returns:
+        Dict: ポートフォリオと株価情報
+    """
+    # 総資産価値を計算（USD建てとJPY建てを分けて計算）
+    total_value_usd = 0
+    total_value_jpy = 0
+    
+    for stock in portfolio:
+        symbol = stock['symbol']
+        quantity = stock['quantity']
+        if symbol in stock_prices:
+            price_info = stock_prices[symbol]
+            current_price = price_info['current_price']
+            currency = price_info.get('currency', 'USD')
+            
+            holding_value = current_price * quantity
+            
+            if currency == 'JPY':
+                total_value_jpy += holding_value
+            else:  # USD or other currencies treated as USD
+                total_value_usd += holding_value
+    
+    return {
+        'portfolio': portfolio,
+        'stock_prices': stock_prices,
+        'usd_jpy_rate': usd_jpy_rate,
+        'total_value_usd': total_value_usd,
+        'total_value_jpy': total_value_jpy,
+        # 米国株を円換算して合計
+        'total_value_jpy_converted': total_value_jpy + (total_value_usd * usd_jpy_rate)
+    }
+
 
 class DataFetcher:
-    def __init__(self):
+    def __init__(self, connect_sheets: bool = True):
+        """
+        Args:
+            connect_sheets: Google Sheetsに接続するかどうか（株価取得だけを行う分散ワーカーではFalse）
+        """
         self.sheets_client = None
-        self._setup_sheets_client()
+        if connect_sheets:
+            self._setup_sheets_client()
     
     def _setup_sheets_client(self):
         """Google Sheetsクライアントの設定"""
         try:
             if not config.GOOGLE_SHEETS_CREDENTIALS_PATH:
-                print("Google Sheets認証情報のパスが設定されていません")
+                logger.warning("Google Sheets認証情報のパスが設定されていません")
                 self.sheets_client = None
                 return
                 
-            creds = Credentials.from_service_account_file(
-                config.GOOGLE_SHEETS_CREDENTIALS_PATH,
-                scopes=config.GOOGLE_SHEETS_SCOPES
-            )
-            self.sheets_client = gspread.authorize(creds)
-            print("Google Sheets接続成功")
+            self.sheets_client = get_sheets_client(config.GOOGLE_SHEETS_CREDENTIALS_PATH)
         except Exception as e:
-            print(f"Google Sheets接続エラー: {e}")
+            logger.error(f"Google Sheets接続エラー: {e}")
             self.sheets_client = None
     
     def get_portfolio_from_sheets(self) -> List[Dict]:
@@ -35,34 +167,26 @@ class DataFetcher:
         Returns:
             List[Dict]: 株式情報のリスト
         """
+        with span('sheets.load') as stage:
+            portfolio = self._read_portfolio_from_sheets()
+            stage.set(holdings=len(portfolio))
+            return portfolio
+    
+    def _read_portfolio_from_sheets(self) -> List[Dict]:
+        """スプレッドシートの最初のワークシートから保有株式を読み込む"""
         if not self.sheets_client:
-            print("Google Sheetsクライアントが初期化されていません")
+            logger.warning("Google Sheetsクライアントが初期化されていません")
             return []
         
         try:
-            sheet = self.sheets_client.open_by_key(config.SPREADSHEET_ID)
-            
-            # 利用可能なワークシート名を確認
-            worksheets = sheet.worksheets()
-            worksheet_names = [ws.title for ws in worksheets]
-            print(f"利用可能なワークシート: {worksheet_names}")
-            
-            # 最初のワークシートを使用
-            if worksheets:
-                worksheet = worksheets[0]
-                print(f"使用するワークシート: {worksheet.title}")
-            else:
-                print("ワークシートが見つかりません")
+            data = self._read_sheet_records()
+            if data is None:
                 return []
             
-            # データを取得
-            data = worksheet.get_all_records()
-            
-            # デバッグ: スプレッドシートの内容を確認
-            print(f"スプレッドシートのデータ数: {len(data)}")
+            # デバッグ: スプレッドシートの内容を確認（行の内容はDEBUGのみ）
             if data:
-                print(f"最初の行のカラム: {list(data[0].keys())}")
-                print(f"最初の行の内容: {data[0]}")
+                logger.debug(f"最初の行のカラム: {list(data[0].keys())}")
+                logger.debug(f"最初の行の内容: {data[0]}")
             
             portfolio = []
             
@@ -79,15 +203,42 @@ class DataFetcher:
                         'symbol': symbol,
                         'quantity': row.get(config.QUANTITY_COLUMN, 0)
                     }
+                    # セクター列がある場合のみ付加（map-reduce分析のシャード単位に使用）
+                    if row.get(config.SECTOR_COLUMN):
+                        stock_info['sector'] = str(row[config.SECTOR_COLUMN])
                     portfolio.append(stock_info)
             
-            print(f"ポートフォリオ取得完了: {len(portfolio)}銘柄")
+            logger.info(f"ポートフォリオ取得完了: {len(portfolio)}銘柄",
+                        extra={'fields': {'stage': 'sheets.load', 'rows': len(data), 'holdings': len(portfolio)}})
             return portfolio
             
         except Exception as e:
-            print(f"スプレッドシート読み込みエラー: {e}")
+            logger.error(f"スプレッドシート読み込みエラー: {e}")
             return []
     
+    def _read_sheet_records(self) -> Optional[List[Dict]]:
+        """
+        スプレッドシートの最初のワークシートの行を取得（外部サービスとの境界。記録・再生の対象）
+        Returns:
+            List[Dict]: 見出し行をキーとした行のリスト（ワークシートがない場合はNone）
+        """
+        sheet = self.sheets_client.open_by_key(config.SPREADSHEET_ID)
+        
+        # 利用可能なワークシート名を確認
+        worksheets = sheet.worksheets()
+        worksheet_names = [ws.title for ws in worksheets]
+        logger.debug(f"利用可能なワークシート: {worksheet_names}")
+        
+        # 最初のワークシートを使用
+        if not worksheets:
+            logger.warning("ワークシートが見つかりません")
+            return None
+        worksheet = worksheets[0]
+        logger.debug(f"使用するワークシート: {worksheet.title}")
+        
+        # データを取得
+        return worksheet.get_all_records()
+    
     def get_stock_prices(self, symbols: List[str]) -> Dict[str, Dict]:
         """
         株価情報をYahoo Finance APIから直接取得
@@ -97,25 +248,33 @@ class DataFetcher:
             Dict: 銘柄ごとの株価情報
         """
         stock_data = {}
+        failed = []
+        started = time.perf_counter()
         
         for symbol in symbols:
             try:
                 # Yahoo Finance APIから株価データを取得
-                price_data = self._fetch_stock_price_from_yahoo_api(symbol)
+                with span('quote.fetch', symbol=symbol):
+                    price_data = self._fetch_stock_price_from_yahoo_api(symbol)
                 if price_data:
                     stock_data[symbol] = price_data
-                    currency = price_data.get('currency', 'USD')
-                    if currency == 'JPY':
-                        print(f"{symbol}: ¥{price_data['current_price']:,.0f} ({price_data['change_percent']:+.2f}%)")
-                    else:
-                        print(f"{symbol}: ${price_data['current_price']:.2f} ({price_data['change_percent']:+.2f}%)")
+                    _quote_cache.set(symbol, price_data, ttl=market_cache_ttl(symbol, config.QUOTE_CACHE_TTL))
+                    if logger.isEnabledFor(logging.DEBUG) and sampled():
+                        logger.debug(_format_quote(symbol, price_data), extra={'fields': {
+                            'symbol': symbol, 'price': price_data['current_price'],
+                            'change_percent': round(price_data['change_percent'], 2)}})
                 else:
-                    print(f"{symbol}: 価格データが取得できませんでした")
+                    failed.append(symbol)
+                    logger.warning(f"{symbol}: 価格データが取得できませんでした", extra={'fields': {'symbol': symbol}})
                     
             except Exception as e:
-                print(f"{symbol}の株価取得エラー: {e}")
+                failed.append(symbol)
+                logger.warning(f"{symbol}の株価取得エラー: {e}", extra={'fields': {'symbol': symbol}})
                 continue
         
+        logger.info(f"株価取得完了: {len(stock_data)}/{len(symbols)}銘柄", extra={'fields': {
+            'stage': 'quotes.fetch', 'symbols': len(symbols), 'fetched': len(stock_data),
+            'failed': failed[:20], 'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)}})
         return stock_data
     
     def _fetch_stock_price_from_yahoo_api(self, symbol: str) -> Optional[Dict]:
@@ -128,11 +287,8 @@ class DataFetcher:
         """
         try:
             # Yahoo Finance Chart APIを使用
-            url = f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol}"
-            
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
+            url = chart_url(symbol)
+            headers = YAHOO_HEADERS
             
             # 5日間のデータを取得
             params = {
@@ -146,7 +302,7 @@ class DataFetcher:
             data = response.json()
             
             if data['chart']['error'] is not None:
-                print(f"Yahoo API エラー: {data['chart']['error']}")
+                logger.warning(f"Yahoo API エラー: {data['chart']['error']}")
                 return None
                 
             result = data['chart']['result'][0]
@@ -192,15 +348,70 @@ class DataFetcher:
             }
             
         except requests.exceptions.RequestException as e:
-            print(f"Yahoo Finance API リクエストエラー ({symbol}): {e}")
+            logger.warning(f"Yahoo Finance API リクエストエラー ({symbol}): {e}")
             return None
         except (KeyError, IndexError, TypeError) as e:
-            print(f"Yahoo Finance API レスポンス解析エラー ({symbol}): {e}")
+            logger.warning(f"Yahoo Finance API レスポンス解析エラー ({symbol}): {e}")
             return None
         except Exception as e:
-            print(f"予期しないエラー ({symbol}): {e}")
+            logger.error(f"予期しないエラー ({symbol}): {e}")
             return None
     
+    def get_quote(self, symbol: str) -> Optional[Dict]:
+        """
+        単一銘柄の株価をキャッシュ優先で取得
+        Args:
+            symbol: 株式銘柄コード
+        Returns:
+            Dict: 株価情報（取得できない場合はNone）
+        """
+        price_data = _quote_cache.get(symbol)
+        count('quote.cache_hit' if price_data is not None else 'quote.cache_miss')
+        if price_data is None:
+            with span('quote.fetch', symbol=symbol):
+                price_data = self._fetch_stock_price_from_yahoo_api(symbol)
+            if price_data:
+                _quote_cache.set(symbol, price_data, ttl=market_cache_ttl(symbol, config.QUOTE_CACHE_TTL))
+        return price_data
+    
+    def get_price_history(self, symbol: str, range_: str = '3mo') -> List[Dict]:
+        """
+        日次の価格履歴をキャッシュ優先で取得
+        Args:
+            symbol: 株式銘柄コード
+            range_: 取得期間（Yahoo Finance Chart APIのrange指定）
+        Returns:
+            List[Dict]: 日付と終値のリスト（古い順）
+        """
+        cache_key = f"{symbol}:{range_}"
+        history = _history_cache.get(cache_key)
+        if history is not None:
+            return history
+        
+        try:
+            response = requests.get(
+                chart_url(symbol),
+                headers=YAHOO_HEADERS,
+                params={'range': range_, 'interval': '1d'},
+                timeout=10
+            )
+            response.raise_for_status()
+            result = response.json()['chart']['result'][0]
+            
+            timestamps = result.get('timestamp') or []
+            closes = result['indicators']['quote'][0].get('close') or []
+            history = [
+                {'date': datetime.fromtimestamp(ts).strftime('%Y-%m-%d'), 'close': close}
+                for ts, close in zip(timestamps, closes)
+                if close is not None
+            ]
+            _history_cache.set(cache_key, history, ttl=market_cache_ttl(symbol, config.HISTORY_CACHE_TTL))
+            return history
+            
+        except Exception as e:
+            logger.warning(f"価格履歴取得エラー ({symbol}): {e}")
+            return []
+    
     def get_usd_jpy_rate(self) -> float:
         """
         USD/JPY為替レートを取得
@@ -208,18 +419,13 @@ class DataFetcher:
             float: USD/JPY為替レート
         """
         try:
-            url = "https://query1.finance.yahoo.com/v8/finance/chart/USDJPY=X"
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            
-            response = requests.get(url, headers=headers, timeout=10)
+            response = requests.get(chart_url('USDJPY=X'), headers=YAHOO_HEADERS, timeout=10)
             response.raise_for_status()
             
             data = response.json()
             
             if data['chart']['error'] is not None:
-                print(f"為替レート取得エラー: {data['chart']['error']}")
+                logger.warning(f"為替レート取得エラー: {data['chart']['error']}")
                 return 150.0  # デフォルト値
             
             result = data['chart']['result'][0]
@@ -228,14 +434,14 @@ class DataFetcher:
             
             if close_prices:
                 usd_jpy_rate = close_prices[-1]
-                print(f"USD/JPY為替レート: {usd_jpy_rate:.2f}")
+                logger.info(f"USD/JPY為替レート: {usd_jpy_rate:.2f}", extra={'fields': {'stage': 'fx.fetch', 'usd_jpy': usd_jpy_rate}})
                 return usd_jpy_rate
             else:
-                print("為替レートデータが取得できませんでした")
+                logger.warning("為替レートデータが取得できませんでした")
                 return 150.0
                 
         except Exception as e:
-            print(f"為替レート取得エラー: {e}")
+            logger.warning(f"為替レート取得エラー: {e}")
             return 150.0  # デフォルト値
 
     def get_portfolio_with_prices(self) -> Dict:
@@ -252,41 +458,10 @@ class DataFetcher:
         stock_prices = self.get_stock_prices(symbols)
         
         # USD/JPY為替レートを取得
-        usd_jpy_rate = self.get_usd_jpy_rate()
+        with span('fx.fetch'):
+            usd_jpy_rate = self.get_usd_jpy_rate()
         
         # ポートフォリオ情報と株価情報を統合
-        portfolio_with_prices = {
-            'portfolio': portfolio,
-            'stock_prices': stock_prices,
-            'usd_jpy_rate': usd_jpy_rate,
-            'total_value_usd': 0,
-            'total_value_jpy': 0
-        }
-        
-        # 総資産価値を計算（USD建てとJPY建てを分けて計算）
-        total_value_usd = 0
-        total_value_jpy = 0
-        
-        for stock in portfolio:
-            symbol = stock['symbol']
-            quantity = stock['quantity']
-            if symbol in stock_prices:
-                price_info = stock_prices[symbol]
-                current_price = price_info['current_price']
-                currency = price_info.get('currency', 'USD')
-                
-                holding_value = current_price * quantity
-                
-                if currency == 'JPY':
-                    total_value_jpy += holding_value
-                else:  # USD or other currencies treated as USD
-                    total_value_usd += holding_value
-        
-        # 米国株を円換算して合計
-        total_value_jpy_converted = total_value_jpy + (total_value_usd * usd_jpy_rate)
-        
-        portfolio_with_prices['total_value_usd'] = total_value_usd
-        portfolio_with_prices['total_value_jpy'] = total_value_jpy
-        portfolio_with_prices['total_value_jpy_converted'] = total_value_jpy_converted
+        portfolio_with_prices = build_portfolio_with_prices(portfolio, stock_prices, usd_jpy_rate)
         
         return portfolio_with_prices
\ No newline at end of file
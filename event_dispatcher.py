@@ -0,0 +1,143 @@
+import queue
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import config
+from cache import make_cache
+
+ACCEPTED = 'accepted'
+DUPLICATE = 'duplicate'
+REJECTED = 'rejected'
+
+_STOP = object()
+
+
+class EventDispatcher:
+    """
+    Slackイベントを即時応答し、上限付きのワーカープールで非同期に処理する
+    キューが満杯の場合は受け付けを拒否して呼び出し元にバックプレッシャーを返す
+    同じイベントID（Slackの再送）は一定時間重複として無視する
+    """
+
+    def __init__(self, workers: Optional[int] = None, queue_size: Optional[int] = None,
+                 dedup_ttl: Optional[float] = None):
+        self.workers = workers or config.SLACK_WORKERS
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size or config.SLACK_QUEUE_SIZE)
+        # 重複判定はCACHE_BACKEND=sqliteの場合ワーカープロセス間で共有される
+        self._seen = make_cache('slack_events', ttl_seconds=dedup_ttl or config.SLACK_EVENT_DEDUP_TTL, max_entries=10000)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stats = {'accepted': 0, 'duplicates': 0, 'rejected': 0, 'completed': 0, 'failed': 0}
+        self._in_flight = 0
+
+    def start(self):
+        """ワーカースレッドを起動（起動済みなら何もしない）"""
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"slack-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, func: Callable, *args, dedup_key: Optional[str] = None, **kwargs) -> str:
+        """
+        処理をキューに登録
+        Args:
+            func: 実行する関数
+            dedup_key: 重複判定キー（SlackのイベントIDなど）
+        Returns:
+            str: accepted / duplicate / rejected
+        """
+        self.start()
+        with self._lock:
+            if dedup_key is not None and not self._seen.add(dedup_key, time.time()):
+                self._stats['duplicates'] += 1
+                return DUPLICATE
+            try:
+                self._queue.put_nowait((func, args, kwargs))
+            except queue.Full:
+                # 拒否したイベントはSlackの再送で受け付けられるよう重複記録を戻す
+                if dedup_key is not None:
+                    self._seen.delete(dedup_key)
+                self._stats['rejected'] += 1
+                return REJECTED
+            self._stats['accepted'] += 1
+            return ACCEPTED
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                func, args, kwargs = item
+                with self._lock:
+                    self._in_flight += 1
+                try:
+                    func(*args, **kwargs)
+                    outcome = 'completed'
+                except Exception as e:
+                    print(f"❌ 非同期イベント処理エラー: {e}")
+                    outcome = 'failed'
+                with self._lock:
+                    self._in_flight -= 1
+                    self._stats[outcome] += 1
+            finally:
+                self._queue.task_done()
+
+    def shutdown(self, wait: bool = True, timeout: Optional[float] = None):
+        """
+        キューに残った処理を実行し終えてからワーカーを停止
+        Args:
+            wait: 停止を待つかどうか
+            timeout: 待機時間の上限（秒）
+        """
+        with self._lock:
+            threads = list(self._threads)
+            self._threads = []
+        for _ in threads:
+            self._queue.put(_STOP)
+        if wait:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            for thread in threads:
+                thread.join(None if deadline is None else max(0, deadline - time.monotonic()))
+
+    def stats(self) -> Dict:
+        """処理件数とキューの状態"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = self._in_flight
+        stats['queued'] = self._queue.qsize()
+        stats['workers'] = self.workers
+        return stats
+
+
+def slack_event_dedup_key(data: Dict, event: Dict) -> str:
+    """
+    Slackイベントの重複判定キーを取得
+    Args:
+        data: リクエストボディ
+        event: イベント
+    Returns:
+        str: イベントID（ない場合はメッセージIDまたはチャンネルとタイムスタンプ）
+    """
+    if data.get("event_id"):
+        return data["event_id"]
+    if event.get("client_msg_id"):
+        return event["client_msg_id"]
+    return f"{event.get('channel')}:{event.get('ts')}"
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher() -> EventDispatcher:
+    """プロセス共有のEventDispatcherを取得"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = EventDispatcher()
+        return _dispatcher
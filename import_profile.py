@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+インポート時間の計測とコールドスタートベンチマーク
+
+使用方法:
+    # モジュールごとの累積インポート時間（python -X importtime を集計）
+    python import_profile.py profile lambda_main --top 25
+
+    # コールドスタートの計測（新しいプロセスで import と health_check を実行）
+    python import_profile.py bench --runs 5
+
+    # 変更前のコミットと比較した before/after 表
+    python import_profile.py bench --runs 5 --baseline-ref HEAD~1
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# 読み込まれたかどうかを報告する重い依存
+HEAVY_MODULES = ['boto3', 'gspread', 'google.generativeai', 'google.auth', 'grpc', 'google.protobuf', 'slack_sdk', 'requests']
+
+# コールドスタートの計測シナリオ（新しいPythonプロセスで実行する）
+SCENARIOS = {
+    'import lambda_main': "import lambda_main",
+    'health_check': (
+        "import lambda_main\n"
+        "class Context:\n"
+        "    aws_request_id = 'bench'\n"
+        "lambda_main.health_check({}, Context())"
+    ),
+    'import all stages': (
+        "import lambda_main, data_fetcher, analyzer, mcp_client, slack_client\n"
+        "import boto3, gspread, google.oauth2.service_account, google.generativeai"
+    ),
+}
+
+_BENCH_TEMPLATE = """
+import json, sys, time
+start = time.perf_counter()
+{code}
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{'elapsed_ms': elapsed, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """
+    python -X importtime の出力を解析
+    Args:
+        stderr: 標準エラー出力
+    Returns:
+        List[Dict]: モジュールごとの自己時間と累積時間（マイクロ秒）
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            rows.append({
+                'module': name.rstrip(),
+                'depth': (len(name) - len(name.lstrip())) // 2,
+                'self_us': int(self_us),
+                'cumulative_us': int(cumulative_us)
+            })
+        except ValueError:
+            continue
+    return rows
+
+
+def profile_imports(module: str, cwd: str = ROOT) -> List[Dict]:
+    """
+    モジュールのインポート時間を新しいプロセスで計測
+    Args:
+        module: 計測するモジュール
+        cwd: 実行ディレクトリ
+    Returns:
+        List[Dict]: モジュールごとの計測結果
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+        cwd=cwd, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'import failed')
+    # インタプリタ起動時（site等）の行を除き、対象モジュールのインポートに含まれる行だけを返す
+    rows = parse_importtime(result.stderr)
+    block: List[Dict] = []
+    for row in rows:
+        block.append(row)
+        if row['depth'] == 0:
+            if row['module'].strip() == module:
+                return block
+            block = []
+    return rows
+
+
+def top_level_costs(rows: List[Dict]) -> Dict[str, int]:
+    """トップレベルパッケージごとの累積インポート時間（マイクロ秒）"""
+    costs: Dict[str, int] = {}
+    for row in rows:
+        package = row['module'].strip().split('.')[0]
+        costs[package] = costs.get(package, 0) + row['self_us']
+    return dict(sorted(costs.items(), key=lambda item: item[1], reverse=True))
+
+
+def run_scenario(code: str, cwd: str) -> Dict:
+    """シナリオを新しいプロセスで1回実行"""
+    script = _BENCH_TEMPLATE.format(code=code, heavy=HEAVY_MODULES)
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    result = subprocess.run([sys.executable, '-c', script], cwd=cwd, capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        return {'error': result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'failed'}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def benchmark(cwd: str, runs: int) -> Dict[str, Dict]:
+    """
+    各シナリオのコールドスタート時間を計測
+    Args:
+        cwd: 計測対象のソースツリー
+        runs: 計測回数
+    Returns:
+        Dict[str, Dict]: シナリオごとの中央値・最小値と読み込まれた重い依存
+    """
+    results = {}
+    for name, code in SCENARIOS.items():
+        samples = [run_scenario(code, cwd) for _ in range(runs)]
+        ok = [sample for sample in samples if 'error' not in sample]
+        if not ok:
+            results[name] = {'error': samples[0]['error']}
+            continue
+        times = [sample['elapsed_ms'] for sample in ok]
+        results[name] = {
+            'median_ms': round(statistics.median(times), 1),
+            'min_ms': round(min(times), 1),
+            'loaded': ok[-1]['loaded']
+        }
+    return results
+
+
+def export_ref(ref: str) -> str:
+    """指定したgitリビジョンのソースツリーを一時ディレクトリに展開"""
+    target = tempfile.mkdtemp(prefix='kabukan-baseline-')
+    archive = os.path.join(target, 'src.tar')
+    subprocess.run(['git', 'archive', '--format=tar', '-o', archive, ref], cwd=ROOT, check=True)
+    with tarfile.open(archive) as tar:
+        tar.extractall(target)
+    os.remove(archive)
+    return target
+
+
+def format_table(after: Dict[str, Dict], before: Optional[Dict[str, Dict]] = None) -> str:
+    """計測結果を表形式の文字列に整形"""
+    def cell(result: Optional[Dict]) -> str:
+        if result is None:
+            return '-'
+        return result.get('error', f"{result['median_ms']:.1f}")
+
+    if before is None:
+        lines = ["| シナリオ | 中央値 (ms) | 最小 (ms) | 読み込まれた重い依存 |", "|---|---:|---:|---|"]
+        for name, result in after.items():
+            lines.append(f"| {name} | {cell(result)} | {result.get('min_ms', '-')} | {', '.join(result.get('loaded', [])) or 'なし'} |")
+        return "\n".join(lines)
+
+    lines = ["| シナリオ | before (ms) | after (ms) | 差分 | after で読み込まれた重い依存 |", "|---|---:|---:|---:|---|"]
+    for name, result in after.items():
+        previous = before.get(name)
+        delta = '-'
+        if previous and 'median_ms' in previous and 'median_ms' in result and previous['median_ms']:
+            delta = f"{(result['median_ms'] - previous['median_ms']) / previous['median_ms'] * 100:+.0f}%"
+        lines.append(f"| {name} | {cell(previous)} | {cell(result)} | {delta} | {', '.join(result.get('loaded', [])) or 'なし'} |")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='インポート時間の計測とコールドスタートベンチマーク')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    profile_parser = subparsers.add_parser('profile', help='モジュールごとの累積インポート時間')
+    profile_parser.add_argument('module', nargs='?', default='lambda_main')
+    profile_parser.add_argument('--top', type=int, default=20, help='表示するモジュール数')
+
+    bench_parser = subparsers.add_parser('bench', help='コールドスタートの計測')
+    bench_parser.add_argument('--runs', type=int, default=5, help='シナリオごとの計測回数')
+    bench_parser.add_argument('--baseline-ref', help='比較するgitリビジョン（before）')
+    bench_parser.add_argument('--save', help='結果をJSONで保存')
+    bench_parser.add_argument('--compare', help='比較する保存済み結果（before）')
+    args = parser.parse_args()
+
+    if args.command == 'profile':
+        rows = profile_imports(args.module)
+        total_us = max((row['cumulative_us'] for row in rows), default=0)
+        print(f"=== {args.module} のインポート時間: {total_us / 1000:.1f}ms ===")
+        print(f"{'累積(ms)':>10} {'自己(ms)':>10}  モジュール")
+        for row in sorted(rows, key=lambda r: r['cumulative_us'], reverse=True)[:args.top]:
+            print(f"{row['cumulative_us'] / 1000:>10.1f} {row['self_us'] / 1000:>10.1f}  {row['module'].strip()}")
+        print("\n=== パッケージ別 ===")
+        for package, us in list(top_level_costs(rows).items())[:args.top]:
+            print(f"{us / 1000:>10.1f}ms  {package}")
+        return
+
+    after = benchmark(ROOT, args.runs)
+    before = None
+    if args.baseline_ref:
+        before = benchmark(export_ref(args.baseline_ref), args.runs)
+    elif args.compare:
+        with open(args.compare) as f:
+            before = json.load(f)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(after, f, ensure_ascii=False, indent=2)
+    print(format_table(after, before))
+
+
+if __name__ == '__main__':
+    main()
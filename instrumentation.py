@@ -0,0 +1,299 @@
+import csv
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+import config
+
+
+class _NoopSpan:
+    """無効時に返す何もしないスパン（計測のオーバーヘッドを発生させない）"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    """処理区間の計測（終了時に所要時間をヒストグラムに記録する）"""
+
+    def __init__(self, recorder: 'Instrumentation', name: str, attributes: Dict):
+        self.recorder = recorder
+        self.name = name
+        self.attributes = attributes
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed_ms = (time.perf_counter() - self.start) * 1000
+        if exc_type is not None:
+            self.attributes['error'] = exc_type.__name__
+        self.recorder._finish_span(self.name, self.start, elapsed_ms, self.attributes)
+        return False
+
+    def set(self, **attributes):
+        """スパンに属性を追加"""
+        self.attributes.update(attributes)
+
+
+class _Reservoir:
+    """
+    区間ごとの所要時間
+    件数・合計・最大は正確に数え、分布（パーセンタイル・EMFの値）は上限件数までの無作為抽出で保持する
+    （長時間動くBotでも記録が増え続けないようにする）
+    """
+
+    def __init__(self, size: int, rng: random.Random):
+        self.size = size
+        self.rng = rng
+        self.values: List[float] = []
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.max = value if self.count == 1 else max(self.max, value)
+        if len(self.values) < self.size:
+            self.values.append(value)
+        else:
+            index = self.rng.randrange(self.count)
+            if index < self.size:
+                self.values[index] = value
+
+
+class Instrumentation:
+    """
+    処理区間（スパン）・カウンター・ヒストグラムの軽量な計測
+    Lambda上ではCloudWatch Embedded Metric Format（EMF）のJSONをログに出力し、
+    ローカルではJSON/CSVのトレースファイルに書き出す
+    """
+
+    def __init__(self, enabled: Optional[bool] = None, namespace: Optional[str] = None,
+                 max_spans: Optional[int] = None, reservoir_size: Optional[int] = None):
+        self.enabled = config.INSTRUMENTATION_ENABLED if enabled is None else enabled
+        self.namespace = namespace or config.METRICS_NAMESPACE
+        self.max_spans = max_spans or config.INSTRUMENTATION_MAX_SPANS
+        self.reservoir_size = reservoir_size or config.INSTRUMENTATION_RESERVOIR_SIZE
+        self._rng = random.Random()
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """記録をすべて破棄（実行ごとに呼び出す）"""
+        with self._lock:
+            self._origin = time.perf_counter()
+            self._spans = deque(maxlen=self.max_spans)
+            self._spans_dropped = 0
+            self._histograms: Dict[str, _Reservoir] = {}
+            self._counters: Dict[str, float] = {}
+            self._dimensions: Dict[str, str] = {}
+
+    def set_dimensions(self, **dimensions):
+        """全メトリクスに付与するディメンション（実行タイプなど）"""
+        with self._lock:
+            self._dimensions.update({key: str(value) for key, value in dimensions.items()})
+
+    def span(self, name: str, **attributes):
+        """
+        処理区間を計測するコンテキストマネージャ
+        Args:
+            name: 区間名（例: sheets.load, quote.fetch, gemini.generate）
+            attributes: 区間の属性（銘柄コードなど）
+        """
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, name, attributes)
+
+    def count(self, name: str, value: float = 1):
+        """カウンターを加算"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float):
+        """ヒストグラムに値（ミリ秒）を記録"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._add_value(name, value)
+
+    def _add_value(self, name: str, value: float):
+        reservoir = self._histograms.get(name)
+        if reservoir is None:
+            reservoir = self._histograms[name] = _Reservoir(self.reservoir_size, self._rng)
+        reservoir.add(value)
+
+    def _finish_span(self, name: str, start: float, elapsed_ms: float, attributes: Dict):
+        with self._lock:
+            self._add_value(name, elapsed_ms)
+            if len(self._spans) == self._spans.maxlen:
+                self._spans_dropped += 1
+            self._spans.append({
+                'name': name,
+                'start_ms': round((start - self._origin) * 1000, 3),
+                'duration_ms': round(elapsed_ms, 3),
+                'thread': threading.current_thread().name,
+                'attributes': dict(attributes)
+            })
+
+    def summary(self) -> Dict:
+        """
+        区間ごとの件数・合計・p50・p95・最大
+        Returns:
+            Dict: 区間名ごとの集計とカウンター
+        """
+        with self._lock:
+            histograms = {name: (reservoir.count, reservoir.total, reservoir.max, sorted(reservoir.values))
+                          for name, reservoir in self._histograms.items()}
+            counters = dict(self._counters)
+        stages = {}
+        for name, (count, total, maximum, values) in histograms.items():
+            stages[name] = {
+                'count': count,
+                'total_ms': round(total, 3),
+                'p50_ms': round(_percentile(values, 50), 3),
+                'p95_ms': round(_percentile(values, 95), 3),
+                'max_ms': round(maximum, 3)
+            }
+        return {'stages': stages, 'counters': counters}
+
+    def emf_records(self) -> List[Dict]:
+        """
+        CloudWatch Embedded Metric Format のレコードを生成
+        区間ごとにStageディメンション付きのStageLatency（値の配列）を出力し、p95でアラームを設定できるようにする
+        （値は保持している標本。件数が標本数を超えた区間は無作為抽出した値になる）
+        Returns:
+            List[Dict]: EMFレコード
+        """
+        with self._lock:
+            histograms = {name: list(reservoir.values) for name, reservoir in self._histograms.items()}
+            counters = dict(self._counters)
+            dimensions = dict(self._dimensions)
+        timestamp = int(time.time() * 1000)
+        base_keys = sorted(dimensions)
+        records = []
+        for name, values in histograms.items():
+            # EMFは1メトリクスあたり100値まで
+            for offset in range(0, len(values), 100):
+                records.append(dict(dimensions, **{
+                    '_aws': {
+                        'Timestamp': timestamp,
+                        'CloudWatchMetrics': [{
+                            'Namespace': self.namespace,
+                            'Dimensions': [base_keys + ['Stage']],
+                            'Metrics': [{'Name': 'StageLatency', 'Unit': 'Milliseconds'}]
+                        }]
+                    },
+                    'Stage': name,
+                    'StageLatency': [round(value, 3) for value in values[offset:offset + 100]]
+                }))
+        if counters:
+            records.append(dict(dimensions, **counters, **{
+                '_aws': {
+                    'Timestamp': timestamp,
+                    'CloudWatchMetrics': [{
+                        'Namespace': self.namespace,
+                        'Dimensions': [base_keys],
+                        'Metrics': [{'Name': name, 'Unit': 'Count'} for name in sorted(counters)]
+                    }]
+                }
+            }))
+        return records
+
+    def flush(self, trace_name: Optional[str] = None) -> Optional[str]:
+        """
+        記録を出力して破棄
+        Lambda上ではEMFを標準出力に、ローカルではトレースファイル（JSONとCSV）に書き出す
+        Args:
+            trace_name: ローカルのトレースファイル名（省略時は時刻から生成）
+        Returns:
+            str: 書き出したJSONトレースのパス（Lambda上・無効時はNone）
+        """
+        if not self.enabled:
+            return None
+        path = None
+        if os.environ.get('AWS_LAMBDA_FUNCTION_NAME'):
+            for record in self.emf_records():
+                print(json.dumps(record, ensure_ascii=False))
+        else:
+            try:
+                path = self.write_trace(trace_name)
+                print(f"📊 トレースを出力しました: {path}")
+            except OSError as e:
+                print(f"⚠️ トレース出力エラー: {e}")
+        self.reset()
+        return path
+
+    def write_trace(self, trace_name: Optional[str] = None) -> str:
+        """
+        ローカル用のトレースをJSONとCSVで書き出す
+        Args:
+            trace_name: ファイル名（拡張子なし）
+        Returns:
+            str: JSONトレースのパス
+        """
+        os.makedirs(config.TRACE_DIR, exist_ok=True)
+        base = os.path.join(config.TRACE_DIR, trace_name or time.strftime('trace_%Y%m%d_%H%M%S'))
+        with self._lock:
+            spans = list(self._spans)
+            spans_dropped = self._spans_dropped
+            dimensions = dict(self._dimensions)
+        with open(f"{base}.json", 'w', encoding='utf-8') as f:
+            json.dump({'dimensions': dimensions, 'spans': spans, 'spans_dropped': spans_dropped, **self.summary()},
+                      f, ensure_ascii=False, indent=2)
+        with open(f"{base}.csv", 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['name', 'start_ms', 'duration_ms', 'thread', 'attributes'])
+            for span in spans:
+                writer.writerow([span['name'], span['start_ms'], span['duration_ms'], span['thread'],
+                                 json.dumps(span['attributes'], ensure_ascii=False)])
+        return f"{base}.json"
+
+
+def _percentile(sorted_values: List[float], p: float) -> float:
+    """パーセンタイル（最近傍法、昇順の値を渡す）"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+_instrumentation = Instrumentation()
+
+
+def get_instrumentation() -> Instrumentation:
+    """プロセス共有のInstrumentationを取得"""
+    return _instrumentation
+
+
+def span(name: str, **attributes):
+    """プロセス共有の計測で処理区間を計測"""
+    return _instrumentation.span(name, **attributes)
+
+
+def count(name: str, value: float = 1):
+    """プロセス共有の計測でカウンターを加算"""
+    _instrumentation.count(name, value)
+
+
+def observe(name: str, value: float):
+    """プロセス共有の計測でヒストグラムに値を記録"""
+    _instrumentation.observe(name, value)
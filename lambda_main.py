@@ -6,14 +6,34 @@ EventBridgeから定期実行され、Slack通知を送信
 
 import json
 import os
-import boto3
-from typing import Dict, Any
+import time
+from typing import Dict, Any, Optional, Tuple
 
-# 必要なモジュールをインポート
-from data_fetcher import DataFetcher
-from analyzer import PortfolioAnalyzer
-from mcp_client import MCPClient
-from slack_client import SlackClient
+import app_logging
+from instrumentation import get_instrumentation, span
+import profiling
+import record_replay
+
+# boto3・gspread・google.generativeai・slack_sdk などの重い依存は、
+# コールドスタート（特にhealth_check）の負担を避けるため利用する段階でインポートする
+
+# ウォームコンテナで再利用するSlackクライアント
+_slack_client = None
+
+# ウォームコンテナで再利用する認証情報ファイルの取得元
+_credentials_state = {'source': None, 'path': None, 'fetched_at': 0.0}
+
+def get_slack_client() -> 'SlackClient':
+    """
+    プロセス内で共有するSlackClientを取得
+    Returns:
+        SlackClient: Slackクライアント（生成時のネットワーク呼び出しなし）
+    """
+    global _slack_client
+    if _slack_client is None:
+        from slack_client import SlackClient
+        _slack_client = SlackClient()
+    return _slack_client
 
 def lambda_handler(event, context):
     """
@@ -27,9 +47,77 @@ def lambda_handler(event, context):
         dict: 実行結果
     """
     
+    # 分散実行のワーカーとして呼ばれた場合は担当シャードの株価だけを返す
+    if event.get('mode') == 'shard_worker':
+        from sharded_runner import fetch_shard
+        try:
+            return fetch_shard(event['symbols'])
+        finally:
+            app_logging.flush()
+    
+    # 寄り付き前のウォームアップ（朝の実行に必要なデータを事前に取得して保存）
+    if event.get('mode') == 'warmup':
+        return warmup_handler(event, context)
+    
     # 実行タイプを判別（日次 or 月次）
     execution_type = event.get('execution_type', 'daily')  # デフォルトは日次
     
+    # 区間ごとの所要時間を計測（終了時にEMFとして出力）
+    started_at = time.perf_counter()
+    instrumentation = get_instrumentation()
+    instrumentation.reset()
+    instrumentation.set_dimensions(ExecutionType=execution_type)
+    try:
+        # PROFILE=sample|cprofile（またはイベントの "profile"）でプロファイリング（成果物は /tmp）
+        # イベントの "record" / "replay" で外部サービスとのやり取りを記録・再生
+        with record_replay.lambda_session(event, execution_type), \
+                profiling.profile(f"lambda_{execution_type}", mode=event.get('profile')):
+            return _run(event, context, execution_type, started_at)
+    finally:
+        instrumentation.observe('total', (time.perf_counter() - started_at) * 1000)
+        instrumentation.flush(f"trace_{execution_type}_{context.aws_request_id}")
+        # 非同期に書き出すログを実行終了（コンテナの凍結）前に出し切る
+        app_logging.flush()
+
+def warmup_handler(event, context):
+    """
+    寄り付き前のウォームアップを実行
+    
+    Args:
+        event: EventBridgeからのイベント（{"mode": "warmup", "time": ...}）
+        context: Lambdaランタイムコンテキスト
+    
+    Returns:
+        dict: ウォームアップ結果
+    """
+    instrumentation = get_instrumentation()
+    instrumentation.reset()
+    instrumentation.set_dimensions(ExecutionType='warmup')
+    try:
+        prepare_google_credentials()
+        from checkpoint import schedule_date
+        from warmup import run_warmup
+        with profiling.profile('lambda_warmup', mode=event.get('profile')):
+            result = run_warmup(schedule_date(event))
+        return {'statusCode': 200 if result['ok'] else 500, 'body': json.dumps(result, ensure_ascii=False)}
+    finally:
+        instrumentation.flush(f"trace_warmup_{context.aws_request_id}")
+        app_logging.flush()
+
+def _run(event, context, execution_type: str, started_at: float):
+    """
+    ポートフォリオ取得からSlack通知までを実行
+    
+    Args:
+        event: EventBridgeからのイベント
+        context: Lambdaランタイムコンテキスト
+        execution_type: 実行タイプ（daily/monthly）
+        started_at: 実行開始時刻（time.perf_counter）
+    
+    Returns:
+        dict: 実行結果
+    """
+    
     print(f"=== AWS Lambda - 投資アドバイス自動通知 ({execution_type}) ===")
     print(f"Event: {json.dumps(event)}")
     print(f"Request ID: {context.aws_request_id}")
@@ -61,16 +149,40 @@ def lambda_handler(event, context):
         }
     
     try:
-        # Google認証情報の取得（S3からダウンロードまたは環境変数から）
-        credentials_path = prepare_google_credentials()
+        import config
         
-        # データフェッチャーの初期化
-        print("\n1️⃣ データフェッチャーを初期化中...")
-        data_fetcher = DataFetcher()
+        # 前回の実行以降に日米とも立会がなければ省略（休場日に同じデータを取得し直さない）
+        run_plan = None
+        if execution_type == 'daily' and config.MARKET_CALENDAR_ENABLED:
+            from checkpoint import schedule_datetime
+            from market_calendar import plan_daily_run
+            run_plan = plan_daily_run(schedule_datetime(event))
+            if run_plan['action'] == 'skip':
+                print(f"⏭️ 日次実行を省略: {run_plan['reason']}")
+                return {
+                    'statusCode': 200,
+                    'body': json.dumps({'message': '休場のため省略', 'market_plan': run_plan}, ensure_ascii=False)
+                }
+        short_run = run_plan is not None and run_plan['action'] == 'short'
         
-        # ポートフォリオと株価情報の取得
-        print("\n2️⃣ ポートフォリオと株価情報を取得中...")
-        portfolio_data = data_fetcher.get_portfolio_with_prices()
+        # スケジュール日と実行タイプごとのチェックポイント（再試行時は未完了の段階から再開）
+        from checkpoint import open_checkpoint
+        checkpoint = open_checkpoint(execution_type, event)
+        if checkpoint.completed:
+            print("✅ このスケジュールの通知は完了済みのため、再通知しません")
+            return {
+                'statusCode': 200,
+                'body': json.dumps({
+                    'message': '通知済み（再試行のためスキップ）',
+                    'slack_notification': checkpoint.get('slack'),
+                    'checkpoint': checkpoint.storage
+                }, ensure_ascii=False)
+            }
+        checkpoint.start_attempt()
+        
+        from checkpoint import schedule_date
+        portfolio_data, prices = load_portfolio_data(execution_type, checkpoint, schedule_date(event))
+        month_stats = prices.get('month_stats') or {}
         
         if not portfolio_data:
             error_msg = "ポートフォリオデータの取得に失敗"
@@ -82,35 +194,74 @@ def lambda_handler(event, context):
         
         print(f"✅ ポートフォリオ取得完了: {len(portfolio_data)}銘柄")
         
-        # 基本分析の実行
-        print("\n3️⃣ ポートフォリオ分析を実行中...")
-        analyzer = PortfolioAnalyzer()
-        analysis = analyzer.analyze_portfolio(portfolio_data)
-        
-        # 分析レポートの生成
-        print("\n4️⃣ 分析レポートを生成中...")
-        report = analyzer.generate_report(analysis)
-        print("✅ 分析レポート生成完了")
+        saved_analysis = checkpoint.get('analysis')
+        if saved_analysis:
+            print("\n3️⃣ 4️⃣ 保存済みの分析レポートを使用")
+            report = saved_analysis['report']
+        else:
+            # 基本分析の実行
+            print("\n3️⃣ ポートフォリオ分析を実行中...")
+            from analyzer import PortfolioAnalyzer
+            analyzer = PortfolioAnalyzer()
+            with span('analysis'):
+                analysis = analyzer.analyze_portfolio(portfolio_data)
+            
+            # 日次実行ではスナップショットを保存（失敗しても通知は続行）
+            if execution_type == 'daily' and config.SNAPSHOT_ENABLED:
+                save_daily_snapshot(portfolio_data, analysis)
+            
+            # 分析レポートの生成
+            print("\n4️⃣ 分析レポートを生成中...")
+            with span('report'):
+                report = analyzer.generate_report(analysis)
+                if month_stats:
+                    from snapshot_store import format_month_summary
+                    report = f"{report}\n\n{format_month_summary(month_stats)}"
+                if short_run:
+                    report = f"{report}\n\n🏖️ {run_plan['reason']}"
+            checkpoint.save('analysis', {'analysis': analysis, 'report': report})
+            print("✅ 分析レポート生成完了")
         
         # Gemini APIによる投資アドバイスの取得
-        print("\n5️⃣ AI投資アドバイスを取得中...")
-        advice = None
-        try:
-            with MCPClient() as mcp_client:
-                advice = mcp_client.get_investment_advice(portfolio_data, execution_type)
-                
-                if advice:
-                    print("✅ AI投資アドバイス取得完了")
-                else:
-                    print("⚠️ 投資アドバイスの取得に失敗")
+        advice = checkpoint.get('advice')
+        if advice:
+            print("\n5️⃣ 保存済みのAI投資アドバイスを使用")
+        elif short_run:
+            # 日米とも休場で売買できないため、終値のレポートだけを送る
+            print(f"\n5️⃣ AI投資アドバイスを省略: {run_plan['reason']}")
+        else:
+            print("\n5️⃣ AI投資アドバイスを取得中...")
+            try:
+                from mcp_client import MCPClient
+                with MCPClient() as mcp_client:
+                    # 残り実行時間に収まるモデルを選択（月次は上位モデルを優先）
+                    with span('gemini.advice'):
+                        advice = mcp_client.get_investment_advice(
+                            portfolio_data,
+                            execution_type,
+                            remaining_time_ms=context.get_remaining_time_in_millis
+                        )
                     
-        except Exception as e:
-            print(f"⚠️ Gemini API接続エラー: {e}")
-            print("注意: AI投資アドバイスの取得に失敗しました。基本分析のみ送信されます。")
+                    if advice:
+                        checkpoint.save('advice', advice)
+                        print("✅ AI投資アドバイス取得完了")
+                    else:
+                        print("⚠️ 投資アドバイスの取得に失敗")
+                        
+            except Exception as e:
+                print(f"⚠️ Gemini API接続エラー: {e}")
+                print("注意: AI投資アドバイスの取得に失敗しました。基本分析のみ送信されます。")
         
-        # Slack通知の送信
+        # Slack通知の送信（投稿済みのメッセージは再投稿せず、1件ごとにtsを記録）
         print("\n6️⃣ Slack通知を送信中...")
-        notification_result = send_slack_notification(portfolio_data, report, advice, execution_type)
+        with span('slack.notify'):
+            notification_result = send_slack_notification(
+                portfolio_data, report, advice, execution_type,
+                delivered=checkpoint.deliveries(),
+                on_delivered=checkpoint.record_delivery
+            )
+        if notification_result.get('success'):
+            checkpoint.complete(notification_result)
         
         # 結果のまとめ
         result = {
@@ -120,12 +271,16 @@ def lambda_handler(event, context):
                 'portfolio_count': len(portfolio_data),
                 'ai_advice_available': advice is not None,
                 'slack_notification': notification_result,
-                'timestamp': context.get_remaining_time_in_millis()
+                'warm_cache': prices.get('warm_cache'),
+                'market_plan': run_plan,
+                'checkpoint': checkpoint.storage,
+                'timestamp': context.get_remaining_time_in_millis(),
+                'stage_timings': get_instrumentation().summary()['stages']
             }, ensure_ascii=False)
         }
         
         print("\n✅ 処理完了")
-        print(f"実行時間: {1000 - context.get_remaining_time_in_millis()}ms")
+        print(f"実行時間: {(time.perf_counter() - started_at) * 1000:.0f}ms（残り {context.get_remaining_time_in_millis()}ms）")
         
         return result
         
@@ -135,7 +290,7 @@ def lambda_handler(event, context):
         
         # エラー時もSlackに通知（可能であれば）
         try:
-            slack_client = SlackClient()
+            slack_client = get_slack_client()
             if slack_client.client:
                 slack_client.send_simple_message(f"⚠️ 投資アドバイス自動通知でエラーが発生しました\n```{error_msg}```")
         except:
@@ -149,10 +304,170 @@ def lambda_handler(event, context):
             }, ensure_ascii=False)
         }
 
+def load_portfolio_data(execution_type: str, checkpoint, run_date: str) -> Tuple[Optional[Dict], Dict]:
+    """
+    ポートフォリオと株価情報を取得（チェックポイントに保存済みの段階は取得し直さない）
+    
+    Args:
+        execution_type: 実行タイプ（daily/monthly）
+        checkpoint: 実行のチェックポイント
+        run_date: スケジュール日（ウォームアップ結果の検索に使う）
+    
+    Returns:
+        Tuple[Dict, Dict]: (ポートフォリオと株価情報, 株価段階の出力（month_stats・warm_cacheを含む）)
+        （取得失敗時は (None, {})）
+    """
+    import config
+    from data_fetcher import build_portfolio_with_prices
+    
+    portfolio = checkpoint.get('portfolio')
+    prices = checkpoint.get('prices')
+    
+    # 月次は日次実行で保存したスナップショットから集計し、外部APIからの再取得を省く
+    if prices is None and execution_type == 'monthly' and config.SNAPSHOT_ENABLED:
+        snapshot_data, month_stats = load_month_from_snapshots()
+        if snapshot_data:
+            portfolio = snapshot_data['portfolio']
+            prices = {
+                'stock_prices': snapshot_data['stock_prices'],
+                'usd_jpy_rate': snapshot_data['usd_jpy_rate'],
+                'month_stats': month_stats
+            }
+            checkpoint.save('portfolio', portfolio)
+            checkpoint.save('prices', prices)
+    
+    # 日次はウォームアップ済みなら、その後に立会が始まった市場の株価だけを取得
+    if portfolio is None and prices is None and execution_type == 'daily' and config.WARMUP_ENABLED:
+        warm = load_warm_start(run_date)
+        if warm:
+            portfolio, prices = warm
+            checkpoint.save('portfolio', portfolio)
+            checkpoint.save('prices', prices)
+    
+    if portfolio is not None and prices is not None:
+        print("\n1️⃣ 2️⃣ 保存済みのポートフォリオと株価情報を使用")
+    else:
+        # スプレッドシートの読み込みが済んでいればGoogle認証を省く
+        if portfolio is None:
+            # Google認証情報の取得（S3からダウンロードまたは環境変数から）
+            prepare_google_credentials()
+        
+        # データフェッチャーの初期化
+        print("\n1️⃣ データフェッチャーを初期化中...")
+        from data_fetcher import DataFetcher
+        data_fetcher = DataFetcher(connect_sheets=portfolio is None)
+        
+        # ポートフォリオと株価情報の取得
+        print("\n2️⃣ ポートフォリオと株価情報を取得中...")
+        if portfolio is None:
+            portfolio = data_fetcher.get_portfolio_from_sheets()
+            if not portfolio:
+                return None, {}
+            checkpoint.save('portfolio', portfolio)
+        
+        if config.SHARD_MODE != 'off':
+            # 銘柄をシャードに分けて並列ワーカーで取得し、単一実行と同じ形式に統合
+            from sharded_runner import ShardedRunner, get_executor
+            stock_prices, usd_jpy_rate = ShardedRunner(get_executor()).get_prices(portfolio, data_fetcher)
+        else:
+            stock_prices = data_fetcher.get_stock_prices([stock['symbol'] for stock in portfolio])
+            with span('fx.fetch'):
+                usd_jpy_rate = data_fetcher.get_usd_jpy_rate()
+        prices = {'stock_prices': stock_prices, 'usd_jpy_rate': usd_jpy_rate, 'month_stats': {}, 'warm_cache': None}
+        checkpoint.save('prices', prices)
+    
+    portfolio_data = build_portfolio_with_prices(portfolio, prices['stock_prices'], prices['usd_jpy_rate'])
+    return portfolio_data, prices
+
+def load_warm_start(run_date: str) -> Optional[Tuple[list, Dict]]:
+    """
+    ウォームアップ結果から保有銘柄と株価を揃える
+    
+    Args:
+        run_date: スケジュール日
+    
+    Returns:
+        Tuple[list, Dict]: (保有銘柄, 株価段階の出力)（ウォームアップ結果がない場合はNone）
+    """
+    try:
+        from warmup import WarmCache, apply_warm_cache
+        with span('warm.load'):
+            bundle = WarmCache().load(run_date)
+    except Exception as e:
+        print(f"⚠️ ウォームキャッシュ読み込みエラー: {e}")
+        return None
+    if not bundle:
+        print(f"ℹ️ {run_date} のウォームアップ結果がないため、すべて取得します")
+        return None
+    
+    print("\n1️⃣ 2️⃣ ウォームアップ結果を使用し、取引が始まった市場の株価だけを取得中...")
+    from data_fetcher import DataFetcher
+    portfolio, stock_prices, usd_jpy_rate, report = apply_warm_cache(bundle, DataFetcher(connect_sheets=False))
+    return portfolio, {'stock_prices': stock_prices, 'usd_jpy_rate': usd_jpy_rate, 'month_stats': {}, 'warm_cache': report}
+
+def save_daily_snapshot(portfolio_data: Dict, analysis: Dict) -> Optional[str]:
+    """
+    日次スナップショットを保存
+    
+    Args:
+        portfolio_data: ポートフォリオと株価情報
+        analysis: ポートフォリオ分析結果
+    
+    Returns:
+        str: 保存したキー（失敗時はNone）
+    """
+    try:
+        from snapshot_store import SnapshotStore, build_snapshot, today_jst
+        with span('snapshot.save'):
+            key = SnapshotStore().save(build_snapshot(portfolio_data, analysis, today_jst()))
+        print(f"💾 スナップショットを保存しました: {key}")
+        return key
+    except Exception as e:
+        print(f"⚠️ スナップショット保存エラー: {e}")
+        return None
+
+def load_month_from_snapshots() -> Tuple[Optional[Dict], Dict]:
+    """
+    対象月のスナップショットを読み込み、最新日のポートフォリオと月次統計を返す
+    
+    Returns:
+        Tuple[Dict, Dict]: (ポートフォリオと株価情報, 月次統計)（スナップショットがない場合は (None, {})）
+    """
+    try:
+        from snapshot_store import (SnapshotStore, compute_month_stats, report_month,
+                                    snapshot_to_portfolio_data, today_jst)
+        year, month = report_month(today_jst())
+        with span('snapshot.load'):
+            snapshots = SnapshotStore().month_snapshots(year, month)
+    except Exception as e:
+        print(f"⚠️ スナップショット読み込みエラー: {e}")
+        return None, {}
+    if not snapshots:
+        print(f"ℹ️ {year}年{month}月のスナップショットがないため、最新データを取得します")
+        return None, {}
+    print(f"📂 {year}年{month}月のスナップショット {len(snapshots)}日分から集計")
+    return snapshot_to_portfolio_data(snapshots[-1]), compute_month_stats(snapshots)
+
+def _credentials_file_is_valid(path: str) -> bool:
+    """
+    サービスアカウントの認証情報ファイルとして読み込めるか確認
+    Args:
+        path: 認証情報ファイルのパス
+    Returns:
+        bool: 有効な認証情報ファイルかどうか
+    """
+    try:
+        with open(path) as f:
+            info = json.load(f)
+        return bool(info.get('client_email') and info.get('private_key'))
+    except (OSError, ValueError):
+        return False
+
 def prepare_google_credentials() -> str:
     """
     Google認証情報を準備
     S3からダウンロードまたは環境変数から取得
+    ウォームコンテナでは取得済みの /tmp のファイルを再利用し、S3へのアクセスを省略する
     
     Returns:
         str: 認証情報ファイルのパス
@@ -164,10 +479,22 @@ def prepare_google_credentials() -> str:
     s3_key = os.environ.get('CREDENTIALS_S3_KEY')
     
     if s3_bucket and s3_key:
-        print(f"📥 S3から認証情報をダウンロード中: s3://{s3_bucket}/{s3_key}")
+        source = f"s3://{s3_bucket}/{s3_key}"
+        # 鍵のローテーションに追従するため、一定時間ごとに取り直す
+        max_age = int(os.environ.get('CREDENTIALS_REFRESH_SECONDS', '86400'))
+        cached = _credentials_state
+        if (cached['source'] == source and cached['path'] == credentials_path
+                and time.time() - cached['fetched_at'] < max_age
+                and _credentials_file_is_valid(credentials_path)):
+            print("♻️ 取得済みの認証情報ファイルを再利用")
+            return credentials_path
+        
+        print(f"📥 S3から認証情報をダウンロード中: {source}")
         try:
+            import boto3
             s3 = boto3.client('s3')
             s3.download_file(s3_bucket, s3_key, credentials_path)
+            _credentials_state.update({'source': source, 'path': credentials_path, 'fetched_at': time.time()})
             print("✅ S3からの認証情報ダウンロード完了")
         except Exception as e:
             print(f"❌ S3ダウンロードエラー: {e}")
@@ -175,14 +502,25 @@ def prepare_google_credentials() -> str:
     
     # 環境変数として直接JSONが設定されている場合
     elif os.environ.get('GOOGLE_CREDENTIALS_JSON'):
+        credentials_json = os.environ.get('GOOGLE_CREDENTIALS_JSON')
+        try:
+            with open(credentials_path) as f:
+                unchanged = f.read() == credentials_json
+        except OSError:
+            unchanged = False
+        if unchanged:
+            print("♻️ 作成済みの認証情報ファイルを再利用")
+            return credentials_path
+        
         print("📝 環境変数から認証情報を作成中...")
         with open(credentials_path, 'w') as f:
-            f.write(os.environ.get('GOOGLE_CREDENTIALS_JSON'))
+            f.write(credentials_json)
         print("✅ 環境変数からの認証情報作成完了")
     
     return credentials_path
 
-def send_slack_notification(portfolio_data: list, report: str, advice: str = None, execution_type: str = 'daily') -> Dict[str, Any]:
+def send_slack_notification(portfolio_data: list, report: str, advice: str = None, execution_type: str = 'daily',
+                            delivered: Optional[Dict[str, str]] = None, on_delivered=None) -> Dict[str, Any]:
     """
     Slack通知を送信
     
@@ -191,44 +529,37 @@ def send_slack_notification(portfolio_data: list, report: str, advice: str = Non
         report: 分析レポート
         advice: AI投資アドバイス（オプション）
         execution_type: 実行タイプ（daily/monthly）
+        delivered: 前回の実行で投稿済みのメッセージ（キー → ts）
+        on_delivered: 1件投稿するごとに呼び出す関数（チェックポイントの記録用）
     
     Returns:
         dict: 送信結果
     """
     try:
-        slack_client = SlackClient()
+        slack_client = get_slack_client()
         if not slack_client.client:
             return {
                 'success': False,
                 'error': 'Slack接続失敗'
             }
         
-        # 基本レポートの送信
-        report_success = slack_client.send_investment_advice(portfolio_data, report, execution_type)
-        
-        # AI投資アドバイスの送信（ある場合）
-        advice_success = True
-        if advice:
-            # Slackメッセージの文字数制限（4000文字）を考慮して分割
-            max_length = 3000
-            if len(advice) > max_length:
-                advice_parts = [advice[i:i+max_length] for i in range(0, len(advice), max_length)]
-                for i, part in enumerate(advice_parts):
-                    part_success = slack_client.send_simple_message(
-                        f"🤖 **AI投資アドバイス (Part {i+1}/{len(advice_parts)})**\n```{part}```"
-                    )
-                    if not part_success:
-                        advice_success = False
-            else:
-                advice_success = slack_client.send_simple_message(
-                    f"🤖 **AI投資アドバイス**\n```{advice}```"
-                )
+        # レポートを送信し、AI投資アドバイスはスレッドに分割して返信（レート制限時は再送）
+        deliveries = slack_client.send_report_with_advice(
+            portfolio_data, report, advice, execution_type,
+            delivered=delivered, on_delivered=on_delivered
+        )
+        report_success = any(d['key'] == 'report' and d['ok'] for d in deliveries)
+        advice_success = all(d['ok'] for d in deliveries if d['key'] != 'report')
         
         result = {
             'success': report_success and advice_success,
             'report_sent': report_success,
             'advice_sent': advice_success if advice else None,
-            'advice_available': advice is not None
+            'advice_available': advice is not None,
+            'deliveries': [
+                {'key': d['key'], 'ok': d['ok'], 'ts': d['ts'], 'attempts': d['attempts'], 'error': d['error']}
+                for d in deliveries
+            ]
         }
         
         if result['success']:
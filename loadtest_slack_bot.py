@@ -0,0 +1,548 @@
+#!/usr/bin/env python3
+"""
+Slack Bot 負荷試験スクリプト
+Slackと同じ方式で署名したイベントを指定した並列数または到着率で送信し、
+受付応答（ack）の応答時間・Slackの再送・取りこぼしたイベントを計測する
+Slackと同様に、3秒以内に200を返さなかったイベントは再送し、再送しても受け付けられなければ破棄する
+--launch を指定すると、ローカルの代替Slack API・代替Gemini APIを起動し、
+serve_slack_bot.py を子プロセスとして起動して、質問の送信から回答の投稿までの時間も計測する
+
+使用方法:
+    python loadtest_slack_bot.py --launch --requests 500 --concurrency 32
+    python loadtest_slack_bot.py --launch --rate 20 --requests 600 --gemini-latency lognormal:3000:0.5
+    python loadtest_slack_bot.py --url http://127.0.0.1:5000 --signing-secret xxx
+
+応答遅延の分布（--slack-latency / --gemini-latency）:
+    0                       遅延なし
+    fixed:MS                一定
+    uniform:MIN_MS:MAX_MS   一様分布
+    exp:MEAN_MS             指数分布
+    lognormal:MEDIAN_MS:SIGMA  対数正規分布（LLMの応答時間に近い裾の重い分布）
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import math
+import os
+import random
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qs
+
+LOADTEST_SIGNING_SECRET = 'loadtest-signing-secret'
+
+# Slackのイベント配信の仕様（3秒以内に応答がなければ失敗とみなし、最大3回再送する）
+SLACK_ACK_TIMEOUT = 3.0
+# 再送までの待ち時間（秒）。実際のSlackは即時・1分後・5分後だが、試験時間に収まるよう短縮する
+DEFAULT_RETRY_DELAYS = [0.0, 5.0, 15.0]
+
+# イベントのts（回答のthread_tsと突き合わせる）
+EVENT_TS_BASE = 1700000000
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """
+    応答遅延の分布を解析
+    Args:
+        spec: 0 / fixed:MS / uniform:MIN_MS:MAX_MS / exp:MEAN_MS / lognormal:MEDIAN_MS:SIGMA
+    Returns:
+        Callable: 遅延（秒）を返す関数
+    """
+    kind, _, params = (spec or '0').partition(':')
+    try:
+        values = [float(value) for value in params.split(':')] if params else []
+        if kind in ('0', 'none'):
+            return lambda: 0.0
+        if kind == 'fixed' and len(values) == 1:
+            return lambda: values[0] / 1000
+        if kind == 'uniform' and len(values) == 2:
+            return lambda: random.uniform(values[0], values[1]) / 1000
+        if kind == 'exp' and len(values) == 1 and values[0] > 0:
+            return lambda: random.expovariate(1000 / values[0])
+        if kind == 'lognormal' and len(values) == 2 and values[0] > 0:
+            return lambda: random.lognormvariate(math.log(values[0]), values[1]) / 1000
+    except ValueError:
+        pass
+    raise ValueError(f"応答遅延の分布を解析できません: {spec}")
+
+
+class _FakeServer:
+    """ローカルの代替サーバーの共通部分（指定した分布で応答を遅らせる）"""
+
+    def __init__(self, host: str, port: int, latency: Optional[Callable[[], float]]):
+        self.latency = latency or (lambda: 0.0)
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                status, payload = fake.handle(self.path, self.headers.get('Content-Type', ''), body)
+                payload = json.dumps(payload, ensure_ascii=False).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=UTF-8')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+
+    def handle(self, path: str, content_type: str, body: bytes):
+        raise NotImplementedError
+
+    @property
+    def address(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeSlackServer(_FakeServer):
+    """
+    Slack Web APIの代替サーバー
+    auth.test と chat.postMessage に成功応答を返し、投稿件数と回答先スレッドごとの投稿時刻を記録する
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: Optional[Callable[[], float]] = None):
+        super().__init__(host, port, latency)
+        self.posts = 0
+        self.answers: Dict[str, float] = {}
+        self.duplicate_answers = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.address}/api/"
+
+    def handle(self, path: str, content_type: str, body: bytes):
+        if path.endswith('/auth.test'):
+            return 200, {'ok': True, 'user': 'kabukan', 'user_id': 'U0LOADTEST', 'bot_id': 'B0LOADTEST'}
+        time.sleep(self.latency())
+        if 'json' in content_type:
+            params = json.loads(body or b'{}')
+        else:
+            params = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+        with self._lock:
+            self.posts += 1
+            count = self.posts
+            thread_ts = params.get('thread_ts')
+            if thread_ts:
+                if thread_ts in self.answers:
+                    self.duplicate_answers += 1
+                else:
+                    self.answers[thread_ts] = time.monotonic()
+        return 200, {'ok': True, 'channel': params.get('channel', 'C0LOADTEST'), 'ts': f"1800000000.{count:06d}"}
+
+
+class FakeGeminiServer(_FakeServer):
+    """
+    Gemini API（generateContent）の代替サーバー
+    指定した分布で遅延させてから固定の回答を返し、呼び出し回数を記録する
+    """
+
+    ANSWER = "トヨタ自動車は保有継続が妥当です。短期的な値動きよりも、為替と決算の動向を確認してください。"
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: Optional[Callable[[], float]] = None):
+        super().__init__(host, port, latency)
+        self.calls = 0
+
+    def handle(self, path: str, content_type: str, body: bytes):
+        if ':generateContent' not in path:
+            return 404, {'error': {'code': 404, 'message': f"Not found: {path}", 'status': 'NOT_FOUND'}}
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency())
+        return 200, {
+            'candidates': [{
+                'content': {'parts': [{'text': self.ANSWER}], 'role': 'model'},
+                'finishReason': 'STOP',
+                'index': 0
+            }],
+            'usageMetadata': {'promptTokenCount': 120, 'candidatesTokenCount': 40, 'totalTokenCount': 160},
+            'modelVersion': 'loadtest'
+        }
+
+
+def build_event(index: int, event_id: Optional[str] = None) -> Dict:
+    """
+    Bot宛てのダイレクトメッセージイベントを生成
+    Args:
+        index: 通し番号
+        event_id: イベントID（省略時は一意なIDを生成）
+    Returns:
+        Dict: イベントペイロード
+    """
+    return {
+        'type': 'event_callback',
+        'event_id': event_id or f"Ev{uuid.uuid4().hex[:16]}",
+        'event': {
+            'type': 'message',
+            'user': f"U{index % 50:05d}",
+            'channel': 'D0LOADTEST',
+            'text': f"トヨタの株価について教えて ({index})",
+            'ts': event_ts(index),
+        },
+    }
+
+
+def event_ts(index: int) -> str:
+    """イベントごとに一意なts（Botは回答をこのtsのスレッドに投稿する）"""
+    return f"{EVENT_TS_BASE + index // 1000000}.{index % 1000000:06d}"
+
+
+def signed_headers(body: str, signing_secret: str) -> Dict[str, str]:
+    """Slackと同じ形式の署名ヘッダーを生成"""
+    timestamp = str(int(time.time()))
+    signature = 'v0=' + hmac.new(
+        signing_secret.encode(), f"v0:{timestamp}:{body}".encode(), hashlib.sha256
+    ).hexdigest()
+    return {
+        'Content-Type': 'application/json',
+        'X-Slack-Request-Timestamp': timestamp,
+        'X-Slack-Signature': signature,
+    }
+
+
+def send_event(url: str, payload: Dict, signing_secret: str, retry_num: Optional[int] = None,
+               retry_reason: Optional[str] = None, timeout: float = 10) -> Dict:
+    """
+    イベントを1件送信
+    Args:
+        url: Bot のベースURL
+        payload: イベントペイロード
+        signing_secret: 署名シークレット
+        retry_num: 再送回数（X-Slack-Retry-Num）
+        retry_reason: 再送理由（X-Slack-Retry-Reason）
+        timeout: 応答を待つ時間（秒）
+    Returns:
+        Dict: ステータスコード（タイムアウトは timeout）と応答時間（ミリ秒）
+    """
+    body = json.dumps(payload)
+    headers = signed_headers(body, signing_secret)
+    if retry_num:
+        headers['X-Slack-Retry-Num'] = str(retry_num)
+        headers['X-Slack-Retry-Reason'] = retry_reason or 'http_error'
+    request = urllib.request.Request(f"{url}/slack/events", data=body.encode(), headers=headers, method='POST')
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (socket.timeout, TimeoutError):
+        status = 'timeout'
+    except urllib.error.URLError as e:
+        status = 'timeout' if isinstance(e.reason, (socket.timeout, TimeoutError)) else 'error'
+    except Exception:
+        status = 'error'
+    return {'status': status, 'latency_ms': (time.perf_counter() - start) * 1000}
+
+
+def deliver_event(url: str, payload: Dict, signing_secret: str, retry_delays: List[float],
+                  ack_timeout: float = SLACK_ACK_TIMEOUT) -> Dict:
+    """
+    Slackと同じ規則でイベントを配信（ack_timeout 以内に200が返らなければ再送し、再送し尽くしたら破棄）
+    Args:
+        url: Bot のベースURL
+        payload: イベントペイロード
+        signing_secret: 署名シークレット
+        retry_delays: 再送ごとの待ち時間（秒）。要素数が再送回数
+        ack_timeout: 受付応答を待つ時間（秒）
+    Returns:
+        Dict: 最初の送信時刻・試行ごとの結果・受け付けられたかどうか
+    """
+    first_sent = time.monotonic()
+    attempts = []
+    for retry_num in range(len(retry_delays) + 1):
+        if retry_num:
+            time.sleep(retry_delays[retry_num - 1])
+        previous = attempts[-1]['status'] if attempts else None
+        result = send_event(url, payload, signing_secret, retry_num=retry_num or None,
+                            retry_reason='http_timeout' if previous == 'timeout' else 'http_error',
+                            timeout=ack_timeout)
+        attempts.append(result)
+        if result['status'] == 200:
+            break
+    return {
+        'event_ts': payload['event']['ts'],
+        'first_sent': first_sent,
+        'attempts': attempts,
+        'acked': attempts[-1]['status'] == 200
+    }
+
+
+def percentile(values: List[float], p: float) -> float:
+    """パーセンタイル値（最近傍法）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def _latency_summary(values: List[float]) -> Dict:
+    return {
+        'mean': round(statistics.mean(values), 2) if values else 0.0,
+        'p50': round(percentile(values, 50), 2),
+        'p95': round(percentile(values, 95), 2),
+        'p99': round(percentile(values, 99), 2),
+        'max': round(max(values), 2) if values else 0.0,
+    }
+
+
+def wait_for_answers(fake_slack: FakeSlackServer, event_ts_list: List[str], timeout: float) -> Dict[str, float]:
+    """
+    受け付けられたイベントの回答が代替Slack APIに投稿されるまで待機
+    Returns:
+        Dict: イベントのts → 回答の投稿時刻（time.monotonic）
+    """
+    deadline = time.monotonic() + timeout
+    pending = set(event_ts_list)
+    while pending and time.monotonic() < deadline:
+        pending = {ts for ts in pending if ts not in fake_slack.answers}
+        if pending:
+            time.sleep(0.1)
+    return {ts: fake_slack.answers[ts] for ts in event_ts_list if ts in fake_slack.answers}
+
+
+def run_load(url: str, total: int, concurrency: int, signing_secret: str, retry_ratio: float = 0.0,
+             rate: Optional[float] = None, retry_delays: Optional[List[float]] = None,
+             ack_timeout: float = SLACK_ACK_TIMEOUT, fake_slack: Optional[FakeSlackServer] = None,
+             answer_timeout: float = 120) -> Dict:
+    """
+    イベントを並列に送信して計測
+    Args:
+        url: Bot のベースURL
+        total: 送信件数
+        concurrency: 同時送信数（rate 指定時は配信中のイベント数の上限）
+        signing_secret: 署名シークレット
+        retry_ratio: Slackの重複配信を模擬して、受け付け済みのイベントを同じイベントIDで再送する割合
+        rate: 到着率（件/秒、ポアソン到着）。省略時は concurrency 件ずつ続けて送信する
+        retry_delays: 受け付けられなかった場合の再送ごとの待ち時間（秒）
+        ack_timeout: Slackが受付応答を待つ時間（秒）
+        fake_slack: 代替Slack API（指定時は回答の投稿までの時間を計測）
+        answer_timeout: 回答の投稿を待つ時間（秒）
+    Returns:
+        Dict: 計測結果
+    """
+    retry_delays = DEFAULT_RETRY_DELAYS if retry_delays is None else retry_delays
+    payloads = [build_event(i) for i in range(total)]
+
+    def deliver(payload):
+        return deliver_event(url, payload, signing_secret, retry_delays, ack_timeout)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        if rate:
+            futures = []
+            next_arrival = time.monotonic()
+            for payload in payloads:
+                time.sleep(max(0.0, next_arrival - time.monotonic()))
+                futures.append(executor.submit(deliver, payload))
+                next_arrival += random.expovariate(rate)
+            deliveries = [future.result() for future in futures]
+        else:
+            deliveries = list(executor.map(deliver, payloads))
+        acked_payloads = [payload for payload, delivery in zip(payloads, deliveries) if delivery['acked']]
+        duplicates = list(executor.map(
+            lambda payload: send_event(url, payload, signing_secret, retry_num=1, timeout=ack_timeout),
+            acked_payloads[:int(total * retry_ratio)]))
+    elapsed = time.perf_counter() - start
+
+    attempts = [attempt for delivery in deliveries for attempt in delivery['attempts']] + duplicates
+    acked = [delivery for delivery in deliveries if delivery['acked']]
+    result = {
+        'requests': len(attempts),
+        'events': total,
+        'concurrency': concurrency,
+        'rate_per_s': rate,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(attempts) / elapsed, 1) if elapsed else 0.0,
+        'ack_latency_ms': _latency_summary([attempt['latency_ms'] for attempt in attempts]),
+        'first_ack_latency_ms': _latency_summary([delivery['attempts'][0]['latency_ms'] for delivery in deliveries]),
+        'status': dict(Counter(str(attempt['status']) for attempt in attempts)),
+        'retries': sum(len(delivery['attempts']) - 1 for delivery in deliveries),
+        'retried_events': sum(1 for delivery in deliveries if len(delivery['attempts']) > 1),
+        'duplicate_deliveries': len(duplicates),
+        'dropped': {'not_acked': total - len(acked)},
+    }
+
+    if fake_slack is not None:
+        answered = wait_for_answers(fake_slack, [delivery['event_ts'] for delivery in acked], answer_timeout)
+        end_to_end = [(answered[delivery['event_ts']] - delivery['first_sent']) * 1000
+                      for delivery in acked if delivery['event_ts'] in answered]
+        result['answer_latency_ms'] = _latency_summary(end_to_end)
+        result['answered'] = len(answered)
+        result['dropped']['unanswered'] = len(acked) - len(answered)
+        result['duplicate_answers'] = fake_slack.duplicate_answers
+    result['dropped']['total'] = sum(result['dropped'].values())
+    return result
+
+
+def wait_for_health(url: str, timeout: float = 30) -> Optional[Dict]:
+    """/health が応答するまで待機"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"{url}/health", timeout=2) as response:
+                return json.loads(response.read())
+        except Exception:
+            time.sleep(0.2)
+    return None
+
+
+def launch_server(port: int, processes: int, threads: int, slack_base_url: str, cache_path: str,
+                  gemini_endpoint: Optional[str] = None, workers: Optional[int] = None,
+                  queue_size: Optional[int] = None) -> subprocess.Popen:
+    """代替Slack API・代替Gemini APIを向いた本番サーバーを子プロセスで起動"""
+    env = dict(os.environ)
+    env.update({
+        'SLACK_BOT_TOKEN': 'xoxb-loadtest',
+        'SLACK_SIGNING_SECRET': LOADTEST_SIGNING_SECRET,
+        'SLACK_API_BASE_URL': slack_base_url,
+        'CACHE_BACKEND': 'sqlite',
+        'CACHE_SQLITE_PATH': cache_path,
+        'SLACK_POST_INTERVAL': '0',
+    })
+    if gemini_endpoint:
+        # 質問ごとにGeminiを1回だけ呼ぶ構成（回答キャッシュ・会話履歴・ツール・モデル選択を無効化）
+        env.update({
+            'GOOGLE_API_KEY': 'loadtest',
+            'GEMINI_API_ENDPOINT': gemini_endpoint,
+            'ANSWER_CACHE_ENABLED': 'false',
+            'CONVERSATION_MEMORY': 'false',
+            'SLACK_QA_TOOLS': 'false',
+            'MODEL_ROUTING': 'false',
+        })
+    if workers:
+        env['SLACK_WORKERS'] = str(workers)
+    if queue_size:
+        env['SLACK_QUEUE_SIZE'] = str(queue_size)
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'serve_slack_bot.py')
+    return subprocess.Popen(
+        [sys.executable, script, '--bind', f"127.0.0.1:{port}",
+         '--processes', str(processes), '--threads', str(threads)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def _format_latency(latency: Dict) -> str:
+    return (f"平均 {latency['mean']}ms / p50 {latency['p50']}ms / p95 {latency['p95']}ms / "
+            f"p99 {latency['p99']}ms / 最大 {latency['max']}ms")
+
+
+def print_report(result: Dict):
+    """計測結果を表示"""
+    print("=== 負荷試験結果 ===")
+    load = f"到着率 {result['rate_per_s']}件/秒" if result['rate_per_s'] else f"同時 {result['concurrency']}"
+    print(f"イベント数: {result['events']} ({load}) / リクエスト数: {result['requests']}")
+    print(f"所要時間: {result['elapsed_s']}秒")
+    print(f"スループット: {result['throughput_rps']} req/s")
+    print(f"受付応答: {_format_latency(result['ack_latency_ms'])}")
+    print(f"ステータス: {result['status']}")
+    print(f"Slackの再送: {result['retries']}回（{result['retried_events']}イベント） / "
+          f"重複配信: {result['duplicate_deliveries']}件")
+    if 'answer_latency_ms' in result:
+        print(f"回答までの時間: {_format_latency(result['answer_latency_ms'])}")
+        print(f"回答数: {result['answered']} / 重複した回答: {result['duplicate_answers']}")
+    dropped = result['dropped']
+    print(f"取りこぼし: {dropped['total']}件（受付失敗 {dropped['not_acked']}件"
+          + (f"、未回答 {dropped['unanswered']}件" if 'unanswered' in dropped else '') + "）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Slack Bot 負荷試験')
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='計測対象のBotのURL')
+    parser.add_argument('--signing-secret', default=os.environ.get('SLACK_SIGNING_SECRET', LOADTEST_SIGNING_SECRET))
+    parser.add_argument('--requests', type=int, default=200, help='送信するイベント数')
+    parser.add_argument('--concurrency', type=int, default=16, help='同時送信数（--rate 指定時は配信中のイベント数の上限）')
+    parser.add_argument('--rate', type=float, help='到着率（件/秒、ポアソン到着）')
+    parser.add_argument('--retry-ratio', type=float, default=0.1, help='受け付け済みのイベントを同じイベントIDで重複配信する割合')
+    parser.add_argument('--retry-delays', default=','.join(f"{delay:g}" for delay in DEFAULT_RETRY_DELAYS),
+                        help='受け付けられなかったイベントの再送までの待ち時間（秒、カンマ区切り。要素数が再送回数）')
+    parser.add_argument('--ack-timeout', type=float, default=SLACK_ACK_TIMEOUT, help='受付応答を待つ時間（秒）')
+    parser.add_argument('--answer-timeout', type=float, default=120, help='--launch時に回答の投稿を待つ時間（秒）')
+    parser.add_argument('--launch', action='store_true', help='代替Slack API・代替Gemini APIと本番サーバーを起動して計測')
+    parser.add_argument('--slack-latency', default='0', help='--launch時の代替Slack APIの応答遅延の分布')
+    parser.add_argument('--gemini-latency', default='lognormal:2000:0.5', help='--launch時の代替Gemini APIの応答遅延の分布')
+    parser.add_argument('--port', type=int, default=5055, help='--launch時の待ち受けポート')
+    parser.add_argument('--processes', type=int, default=2, help='--launch時のワーカープロセス数')
+    parser.add_argument('--threads', type=int, default=8, help='--launch時のスレッド数')
+    parser.add_argument('--workers', type=int, help='--launch時の質問処理のワーカースレッド数（SLACK_WORKERS）')
+    parser.add_argument('--queue-size', type=int, help='--launch時の処理待ちキューの上限（SLACK_QUEUE_SIZE）')
+    parser.add_argument('--json', action='store_true', help='結果をJSONで出力')
+    args = parser.parse_args()
+
+    retry_delays = [float(delay) for delay in args.retry_delays.split(',') if delay.strip()]
+    fake_slack = None
+    fake_gemini = None
+    server = None
+    url = args.url
+    signing_secret = args.signing_secret
+    try:
+        if args.launch:
+            fake_slack = FakeSlackServer(latency=parse_latency(args.slack_latency))
+            fake_slack.start()
+            fake_gemini = FakeGeminiServer(latency=parse_latency(args.gemini_latency))
+            fake_gemini.start()
+            cache_path = os.path.join(tempfile.mkdtemp(prefix='kabukan-loadtest-'), 'cache.sqlite3')
+            server = launch_server(args.port, args.processes, args.threads, fake_slack.base_url, cache_path,
+                                   gemini_endpoint=fake_gemini.address, workers=args.workers,
+                                   queue_size=args.queue_size)
+            url = f"http://127.0.0.1:{args.port}"
+            signing_secret = LOADTEST_SIGNING_SECRET
+            if wait_for_health(url) is None:
+                print("❌ サーバーが起動しませんでした（gunicornがインストールされているか確認してください）")
+                sys.exit(1)
+
+        result = run_load(url, args.requests, args.concurrency, signing_secret, args.retry_ratio,
+                          rate=args.rate, retry_delays=retry_delays, ack_timeout=args.ack_timeout,
+                          fake_slack=fake_slack, answer_timeout=args.answer_timeout)
+        if fake_slack:
+            result['slack_posts'] = fake_slack.posts
+        if fake_gemini:
+            result['gemini_calls'] = fake_gemini.calls
+        if args.json:
+            print(json.dumps(result, ensure_ascii=False, indent=2))
+        else:
+            print_report(result)
+    finally:
+        if server:
+            server.send_signal(signal.SIGTERM)
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        if fake_slack:
+            fake_slack.stop()
+        if fake_gemini:
+            fake_gemini.stop()
+
+
+if __name__ == '__main__':
+    main()
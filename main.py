@@ -13,6 +13,9 @@ from data_fetcher import DataFetcher
 from analyzer import PortfolioAnalyzer
 from mcp_client import MCPClient
 from slack_client import SlackClient
+from instrumentation import get_instrumentation, span
+import profiling
+import record_replay
 
 load_dotenv()
 
@@ -28,7 +31,8 @@ def main():
         if not os.getenv(var):
             missing_vars.append(var)
     
-    if missing_vars:
+    # 記録の再生時は外部サービスに接続しないため不要
+    if missing_vars and not record_replay.replaying_active():
         print(f"エラー: 以下の環境変数が設定されていません: {', '.join(missing_vars)}")
         print("\n.envファイルに以下の設定を追加してください:")
         print("GOOGLE_SHEETS_CREDENTIALS_PATH=path/to/your/credentials.json")
@@ -52,7 +56,8 @@ def main():
         # 基本分析の実行
         print("\n3. ポートフォリオ分析を実行中...")
         analyzer = PortfolioAnalyzer()
-        analysis = analyzer.analyze_portfolio(portfolio_data)
+        with span('analysis'):
+            analysis = analyzer.analyze_portfolio(portfolio_data)
         
         # 分析レポートの表示
         print("\n4. 分析レポートを生成中...")
@@ -64,7 +69,8 @@ def main():
         advice = None
         try:
             with MCPClient() as mcp_client:
-                advice = mcp_client.get_investment_advice(portfolio_data)
+                with span('gemini.advice'):
+                    advice = mcp_client.get_investment_advice(portfolio_data)
                 
                 if advice:
                     print("\n=== AI投資アドバイス ===")
@@ -81,13 +87,11 @@ def main():
         try:
             slack_client = SlackClient()
             if slack_client.client:
-                # 投資アドバイスとレポートをSlackに送信
-                success = slack_client.send_investment_advice(portfolio_data, report)
-                if success:
+                # レポートを送信し、AI投資アドバイスはそのスレッドに返信
+                with span('slack.notify'):
+                    deliveries = slack_client.send_report_with_advice(portfolio_data, report, advice)
+                if deliveries and all(d['ok'] for d in deliveries):
                     print("Slack通知送信成功")
-                    if advice:
-                        # AI投資アドバイスも送信
-                        slack_client.send_simple_message(f"🤖 *AI投資アドバイス*\n```{advice}```")
                 else:
                     print("Slack通知送信失敗")
             else:
@@ -96,6 +100,8 @@ def main():
             print(f"Slack通知エラー: {e}")
         
         print("\n=== 処理完了 ===")
+        # 区間ごとの所要時間をトレースファイル（JSON/CSV）に出力
+        get_instrumentation().flush()
         return 0
         
     except KeyboardInterrupt:
@@ -113,6 +119,9 @@ def show_help():
 使用方法:
   python main.py        - メイン処理を実行
   python main.py --help - このヘルプを表示
+  python main.py --profile[=cprofile] - プロファイリングして実行（profiles/ にフレームグラフ用の出力）
+  python main.py --record FILE   - 外部サービスとのやり取りを記録（gzip圧縮したJSON）
+  python main.py --replay FILE [--replay-timing preserved|collapsed] - 記録をオフラインで再生
 
 必要な環境変数:
   GOOGLE_SHEETS_CREDENTIALS_PATH - Google Sheetsサービスアカウントの認証情報ファイルパス
@@ -129,8 +138,12 @@ def show_help():
     print(help_text)
 
 if __name__ == "__main__":
+    sys.argv = profiling.consume_cli_flag(sys.argv)
+    sys.argv = record_replay.consume_cli_flags(sys.argv)
     if len(sys.argv) > 1 and sys.argv[1] in ['--help', '-h']:
         show_help()
         sys.exit(0)
     
-    sys.exit(main())
\ No newline at end of file
+    with record_replay.session('main'), profiling.profile('main'):
+        exit_code = main()
+    sys.exit(exit_code)
\ No newline at end of file
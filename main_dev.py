@@ -13,6 +13,7 @@ from data_fetcher import DataFetcher
 from analyzer import PortfolioAnalyzer
 from mcp_client import MCPClient
 from slack_client import SlackClient
+import profiling
 
 def main():
     """メイン処理"""
@@ -130,6 +131,7 @@ def show_help():
 使用方法:
   python main_dev.py        - メイン処理を実行
   python main_dev.py --help - このヘルプを表示
+  python main_dev.py --profile[=cprofile] - プロファイリングして実行（profiles/ にフレームグラフ用の出力）
 
 必要な環境変数:
   GOOGLE_SHEETS_CREDENTIALS_PATH - Google Sheetsサービスアカウントの認証情報ファイルパス
@@ -154,8 +156,11 @@ Slack Bot開発環境:
     print(help_text)
 
 if __name__ == "__main__":
+    sys.argv = profiling.consume_cli_flag(sys.argv)
     if len(sys.argv) > 1 and sys.argv[1] in ['--help', '-h']:
         show_help()
         sys.exit(0)
     
-    sys.exit(main())
+    with profiling.profile('main_dev'):
+        exit_code = main()
+    sys.exit(exit_code)
@@ -0,0 +1,350 @@
+"""
+取引所カレンダー（東証・米国市場）
+
+外部サービスを使わずに休場日・立会時間・半日取引を判定する。
+祝日は法律・取引所規則に基づいて年ごとに計算し、臨時の休場・日程変更は表で補う。
+日付ごとの判定結果はキャッシュするため、キャッシュ期限の計算など頻繁な呼び出しにも使える。
+"""
+
+from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, NamedTuple, Optional
+
+JST = timezone(timedelta(hours=9))
+
+JP = 'JP'
+US = 'US'
+MARKETS = (JP, US)
+
+# 立会時間（現地時間）
+_SESSION_HOURS = {
+    JP: (time(9, 0), time(15, 30)),   # 2024年11月から大引けは15:30
+    US: (time(9, 30), time(16, 0)),
+}
+_EARLY_CLOSE = {
+    JP: time(11, 30),  # 半日取引（前場のみ）
+    US: time(13, 0),
+}
+
+# 祝日の移動・臨時休場（計算で求められないもの）
+_JP_MOVED_HOLIDAYS = {
+    2020: {'add': [date(2020, 7, 23), date(2020, 7, 24), date(2020, 8, 10)],
+           'remove': [date(2020, 7, 20), date(2020, 10, 12), date(2020, 8, 11)]},
+    2021: {'add': [date(2021, 7, 22), date(2021, 7, 23), date(2021, 8, 8), date(2021, 8, 9)],
+           'remove': [date(2021, 7, 19), date(2021, 10, 11), date(2021, 8, 11)]},
+}
+_SPECIAL_CLOSURES = {
+    JP: [],
+    US: [date(2025, 1, 9)],  # カーター元大統領の国葬
+}
+# 臨時の半日取引（規則で求められないもの）
+_SPECIAL_EARLY_CLOSES: Dict[str, List[date]] = {JP: [], US: []}
+
+
+class Session(NamedTuple):
+    """1日分の立会（開始・終了は日本時間のタイムゾーン付き日時）"""
+    market: str
+    date: date
+    open: datetime
+    close: datetime
+    early_close: bool
+
+
+def market_for_symbol(symbol: str) -> str:
+    """銘柄コードから市場を判定（.T は東証、それ以外は米国）"""
+    return JP if symbol.endswith('.T') else US
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """その月の第n weekday（n=-1は最終）"""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + (month == 12), month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year: int) -> date:
+    """復活祭（グレゴリオ暦、匿名グレゴリオ算法）"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _japanese_holidays(year: int) -> FrozenSet[date]:
+    """国民の祝日（振替休日・国民の休日を含む、1980〜2099年）"""
+    days = {
+        date(year, 1, 1),
+        _nth_weekday(year, 1, 0, 2),                       # 成人の日
+        date(year, 2, 11),
+        date(year, 2, 23),                                 # 天皇誕生日
+        date(year, 3, int(20.8431 + 0.242194 * (year - 1980) - (year - 1980) // 4)),  # 春分の日
+        date(year, 4, 29),
+        date(year, 5, 3), date(year, 5, 4), date(year, 5, 5),
+        _nth_weekday(year, 7, 0, 3),                       # 海の日
+        date(year, 8, 11),                                 # 山の日
+        _nth_weekday(year, 9, 0, 3),                       # 敬老の日
+        date(year, 9, int(23.2488 + 0.242194 * (year - 1980) - (year - 1980) // 4)),  # 秋分の日
+        _nth_weekday(year, 10, 0, 2),                      # スポーツの日
+        date(year, 11, 3),
+        date(year, 11, 23),
+    }
+    moved = _JP_MOVED_HOLIDAYS.get(year)
+    if moved:
+        days.difference_update(moved['remove'])
+        days.update(moved['add'])
+
+    # 国民の休日（祝日に挟まれた平日）
+    for day in sorted(days):
+        between = day + timedelta(days=1)
+        if between + timedelta(days=1) in days and between not in days and between.weekday() != 6:
+            days.add(between)
+    # 振替休日（日曜の祝日の後の最初の平日）
+    for day in sorted(days):
+        if day.weekday() == 6:
+            substitute = day + timedelta(days=1)
+            while substitute in days:
+                substitute += timedelta(days=1)
+            days.add(substitute)
+    return frozenset(days)
+
+
+def _observed(day: date, saturday_to_friday: bool = True) -> Optional[date]:
+    """米国の振替（土曜は前の金曜、日曜は翌月曜）"""
+    if day.weekday() == 5:
+        return day - timedelta(days=1) if saturday_to_friday else None
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+def _us_holidays(year: int) -> FrozenSet[date]:
+    """NYSEの休場日（週末を除く）"""
+    days = [
+        _observed(date(year, 1, 1), saturday_to_friday=False),  # 元日が土曜の場合は振替なし
+        _nth_weekday(year, 1, 0, 3),                 # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),                 # Washington's Birthday
+        _easter(year) - timedelta(days=2),           # Good Friday
+        _nth_weekday(year, 5, 0, -1),                # Memorial Day
+        _observed(date(year, 6, 19)) if year >= 2022 else None,  # Juneteenth
+        _observed(date(year, 7, 4)),
+        _nth_weekday(year, 9, 0, 1),                 # Labor Day
+        _nth_weekday(year, 11, 3, 4),                # Thanksgiving
+        _observed(date(year, 12, 25)),
+    ]
+    return frozenset(day for day in days if day is not None and day.year == year)
+
+
+@lru_cache(maxsize=64)
+def holidays(market: str, year: int) -> FrozenSet[date]:
+    """
+    週末以外の休場日
+    Args:
+        market: JP / US
+        year: 年
+    Returns:
+        FrozenSet[date]: 休場日
+    """
+    if market == JP:
+        # 東証は祝日に加えて年末年始（12/31〜1/3）が休場
+        days = set(_japanese_holidays(year)) | {date(year, 1, 2), date(year, 1, 3), date(year, 12, 31)}
+    else:
+        days = set(_us_holidays(year))
+    days.update(day for day in _SPECIAL_CLOSURES[market] if day.year == year)
+    return frozenset(days)
+
+
+@lru_cache(maxsize=64)
+def early_closes(market: str, year: int) -> FrozenSet[date]:
+    """
+    半日取引の日
+    Args:
+        market: JP / US
+        year: 年
+    Returns:
+        FrozenSet[date]: 半日取引の日
+    """
+    days = set(_SPECIAL_EARLY_CLOSES[market])
+    if market == US:
+        # 独立記念日の前日・感謝祭の翌日・クリスマスイブ（営業日の場合）
+        days.update([date(year, 7, 3), _nth_weekday(year, 11, 3, 4) + timedelta(days=1), date(year, 12, 24)])
+    return frozenset(day for day in days if day.year == year and is_trading_day(market, day))
+
+
+def is_trading_day(market: str, day: date) -> bool:
+    """
+    立会がある日か
+    Args:
+        market: JP / US
+        day: 現地の日付
+    Returns:
+        bool: 立会がある日かどうか
+    """
+    return day.weekday() < 5 and day not in holidays(market, day.year)
+
+
+def _us_utc_offset(day: date) -> timedelta:
+    """米国東部時間のUTCオフセット（3月第2日曜〜11月第1日曜は夏時間）"""
+    dst_start = _nth_weekday(day.year, 3, 6, 2)
+    dst_end = _nth_weekday(day.year, 11, 6, 1)
+    return timedelta(hours=-4) if dst_start <= day < dst_end else timedelta(hours=-5)
+
+
+def _local_tz(market: str, day: date) -> timezone:
+    return JST if market == JP else timezone(_us_utc_offset(day))
+
+
+def _local_date(market: str, moment: datetime) -> date:
+    return moment.astimezone(_local_tz(market, moment.astimezone(JST).date())).date()
+
+
+@lru_cache(maxsize=4096)
+def session(market: str, day: date) -> Optional[Session]:
+    """
+    その日の立会
+    Args:
+        market: JP / US
+        day: 現地の日付
+    Returns:
+        Session: 立会（休場日はNone）
+    """
+    if not is_trading_day(market, day):
+        return None
+    tz = _local_tz(market, day)
+    open_time, close_time = _SESSION_HOURS[market]
+    early = day in early_closes(market, day.year)
+    if early:
+        close_time = _EARLY_CLOSE[market]
+    return Session(
+        market=market,
+        date=day,
+        open=datetime.combine(day, open_time, tzinfo=tz).astimezone(JST),
+        close=datetime.combine(day, close_time, tzinfo=tz).astimezone(JST),
+        early_close=early
+    )
+
+
+def is_open(market: str, moment: datetime) -> bool:
+    """その時点で立会中か（昼休みは考慮しない）"""
+    current = session(market, _local_date(market, moment))
+    return current is not None and current.open <= moment < current.close
+
+
+def next_open(market: str, moment: datetime, max_days: int = 14) -> datetime:
+    """
+    その時点より後の最初の立会開始
+    Args:
+        market: JP / US
+        moment: 基準日時（タイムゾーン付き）
+        max_days: 探索する日数
+    Returns:
+        datetime: 立会開始（日本時間）
+    """
+    day = _local_date(market, moment)
+    for offset in range(max_days + 1):
+        current = session(market, day + timedelta(days=offset))
+        if current is not None and current.open > moment:
+            return current.open
+    raise ValueError(f"{max_days}日以内に{market}の立会がありません")
+
+
+def previous_close(market: str, moment: datetime, max_days: int = 14) -> datetime:
+    """
+    その時点以前の直近の立会終了
+    Args:
+        market: JP / US
+        moment: 基準日時（タイムゾーン付き）
+        max_days: 探索する日数
+    Returns:
+        datetime: 立会終了（日本時間）
+    """
+    day = _local_date(market, moment)
+    for offset in range(max_days + 1):
+        current = session(market, day - timedelta(days=offset))
+        if current is not None and current.close <= moment:
+            return current.close
+    raise ValueError(f"{max_days}日以内に{market}の立会がありません")
+
+
+def sessions_between(market: str, start: datetime, end: datetime) -> List[Session]:
+    """
+    期間 (start, end] に重なる立会
+    Args:
+        market: JP / US
+        start: 開始（この時点は含まない）
+        end: 終了
+    Returns:
+        List[Session]: 立会のリスト（日付順）
+    """
+    first = _local_date(market, start) - timedelta(days=1)
+    last = _local_date(market, end)
+    sessions = []
+    day = first
+    while day <= last:
+        current = session(market, day)
+        if current is not None and current.close > start and current.open <= end:
+            sessions.append(current)
+        day += timedelta(days=1)
+    return sessions
+
+
+def cache_ttl(market: str, now: datetime, ttl: float, settle_seconds: float = 0) -> float:
+    """
+    株価キャッシュの有効期間
+    立会中（と引け直後の確定待ち）は通常のTTL、引け後は次の立会開始まで有効とする
+    Args:
+        market: JP / US
+        now: 現在日時
+        ttl: 立会中のTTL（秒）
+        settle_seconds: 引け後に終値が確定するまでの待ち時間（秒）
+    Returns:
+        float: 有効期間（秒）
+    """
+    if is_open(market, now):
+        return ttl
+    try:
+        if (now - previous_close(market, now)).total_seconds() < settle_seconds:
+            return ttl
+        return max(ttl, (next_open(market, now) - now).total_seconds())
+    except ValueError:
+        return ttl
+
+
+def plan_daily_run(run_at: datetime) -> Dict:
+    """
+    日次実行の要否を判定
+    前回の実行（前の平日の同時刻）以降にどちらの市場にも立会がなければ skip、
+    新しい終値はあるが今後24時間にどちらの市場も開かない場合は short（売買アドバイスを省略）
+    Args:
+        run_at: 実行日時（タイムゾーン付き）
+    Returns:
+        Dict: {'action': 'full' | 'short' | 'skip', 'reason': 理由, 'markets': 市場ごとの状況}
+    """
+    previous_run = run_at - timedelta(days=1)
+    while previous_run.astimezone(JST).weekday() >= 5:
+        previous_run -= timedelta(days=1)
+
+    markets = {}
+    for market in MARKETS:
+        try:
+            opens_soon = is_open(market, run_at) or (next_open(market, run_at) - run_at) <= timedelta(hours=24)
+        except ValueError:
+            opens_soon = False
+        markets[market] = {
+            'new_sessions': [current.date.isoformat() for current in sessions_between(market, previous_run, run_at)],
+            'opens_within_24h': opens_soon
+        }
+
+    if not any(status['new_sessions'] for status in markets.values()):
+        return {'action': 'skip', 'reason': '前回の実行以降、日米とも立会がありません', 'markets': markets}
+    if not any(status['opens_within_24h'] for status in markets.values()):
+        return {'action': 'short', 'reason': '日米とも休場のため売買アドバイスを省略します', 'markets': markets}
+    return {'action': 'full', 'reason': '', 'markets': markets}
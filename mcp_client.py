@@ -1,19 +1,33 @@
 import json
-import google.generativeai as genai
-from typing import Dict, Any, Optional
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Optional, Tuple
 import config
+from cache import TTLCache
+from instrumentation import count, span
+from model_router import configure_gemini, get_model, get_router
+
+# map-reduce分析の部分結果（シャードごとの回答）
+# ウォームコンテナ内で再実行された場合、失敗したシャードのみ再生成する
+_shard_cache = TTLCache(ttl_seconds=config.LLM_SHARD_CACHE_TTL, max_entries=2048)
 
 class MCPClient:
+    # シャードは短い定型分析のため速いモデルを優先する
+    SHARD_COMPLEXITY = 0.2
+
     def __init__(self):
         self.connected = False
         self.model = None
+        self.router = None
     
     def start_server(self):
         """Gemini APIクライアントを初期化"""
         try:
             # Gemini APIの設定
-            genai.configure(api_key=config.GOOGLE_API_KEY)
-            self.model = genai.GenerativeModel('gemini-2.5-flash')
+            configure_gemini()
+            self.model = get_model(config.GEMINI_DEFAULT_MODEL)
+            # モデル選択を有効にした場合は残り時間と実測レイテンシから階層を選ぶ
+            self.router = get_router() if config.MODEL_ROUTING else None
             self.connected = True
             print("Gemini APIクライアントを初期化しました")
             
@@ -25,14 +39,19 @@ class MCPClient:
         """クライアントを停止"""
         self.connected = False
         self.model = None
+        self.router = None
         print("Gemini APIクライアントを停止しました")
     
-    def get_investment_advice(self, portfolio_data: Dict, execution_type: str = 'daily') -> Optional[str]:
+    def get_investment_advice(self, portfolio_data: Dict, execution_type: str = 'daily',
+                              map_reduce: Optional[bool] = None,
+                              remaining_time_ms: Optional[Callable[[], float]] = None) -> Optional[str]:
         """
         Gemini APIを使用して投資アドバイスを取得
         Args:
             portfolio_data: ポートフォリオデータ
             execution_type: 実行タイプ（daily/monthly）
+            map_reduce: 銘柄ごとの並列分析を使うか（省略時は設定値）
+            remaining_time_ms: 残り時間（ミリ秒）を返す関数（Lambdaのcontext.get_remaining_time_in_millis）
         Returns:
             str: 投資アドバイス
         """
@@ -40,6 +59,12 @@ class MCPClient:
             print("Gemini APIクライアントに接続されていません")
             return None
         
+        if map_reduce is None:
+            map_reduce = config.LLM_MAP_REDUCE
+        if map_reduce:
+            return self.get_investment_advice_map_reduce(portfolio_data, execution_type,
+                                                         remaining_time_ms=remaining_time_ms)
+        
         try:
             # ポートフォリオ情報を文字列に変換
             portfolio_summary = self._format_portfolio_for_analysis(portfolio_data)
@@ -89,7 +114,7 @@ class MCPClient:
                 """
             
             # Gemini APIを通じてアドバイスを取得
-            response = self.model.generate_content(prompt)
+            response = self._generate(prompt, remaining_time_ms, execution_type=execution_type)
             
             if response and response.text:
                 return response.text
@@ -101,6 +126,215 @@ class MCPClient:
             print(f"投資アドバイス取得エラー: {e}")
             return None
     
+    def get_investment_advice_map_reduce(self, portfolio_data: Dict, execution_type: str = 'daily',
+                                         shard_by: Optional[str] = None,
+                                         max_concurrency: Optional[int] = None,
+                                         remaining_time_ms: Optional[Callable[[], float]] = None) -> Optional[str]:
+        """
+        銘柄（またはセクター）ごとに短い分析を並列実行し、最後に1回の統合分析を行う
+        Args:
+            portfolio_data: ポートフォリオデータ
+            execution_type: 実行タイプ（daily/monthly）
+            shard_by: 分割単位（holding/sector、省略時は設定値）
+            max_concurrency: 同時リクエスト数の上限（省略時は設定値）
+            remaining_time_ms: 残り時間（ミリ秒）を返す関数
+        Returns:
+            str: 投資アドバイス
+        """
+        if not self.connected or not self.model:
+            print("Gemini APIクライアントに接続されていません")
+            return None
+        
+        shards = self._build_shards(portfolio_data, shard_by or config.LLM_MAP_REDUCE_SHARD_BY)
+        if not shards:
+            print("分析対象の銘柄がありません")
+            return None
+        
+        usd_jpy_rate = portfolio_data.get('usd_jpy_rate', 150.0)
+        results: Dict[str, str] = {}
+        pending: List[Tuple[str, str, str]] = []
+        
+        # キャッシュ済みのシャードは再生成しない（シャードに選ばれるモデルで生成した回答のみ使う）
+        shard_model = self._shard_model()
+        for shard_name, shard_items in shards:
+            prompt = self._build_shard_prompt(shard_name, shard_items, usd_jpy_rate, execution_type)
+            cache_key = self._shard_cache_key(prompt, shard_model)
+            cached = _shard_cache.get(cache_key)
+            if cached is not None:
+                results[shard_name] = cached
+            else:
+                pending.append((shard_name, prompt, cache_key))
+        
+        print(f"map-reduce分析: {len(shards)}シャード（キャッシュ済み {len(results)}、生成 {len(pending)}）")
+        
+        failed_shards = []
+        if pending:
+            workers = max(1, min(max_concurrency or config.LLM_MAX_CONCURRENCY, len(pending)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    executor.submit(self._generate_shard, prompt, remaining_time_ms): (shard_name, cache_key)
+                    for shard_name, prompt, cache_key in pending
+                }
+                for future, (shard_name, cache_key) in futures.items():
+                    text, model_name = future.result()
+                    if text:
+                        results[shard_name] = text
+                        # 残り時間やタイムアウトで別のモデルが生成した回答は、以降の実行で再利用しない
+                        if model_name == shard_model:
+                            _shard_cache.set(cache_key, text)
+                    else:
+                        failed_shards.append(shard_name)
+        
+        if not results:
+            print("全シャードの分析に失敗しました")
+            return None
+        if failed_shards:
+            print(f"⚠️ 分析に失敗したシャード: {', '.join(failed_shards)}（再実行時はこのシャードのみ再生成）")
+        
+        # 元の銘柄順で統合プロンプトを構築
+        shard_answers = [(name, results[name]) for name, _ in shards if name in results]
+        prompt = self._build_reduce_prompt(portfolio_data, shard_answers, failed_shards, execution_type)
+        
+        try:
+            response = self._generate(prompt, remaining_time_ms, execution_type=execution_type)
+            if response and response.text:
+                return response.text
+            print("Gemini APIからの統合分析の応答が空です")
+            return None
+        except Exception as e:
+            print(f"統合分析エラー: {e}")
+            return None
+    
+    def _build_shards(self, portfolio_data: Dict, shard_by: str) -> List[Tuple[str, List[Tuple[Dict, Dict]]]]:
+        """
+        保有銘柄をシャードに分割
+        Args:
+            portfolio_data: ポートフォリオデータ
+            shard_by: 分割単位（holding/sector）
+        Returns:
+            List: (シャード名, [(保有銘柄情報, 株価情報)]) のリスト（銘柄の出現順）
+        """
+        portfolio = portfolio_data.get('portfolio', []) if portfolio_data else []
+        stock_prices = portfolio_data.get('stock_prices', {}) if portfolio_data else {}
+        
+        shards: Dict[str, List[Tuple[Dict, Dict]]] = {}
+        for stock in portfolio:
+            symbol = stock['symbol']
+            if symbol not in stock_prices:
+                continue
+            if shard_by == 'sector':
+                # セクター列がない場合は通貨（市場）単位でまとめる
+                shard_name = stock.get('sector') or stock_prices[symbol].get('currency', 'USD')
+            else:
+                shard_name = symbol
+            shards.setdefault(shard_name, []).append((stock, stock_prices[symbol]))
+        
+        return list(shards.items())
+    
+    def _build_shard_prompt(self, shard_name: str, shard_items: List[Tuple[Dict, Dict]],
+                            usd_jpy_rate: float, execution_type: str) -> str:
+        """シャード単位の短い分析プロンプトを構築"""
+        holdings = "".join(self._format_holding(stock, price_info, usd_jpy_rate)
+                           for stock, price_info in shard_items)
+        focus = "短期的な売買タイミング" if execution_type == 'daily' else "中長期的な保有方針"
+        return f"""
+                以下の保有銘柄（{shard_name}）について{focus}を簡潔に分析してください：
+
+                {holdings}
+                【回答形式】
+                - 各銘柄について「買い増し」「売却」「保有継続」のいずれかの推奨アクションを明記
+                - 根拠は1銘柄あたり3行以内
+
+                日本語で回答してください。
+                """
+    
+    def _build_reduce_prompt(self, portfolio_data: Dict, shard_answers: List[Tuple[str, str]],
+                             failed_shards: List[str], execution_type: str) -> str:
+        """シャードごとの分析結果を統合するプロンプトを構築"""
+        total_value_jpy = portfolio_data.get('total_value_jpy_converted', 0)
+        total_value_usd = portfolio_data.get('total_value_usd', 0)
+        usd_jpy_rate = portfolio_data.get('usd_jpy_rate', 150.0)
+        
+        sections = "\n".join(f"■ {name}\n{answer.strip()}\n" for name, answer in shard_answers)
+        missing = f"\n※次の銘柄は個別分析を取得できませんでした: {', '.join(failed_shards)}\n" if failed_shards else ""
+        analysis_name = "日次売買タイミング分析" if execution_type == 'daily' else "月次戦略分析"
+        
+        return f"""
+                以下は株式ポートフォリオの銘柄別分析結果です。これらを統合して{analysis_name}をまとめてください：
+
+                総資産価値: ¥{total_value_jpy:,.0f}（米国株部分: ${total_value_usd:,.2f}）
+                USD/JPY為替レート: {usd_jpy_rate:.2f}
+
+                {sections}{missing}
+                【回答形式】
+                - 銘柄別の推奨アクション（買い増し／売却／保有継続）の一覧
+                - ポートフォリオ全体としての優先順位とリスク要因
+                - 銘柄別分析の内容と矛盾しないこと
+
+                日本語で回答してください。
+                """
+    
+    def _generate_shard(self, prompt: str,
+                        remaining_time_ms: Optional[Callable[[], float]] = None) -> Tuple[Optional[str], Optional[str]]:
+        """
+        シャード単位の分析を実行
+        Returns:
+            Tuple: (回答（失敗時はNone）, 回答を生成したモデル名)
+        """
+        used_model: Dict[str, str] = {}
+        try:
+            response = self._generate(prompt, remaining_time_ms, complexity=self.SHARD_COMPLEXITY,
+                                      used_model=used_model)
+            if response and response.text:
+                return response.text, used_model.get('name')
+            return None, None
+        except Exception as e:
+            print(f"シャード分析エラー: {e}")
+            return None, None
+    
+    def _generate(self, prompt: str, remaining_time_ms: Optional[Callable[[], float]] = None,
+                  execution_type: Optional[str] = None, complexity: float = 0.5,
+                  used_model: Optional[Dict[str, str]] = None):
+        """
+        プロンプトを送信（モデル選択が有効な場合は残り時間に収まるモデルを選び、タイムアウト時はより速いモデルで再試行）
+        Args:
+            prompt: プロンプト
+            remaining_time_ms: 残り時間（ミリ秒）を返す関数
+            execution_type: 実行タイプ（daily/monthly）
+            complexity: 質問の複雑さ（0〜1）
+            used_model: 渡した場合、応答を生成したモデル名を 'name' に設定する
+        Returns:
+            GenerateContentResponse: Geminiの応答
+        """
+        if not self.router:
+            model_name = getattr(self.model, 'model_name', '')
+            with span('gemini.generate', model=model_name):
+                response = self.model.generate_content(prompt)
+            if used_model is not None:
+                used_model['name'] = model_name
+            return response
+        
+        def call(model_name: str, timeout: Optional[float]):
+            request_options = {'timeout': timeout} if timeout else None
+            count('gemini.attempts')
+            with span('gemini.generate', model=model_name):
+                response = get_model(model_name).generate_content(prompt, request_options=request_options)
+            if used_model is not None:
+                used_model['name'] = model_name
+            return response
+        
+        return self.router.generate(call, remaining_time_ms, complexity, execution_type)
+    
+    def _shard_model(self) -> str:
+        """残り時間の制約がない場合にシャードの分析に選ばれるモデル"""
+        if self.router:
+            return self.router.select(complexity=self.SHARD_COMPLEXITY)[0]
+        return getattr(self.model, 'model_name', '')
+    
+    def _shard_cache_key(self, prompt: str, model_name: str) -> str:
+        """プロンプト内容と回答を生成するモデルからシャードのキャッシュキーを生成"""
+        return hashlib.sha256(f"{model_name}\n{prompt}".encode('utf-8')).hexdigest()
+    
     def _format_portfolio_for_analysis(self, portfolio_data: Dict) -> str:
         """
         ポートフォリオデータを分析用の文字列に変換（円換算対応）
@@ -124,33 +358,52 @@ class MCPClient:
         summary += "保有銘柄一覧:\n"
         
         for stock in portfolio:
-            symbol = stock['symbol']
-            quantity = stock['quantity']
-            
-            if symbol in stock_prices:
-                price_info = stock_prices[symbol]
-                current_price = price_info['current_price']
-                change_percent = price_info['change_percent']
-                company_name = price_info['company_name']
-                currency = price_info.get('currency', 'USD')
-                
-                holding_value_original = current_price * quantity
-                
-                if currency == 'JPY':
-                    holding_value_jpy = holding_value_original
-                    price_display = f"¥{current_price:,.0f}"
-                    value_display = f"¥{holding_value_jpy:,.0f}"
-                else:
-                    holding_value_jpy = holding_value_original * usd_jpy_rate
-                    price_display = f"${current_price:.2f} (¥{current_price * usd_jpy_rate:,.0f})"
-                    value_display = f"¥{holding_value_jpy:,.0f} (${holding_value_original:,.2f})"
-                
-                summary += f"- {company_name} ({symbol}): {quantity}株\n"
-                summary += f"  現在価格: {price_display} ({change_percent:+.2f}%)\n"
-                summary += f"  保有価値: {value_display}\n\n"
+            if stock['symbol'] in stock_prices:
+                summary += self._format_holding(stock, stock_prices[stock['symbol']], usd_jpy_rate)
         
         return summary
     
+    def _format_holding(self, stock: Dict, price_info: Dict, usd_jpy_rate: float) -> str:
+        """
+        1銘柄分の保有情報を分析用の文字列に変換
+        Args:
+            stock: 保有銘柄情報
+            price_info: 株価情報
+            usd_jpy_rate: USD/JPY為替レート
+        Returns:
+            str: フォーマット済みの文字列
+        """
+        symbol = stock['symbol']
+        quantity = stock['quantity']
+        current_price = price_info['current_price']
+        change_percent = price_info['change_percent']
+        company_name = price_info['company_name']
+        currency = price_info.get('currency', 'USD')
+        
+        holding_value_original = current_price * quantity
+        
+        if currency == 'JPY':
+            holding_value_jpy = holding_value_original
+            price_display = f"¥{current_price:,.0f}"
+            value_display = f"¥{holding_value_jpy:,.0f}"
+        else:
+            holding_value_jpy = holding_value_original * usd_jpy_rate
+            price_display = f"${current_price:.2f} (¥{current_price * usd_jpy_rate:,.0f})"
+            value_display = f"¥{holding_value_jpy:,.0f} (${holding_value_original:,.2f})"
+        
+        text = f"- {company_name} ({symbol}): {quantity}株\n"
+        text += f"  現在価格: {price_display} ({change_percent:+.2f}%)\n"
+        text += f"  保有価値: {value_display}\n"
+        indicators = price_info.get('indicators')
+        if indicators:
+            # ウォームアップで前日終値までの履歴から計算したテクニカル指標
+            parts = [f"{label}: {indicators[key]:,.2f}" for key, label in
+                     (('sma_5', 'SMA5'), ('sma_25', 'SMA25'), ('rsi_14', 'RSI14')) if indicators.get(key) is not None]
+            parts.append(f"期間騰落率: {indicators.get('period_return_percent', 0):+.1f}%")
+            text += f"  テクニカル: {', '.join(parts)}\n"
+        text += "\n"
+        return text
+    
     def __enter__(self):
         """コンテキストマネージャーの開始"""
         self.start_server()
@@ -0,0 +1,212 @@
+import re
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+import config
+
+# 複雑な質問を示すキーワード（戦略・比較・理由付けを要するもの）
+COMPLEX_KEYWORDS = [
+    '戦略', '比較', '分析', 'なぜ', '理由', 'リスク', '見通し', '最適', 'ポートフォリオ', 'シナリオ', 'リバランス',
+    'strategy', 'compare', 'why', 'outlook', 'risk', 'rebalance'
+]
+# 単純な問い合わせを示すキーワード（価格確認など）
+SIMPLE_KEYWORDS = ['株価', 'いくら', '現在値', '終値', 'price', 'quote']
+
+SYMBOL_PATTERN = re.compile(r'\b(\d{4}|[A-Z]{2,5})\b')
+
+
+class ModelRouter:
+    """
+    残り時間・質問の複雑さ・モデルごとの実測レイテンシからGeminiモデルを選択する
+    モデル階層は強い順に並べ、タイムアウト時はより速い階層にフォールバックする
+    """
+
+    def __init__(self, tiers: Optional[List[str]] = None, window: int = 50):
+        self.tiers = tiers or config.GEMINI_MODEL_TIERS
+        self.window = window
+        self._latencies: Dict[str, deque] = {model: deque(maxlen=window) for model in self.tiers}
+        self._lock = threading.Lock()
+
+    def record(self, model_name: str, latency_ms: float):
+        """モデルの応答時間を記録"""
+        with self._lock:
+            self._latencies.setdefault(model_name, deque(maxlen=self.window)).append(latency_ms)
+
+    def percentiles(self, model_name: str) -> Dict:
+        """
+        モデルの応答時間のp50/p95を取得
+        Args:
+            model_name: モデル名
+        Returns:
+            Dict: サンプル数・p50・p95（ミリ秒）
+        """
+        with self._lock:
+            samples = sorted(self._latencies.get(model_name, ()))
+        if not samples:
+            return {'count': 0, 'p50': None, 'p95': None}
+        return {
+            'count': len(samples),
+            'p50': samples[int(0.5 * (len(samples) - 1))],
+            'p95': samples[int(round(0.95 * (len(samples) - 1)))]
+        }
+
+    def estimate_ms(self, model_name: str) -> float:
+        """モデルの想定応答時間（十分な実測がなければ既定値）"""
+        stats = self.percentiles(model_name)
+        if stats['count'] >= 3:
+            return stats['p95']
+        index = self.tiers.index(model_name) if model_name in self.tiers else len(self.tiers) - 1
+        defaults = config.GEMINI_DEFAULT_LATENCY_MS
+        return defaults[min(index, len(defaults) - 1)]
+
+    @staticmethod
+    def question_complexity(question: str) -> float:
+        """
+        質問の複雑さをローカルで推定
+        Args:
+            question: 質問内容
+        Returns:
+            float: 0（単純）〜1（複雑）のスコア
+        """
+        if not question:
+            return 0.0
+        lowered = question.lower()
+        score = min(0.4, len(question) / 300)
+        score += min(0.6, 0.2 * sum(1 for keyword in COMPLEX_KEYWORDS if keyword in lowered))
+        if len(set(SYMBOL_PATTERN.findall(question))) > 1:
+            score += 0.15
+        if any(keyword in lowered for keyword in SIMPLE_KEYWORDS):
+            score -= 0.2
+        return max(0.0, min(1.0, score))
+
+    def select(self, remaining_ms: Optional[float] = None, complexity: float = 0.5,
+               execution_type: Optional[str] = None) -> List[str]:
+        """
+        使用するモデルを選択
+        Args:
+            remaining_ms: 使える残り時間（ミリ秒、Noneは無制限）
+            complexity: 質問の複雑さ（0〜1）
+            execution_type: 実行タイプ（monthlyは最上位、dailyは中位を優先）
+        Returns:
+            List[str]: 試行順のモデル名（先頭が選択モデル、以降はフォールバック）
+        """
+        if execution_type == 'monthly':
+            preferred = 0
+        elif execution_type == 'daily':
+            preferred = min(1, len(self.tiers) - 1)
+        elif complexity >= 0.6:
+            preferred = 0
+        elif complexity >= 0.3:
+            preferred = min(1, len(self.tiers) - 1)
+        else:
+            preferred = len(self.tiers) - 1
+
+        chosen = len(self.tiers) - 1
+        for index in range(preferred, len(self.tiers)):
+            if remaining_ms is None or self.estimate_ms(self.tiers[index]) <= remaining_ms:
+                chosen = index
+                break
+        return self.tiers[chosen:]
+
+    def generate(self, generate_fn: Callable[[str, Optional[float]], object],
+                 remaining_ms: Optional[Callable[[], float]] = None,
+                 complexity: float = 0.5, execution_type: Optional[str] = None):
+        """
+        選択したモデルで生成し、タイムアウト時はより速いモデルで再試行
+        Args:
+            generate_fn: (モデル名, タイムアウト秒) を受け取り応答を返す関数
+            remaining_ms: 残り時間（ミリ秒）を返す関数（Lambdaの場合はcontext.get_remaining_time_in_millis）
+            complexity: 質問の複雑さ（0〜1）
+            execution_type: 実行タイプ
+        Returns:
+            object: generate_fnの戻り値
+        """
+        def budget_ms() -> Optional[float]:
+            if remaining_ms is None:
+                return None
+            return remaining_ms() - config.GEMINI_SAFETY_MARGIN_MS
+
+        candidates = self.select(budget_ms(), complexity, execution_type)
+        last_error = None
+        for index, model_name in enumerate(candidates):
+            budget = budget_ms()
+            if budget is not None and budget <= 0:
+                break
+            timeout_ms = budget
+            if budget is not None and index + 1 < len(candidates):
+                # フォールバック先が収まる時間を残してタイムアウトさせる
+                reserve = self.estimate_ms(candidates[index + 1])
+                if budget > reserve:
+                    timeout_ms = budget - reserve
+            start = time.monotonic()
+            try:
+                response = generate_fn(model_name, timeout_ms / 1000 if timeout_ms is not None else None)
+                elapsed_ms = (time.monotonic() - start) * 1000
+                self.record(model_name, elapsed_ms)
+                print(f"Geminiモデル: {model_name} ({elapsed_ms:,.0f}ms)")
+                return response
+            except Exception as e:
+                if not _is_timeout(e):
+                    raise
+                # タイムアウトも実測値として記録し、次回の選択に反映する
+                self.record(model_name, (time.monotonic() - start) * 1000)
+                print(f"⚠️ {model_name} がタイムアウトしました。より速いモデルで再試行します: {e}")
+                last_error = e
+
+        if last_error:
+            raise last_error
+        raise TimeoutError("Gemini呼び出しに使える残り時間がありません")
+
+    def stats(self) -> Dict:
+        """全モデルのレイテンシ統計"""
+        return {model: self.percentiles(model) for model in self.tiers}
+
+
+def _is_timeout(error: Exception) -> bool:
+    """タイムアウト系の例外かどうか判定"""
+    if isinstance(error, TimeoutError):
+        return True
+    name = type(error).__name__
+    message = str(error).lower()
+    return name in ('DeadlineExceeded', 'ReadTimeout', 'Timeout') or 'deadline' in message or 'timed out' in message
+
+
+_router = None
+_models: Dict[str, object] = {}
+_gemini_configured = False
+_router_lock = threading.Lock()
+
+
+def configure_gemini():
+    """genai.configureをプロセス内で1回だけ実行"""
+    global _gemini_configured
+    with _router_lock:
+        if not _gemini_configured:
+            import google.generativeai as genai
+            if config.GEMINI_API_ENDPOINT:
+                # 代替サーバー向けはREST（http:// のURLも指定可能）
+                genai.configure(api_key=config.GOOGLE_API_KEY, transport='rest',
+                                client_options={'api_endpoint': config.GEMINI_API_ENDPOINT})
+            else:
+                genai.configure(api_key=config.GOOGLE_API_KEY)
+            _gemini_configured = True
+
+
+def get_router() -> ModelRouter:
+    """プロセス共有のModelRouterを取得（レイテンシ実測をウォーム実行間で引き継ぐ）"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter()
+        return _router
+
+
+def get_model(model_name: str):
+    """モデル名ごとのGenerativeModelを取得（genai.configure済みであること）"""
+    with _router_lock:
+        if model_name not in _models:
+            import google.generativeai as genai
+            _models[model_name] = genai.GenerativeModel(model_name)
+        return _models[model_name]
@@ -0,0 +1,107 @@
+import os
+from typing import List, Optional
+
+import config
+
+
+class LocalObjectStore:
+    """ローカルディレクトリをオブジェクトストアとして使う（開発用）"""
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or config.SNAPSHOT_DIR
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split('/'))
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        オブジェクトを取得
+        Args:
+            key: キー
+        Returns:
+            bytes: 内容（存在しない場合はNone）
+        """
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: bytes):
+        """
+        オブジェクトを保存（一時ファイルに書いてから置き換える）
+        Args:
+            key: キー
+            data: 内容
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def list(self, prefix: str) -> List[str]:
+        """
+        プレフィックスに一致するキーの一覧
+        Args:
+            prefix: キーのプレフィックス
+        Returns:
+            List[str]: キーのリスト（昇順）
+        """
+        keys = []
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                key = os.path.relpath(os.path.join(directory, name), self.root).replace(os.sep, '/')
+                if key.startswith(prefix):
+                    keys.append(key)
+        return sorted(keys)
+
+
+class S3ObjectStore:
+    """S3バケットをオブジェクトストアとして使う（本番用）"""
+
+    def __init__(self, bucket: Optional[str] = None, prefix: Optional[str] = None):
+        self.bucket = bucket or config.SNAPSHOT_S3_BUCKET
+        self.prefix = (prefix if prefix is not None else config.SNAPSHOT_S3_PREFIX).strip('/')
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import boto3
+            self._client = boto3.client('s3')
+        return self._client
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self._key(key))['Body'].read()
+        except self.client.exceptions.NoSuchKey:
+            return None
+
+    def put(self, key: str, data: bytes):
+        self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=data)
+
+    def list(self, prefix: str) -> List[str]:
+        keys = []
+        paginator = self.client.get_paginator('list_objects_v2')
+        strip = len(self._key(''))
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix)):
+            keys.extend(item['Key'][strip:] for item in page.get('Contents', []))
+        return sorted(keys)
+
+
+def get_object_store():
+    """
+    設定に応じたオブジェクトストアを取得
+    Returns:
+        S3ObjectStore | LocalObjectStore: SNAPSHOT_S3_BUCKETが設定されていればS3、それ以外はローカル
+    """
+    if config.SNAPSHOT_S3_BUCKET:
+        return S3ObjectStore()
+    return LocalObjectStore()
@@ -0,0 +1,235 @@
+import hashlib
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import config
+from cache import make_cache
+
+# ポートフォリオと分析結果のスナップショット（CACHE_BACKEND=sqliteの場合はワーカープロセス間で共有）
+_portfolio_cache = make_cache('portfolio', ttl_seconds=config.PORTFOLIO_CACHE_TTL, max_entries=4)
+
+
+def _holdings_version(portfolio: List[Dict]) -> str:
+    """保有銘柄と数量のハッシュ（保有銘柄がない場合は'none'）"""
+    if not portfolio:
+        return 'none'
+    holdings = sorted((stock['symbol'], stock['quantity']) for stock in portfolio)
+    return hashlib.sha1(json.dumps(holdings).encode('utf-8')).hexdigest()[:12]
+
+
+class ToolCallStats:
+    """1回の回答で発生したツール呼び出しの記録"""
+
+    def __init__(self):
+        self.calls: List[Dict] = []
+
+    def record(self, name: str, elapsed_ms: float):
+        self.calls.append({'name': name, 'elapsed_ms': elapsed_ms})
+
+    @property
+    def count(self) -> int:
+        return len(self.calls)
+
+    @property
+    def total_ms(self) -> float:
+        return sum(call['elapsed_ms'] for call in self.calls)
+
+    def to_dict(self) -> Dict:
+        return {
+            'tool_calls': self.count,
+            'tool_time_ms': round(self.total_ms, 3),
+            'calls': self.calls
+        }
+
+
+class PortfolioTools:
+    """
+    Geminiのツール呼び出し（Function Calling）向けのローカルツール群
+    ポートフォリオ全体をプロンプトに埋め込む代わりに、モデルが必要なデータだけを取得する
+    """
+
+    def __init__(self, data_fetcher=None, analyzer=None):
+        self._data_fetcher = data_fetcher
+        self._analyzer = analyzer
+
+    @property
+    def data_fetcher(self):
+        """DataFetcherを初回利用時に生成"""
+        if self._data_fetcher is None:
+            from data_fetcher import DataFetcher
+            self._data_fetcher = DataFetcher()
+        return self._data_fetcher
+
+    @property
+    def analyzer(self):
+        if self._analyzer is None:
+            from analyzer import PortfolioAnalyzer
+            self._analyzer = PortfolioAnalyzer()
+        return self._analyzer
+
+    def prime(self, portfolio_data: Dict, analysis: Optional[Dict] = None):
+        """
+        取得済みのポートフォリオデータでキャッシュを埋める
+        Args:
+            portfolio_data: ポートフォリオデータ
+            analysis: 分析結果（省略時は計算）
+        """
+        if analysis is None:
+            analysis = self.analyzer.analyze_portfolio(portfolio_data)
+        _portfolio_cache.set('snapshot', {'portfolio_data': portfolio_data, 'analysis': analysis})
+        _portfolio_cache.set('version', _holdings_version(portfolio_data.get('portfolio', [])))
+
+    def snapshot(self) -> Dict:
+        """ポートフォリオと分析結果をキャッシュ優先で取得"""
+        snapshot = _portfolio_cache.get('snapshot')
+        if snapshot is None:
+            portfolio_data = self.data_fetcher.get_portfolio_with_prices()
+            analysis = self.analyzer.analyze_portfolio(portfolio_data) if portfolio_data else {}
+            snapshot = {'portfolio_data': portfolio_data or {}, 'analysis': analysis}
+            if portfolio_data:
+                _portfolio_cache.set('snapshot', snapshot)
+                _portfolio_cache.set('version', _holdings_version(portfolio_data.get('portfolio', [])))
+        return snapshot
+
+    def portfolio_version(self) -> str:
+        """
+        保有銘柄と数量から算出したポートフォリオのバージョン
+        キャッシュ済みのスナップショットがなければスプレッドシートの保有銘柄だけを読む（株価は取得しない）
+        Returns:
+            str: 保有内容のハッシュ（取得できない場合は'none'）
+        """
+        version = _portfolio_cache.get('version')
+        if version is not None:
+            return version
+        snapshot = _portfolio_cache.get('snapshot')
+        if snapshot is not None:
+            portfolio = snapshot['portfolio_data'].get('portfolio', [])
+        else:
+            portfolio = self.data_fetcher.get_portfolio_from_sheets()
+        version = _holdings_version(portfolio)
+        if portfolio:
+            _portfolio_cache.set('version', version)
+        return version
+
+    @staticmethod
+    def normalize_symbol(symbol: str) -> str:
+        """証券コードを正規化（4桁の数字は東証銘柄として.Tを付加）"""
+        symbol = str(symbol).strip().upper()
+        if symbol.isdigit():
+            return f"{symbol}.T"
+        return symbol
+
+    def get_holding(self, symbol: str) -> Dict:
+        """
+        保有銘柄の数量・評価額・構成比を取得
+        Args:
+            symbol: 株式銘柄コード
+        Returns:
+            Dict: 保有情報（保有していない場合はerror）
+        """
+        symbol = self.normalize_symbol(symbol)
+        for holding in self.snapshot()['analysis'].get('holdings_analysis', []):
+            if holding['symbol'] == symbol:
+                return holding
+        return {'symbol': symbol, 'error': '保有していない銘柄です'}
+
+    def get_quote(self, symbol: str) -> Dict:
+        """
+        銘柄の現在価格と前日比を取得
+        Args:
+            symbol: 株式銘柄コード
+        Returns:
+            Dict: 株価情報
+        """
+        symbol = self.normalize_symbol(symbol)
+        quote = self.snapshot()['portfolio_data'].get('stock_prices', {}).get(symbol)
+        if quote is None:
+            quote = self.data_fetcher.get_quote(symbol)
+        if not quote:
+            return {'symbol': symbol, 'error': '株価を取得できませんでした'}
+        return dict(quote, symbol=symbol)
+
+    def get_history(self, symbol: str, days: int = 30) -> Dict:
+        """
+        銘柄の日次終値履歴を取得
+        Args:
+            symbol: 株式銘柄コード
+            days: 取得する営業日数
+        Returns:
+            Dict: 終値履歴
+        """
+        symbol = self.normalize_symbol(symbol)
+        history = self.data_fetcher.get_price_history(symbol)
+        return {'symbol': symbol, 'history': history[-max(1, int(days)):]}
+
+    def get_indicators(self, symbol: str) -> Dict:
+        """
+        銘柄のテクニカル指標（移動平均・RSI・ボラティリティ）を取得
+        Args:
+            symbol: 株式銘柄コード
+        Returns:
+            Dict: テクニカル指標
+        """
+        symbol = self.normalize_symbol(symbol)
+        closes = [point['close'] for point in self.data_fetcher.get_price_history(symbol)]
+        if not closes:
+            return {'symbol': symbol, 'error': '価格履歴を取得できませんでした'}
+        return dict(self.analyzer.calculate_indicators(closes), symbol=symbol)
+
+    def get_risk_metrics(self) -> Dict:
+        """
+        ポートフォリオ全体のリスク評価・分散状況・パフォーマンスを取得
+        Returns:
+            Dict: リスク指標
+        """
+        analysis = self.snapshot()['analysis']
+        distribution = analysis.get('portfolio_distribution', {})
+        return {
+            'total_portfolio_value_jpy': analysis.get('total_portfolio_value_jpy', 0),
+            'number_of_holdings': analysis.get('number_of_holdings', 0),
+            'risk_assessment': analysis.get('risk_assessment', {}),
+            'performance_summary': analysis.get('performance_summary', {}),
+            'concentration_top5': distribution.get('concentration_top5', 0),
+            'is_diversified': distribution.get('is_diversified', False),
+            'top_holdings': [h['symbol'] for h in distribution.get('top_holdings', [])]
+        }
+
+    def build_tool_functions(self, stats: ToolCallStats) -> List[Callable]:
+        """
+        Geminiに渡すツール関数を構築（呼び出し回数と時間をstatsに記録）
+        Args:
+            stats: 記録先
+        Returns:
+            List[Callable]: ツール関数のリスト
+        """
+        def timed(name: str, func: Callable, *args) -> Any:
+            start = time.perf_counter()
+            try:
+                return func(*args)
+            except Exception as e:
+                return {'error': str(e)}
+            finally:
+                stats.record(name, (time.perf_counter() - start) * 1000)
+
+        def get_holding(symbol: str):
+            """保有銘柄の数量・円換算評価額・構成比を取得する。symbolは証券コード（例: 7203, AAPL）"""
+            return timed('get_holding', self.get_holding, symbol)
+
+        def get_quote(symbol: str):
+            """銘柄の最新価格と前日比を取得する。symbolは証券コード（例: 7203, AAPL）"""
+            return timed('get_quote', self.get_quote, symbol)
+
+        def get_indicators(symbol: str):
+            """銘柄のテクニカル指標（移動平均・RSI・ボラティリティ・期間騰落率）を取得する。symbolは証券コード"""
+            return timed('get_indicators', self.get_indicators, symbol)
+
+        def get_risk_metrics():
+            """ポートフォリオ全体のリスクレベル・変動性・集中度・日次パフォーマンスを取得する"""
+            return timed('get_risk_metrics', self.get_risk_metrics)
+
+        def get_history(symbol: str, days: int):
+            """銘柄の直近の日次終値を取得する。symbolは証券コード、daysは取得する営業日数"""
+            return timed('get_history', self.get_history, symbol, days)
+
+        return [get_holding, get_quote, get_indicators, get_risk_metrics, get_history]
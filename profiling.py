@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+実行時プロファイリング（任意で有効化）
+処理全体をサンプリング（sample）または決定的プロファイラ（cprofile）で計測し、
+フレームグラフ用のcollapsed stack形式（値はsampleがサンプル数、cprofileがマイクロ秒）と、
+時間のかかった関数の上位N件の要約を出力する
+無効時（既定）は何もしないコンテキストを返すため、計測のオーバーヘッドは発生しない
+
+有効化:
+    PROFILE=sample python main.py       # 環境変数（Lambda・Slack Botでも有効）
+    python main.py --profile            # サンプリング
+    python main.py --profile=cprofile   # cProfile
+
+フレームグラフの作成（例）:
+    flamegraph.pl profiles/main_20261019_090000_1234.collapsed > main.svg
+    speedscope profiles/main_20261019_090000_1234.collapsed
+"""
+
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import config
+
+SAMPLE = 'sample'
+CPROFILE = 'cprofile'
+MODES = (SAMPLE, CPROFILE)
+
+# ログに出す上位件数（全件は .top.txt に出力）
+LOG_TOP_N = 5
+
+_mode = config.PROFILE_MODE if config.PROFILE_MODE in MODES else None
+
+# 同じ秒に終了した区間の成果物を区別する通し番号
+_sequence = itertools.count(1)
+
+
+def set_mode(mode: Optional[str]):
+    """
+    プロファイリングのモードを設定
+    Args:
+        mode: sample / cprofile（None または空文字で無効）
+    """
+    global _mode
+    if mode and mode not in MODES:
+        raise ValueError(f"プロファイリングのモードは {', '.join(MODES)} のいずれかです: {mode}")
+    _mode = mode or None
+
+
+def enabled() -> bool:
+    return _mode is not None
+
+
+def consume_cli_flag(argv: List[str]) -> List[str]:
+    """
+    コマンドライン引数から --profile / --profile=MODE を取り除いてモードを設定
+    Args:
+        argv: sys.argv
+    Returns:
+        List[str]: --profile を除いた引数
+    """
+    remaining = []
+    for arg in argv:
+        if arg == '--profile':
+            set_mode(SAMPLE)
+        elif arg.startswith('--profile='):
+            set_mode(arg.split('=', 1)[1])
+        else:
+            remaining.append(arg)
+    return remaining
+
+
+class _NoopProfile:
+    """無効時に返す何もしないコンテキスト"""
+
+    result = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_PROFILE = _NoopProfile()
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _Sampler(threading.Thread):
+    """一定間隔でスタックを採取するスレッド"""
+
+    def __init__(self, interval_ms: float, thread_id: Optional[int]):
+        super().__init__(name='profiler-sampler', daemon=True)
+        self.interval = interval_ms / 1000
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop_event.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (self.thread_id is not None and thread_id != self.thread_id):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                if thread_id not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack.append(f"thread:{names.get(thread_id, thread_id)}")
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def collapsed_from_pstats(stats: 'pstats.Stats') -> Dict[str, int]:
+    """
+    cProfileの呼び出しグラフからcollapsed stack形式を組み立て（値はマイクロ秒）
+    呼び出し元ごとの経路は保持されないため、関数の時間を呼び出し元の比率で按分した近似となる
+    Args:
+        stats: pstats.Stats
+    Returns:
+        Dict: スタック → 自己時間（マイクロ秒）
+    """
+    entries = stats.stats
+    children: Dict[tuple, List[tuple]] = {}
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, edge in callers.items():
+            children.setdefault(caller, []).append((func, edge[3]))
+
+    def label(func: tuple) -> str:
+        filename, lineno, name = func
+        return name if filename == '~' else f"{name} ({os.path.basename(filename)}:{lineno})"
+
+    stacks = Counter()
+
+    def walk(func: tuple, path: List[str], on_path: set, weight: float):
+        _, _, tottime, cumtime, _ = entries[func]
+        path = path + [label(func)]
+        self_us = int(tottime * weight * 1e6)
+        if self_us:
+            stacks[';'.join(path)] += self_us
+        if len(path) >= 128:
+            return
+        for child, edge_cumtime in children.get(func, ()):
+            child_cumtime = entries[child][3]
+            if child in on_path or not child_cumtime:
+                continue
+            child_weight = weight * edge_cumtime / child_cumtime
+            if child_weight * child_cumtime < 1e-6:
+                continue
+            walk(child, path, on_path | {child}, min(child_weight, 1.0))
+
+    for func, (_, _, _, _, callers) in entries.items():
+        if not callers:
+            walk(func, [], {func}, 1.0)
+    return dict(stacks)
+
+
+def _top_from_collapsed(stacks: Dict[str, int], scale_ms: float, top_n: int) -> List[Dict]:
+    """collapsed stackから関数ごとの自己時間・累積時間の上位を集計"""
+    self_time = Counter()
+    total_time = Counter()
+    for stack, value in stacks.items():
+        frames = stack.split(';')
+        self_time[frames[-1]] += value
+        for frame in set(frames):
+            total_time[frame] += value
+    return [
+        {'function': frame, 'self_ms': round(value * scale_ms, 3), 'total_ms': round(total_time[frame] * scale_ms, 3)}
+        for frame, value in self_time.most_common(top_n) if not frame.startswith('thread:')
+    ]
+
+
+def _top_from_pstats(stats: 'pstats.Stats', top_n: int) -> List[Dict]:
+    """pstatsの自己時間の上位"""
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:top_n]
+    return [
+        {
+            'function': func[2] if func[0] == '~' else f"{func[2]} ({os.path.basename(func[0])}:{func[1]})",
+            'self_ms': round(tottime * 1000, 3),
+            'total_ms': round(cumtime * 1000, 3),
+            'calls': ncalls
+        }
+        for func, (_, ncalls, tottime, cumtime, _) in rows
+    ]
+
+
+class _Profile:
+    """処理区間のプロファイリング（終了時に成果物を書き出し、要約をログに出力）"""
+
+    def __init__(self, name: str, mode: str, all_threads: bool):
+        self.name = name
+        self.mode = mode
+        self.all_threads = all_threads
+        self.result: Optional[Dict] = None
+        self._profiler = None
+        self._sampler = None
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        if self.mode == CPROFILE:
+            # cProfileは開始したスレッドのみを計測する（無効時に読み込まないようここでインポート）
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._sampler = _Sampler(config.PROFILE_SAMPLE_INTERVAL_MS,
+                                     None if self.all_threads else threading.get_ident())
+            self._sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed_ms = (time.perf_counter() - self._start) * 1000
+        try:
+            if self._profiler is not None:
+                import pstats
+                self._profiler.disable()
+                stats = pstats.Stats(self._profiler)
+                stacks = collapsed_from_pstats(stats)
+                top = _top_from_pstats(stats, config.PROFILE_TOP_N)
+                samples = None
+            else:
+                self._sampler.stop()
+                stacks = dict(self._sampler.stacks)
+                top = _top_from_collapsed(stacks, config.PROFILE_SAMPLE_INTERVAL_MS, config.PROFILE_TOP_N)
+                samples = self._sampler.samples
+            self.result = self._write(stacks, top, stats if self._profiler is not None else None)
+            self.result.update(elapsed_ms=round(elapsed_ms, 1), samples=samples)
+            self._log(self.result)
+        except Exception as e:
+            # プロファイリングの失敗で本処理を失敗させない
+            print(f"⚠️ プロファイル出力エラー ({self.name}): {e}")
+        return False
+
+    def _write(self, stacks: Dict[str, int], top: List[Dict], stats: Optional['pstats.Stats']) -> Dict:
+        os.makedirs(config.PROFILE_DIR, exist_ok=True)
+        base = os.path.join(config.PROFILE_DIR,
+                            f"{self.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{next(_sequence)}")
+        files = {'collapsed': f"{base}.collapsed", 'top': f"{base}.top.txt"}
+        with open(files['collapsed'], 'w', encoding='utf-8') as f:
+            for stack, value in sorted(stacks.items()):
+                f.write(f"{stack} {value}\n")
+        with open(files['top'], 'w', encoding='utf-8') as f:
+            f.write(f"# {self.name} ({self.mode}) self_ms total_ms function\n")
+            for row in top:
+                f.write(f"{row['self_ms']:>12,.3f} {row['total_ms']:>12,.3f}  {row['function']}\n")
+        if stats is not None:
+            files['pstats'] = f"{base}.prof"
+            stats.dump_stats(files['pstats'])
+        return {'name': self.name, 'mode': self.mode, 'files': files, 'top': top}
+
+    def _log(self, result: Dict):
+        summary = {
+            'name': result['name'],
+            'mode': result['mode'],
+            'elapsed_ms': result['elapsed_ms'],
+            'samples': result['samples'],
+            'top': [f"{row['function']} self={row['self_ms']:,.1f}ms total={row['total_ms']:,.1f}ms"
+                    for row in result['top'][:LOG_TOP_N]],
+            'collapsed': result['files']['collapsed']
+        }
+        print(f"🔬 プロファイル: {json.dumps(summary, ensure_ascii=False)}")
+
+
+def profile(name: str, mode: Optional[str] = None, all_threads: bool = True):
+    """
+    処理区間をプロファイリングするコンテキストマネージャ
+    Args:
+        name: 成果物のファイル名に使う区間名（例: main, lambda_daily）
+        mode: sample / cprofile（省略時は設定値、無効なら何もしない）
+        all_threads: サンプリング時に全スレッドを採取するか（Falseなら開始したスレッドのみ）
+    """
+    mode = mode or _mode
+    if mode not in MODES:
+        return _NOOP_PROFILE
+    return _Profile(name, mode, all_threads)
+
+
+def wrap(name: str, func: Callable) -> Callable:
+    """
+    関数の呼び出しごとにプロファイリングする（無効時は関数をそのまま返す）
+    並列に動くワーカーの処理を対象とするため、サンプリングは呼び出したスレッドのみを採取する
+    Args:
+        name: 区間名
+        func: 対象の関数
+    Returns:
+        Callable: 対象の関数
+    """
+    if _mode is None:
+        return func
+
+    def profiled(*args, **kwargs):
+        with profile(name, all_threads=False):
+            return func(*args, **kwargs)
+    return profiled
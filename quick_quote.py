@@ -0,0 +1,229 @@
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, List, Optional, Tuple
+
+import config
+from cache import TTLCache
+from portfolio_tools import PortfolioTools
+
+# 最後に取得できた値（期限切れでも即答に使い、裏で再取得する）
+# 問い合わせのあった銘柄ごとに増えるため件数に上限を設け、1日以上前の値は使わない
+_last_known = TTLCache(ttl_seconds=86400, max_entries=4096)
+_loading: Dict[str, Future] = {}
+_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='quick-quote')
+# 遅延応答は取得とは別のスレッドで待つ（取得用のスレッドを待ち合わせで埋めない）
+_deferred_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='quick-quote-deferred')
+
+HELP_TEXT = (
+    "💡 `/stock` の使い方\n"
+    "• `/stock 7203` `/stock AAPL` : 株価\n"
+    "• `/stock 保有 7203` : 保有数量・評価額\n"
+    "• `/stock 合計` : ポートフォリオ評価額\n"
+    "• `/stock 値動き` : 値上がり・値下がり上位\n"
+    "• それ以外の質問はAIが回答します（例: `/stock トヨタの見通しは？`）"
+)
+
+PENDING_TEXT = "⏳ データを取得しています。準備ができ次第このチャンネルにお知らせします。"
+DEFERRED_FAILED_TEXT = "⚠️ データを取得できませんでした。しばらくしてから再度お試しください。"
+
+_SYMBOL_PATTERN = re.compile(r'^(\d{4}(\.T)?|[A-Z]{1,5}(\.[A-Z]{1,2})?)$')
+_TOTAL_WORDS = {'total', '合計', '評価額', '総額', 'サマリー'}
+_MOVERS_WORDS = {'movers', '値動き', '騰落', 'ランキング'}
+_HOLDING_WORDS = {'holding', '保有'}
+_QUOTE_WORDS = {'quote', '株価'}
+_HELP_WORDS = {'help', 'ヘルプ', '使い方'}
+
+
+class QuickQuote:
+    """
+    /stock スラッシュコマンドの高速応答
+    株価・保有評価額・合計・値動き上位をキャッシュから即答し、LLMは呼ばない
+    古くなったデータはそのまま返しつつ裏で再取得する（stale-while-revalidate）
+    """
+
+    def __init__(self, tools: Optional[PortfolioTools] = None, budget_ms: Optional[int] = None):
+        self.tools = tools or PortfolioTools()
+        self.budget_ms = budget_ms if budget_ms is not None else config.QUICK_QUOTE_BUDGET_MS
+
+    @staticmethod
+    def parse(text: str) -> Optional[Tuple[str, List[str]]]:
+        """
+        コマンドを解析
+        Args:
+            text: スラッシュコマンドの引数
+        Returns:
+            Tuple[str, List[str]]: (コマンド種別, 引数)。自由形式の質問の場合はNone
+        """
+        tokens = text.strip().split()
+        if not tokens:
+            return 'help', []
+        head = tokens[0].lower()
+        rest = tokens[1:]
+        if head in _HELP_WORDS and not rest:
+            return 'help', []
+        if head in _TOTAL_WORDS and not rest:
+            return 'total', []
+        if head in _MOVERS_WORDS and len(rest) <= 1 and all(token.isdigit() for token in rest):
+            return 'movers', rest
+        if head in _HOLDING_WORDS and len(rest) == 1:
+            return 'holding', rest
+        if head in _QUOTE_WORDS and rest:
+            return 'quote', rest
+        if len(tokens) <= 5 and all(_SYMBOL_PATTERN.match(token) for token in tokens):
+            return 'quote', tokens
+        return None
+
+    def answer(self, text: str, deferred: Optional[Callable[[str], None]] = None) -> Optional[str]:
+        """
+        コマンドに回答
+        Args:
+            text: スラッシュコマンドの引数
+            deferred: 時間内にデータが揃わない場合に、後から回答を送る関数
+        Returns:
+            str: 回答テキスト（自由形式の質問でLLMに回すべき場合はNone）
+        """
+        parsed = self.parse(text)
+        if parsed is None:
+            return None
+        command, args = parsed
+        if command == 'help':
+            return HELP_TEXT
+        try:
+            return self._answer(command, args)
+        except FutureTimeoutError:
+            if deferred is None:
+                return PENDING_TEXT
+
+            def send_later():
+                deadline = time.monotonic() + config.QUICK_QUOTE_DEFERRED_TIMEOUT
+                try:
+                    reply = self._answer(command, args, deadline)
+                except FutureTimeoutError:
+                    print(f"⚠️ /stock 遅延応答タイムアウト: {text}")
+                    reply = DEFERRED_FAILED_TEXT
+                except Exception as e:
+                    print(f"❌ /stock 遅延応答エラー: {e}")
+                    reply = DEFERRED_FAILED_TEXT
+                try:
+                    deferred(reply)
+                except Exception as e:
+                    print(f"❌ /stock 遅延応答送信エラー: {e}")
+
+            _deferred_executor.submit(send_later)
+            return PENDING_TEXT
+
+    def _answer(self, command: str, args: List[str], deadline: Optional[float] = None) -> str:
+        if command == 'quote':
+            return "\n".join(self._format_quote(symbol, deadline) for symbol in args)
+        if command == 'holding':
+            return self._format_holding(args[0], deadline)
+        if command == 'total':
+            return self._format_total(deadline)
+        return self._format_movers(int(args[0]) if args else 3, deadline)
+
+    def _get(self, key: str, loader: Callable, fresh_seconds: float,
+             deadline: Optional[float] = None) -> Tuple[Optional[object], float]:
+        """
+        キャッシュ優先で取得（古い場合は裏で再取得、未取得の場合は予算内だけ待つ）
+        Args:
+            deadline: 遅延応答で待つ期限（time.monotonic の値）。Noneの場合は即答の予算だけ待つ
+        Returns:
+            Tuple[object, float]: (値, 取得からの経過秒数)
+        """
+        entry = _last_known.get(key)
+        if entry is not None:
+            age = time.time() - entry['fetched_at']
+            if age >= fresh_seconds:
+                self._load_async(key, loader)
+            return entry['value'], age
+        future = self._load_async(key, loader)
+        timeout = self.budget_ms / 1000 if deadline is None else max(0.0, deadline - time.monotonic())
+        value = future.result(timeout=timeout)
+        return value, 0.0
+
+    def _load_async(self, key: str, loader: Callable) -> Future:
+        """同じキーの取得を1本にまとめてバックグラウンドで実行"""
+        with _lock:
+            future = _loading.get(key)
+            if future is not None and not future.done():
+                return future
+
+            def load():
+                try:
+                    value = loader()
+                    if value:
+                        _last_known.set(key, {'value': value, 'fetched_at': time.time()})
+                    return value
+                finally:
+                    with _lock:
+                        _loading.pop(key, None)
+
+            future = _executor.submit(load)
+            _loading[key] = future
+            return future
+
+    def _load_snapshot(self) -> Optional[Dict]:
+        """ポートフォリオを取得（SheetsやYahooの失敗で空の場合はNoneを返し、保持しない）"""
+        snapshot = self.tools.snapshot()
+        return snapshot if snapshot and snapshot.get('portfolio_data') else None
+
+    def _snapshot(self, deadline: Optional[float]) -> Dict:
+        snapshot, _ = self._get('snapshot', self._load_snapshot, config.PORTFOLIO_CACHE_TTL, deadline)
+        return snapshot or {'portfolio_data': {}, 'analysis': {}}
+
+    def _holdings(self, deadline: Optional[float]) -> List[Dict]:
+        return self._snapshot(deadline)['analysis'].get('holdings_analysis', [])
+
+    def _format_quote(self, symbol: str, deadline: Optional[float]) -> str:
+        symbol = self.tools.normalize_symbol(symbol)
+        quote, age = self._get(f"quote:{symbol}", lambda: self.tools.data_fetcher.get_quote(symbol),
+                               config.QUOTE_CACHE_TTL, deadline)
+        if not quote:
+            return f"❓ {symbol}: 株価を取得できませんでした"
+        arrow = '▲' if quote['change_percent'] > 0 else ('▼' if quote['change_percent'] < 0 else '―')
+        line = (f"*{quote['company_name']}* ({symbol})  {quote['current_price']:,.2f} {quote['currency']}  "
+                f"{arrow}{quote['change_percent']:+.2f}% ({quote['change']:+,.2f})")
+        return line + self._age_note(age, config.QUOTE_CACHE_TTL)
+
+    def _format_holding(self, symbol: str, deadline: Optional[float]) -> str:
+        symbol = self.tools.normalize_symbol(symbol)
+        holding = next((h for h in self._holdings(deadline) if h['symbol'] == symbol), None)
+        if holding is None:
+            return f"❓ {symbol} は保有していません"
+        return (f"*{holding['company_name']}* ({symbol})\n"
+                f"数量: {holding['quantity']:,}  現在値: {holding['current_price']:,.2f} {holding['currency']}\n"
+                f"評価額: ¥{holding['holding_value_jpy']:,.0f}（構成比 {holding['portfolio_weight']:.1f}%）\n"
+                f"前日比: {holding['daily_change_percent']:+.2f}%（¥{holding['daily_pnl_jpy']:+,.0f}）")
+
+    def _format_total(self, deadline: Optional[float]) -> str:
+        analysis = self._snapshot(deadline)['analysis']
+        holdings = analysis.get('holdings_analysis', [])
+        if not holdings:
+            return "❓ ポートフォリオを取得できませんでした"
+        daily_pnl = sum(h['daily_pnl_jpy'] for h in holdings)
+        weighted_return = analysis.get('performance_summary', {}).get('weighted_return', 0)
+        return (f"💼 *ポートフォリオ評価額*: ¥{analysis.get('total_portfolio_value_jpy', 0):,.0f}\n"
+                f"保有銘柄数: {len(holdings)}  前日比: {weighted_return:+.2f}%（¥{daily_pnl:+,.0f}）")
+
+    def _format_movers(self, count: int, deadline: Optional[float]) -> str:
+        holdings = sorted(self._holdings(deadline), key=lambda h: h['daily_change_percent'], reverse=True)
+        if not holdings:
+            return "❓ ポートフォリオを取得できませんでした"
+        count = max(1, min(count, 10))
+        gainers = [h for h in holdings if h['daily_change_percent'] > 0][:count]
+        losers = [h for h in reversed(holdings) if h['daily_change_percent'] < 0][:count]
+        lines = ["📈 *値上がり上位*"]
+        lines += [f"• {h['company_name']} ({h['symbol']}) {h['daily_change_percent']:+.2f}%" for h in gainers] or ["• なし"]
+        lines.append("📉 *値下がり上位*")
+        lines += [f"• {h['company_name']} ({h['symbol']}) {h['daily_change_percent']:+.2f}%" for h in losers] or ["• なし"]
+        return "\n".join(lines)
+
+    @staticmethod
+    def _age_note(age: float, fresh_seconds: float) -> str:
+        """古いデータで回答した場合の注記"""
+        if age < fresh_seconds:
+            return ""
+        return f"（{int(age // 60)}分前の価格・更新中）" if age >= 60 else f"（{int(age)}秒前の価格・更新中）"
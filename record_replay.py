@@ -0,0 +1,580 @@
+#!/usr/bin/env python3
+"""
+実行全体の記録と再生
+本番の1回の実行で外部サービスとやり取りした内容（スプレッドシートの行・Yahoo Financeの応答・為替・
+Geminiの応答・Slack APIの呼び出し）を DataFetcher・MCPClient・SlackClient の境界で記録し、
+gzip圧縮したJSON（バンドル）に保存する
+再生時は同じ境界で記録した応答を返すため、ネットワークに接続せずに同じ入力で実行を再現できる
+（遅い実行や誤ったレポートの再現、最適化の前後比較に使う）。Slackには投稿せず、投稿内容を記録と比較する
+タイミングは preserved（呼び出しごとに記録時の所要時間だけ待つ）と collapsed（待たない）から選ぶ
+
+記録・再生の間は、境界の外から入力が入らないよう、ウォームアップ結果・チェックポイント・スナップショット・
+取引所カレンダー・分散実行を使わずに実行する
+
+使用方法:
+    python main.py --record recordings/run.json.gz
+    python main.py --replay recordings/run.json.gz --replay-timing preserved
+    python record_replay.py show recordings/run.json.gz
+    python record_replay.py replay recordings/daily_20261019_090000.json.gz --entry lambda
+    Lambda: {"record": true}（RECORDINGS_PREFIX 以下に保存）
+            {"replay": "recordings/daily_20261019_090000.json.gz", "replay_timing": "collapsed"}
+"""
+
+import argparse
+import contextlib
+import gzip
+import hashlib
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import config
+
+BUNDLE_VERSION = 1
+PRESERVED = 'preserved'
+COLLAPSED = 'collapsed'
+TIMINGS = (PRESERVED, COLLAPSED)
+
+# 記録・再生の間に無効化する設定（境界の外からの入力を断つ）
+ISOLATED_CONFIG = {
+    'WARMUP_ENABLED': False,
+    'CHECKPOINT_ENABLED': False,
+    'SNAPSHOT_ENABLED': False,
+    'MARKET_CALENDAR_ENABLED': False,
+    'SHARD_MODE': 'off',
+}
+
+# Lambdaのローカル再生で、設定されていなければ仮の値を入れる環境変数（_run の必須チェック用）
+LAMBDA_REQUIRED_ENV = ['GOOGLE_SHEETS_CREDENTIALS_PATH', 'SPREADSHEET_ID', 'GOOGLE_API_KEY',
+                       'SLACK_BOT_TOKEN', 'SLACK_CHANNEL']
+
+# main.py の --record / --replay
+_cli = {'record': None, 'replay': None, 'timing': COLLAPSED}
+
+# 実行中の再生（再生中はmain.pyの環境変数チェックを省く）
+_active = {'replayer': None}
+
+
+class ReplayMissError(KeyError):
+    """記録にない呼び出し"""
+
+
+def _prompt_key(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:16]
+
+
+def _response_text(response) -> Optional[str]:
+    """Geminiの応答の本文（候補がない場合などはNone）"""
+    try:
+        return response.text if response else None
+    except Exception:
+        return None
+
+
+def _text_digest(text: Optional[str]) -> str:
+    return hashlib.sha256((text or '').encode('utf-8')).hexdigest()[:16]
+
+
+def save_bundle(bundle: Dict, path: str, use_store: bool = False) -> str:
+    """
+    バンドルを保存
+    Args:
+        bundle: バンドル
+        path: ローカルのファイルパス（use_store の場合は object_store のキー）
+        use_store: object_store（S3・ローカルディレクトリ）に保存するか
+    Returns:
+        str: 保存先
+    """
+    data = gzip.compress(json.dumps(bundle, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+    if use_store:
+        from object_store import get_object_store
+        get_object_store().put(path, data)
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+    return path
+
+
+def load_bundle(path: str) -> Dict:
+    """
+    バンドルを読み込み（ローカルのファイルがなければ object_store のキーとして探す）
+    Args:
+        path: ファイルパスまたはキー
+    Returns:
+        Dict: バンドル
+    """
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            data = f.read()
+    else:
+        from object_store import get_object_store
+        data = get_object_store().get(path)
+        if data is None:
+            raise FileNotFoundError(f"記録が見つかりません: {path}")
+    bundle = json.loads(gzip.decompress(data).decode('utf-8'))
+    if bundle.get('version') != BUNDLE_VERSION:
+        raise ValueError(f"対応していない記録の形式です: version={bundle.get('version')}")
+    return bundle
+
+
+class _Patches:
+    """属性の差し替えと復元"""
+
+    def __init__(self):
+        self._saved = []
+
+    def set(self, target, name: str, value):
+        self._saved.append((target, name, getattr(target, name)))
+        setattr(target, name, value)
+
+    def restore(self):
+        for target, name, value in reversed(self._saved):
+            setattr(target, name, value)
+        self._saved = []
+
+
+def _isolate(patches: _Patches):
+    for name, value in ISOLATED_CONFIG.items():
+        patches.set(config, name, value)
+
+
+class Recorder:
+    """境界の呼び出しを記録"""
+
+    def __init__(self, name: str, event: Optional[Dict] = None):
+        self.name = name
+        self.event = event
+        self.calls: List[Dict] = []
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def call(self, boundary: str, key: str, func: Callable, *args, encode: Callable = None, extra: Dict = None):
+        """
+        関数を呼び出して結果と所要時間を記録（例外も記録して送出する）
+        Args:
+            boundary: 境界（sheets / yahoo.quote / yahoo.history / fx / gemini / slack）
+            key: 再生時に応答を引き当てるキー
+            func: 呼び出す関数
+            encode: 結果をJSONに保存できる形に変換する関数
+            extra: 一緒に記録する情報
+        """
+        started = time.perf_counter()
+        entry = {'boundary': boundary, 'key': key, 'offset_ms': round((started - self._start) * 1000, 3)}
+        if extra:
+            entry.update(extra)
+        try:
+            result = func(*args)
+            entry['result'] = encode(result) if encode else result
+            return result
+        except Exception as e:
+            entry['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            entry['duration_ms'] = round((time.perf_counter() - started) * 1000, 3)
+            with self._lock:
+                self.calls.append(entry)
+
+    def bundle(self) -> Dict:
+        with self._lock:
+            calls = sorted(self.calls, key=lambda entry: entry['offset_ms'])
+        return {
+            'version': BUNDLE_VERSION,
+            'name': self.name,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'event': self.event,
+            'config': {'GEMINI_DEFAULT_MODEL': config.GEMINI_DEFAULT_MODEL, 'MODEL_ROUTING': config.MODEL_ROUTING,
+                       'LLM_MAP_REDUCE': config.LLM_MAP_REDUCE},
+            'elapsed_ms': round((time.perf_counter() - self._start) * 1000, 3),
+            'calls': calls,
+            'summary': dict(Counter(entry['boundary'] for entry in calls))
+        }
+
+
+class _ReplayResponse:
+    """再生したGeminiの応答（呼び出し元は text だけを使う）"""
+
+    def __init__(self, text: Optional[str]):
+        self.text = text
+
+
+class _ReplaySheetsClient:
+    """再生時に DataFetcher.sheets_client に入れる目印（接続しない）"""
+
+
+class Replayer:
+    """記録した応答を境界ごとに順に返す"""
+
+    def __init__(self, bundle: Dict, timing: str = COLLAPSED):
+        if timing not in TIMINGS:
+            raise ValueError(f"タイミングは {', '.join(TIMINGS)} のいずれかです: {timing}")
+        self.bundle = bundle
+        self.timing = timing
+        self._queues: Dict[tuple, deque] = {}
+        self._last: Dict[tuple, Dict] = {}
+        for entry in bundle['calls']:
+            self._queues.setdefault((entry['boundary'], entry['key']), deque()).append(entry)
+        self.replayed = Counter()
+        self.issues = Counter()
+        self.slack_messages: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def take(self, boundary: str, key: str, any_key: bool = False) -> Dict:
+        """
+        記録した応答を取り出す（同じキーの記録を使い切った場合は最後の応答を再利用）
+        Args:
+            boundary: 境界
+            key: キー
+            any_key: キーが一致しない場合に、同じ境界のまだ使っていない記録を順に使うか
+        Returns:
+            Dict: 記録
+        """
+        with self._lock:
+            queue = self._queues.get((boundary, key))
+            if not queue and any_key:
+                pending = [q for (b, _), q in self._queues.items() if b == boundary and q]
+                if pending:
+                    queue = min(pending, key=lambda q: q[0]['offset_ms'])
+                    self.issues[f"{boundary}.mismatched"] += 1
+            if queue:
+                entry = queue.popleft()
+                self._last[(boundary, key)] = entry
+            elif (boundary, key) in self._last:
+                entry = self._last[(boundary, key)]
+                self.issues[f"{boundary}.reused"] += 1
+            else:
+                self.issues[f"{boundary}.missed"] += 1
+                raise ReplayMissError(f"記録にない呼び出しです: {boundary} {key}")
+            self.replayed[boundary] += 1
+        if self.timing == PRESERVED:
+            time.sleep(entry['duration_ms'] / 1000)
+        return entry
+
+    def result(self, boundary: str, key: str, any_key: bool = False):
+        entry = self.take(boundary, key, any_key)
+        if 'error' in entry:
+            raise RuntimeError(f"(記録されたエラー) {entry['error']}")
+        return entry.get('result')
+
+    def summary(self) -> Dict:
+        unused = sum(len(queue) for queue in self._queues.values())
+        return {
+            'name': self.bundle.get('name'),
+            'timing': self.timing,
+            'replayed': dict(self.replayed),
+            'issues': dict(self.issues),
+            'unused': unused,
+            'slack_changed': sum(1 for message in self.slack_messages if message['changed']),
+            'recorded_elapsed_ms': self.bundle.get('elapsed_ms')
+        }
+
+
+class _RecordingWebClient:
+    """Slack WebClientの chat_postMessage を記録し、それ以外はそのまま委譲"""
+
+    def __init__(self, client, recorder: Recorder):
+        self._client = client
+        self._recorder = recorder
+
+    def chat_postMessage(self, **kwargs):
+        return self._recorder.call(
+            'slack', 'chat.postMessage', lambda: self._client.chat_postMessage(**kwargs),
+            encode=lambda response: {'ok': response.get('ok'), 'ts': response.get('ts'),
+                                     'channel': response.get('channel')},
+            extra={'request': {'channel': kwargs.get('channel'), 'thread_ts': kwargs.get('thread_ts'),
+                               'text': kwargs.get('text')}})
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class _ReplayWebClient:
+    """記録したSlack APIの応答を返す（投稿はしない）"""
+
+    def __init__(self, replayer: Replayer):
+        self._replayer = replayer
+
+    def chat_postMessage(self, **kwargs):
+        text = kwargs.get('text')
+        try:
+            entry = self._replayer.take('slack', 'chat.postMessage')
+            recorded = entry.get('request', {}).get('text')
+        except ReplayMissError:
+            entry, recorded = {'result': {'ok': True, 'ts': f"{time.time():.6f}"}}, None
+        with self._replayer._lock:
+            self._replayer.slack_messages.append({
+                'channel': kwargs.get('channel'), 'thread_ts': kwargs.get('thread_ts'), 'text': text,
+                'changed': recorded is None or _text_digest(recorded) != _text_digest(text)
+            })
+        if 'error' in entry:
+            raise RuntimeError(f"(記録されたエラー) {entry['error']}")
+        return entry['result']
+
+    def auth_test(self):
+        return {'ok': True, 'user': 'replay', 'user_id': 'UREPLAY', 'bot_id': 'BREPLAY'}
+
+
+def _install_recording(patches: _Patches, recorder: Recorder):
+    import data_fetcher
+    import mcp_client
+    import slack_client
+    from data_fetcher import DataFetcher
+    from mcp_client import MCPClient
+
+    read_sheet_records = DataFetcher._read_sheet_records
+    fetch_quote = DataFetcher._fetch_stock_price_from_yahoo_api
+    get_price_history = DataFetcher.get_price_history
+    get_usd_jpy_rate = DataFetcher.get_usd_jpy_rate
+    generate = MCPClient._generate
+    get_web_client = slack_client.get_slack_web_client
+    wrapped = {}
+
+    def recording_web_client():
+        client = get_web_client()
+        if client is None:
+            return None
+        if id(client) not in wrapped:
+            wrapped[id(client)] = _RecordingWebClient(client, recorder)
+        return wrapped[id(client)]
+
+    patches.set(DataFetcher, '_read_sheet_records',
+                lambda self: recorder.call('sheets', 'records', read_sheet_records, self))
+    patches.set(DataFetcher, '_fetch_stock_price_from_yahoo_api',
+                lambda self, symbol: recorder.call('yahoo.quote', symbol, fetch_quote, self, symbol))
+    patches.set(DataFetcher, 'get_price_history',
+                lambda self, symbol, range_='3mo': recorder.call(
+                    'yahoo.history', f"{symbol}:{range_}", get_price_history, self, symbol, range_))
+    patches.set(DataFetcher, 'get_usd_jpy_rate',
+                lambda self: recorder.call('fx', 'USDJPY', get_usd_jpy_rate, self))
+    patches.set(MCPClient, '_generate',
+                lambda self, prompt, *args, **kwargs: recorder.call(
+                    'gemini', _prompt_key(prompt), lambda: generate(self, prompt, *args, **kwargs),
+                    encode=lambda response: {'text': _response_text(response)},
+                    extra={'prompt_chars': len(prompt)}))
+    patches.set(slack_client, 'get_slack_web_client', recording_web_client)
+    # 記録中に取得した値がキャッシュから返され、記録から漏れることがないよう空にする
+    data_fetcher._quote_cache.clear()
+    data_fetcher._history_cache.clear()
+    mcp_client._shard_cache.clear()
+
+
+def _install_replay(patches: _Patches, replayer: Replayer):
+    import data_fetcher
+    import mcp_client
+    import slack_client
+    from data_fetcher import DataFetcher
+    from mcp_client import MCPClient
+
+    def setup_sheets_client(self):
+        self.sheets_client = _ReplaySheetsClient()
+
+    def start_server(self):
+        self.model, self.router, self.connected = 'replay', None, True
+
+    def generate(self, prompt, *args, **kwargs):
+        result = replayer.result('gemini', _prompt_key(prompt), any_key=True)
+        return _ReplayResponse(result['text'] if result else None)
+
+    web_client = _ReplayWebClient(replayer)
+    patches.set(DataFetcher, '_setup_sheets_client', setup_sheets_client)
+    patches.set(DataFetcher, '_read_sheet_records', lambda self: replayer.result('sheets', 'records'))
+    patches.set(DataFetcher, '_fetch_stock_price_from_yahoo_api',
+                lambda self, symbol: replayer.result('yahoo.quote', symbol))
+    patches.set(DataFetcher, 'get_price_history',
+                lambda self, symbol, range_='3mo': replayer.result('yahoo.history', f"{symbol}:{range_}"))
+    patches.set(DataFetcher, 'get_usd_jpy_rate', lambda self: replayer.result('fx', 'USDJPY'))
+    patches.set(MCPClient, 'start_server', start_server)
+    patches.set(MCPClient, '_generate', generate)
+    patches.set(slack_client, 'get_slack_web_client', lambda: web_client)
+    data_fetcher._quote_cache.clear()
+    data_fetcher._history_cache.clear()
+    mcp_client._shard_cache.clear()
+
+
+def _log(label: str, summary: Dict):
+    print(f"{label}: {json.dumps(summary, ensure_ascii=False)}")
+
+
+@contextlib.contextmanager
+def recording(path: str, name: str = 'main', event: Optional[Dict] = None, use_store: bool = False):
+    """
+    境界の呼び出しを記録し、終了時にバンドルを保存するコンテキストマネージャ
+    Args:
+        path: 保存先のファイルパス（use_store の場合は object_store のキー）
+        name: 実行の名前（main / daily / monthly）
+        event: Lambdaのイベント（再生時に同じ実行タイプで実行するため保存）
+        use_store: object_store（S3・ローカルディレクトリ）に保存するか
+    """
+    recorder = Recorder(name, event)
+    patches = _Patches()
+    _isolate(patches)
+    _install_recording(patches, recorder)
+    try:
+        yield recorder
+    finally:
+        patches.restore()
+        bundle = recorder.bundle()
+        try:
+            save_bundle(bundle, path, use_store)
+            _log("📼 実行を記録しました", {'path': path, 'calls': bundle['summary']})
+        except Exception as e:
+            # 記録の失敗で本処理を失敗させない
+            print(f"⚠️ 記録の保存エラー ({path}): {e}")
+
+
+@contextlib.contextmanager
+def replaying(bundle: Dict, timing: str = COLLAPSED):
+    """
+    記録した応答で実行を再生するコンテキストマネージャ（ネットワークに接続せず、Slackにも投稿しない）
+    Args:
+        bundle: バンドル
+        timing: preserved（記録時の所要時間だけ待つ）/ collapsed（待たない）
+    """
+    replayer = Replayer(bundle, timing)
+    patches = _Patches()
+    _isolate(patches)
+    if timing == COLLAPSED:
+        # Slackのレート制限に合わせた送信間隔も待たない
+        patches.set(config, 'SLACK_POST_INTERVAL', 0)
+    _install_replay(patches, replayer)
+    _active['replayer'] = replayer
+    try:
+        yield replayer
+    finally:
+        _active['replayer'] = None
+        patches.restore()
+        _log("📼 記録を再生しました", replayer.summary())
+
+
+def replaying_active() -> bool:
+    return _active['replayer'] is not None
+
+
+def consume_cli_flags(argv: List[str]) -> List[str]:
+    """
+    コマンドライン引数から --record PATH / --replay PATH / --replay-timing MODE を取り除いて設定
+    Args:
+        argv: sys.argv
+    Returns:
+        List[str]: 取り除いた後の引数
+    """
+    remaining = []
+    args = iter(argv)
+    for arg in args:
+        name, _, value = arg.partition('=')
+        if name in ('--record', '--replay', '--replay-timing'):
+            value = value or next(args, '')
+            if not value:
+                raise ValueError(f"{name} には値を指定してください")
+            _cli['timing' if name == '--replay-timing' else name[2:]] = value
+        else:
+            remaining.append(arg)
+    if _cli['timing'] not in TIMINGS:
+        raise ValueError(f"--replay-timing は {', '.join(TIMINGS)} のいずれかです: {_cli['timing']}")
+    return remaining
+
+
+def session(name: str = 'main'):
+    """
+    コマンドライン引数に応じた記録・再生（指定がなければ何もしない）
+    Args:
+        name: 実行の名前
+    """
+    if _cli['replay']:
+        return replaying(load_bundle(_cli['replay']), _cli['timing'])
+    if _cli['record']:
+        return recording(_cli['record'], name)
+    return contextlib.nullcontext()
+
+
+def lambda_session(event: Dict, name: str):
+    """
+    Lambdaのイベントに応じた記録・再生（{"record": true} / {"replay": KEY, "replay_timing": MODE}）
+    Args:
+        event: Lambdaのイベント
+        name: 実行の名前（実行タイプ）
+    """
+    if event.get('replay'):
+        return replaying(load_bundle(event['replay']), event.get('replay_timing', COLLAPSED))
+    if event.get('record'):
+        key = f"{config.RECORDINGS_PREFIX}{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json.gz"
+        return recording(key, name, {k: v for k, v in event.items() if k != 'record'}, use_store=True)
+    return contextlib.nullcontext()
+
+
+class _LocalContext:
+    """ローカルで再生する際のLambdaランタイムコンテキスト"""
+
+    aws_request_id = 'replay'
+
+    def __init__(self, timeout_ms: int = 900000):
+        self._deadline = time.monotonic() + timeout_ms / 1000
+
+    def get_remaining_time_in_millis(self) -> int:
+        return int((self._deadline - time.monotonic()) * 1000)
+
+
+def replay_lambda(bundle: Dict, timing: str = COLLAPSED) -> Any:
+    """
+    記録したLambdaの実行をローカルで再生
+    Args:
+        bundle: バンドル
+        timing: preserved / collapsed
+    Returns:
+        dict: lambda_handlerの戻り値
+    """
+    for name in LAMBDA_REQUIRED_ENV:
+        os.environ.setdefault(name, 'replay')
+    import lambda_main
+    event = dict(bundle.get('event') or {'execution_type': bundle.get('name', 'daily')})
+    with replaying(bundle, timing):
+        return lambda_main.lambda_handler(event, _LocalContext())
+
+
+def _show(bundle: Dict):
+    print(f"記録: {bundle['name']}（{bundle['created_at']}、所要時間 {bundle['elapsed_ms']:,.0f}ms）")
+    if bundle.get('event'):
+        print(f"イベント: {json.dumps(bundle['event'], ensure_ascii=False)}")
+    by_boundary: Dict[str, List[float]] = {}
+    for entry in bundle['calls']:
+        by_boundary.setdefault(entry['boundary'], []).append(entry['duration_ms'])
+    for boundary, durations in by_boundary.items():
+        print(f"  {boundary:<14} {len(durations):>6}回  合計 {sum(durations):>10,.1f}ms  最大 {max(durations):>9,.1f}ms")
+    errors = [entry for entry in bundle['calls'] if 'error' in entry]
+    for entry in errors[:10]:
+        print(f"  ⚠️ {entry['boundary']} {entry['key']}: {entry['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='実行全体の記録と再生')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    show = subparsers.add_parser('show', help='記録の内容を表示')
+    show.add_argument('bundle', help='記録のファイルパスまたはキー')
+    replay = subparsers.add_parser('replay', help='記録を再生')
+    replay.add_argument('bundle', help='記録のファイルパスまたはキー')
+    replay.add_argument('--entry', choices=['main', 'lambda'], default='main', help='再生する入口')
+    replay.add_argument('--timing', choices=TIMINGS, default=COLLAPSED, help='記録時の所要時間を再現するか')
+    args = parser.parse_args()
+
+    bundle = load_bundle(args.bundle)
+    if args.command == 'show':
+        _show(bundle)
+        return 0
+    if args.entry == 'lambda':
+        result = replay_lambda(bundle, args.timing)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 0 if result.get('statusCode') == 200 else 1
+    import main as app
+    with replaying(bundle, args.timing):
+        return app.main()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
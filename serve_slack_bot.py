@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Slack Bot 本番サーバー
+slack_bot.app をgunicorn（gthreadワーカー）の複数プロセス・複数スレッドで起動する
+停止時は処理中のリクエストとキューに残った質問を処理し終えてから終了する
+
+使用方法:
+    pip install gunicorn
+    CACHE_BACKEND=sqlite python serve_slack_bot.py
+"""
+
+import argparse
+import sys
+
+import config
+
+
+def worker_exit(server, worker):
+    """ワーカー停止時に非同期処理キューを処理し終えてから終了"""
+    from event_dispatcher import get_dispatcher
+    dispatcher = get_dispatcher()
+    print(f"🛑 ワーカー停止: キュー残り{dispatcher.stats()['queued']}件を処理します (pid={worker.pid})")
+    dispatcher.shutdown(wait=True, timeout=config.SLACK_BOT_GRACEFUL_TIMEOUT)
+
+
+def build_options(bind: str, processes: int, threads: int) -> dict:
+    """
+    gunicornの設定を生成
+    Args:
+        bind: 待ち受けアドレス
+        processes: ワーカープロセス数
+        threads: プロセスあたりのスレッド数
+    Returns:
+        dict: gunicorn設定
+    """
+    return {
+        'bind': bind,
+        'workers': processes,
+        'threads': threads,
+        'worker_class': 'gthread',
+        # Slackへの応答は即時返すため、リクエスト単位のタイムアウトは短くてよい
+        'timeout': 30,
+        'graceful_timeout': config.SLACK_BOT_GRACEFUL_TIMEOUT,
+        'keepalive': 5,
+        # アプリはワーカーごとに読み込む（SlackClientやスレッドをforkで共有しない）
+        'preload_app': False,
+        'worker_exit': worker_exit,
+        'accesslog': '-',
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Slack Bot 本番サーバー')
+    parser.add_argument('--bind', default=config.SLACK_BOT_BIND, help='待ち受けアドレス（例: 0.0.0.0:5000）')
+    parser.add_argument('--processes', type=int, default=config.SLACK_BOT_PROCESSES, help='ワーカープロセス数')
+    parser.add_argument('--threads', type=int, default=config.SLACK_BOT_THREADS, help='プロセスあたりのスレッド数')
+    args = parser.parse_args()
+
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        print("❌ gunicornがインストールされていません: pip install gunicorn")
+        sys.exit(1)
+
+    if args.processes > 1 and config.CACHE_BACKEND != 'sqlite':
+        print("⚠️ CACHE_BACKEND=sqliteでない場合、イベントの重複判定・回答キャッシュ・会話履歴はワーカープロセスごとになります")
+
+    class SlackBotApplication(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from slack_bot import app
+            return app
+
+    print("=== Slack Bot 本番サーバー起動 ===")
+    print(f"待ち受け: {args.bind} / プロセス: {args.processes} / スレッド: {args.threads} / キャッシュ: {config.CACHE_BACKEND}")
+    SlackBotApplication(build_options(args.bind, args.processes, args.threads)).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,7 @@ AWS_REGION="ap-northeast-1"
 LAMBDA_FUNCTION_NAME="kabukan"
 SLACK_LAMBDA_FUNCTION_NAME="slack-notifier"
 SNS_ERROR_TOPIC="kabukan-error-alerts"
+METRICS_NAMESPACE="Kabukan"
 
 # 色付きログ関数
 log_info() {
@@ -131,6 +132,29 @@ setup_main_lambda_alarms() {
         --region "$AWS_REGION" > /dev/null
     
     log_info "✅ 実行回数アラーム作成完了"
+    
+    # 区間ごとのp95所要時間監視アラーム（lambda_mainがEMFで出力するStageLatency）
+    log_info "区間別p95所要時間アラームを作成中..."
+    for stage_threshold in "total:240000" "gemini.advice:180000" "sheets.load:20000" "slack.notify:30000"; do
+        stage="${stage_threshold%%:*}"
+        threshold="${stage_threshold##*:}"
+        aws cloudwatch put-metric-alarm \
+            --alarm-name "${LAMBDA_FUNCTION_NAME}-p95-${stage}" \
+            --alarm-description "p95 latency of stage ${stage} in ${LAMBDA_FUNCTION_NAME}" \
+            --metric-name "StageLatency" \
+            --namespace "$METRICS_NAMESPACE" \
+            --extended-statistic "p95" \
+            --period 86400 \
+            --threshold "$threshold" \
+            --comparison-operator "GreaterThanThreshold" \
+            --evaluation-periods 1 \
+            --treat-missing-data "notBreaching" \
+            --alarm-actions "$SNS_TOPIC_ARN" \
+            --dimensions Name=ExecutionType,Value=daily Name=Stage,Value="$stage" \
+            --region "$AWS_REGION" > /dev/null
+    done
+    
+    log_info "✅ 区間別p95所要時間アラーム作成完了"
 }
 
 # Slack Lambda関数のアラーム設定
@@ -3,6 +3,7 @@
 # EventBridge日次・月次実行設定スクリプト
 # 日次: 売買タイミングアドバイス (平日 9:00 JST)
 # 月次: ポートフォリオ分析 (毎月1日 9:00 JST)
+# ウォームアップ: 寄り付き前のキャッシュ準備 (平日 6:30 JST、米国市場の引け後)
 
 set -e
 
@@ -10,6 +11,7 @@ FUNCTION_NAME="kabukan"
 AWS_REGION="ap-northeast-1"
 DAILY_RULE_NAME="kabukan-daily-execution"
 MONTHLY_RULE_NAME="kabukan-monthly-execution"
+WARMUP_RULE_NAME="kabukan-warmup-execution"
 
 # 色付きログ関数
 log_info() {
@@ -41,6 +43,7 @@ log_info "  - Lambda関数: $FUNCTION_NAME"
 log_info "  - リージョン: $AWS_REGION"
 log_info "  - 日次実行: 平日 9:00 JST (UTC 0:00)"
 log_info "  - 月次実行: 毎月1日 9:00 JST (UTC 0:00)"
+log_info "  - ウォームアップ: 平日 6:30 JST (前日 UTC 21:30)"
 log_info ""
 
 # 日次実行ルールの設定
@@ -75,9 +78,10 @@ setup_daily_rule() {
     fi
     
     # ターゲットを設定（execution_type: daily）
+    # スケジュール時刻（time）を渡し、再試行でも同じチェックポイントから再開できるようにする
     if aws events put-targets \
         --rule "$DAILY_RULE_NAME" \
-        --targets "Id=1,Arn=$LAMBDA_ARN,Input={\"execution_type\":\"daily\"}" \
+        --targets "[{\"Id\":\"1\",\"Arn\":\"$LAMBDA_ARN\",\"InputTransformer\":{\"InputPathsMap\":{\"time\":\"$.time\"},\"InputTemplate\":\"{\\\"execution_type\\\":\\\"daily\\\",\\\"time\\\":<time>}\"}}]" \
         --region "$AWS_REGION" > /dev/null; then
         log_info "✅ 日次ターゲット設定完了"
     else
@@ -117,10 +121,10 @@ setup_monthly_rule() {
         log_warn "⚠️  月次Lambda実行権限の追加でエラー（既に存在する可能性があります）"
     fi
     
-    # ターゲットを設定（execution_type: monthly）
+    # ターゲットを設定（execution_type: monthly、スケジュール時刻付き）
     if aws events put-targets \
         --rule "$MONTHLY_RULE_NAME" \
-        --targets "Id=1,Arn=$LAMBDA_ARN,Input={\"execution_type\":\"monthly\"}" \
+        --targets "[{\"Id\":\"1\",\"Arn\":\"$LAMBDA_ARN\",\"InputTransformer\":{\"InputPathsMap\":{\"time\":\"$.time\"},\"InputTemplate\":\"{\\\"execution_type\\\":\\\"monthly\\\",\\\"time\\\":<time>}\"}}]" \
         --region "$AWS_REGION" > /dev/null; then
         log_info "✅ 月次ターゲット設定完了"
     else
@@ -129,9 +133,52 @@ setup_monthly_rule() {
     fi
 }
 
+# ウォームアップルールの設定
+setup_warmup_rule() {
+    log_info "3. ウォームアップルールを設定中..."
+    
+    # 米国市場の引け（夏時間 5:00 / 冬時間 6:00 JST）から終値の確定待ち（QUOTE_SETTLE_SECONDS 既定20分）を過ぎた後、日次実行の前に実行
+    if aws events put-rule \
+        --name "$WARMUP_RULE_NAME" \
+        --schedule-expression "cron(30 21 ? * SUN-THU *)" \
+        --description "Pre-market cache warm-up for the daily run" \
+        --state ENABLED \
+        --region "$AWS_REGION" > /dev/null; then
+        log_info "✅ ウォームアップEventBridgeルールの作成完了"
+    else
+        log_error "❌ ウォームアップEventBridgeルールの作成エラー"
+        return 1
+    fi
+    
+    # Lambda関数に実行権限を追加
+    WARMUP_STATEMENT_ID="eventbridge-warmup-$(date +%s)"
+    if aws lambda add-permission \
+        --function-name "$FUNCTION_NAME" \
+        --statement-id "$WARMUP_STATEMENT_ID" \
+        --action "lambda:InvokeFunction" \
+        --principal "events.amazonaws.com" \
+        --source-arn "arn:aws:events:$AWS_REGION:$ACCOUNT_ID:rule/$WARMUP_RULE_NAME" \
+        --region "$AWS_REGION" > /dev/null 2>&1; then
+        log_info "✅ ウォームアップLambda実行権限の追加完了"
+    else
+        log_warn "⚠️  ウォームアップLambda実行権限の追加でエラー（既に存在する可能性があります）"
+    fi
+    
+    # ターゲットを設定（mode: warmup、スケジュール時刻付き）
+    if aws events put-targets \
+        --rule "$WARMUP_RULE_NAME" \
+        --targets "[{\"Id\":\"1\",\"Arn\":\"$LAMBDA_ARN\",\"InputTransformer\":{\"InputPathsMap\":{\"time\":\"$.time\"},\"InputTemplate\":\"{\\\"mode\\\":\\\"warmup\\\",\\\"time\\\":<time>}\"}}]" \
+        --region "$AWS_REGION" > /dev/null; then
+        log_info "✅ ウォームアップターゲット設定完了"
+    else
+        log_error "❌ ウォームアップターゲット設定エラー"
+        return 1
+    fi
+}
+
 # 設定確認
 verify_setup() {
-    log_info "3. 設定確認中..."
+    log_info "4. 設定確認中..."
     
     log_info ""
     log_info "EventBridgeルール詳細:"
@@ -152,7 +199,7 @@ verify_setup() {
     aws events list-targets-by-rule \
         --rule "$DAILY_RULE_NAME" \
         --region "$AWS_REGION" \
-        --query 'Targets[*].{Id:Id,Arn:Arn,Input:Input}' \
+        --query 'Targets[*].{Id:Id,Arn:Arn,Input:Input,InputTemplate:InputTransformer.InputTemplate}' \
         --output table 2>/dev/null || log_warn "日次ターゲットの詳細取得に失敗"
     
     log_info ""
@@ -160,19 +207,20 @@ verify_setup() {
     aws events list-targets-by-rule \
         --rule "$MONTHLY_RULE_NAME" \
         --region "$AWS_REGION" \
-        --query 'Targets[*].{Id:Id,Arn:Arn,Input:Input}' \
+        --query 'Targets[*].{Id:Id,Arn:Arn,Input:Input,InputTemplate:InputTransformer.InputTemplate}' \
         --output table 2>/dev/null || log_warn "月次ターゲットの詳細取得に失敗"
 }
 
 # 使用方法
 echo "使用方法:"
-echo "  ./setup_eventbridge_daily_monthly.sh [daily|monthly|all]"
+echo "  ./setup_eventbridge_daily_monthly.sh [daily|monthly|warmup|all]"
 echo ""
 
 if [[ $# -eq 0 ]] || [[ "$1" == "all" ]]; then
     log_info "日次・月次の両方のスケジュールを設定します..."
     setup_daily_rule
     setup_monthly_rule
+    setup_warmup_rule
     verify_setup
 elif [[ "$1" == "daily" ]]; then
     setup_daily_rule
@@ -180,9 +228,12 @@ elif [[ "$1" == "daily" ]]; then
 elif [[ "$1" == "monthly" ]]; then
     setup_monthly_rule
     verify_setup
+elif [[ "$1" == "warmup" ]]; then
+    setup_warmup_rule
+    verify_setup
 else
     log_error "無効なオプション: $1"
-    log_info "使用可能なオプション: daily, monthly, all"
+    log_info "使用可能なオプション: daily, monthly, warmup, all"
     exit 1
 fi
 
@@ -192,7 +243,8 @@ log_info ""
 log_info "📋 設定内容:"
 log_info "1. ✅ 日次実行: 平日 9:00 JST (売買タイミングアドバイス)"
 log_info "2. ✅ 月次実行: 毎月1日 9:00 JST (ポートフォリオ分析)"
-log_info "3. スケジュール変更: SCHEDULE_EXPRESSIONを編集してスクリプト再実行"
+log_info "3. ✅ ウォームアップ: 平日 6:30 JST (日次実行の事前取得)"
+log_info "4. スケジュール変更: SCHEDULE_EXPRESSIONを編集してスクリプト再実行"
 log_info "  • 実行間隔例:"
 log_info "  - rate(5 minutes) : 5分毎"
 log_info "  - rate(1 hour)    : 1時間毎"
@@ -206,6 +258,9 @@ log_info ""
 log_info "• 月次実行テスト:"
 log_info "  aws lambda invoke --function-name $FUNCTION_NAME --payload '{\"execution_type\":\"monthly\"}' response.json --region $AWS_REGION"
 log_info ""
+log_info "• ウォームアップテスト:"
+log_info "  aws lambda invoke --function-name $FUNCTION_NAME --payload '{\"mode\":\"warmup\"}' response.json --region $AWS_REGION"
+log_info ""
 log_info "🔧 管理コマンド:"
 log_info "• 日次ルール無効化: aws events disable-rule --name $DAILY_RULE_NAME --region $AWS_REGION"
 log_info "• 月次ルール無効化: aws events disable-rule --name $MONTHLY_RULE_NAME --region $AWS_REGION"
@@ -0,0 +1,182 @@
+import json
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import config
+from data_fetcher import DataFetcher, build_portfolio_with_prices
+from instrumentation import count, span
+
+SHARD_WORKER_MODE = 'shard_worker'
+
+
+def split_shards(portfolio: List[Dict], shard_size: int) -> List[List[Dict]]:
+    """
+    保有銘柄を順序を保ったままシャードに分割
+    Args:
+        portfolio: 保有株式のリスト
+        shard_size: シャードあたりの銘柄数
+    Returns:
+        List[List[Dict]]: シャードのリスト
+    """
+    shard_size = max(1, shard_size)
+    return [portfolio[i:i + shard_size] for i in range(0, len(portfolio), shard_size)]
+
+
+def fetch_shard(symbols: List[str]) -> Dict:
+    """
+    1シャード分の株価を取得（ワーカーで実行）
+    Args:
+        symbols: 銘柄コードのリスト
+    Returns:
+        Dict: {'stock_prices': 銘柄ごとの株価情報}
+    """
+    with span('shard.fetch', symbols=len(symbols)):
+        return {'stock_prices': DataFetcher(connect_sheets=False).get_stock_prices(symbols)}
+
+
+class LocalProcessExecutor:
+    """ローカルのプロセスプールでシャードを処理（開発・テスト用）"""
+
+    def __init__(self, max_workers: Optional[int] = None, worker: Callable[[List[str]], Dict] = fetch_shard):
+        self.max_workers = max_workers or config.SHARD_MAX_WORKERS
+        self.worker = worker
+
+    def map(self, shards: List[List[str]]) -> List[Optional[Dict]]:
+        with ProcessPoolExecutor(max_workers=min(self.max_workers, len(shards))) as executor:
+            futures = [executor.submit(self.worker, shard) for shard in shards]
+            return [_result_or_none(future) for future in futures]
+
+
+class LambdaInvokeExecutor:
+    """同じLambda関数を同期呼び出ししてシャードを処理（本番用）"""
+
+    def __init__(self, function_name: Optional[str] = None, max_workers: Optional[int] = None):
+        self.function_name = function_name or config.SHARD_WORKER_FUNCTION
+        self.max_workers = max_workers or config.SHARD_MAX_WORKERS
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import boto3
+            from botocore.config import Config
+            # シャードの処理時間を待てるよう読み取りタイムアウトを延ばす
+            self._client = boto3.client('lambda', config=Config(read_timeout=300, retries={'max_attempts': 0}))
+        return self._client
+
+    def invoke(self, symbols: List[str]) -> Dict:
+        response = self.client.invoke(
+            FunctionName=self.function_name,
+            InvocationType='RequestResponse',
+            Payload=json.dumps({'mode': SHARD_WORKER_MODE, 'symbols': symbols}).encode('utf-8')
+        )
+        payload = json.loads(response['Payload'].read())
+        if response.get('FunctionError'):
+            raise RuntimeError(payload.get('errorMessage', 'shard worker failed'))
+        return payload
+
+    def map(self, shards: List[List[str]]) -> List[Optional[Dict]]:
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(shards))) as executor:
+            futures = [executor.submit(self.invoke, shard) for shard in shards]
+            return [_result_or_none(future) for future in futures]
+
+
+def _result_or_none(future) -> Optional[Dict]:
+    try:
+        return future.result()
+    except Exception as e:
+        print(f"⚠️ シャード処理エラー: {e}")
+        return None
+
+
+def get_executor(mode: Optional[str] = None):
+    """
+    設定に応じたシャード実行方式を取得
+    Args:
+        mode: lambda / local（省略時はSHARD_MODE）
+    Returns:
+        LambdaInvokeExecutor | LocalProcessExecutor | None: 分散しない場合はNone
+    """
+    mode = mode or config.SHARD_MODE
+    if mode == 'lambda':
+        return LambdaInvokeExecutor()
+    if mode == 'local':
+        return LocalProcessExecutor()
+    return None
+
+
+class ShardedRunner:
+    """
+    大きなポートフォリオの株価取得をシャードに分けて並列ワーカーに配り、結果を統合する
+    統合は元の銘柄順で行い、単一プロセス実行（DataFetcher.get_portfolio_with_prices）と同じ結果を返す
+    """
+
+    def __init__(self, executor, shard_size: Optional[int] = None):
+        self.executor = executor
+        self.shard_size = shard_size or config.SHARD_SIZE
+
+    def get_portfolio_with_prices(self, data_fetcher: DataFetcher) -> Dict:
+        """
+        ポートフォリオと株価情報を統合して取得
+        Args:
+            data_fetcher: スプレッドシートと為替の取得に使うDataFetcher（コーディネーター側）
+        Returns:
+            Dict: ポートフォリオと株価情報（単一プロセス実行と同じ形式）
+        """
+        portfolio = data_fetcher.get_portfolio_from_sheets()
+        if not portfolio:
+            return {}
+        stock_prices, usd_jpy_rate = self.get_prices(portfolio, data_fetcher)
+        return build_portfolio_with_prices(portfolio, stock_prices, usd_jpy_rate)
+
+    def get_prices(self, portfolio: List[Dict], data_fetcher: DataFetcher) -> Tuple[Dict[str, Dict], float]:
+        """
+        保有銘柄の株価と為替レートを取得
+        Args:
+            portfolio: 保有株式のリスト
+            data_fetcher: 為替の取得と再取得に使うDataFetcher（コーディネーター側）
+        Returns:
+            Tuple[Dict[str, Dict], float]: (銘柄ごとの株価情報, USD/JPY為替レート)
+        """
+        shards = [[stock['symbol'] for stock in shard] for shard in split_shards(portfolio, self.shard_size)]
+        if len(shards) == 1:
+            # 1シャードに収まる場合は分散の往復を省いて単一プロセスと同じ経路で取得
+            return data_fetcher.get_stock_prices(shards[0]), self._fetch_fx(data_fetcher)
+        print(f"🔀 {len(portfolio)}銘柄を{len(shards)}シャードに分割して取得")
+
+        # 為替はコーディネーターでシャードと並行して取得
+        with ThreadPoolExecutor(max_workers=1) as fx_executor:
+            fx_future = fx_executor.submit(self._fetch_fx, data_fetcher)
+            with span('shard.fan_out', shards=len(shards)):
+                results = self.executor.map(shards)
+            usd_jpy_rate = fx_future.result()
+
+        return self.merge(shards, results, data_fetcher), usd_jpy_rate
+
+    @staticmethod
+    def _fetch_fx(data_fetcher: DataFetcher) -> float:
+        with span('fx.fetch'):
+            return data_fetcher.get_usd_jpy_rate()
+
+    @staticmethod
+    def merge(shards: List[List[str]], results: List[Optional[Dict]], data_fetcher: DataFetcher) -> Dict[str, Dict]:
+        """
+        シャードの結果を元の銘柄順に統合（失敗したシャードはコーディネーターで取得し直す）
+        Args:
+            shards: シャードごとの銘柄コード
+            results: シャードごとの結果（失敗はNone）
+            data_fetcher: 再取得に使うDataFetcher
+        Returns:
+            Dict[str, Dict]: 銘柄ごとの株価情報
+        """
+        stock_prices = {}
+        for symbols, result in zip(shards, results):
+            if result is None:
+                count('shard.retried')
+                print(f"🔁 失敗したシャードを再取得: {len(symbols)}銘柄")
+                result = {'stock_prices': data_fetcher.get_stock_prices(symbols)}
+            shard_prices = result['stock_prices']
+            for symbol in symbols:
+                if symbol in shard_prices:
+                    stock_prices[symbol] = shard_prices[symbol]
+        return stock_prices
@@ -6,19 +6,29 @@ Gemini APIを使用して投資関連の質問に回答する
 """
 
 import os
+import sys
 import json
 import hashlib
 import hmac
 import time
 from flask import Flask, request, jsonify
 from slack_client import SlackClient
+from event_dispatcher import get_dispatcher, slack_event_dedup_key, REJECTED
+from quick_quote import QuickQuote
 import config
+import profiling
 
 app = Flask(__name__)
 
 # Slack クライアントの初期化
 slack_client = SlackClient()
 
+# 質問処理は上限付きワーカープールで非同期に実行（Slackの3秒制限内に応答する）
+dispatcher = get_dispatcher()
+
+# /stock の株価・保有・合計・値動きはキャッシュから即答（LLMを呼ばない）
+quick_quote = QuickQuote(slack_client.portfolio_tools)
+
 def verify_slack_signature(request_body, timestamp, signature):
     """
     Slackからのリクエストの署名を検証
@@ -85,8 +95,20 @@ def slack_events():
                     # Bot mentionを除去
                     clean_text = clean_bot_mention(text)
                     
-                    # 質問を処理
-                    slack_client.handle_user_question(clean_text, user_id, channel_id)
+                    # 質問をキューに登録して即時応答（再送はイベントIDで重複排除）
+                    # 回答は質問のスレッドに返信する（スレッド内の質問は親スレッド）
+                    status = dispatcher.submit(
+                        profiling.wrap('slack_question', slack_client.handle_user_question),
+                        clean_text, user_id, channel_id,
+                        event.get("thread_ts") or event.get("ts"),
+                        dedup_key=slack_event_dedup_key(data, event)
+                    )
+                    if status == REJECTED:
+                        # キューが満杯の場合は503を返し、Slackの再送で後から受け付ける
+                        print("⚠️ 処理待ちキューが満杯のためイベントを保留します")
+                        return jsonify({"error": "busy"}), 503, {"Retry-After": "5"}
+                    if request.headers.get('X-Slack-Retry-Num'):
+                        print(f"Slack再送イベント ({request.headers.get('X-Slack-Retry-Num')}回目): {status}")
         
         return jsonify({"status": "ok"})
         
@@ -94,6 +116,51 @@ def slack_events():
         print(f"Slack イベント処理エラー: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
+@app.route("/slack/commands", methods=["POST"])
+def slack_commands():
+    """
+    Slackからのスラッシュコマンドを処理
+    定型の問い合わせはキャッシュから即答し、自由形式の質問だけGeminiに回す
+    """
+    try:
+        request_body = request.get_data(as_text=True)
+        timestamp = request.headers.get('X-Slack-Request-Timestamp', '')
+        signature = request.headers.get('X-Slack-Signature', '')
+        
+        if abs(time.time() - int(timestamp)) > 300:
+            return jsonify({"error": "Request too old"}), 400
+        if not verify_slack_signature(request_body, timestamp, signature):
+            return jsonify({"error": "Invalid signature"}), 400
+        
+        text = request.form.get('text', '')
+        user_id = request.form.get('user_id', '')
+        channel_id = request.form.get('channel_id', '')
+        response_url = request.form.get('response_url', '')
+        
+        # 時間内にデータが揃わない場合はresponse_urlに後から回答する
+        deferred = (lambda answer: slack_client.respond_to_command(response_url, answer)) if response_url else None
+        answer = quick_quote.answer(text, deferred=deferred)
+        if answer is not None:
+            return jsonify({"response_type": "in_channel", "text": answer})
+        
+        status = dispatcher.submit(profiling.wrap('slack_question', slack_client.handle_user_question), text, user_id, channel_id)
+        if status == REJECTED:
+            return jsonify({
+                "response_type": "ephemeral",
+                "text": "⏳ 現在混み合っています。しばらくしてから再度お試しください。"
+            })
+        return jsonify({
+            "response_type": "in_channel",
+            "text": f"🤖 質問を受け付けました: 「{text[:100]}」\n💭 AI分析中です。少々お待ちください..."
+        })
+        
+    except Exception as e:
+        print(f"スラッシュコマンド処理エラー: {e}")
+        return jsonify({
+            "response_type": "ephemeral",
+            "text": "⚠️ エラーが発生しました。しばらくしてから再度お試しください。"
+        })
+
 def is_bot_mention(text):
     """
     Bot宛てのメンションかどうか判定
@@ -102,6 +169,9 @@ def is_bot_mention(text):
     Returns:
         bool: Bot宛てのメンションかどうか
     """
+    identity = slack_client.bot_identity
+    if identity and identity.get("user_id"):
+        return f"<@{identity['user_id']}>" in text
     return "<@" in text and "bot" in text.lower()
 
 def is_direct_message(channel_id):
@@ -135,7 +205,10 @@ def health_check():
     return jsonify({
         "status": "healthy",
         "slack_connected": slack_client.client is not None,
-        "gemini_connected": slack_client.gemini_model is not None
+        "gemini_connected": slack_client.gemini_available,
+        "answer_cache": slack_client.answer_cache.stats() if slack_client.answer_cache else None,
+        "conversation_memory": slack_client.conversation_memory.stats() if slack_client.conversation_memory else None,
+        "dispatcher": dispatcher.stats()
     })
 
 @app.route("/send-test", methods=["POST"])
@@ -157,14 +230,16 @@ def send_test_message():
         return jsonify({"error": str(e)}), 500
 
 if __name__ == "__main__":
+    # --profile / --profile=cprofile で質問処理ごとにプロファイリング
+    sys.argv = profiling.consume_cli_flag(sys.argv)
     print("=== Slack Bot サーバー起動 ===")
     print(f"Slack接続状態: {'✓' if slack_client.client else '✗'}")
-    print(f"Gemini接続状態: {'✓' if slack_client.gemini_model else '✗'}")
+    print(f"Gemini接続状態: {'✓' if slack_client.gemini_available else '✗'}")
     print("サーバーを起動しています...")
     
-    # 開発用サーバーを起動
+    # 開発用サーバーを起動（本番は serve_slack_bot.py で複数ワーカー起動）
     app.run(
         host="0.0.0.0",
         port=int(os.environ.get("PORT", 5000)),
-        debug=True
+        debug=os.environ.get("FLASK_DEBUG", "1") == "1"
     )
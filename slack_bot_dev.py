@@ -12,13 +12,25 @@ import time
 import threading
 from flask import Flask, request, jsonify
 from slack_client import SlackClient
+from event_dispatcher import get_dispatcher, slack_event_dedup_key, REJECTED
+from quick_quote import QuickQuote
 import config
+import profiling
+from app_logging import get_logger
 
 app = Flask(__name__)
 
+logger = get_logger(__name__)
+
 # Slack クライアントの初期化
 slack_client = SlackClient()
 
+# イベント・スラッシュコマンド共通の上限付きワーカープール
+dispatcher = get_dispatcher()
+
+# 株価・保有・合計・値動きのスラッシュコマンドはキャッシュから即答
+quick_quote = QuickQuote(slack_client.portfolio_tools)
+
 def verify_slack_signature(request_body, timestamp, signature):
     """
     Slackからのリクエストの署名を検証
@@ -50,11 +62,11 @@ def slack_events():
         timestamp = request.headers.get('X-Slack-Request-Timestamp', '')
         signature = request.headers.get('X-Slack-Signature', '')
         
-        print(f"📨 Slackイベント受信: {len(request_body)}バイト")
-        print(f"📝 リクエストボディ: {request_body[:200]}...")  # 最初の200文字のみ表示
+        logger.info(f"📨 Slackイベント受信: {len(request_body)}バイト")
+        logger.debug(f"📝 リクエストボディ: {request_body[:200]}...")  # 最初の200文字のみ表示（DEBUGのみ）
         
         # 開発環境では署名検証を一時的に無効化
-        print(f"🔐 リクエストヘッダー: Timestamp={timestamp}, Signature={signature[:20]}..." if signature else "署名なし")
+        logger.debug(f"🔐 リクエストヘッダー: Timestamp={timestamp}, Signature={signature[:20]}..." if signature else "署名なし")
         
         # 署名検証を一時的にスキップ（開発時のみ）
         # if timestamp and signature:
@@ -105,8 +117,17 @@ def slack_events():
                     clean_text = clean_bot_mention(text)
                     print(f"🎯 Bot宛てメッセージを処理: {clean_text[:30]}...")
                     
-                    # 質問を処理
-                    slack_client.handle_user_question(clean_text, user_id, channel_id)
+                    # 質問をキューに登録して即時応答（再送はイベントIDで重複排除）
+                    # 回答は質問のスレッドに返信する（スレッド内の質問は親スレッド）
+                    status = dispatcher.submit(
+                        profiling.wrap('slack_question', slack_client.handle_user_question),
+                        clean_text, user_id, channel_id,
+                        event.get("thread_ts") or event.get("ts"),
+                        dedup_key=slack_event_dedup_key(data, event)
+                    )
+                    print(f"📥 キュー登録: {status} (再送: {request.headers.get('X-Slack-Retry-Num', '0')})")
+                    if status == REJECTED:
+                        return jsonify({"error": "busy"}), 503, {"Retry-After": "5"}
                 else:
                     print("ℹ️  Bot宛て以外のメッセージをスキップ")
         
@@ -137,7 +158,10 @@ def health_check():
         "status": "healthy",
         "environment": "development",
         "slack_connected": slack_client.client is not None,
-        "gemini_connected": slack_client.gemini_model is not None,
+        "gemini_connected": slack_client.gemini_available,
+        "answer_cache": slack_client.answer_cache.stats() if slack_client.answer_cache else None,
+        "conversation_memory": slack_client.conversation_memory.stats() if slack_client.conversation_memory else None,
+        "dispatcher": dispatcher.stats(),
         "ngrok_info": "Use ngrok http 5000 to expose this server",
         "endpoints": {
             "events": "/slack/events - Slack Event Subscriptions",
@@ -210,23 +234,26 @@ def slack_commands():
         print(f"   ユーザー: {user_name} ({user_id})")
         print(f"   チャンネル: {channel_id}")
         
+        # 定型の問い合わせ（株価・保有・合計・値動き）はLLMを使わず即答
+        response_url = request.form.get('response_url', '')
+        deferred = (lambda answer: slack_client.respond_to_command(response_url, answer)) if response_url else None
+        answer = quick_quote.answer(text, deferred=deferred)
+        if answer is not None and text.strip():
+            print(f"⚡ 即答: {text}")
+            return jsonify({"response_type": "in_channel", "text": answer})
+        
         # 簡単な応答を返す
         if text.strip():
             # ユーザーからの質問を処理
             print(f"🎯 質問を処理中: {text[:50]}...")
             
             # バックグラウンドで質問を処理（Slackの3秒制限を回避）
-            def process_question_async():
-                try:
-                    slack_client.handle_user_question(text, user_id, channel_id)
-                except Exception as e:
-                    print(f"❌ 非同期質問処理エラー: {e}")
-            
-            # 別スレッドで実行
-            import threading
-            thread = threading.Thread(target=process_question_async)
-            thread.daemon = True
-            thread.start()
+            status = dispatcher.submit(profiling.wrap('slack_question', slack_client.handle_user_question), text, user_id, channel_id)
+            if status == REJECTED:
+                return jsonify({
+                    "response_type": "ephemeral",
+                    "text": "⏳ 現在混み合っています。しばらくしてから再度お試しください。"
+                })
             
             return jsonify({
                 "response_type": "in_channel",
@@ -246,11 +273,13 @@ def slack_commands():
         }), 500
 
 if __name__ == "__main__":
+    # --profile / --profile=cprofile で質問処理ごとにプロファイリング
+    sys.argv = profiling.consume_cli_flag(sys.argv)
     print("=" * 50)
     print("🚀 投資アドバイス Slack Bot - 開発環境")
     print("=" * 50)
     print(f"Slack接続状態: {'✅' if slack_client.client else '❌'}")
-    print(f"Gemini接続状態: {'✅' if slack_client.gemini_model else '❌'}")
+    print(f"Gemini接続状態: {'✅' if slack_client.gemini_available else '❌'}")
     print()
     print("📋 次の手順:")
     print("1. 別ターミナルで 'ngrok http 5000' を実行")
@@ -1,47 +1,328 @@
 import os
 import json
-from typing import Optional, Dict, Any
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Callable, List
+from urllib.error import URLError
 from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
-import google.generativeai as genai
+from slack_sdk.webhook import WebhookClient
 import config
+from instrumentation import count, observe, span
+from answer_cache import get_answer_cache
+from conversation_memory import get_conversation_memory
+from model_router import configure_gemini, get_model, get_router
+from portfolio_tools import PortfolioTools, ToolCallStats
 
-class SlackClient:
-    def __init__(self):
-        self.client = None
-        self.gemini_model = None
-        self._setup_slack_client()
-        self._setup_gemini_client()
-    
-    def _setup_slack_client(self):
-        """Slack APIクライアントの設定"""
+# Slackのメッセージ文字数制限（4000文字）を考慮した分割サイズ
+MAX_MESSAGE_LENGTH = 3000
+
+
+def split_message(text: str, max_length: int = MAX_MESSAGE_LENGTH) -> List[str]:
+    """
+    長いテキストを分割（できるだけ改行位置で区切る）
+    Args:
+        text: テキスト
+        max_length: 1メッセージの最大文字数
+    Returns:
+        List[str]: 分割されたテキスト
+    """
+    parts = []
+    while len(text) > max_length:
+        cut = text.rfind('\n', 0, max_length)
+        if cut <= max_length // 2:
+            cut = max_length
+        parts.append(text[:cut])
+        text = text[cut:].lstrip('\n')
+    if text:
+        parts.append(text)
+    return parts
+
+
+class SlackDeliveryQueue:
+    """
+    Slackへの送信キュー
+    チャンネルごとに順序を保って送信し、429（rate limited）の場合はRetry-Afterに従って再送する
+    続きのメッセージは最初のメッセージのスレッドに返信として投稿する
+    """
+
+    def __init__(self, client, min_interval: Optional[float] = None, max_retries: Optional[int] = None,
+                 sleep=time.sleep, delivered: Optional[Dict[str, str]] = None,
+                 on_delivered: Optional[Callable[[Dict], None]] = None):
+        """
+        Args:
+            client: slack_sdkのWebClient
+            min_interval: 同一チャンネルへの送信間隔（秒）
+            max_retries: 送信失敗時の再送回数
+            sleep: 待機関数
+            delivered: 投稿済みメッセージ（キー → ts）。該当するキーは再投稿しない
+            on_delivered: 投稿に成功するたびに送信結果を渡して呼び出す関数
+        """
+        self.client = client
+        self.min_interval = config.SLACK_POST_INTERVAL if min_interval is None else min_interval
+        self.max_retries = config.SLACK_POST_MAX_RETRIES if max_retries is None else max_retries
+        self._sleep = sleep
+        self.delivered = delivered or {}
+        self.on_delivered = on_delivered
+        self._messages: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def enqueue(self, text: str, channel: Optional[str] = None, blocks: Optional[list] = None,
+                in_thread: bool = False, key: Optional[str] = None) -> int:
+        """
+        メッセージをキューに追加
+        Args:
+            text: メッセージ本文
+            channel: チャンネル（省略時はデフォルト）
+            blocks: Block Kitのブロック
+            in_thread: 同じチャンネルの最初のメッセージのスレッドに投稿するか
+            key: 呼び出し元で結果を識別するためのキー
+        Returns:
+            int: キュー内の番号
+        """
+        with self._lock:
+            self._messages.append({
+                'index': len(self._messages),
+                'key': key,
+                'channel': channel or config.SLACK_CHANNEL,
+                'text': text,
+                'blocks': blocks,
+                'in_thread': in_thread
+            })
+            return len(self._messages) - 1
+
+    def flush(self) -> List[Dict]:
+        """
+        キューのメッセージをすべて送信
+        Returns:
+            List[Dict]: メッセージごとの送信結果（キューの順）
+        """
+        with self._lock:
+            messages, self._messages = self._messages, []
+        if not messages:
+            return []
+
+        by_channel: Dict[str, List[Dict]] = {}
+        for message in messages:
+            by_channel.setdefault(message['channel'], []).append(message)
+
+        # チャンネル内は順番に、チャンネル間は並列に送信
+        if len(by_channel) == 1:
+            channel_results = [self._deliver_channel(next(iter(by_channel.values())))]
+        else:
+            with ThreadPoolExecutor(max_workers=min(4, len(by_channel))) as executor:
+                channel_results = list(executor.map(self._deliver_channel, by_channel.values()))
+
+        results = [result for batch in channel_results for result in batch]
+        return sorted(results, key=lambda result: result['index'])
+
+    def _deliver_channel(self, messages: List[Dict]) -> List[Dict]:
+        results = []
+        root_ts = None
+        root_failed = False
+        last_post = None
+        for message in messages:
+            thread_ts = root_ts if message['in_thread'] else None
+            if message['in_thread'] and root_ts is None and root_failed:
+                # スレッドの親が投稿できていない場合はスレッド外に投稿せず失敗とする（再試行時に親の下へ投稿する）
+                results.append({
+                    'index': message['index'], 'key': message['key'], 'channel': message['channel'],
+                    'thread_ts': None, 'ok': False, 'ts': None,
+                    'error': 'thread_root_not_posted', 'attempts': 0
+                })
+                continue
+            if message['key'] in self.delivered:
+                # 前回の実行で投稿済みのメッセージは送らずにtsだけ引き継ぐ
+                result = {
+                    'index': message['index'], 'key': message['key'], 'channel': message['channel'],
+                    'thread_ts': thread_ts, 'ok': True, 'ts': self.delivered[message['key']],
+                    'error': None, 'attempts': 0
+                }
+                if root_ts is None and not message['in_thread']:
+                    root_ts = result['ts']
+                results.append(result)
+                continue
+            if last_post is not None:
+                wait = self.min_interval - (time.monotonic() - last_post)
+                if wait > 0:
+                    self._sleep(wait)
+            result = self._post_with_retry(message, thread_ts)
+            last_post = time.monotonic()
+            if result['ok'] and self.on_delivered and message['key']:
+                self.on_delivered(result)
+            if root_ts is None and not message['in_thread']:
+                if result['ok']:
+                    root_ts = result['ts']
+                else:
+                    root_failed = True
+            results.append(result)
+        return results
+
+    def _post_with_retry(self, message: Dict, thread_ts: Optional[str]) -> Dict:
+        result = {
+            'index': message['index'],
+            'key': message['key'],
+            'channel': message['channel'],
+            'thread_ts': thread_ts,
+            'ok': False,
+            'ts': None,
+            'error': None,
+            'attempts': 0
+        }
+        while result['attempts'] <= self.max_retries:
+            result['attempts'] += 1
+            try:
+                kwargs = {'channel': message['channel'], 'text': message['text']}
+                if message['blocks']:
+                    kwargs['blocks'] = message['blocks']
+                if thread_ts:
+                    kwargs['thread_ts'] = thread_ts
+                with span('slack.post', channel=message['channel'], key=message['key']):
+                    response = self.client.chat_postMessage(**kwargs)
+                result['ok'] = True
+                result['ts'] = response.get('ts')
+                result['error'] = None
+                return result
+            except SlackApiError as e:
+                retry_after = _retry_after_seconds(e)
+                count('slack.rate_limited' if retry_after is not None else 'slack.errors')
+                result['error'] = e.response.get('error') if e.response is not None else str(e)
+                if retry_after is not None:
+                    print(f"Slackレート制限: {retry_after}秒後に再送します ({result['attempts']}回目)")
+                    self._sleep(retry_after)
+                elif _is_server_error(e):
+                    self._sleep(min(30, 2 ** (result['attempts'] - 1)))
+                else:
+                    return result
+            except URLError as e:
+                # 接続・送信中のエラーはSlackに届いていないため指数バックオフで再送
+                count('slack.errors')
+                result['error'] = str(e)
+                self._sleep(min(30, 2 ** (result['attempts'] - 1)))
+            except Exception as e:
+                # 応答待ちのタイムアウトなどは投稿されたか分からないため、二重投稿を避けて再送しない
+                count('slack.errors')
+                result['error'] = f"{type(e).__name__}: {e}"
+                print(f"⚠️ Slack投稿の結果が不明のため再送しません: {result['error']}")
+                return result
+        return result
+
+
+def _retry_after_seconds(error: SlackApiError) -> Optional[float]:
+    """429（rate limited）の場合に待機秒数を返す（それ以外はNone）"""
+    response = error.response
+    if response is None:
+        return None
+    if response.status_code != 429 and response.get('error') != 'ratelimited':
+        return None
+    headers = response.headers or {}
+    retry_after = headers.get('Retry-After') or headers.get('retry-after') or 1
+    try:
+        return max(0.0, float(retry_after))
+    except (TypeError, ValueError):
+        return 1.0
+
+
+def _is_server_error(error: SlackApiError) -> bool:
+    """Slack側の一時的なエラー（5xx）か"""
+    response = error.response
+    return response is not None and (response.status_code or 0) >= 500
+
+
+# プロセス内で共有するSlackクライアントとBot情報（ウォームコンテナ・Botプロセスで再利用）
+_shared_slack = {'web_client': None, 'identity': None, 'checked': False}
+_shared_slack_lock = threading.Lock()
+
+
+def get_slack_web_client() -> Optional[WebClient]:
+    """
+    認証確認済みの共有WebClientを取得（auth_testはプロセス内で初回のみ）
+    Returns:
+        WebClient: Slackクライアント（未設定・認証失敗の場合はNone）
+    """
+    with _shared_slack_lock:
+        if _shared_slack['checked']:
+            return _shared_slack['web_client']
+        
+        if not config.SLACK_BOT_TOKEN:
+            print("Slack Bot Tokenが設定されていません")
+            _shared_slack['checked'] = True
+            return None
+        
         try:
-            if not config.SLACK_BOT_TOKEN:
-                print("Slack Bot Tokenが設定されていません")
-                return
-            
-            self.client = WebClient(token=config.SLACK_BOT_TOKEN)
+            client = WebClient(token=config.SLACK_BOT_TOKEN, base_url=config.SLACK_API_BASE_URL)
             
-            # Bot接続テスト
-            response = self.client.auth_test()
+            # Bot接続テスト（結果はBot情報としてキャッシュ）
+            response = client.auth_test()
+            _shared_slack['identity'] = {
+                'user': response.get('user'),
+                'user_id': response.get('user_id'),
+                'bot_id': response.get('bot_id'),
+                'team_id': response.get('team_id')
+            }
+            _shared_slack['web_client'] = client
+            _shared_slack['checked'] = True
             print(f"Slack Bot接続成功: {response['user']}")
             
         except SlackApiError as e:
+            # トークン不正などは再試行しても変わらないため結果を保持
             print(f"Slack接続エラー: {e.response['error']}")
-            self.client = None
+            _shared_slack['checked'] = True
         except Exception as e:
+            # 通信エラーは次回の利用時に再試行
             print(f"Slack設定エラー: {e}")
-            self.client = None
+        
+        return _shared_slack['web_client']
+
+
+def get_slack_bot_identity() -> Optional[Dict]:
+    """キャッシュ済みのBot情報（user_id / bot_id など）を取得"""
+    get_slack_web_client()
+    return _shared_slack['identity']
+
+
+class SlackClient:
+    def __init__(self):
+        # Slack・Geminiのクライアントは初回利用時に生成する（生成時のネットワーク呼び出しを避ける）
+        self._client_override = None
+        self._gemini_model = None
+        self.router = get_router() if config.MODEL_ROUTING else None
+        self.portfolio_tools = PortfolioTools() if config.SLACK_QA_TOOLS else None
+        self.answer_cache = get_answer_cache() if config.ANSWER_CACHE_ENABLED else None
+        self.conversation_memory = get_conversation_memory() if config.CONVERSATION_MEMORY else None
     
-    def _setup_gemini_client(self):
-        """Gemini APIクライアントの設定"""
-        try:
-            genai.configure(api_key=config.GOOGLE_API_KEY)
-            self.gemini_model = genai.GenerativeModel('gemini-1.5-flash')
-            print("Gemini APIクライアント設定完了")
-        except Exception as e:
-            print(f"Gemini API設定エラー: {e}")
-            self.gemini_model = None
+    @property
+    def client(self) -> Optional[WebClient]:
+        """Slack APIクライアント（プロセス内で共有）"""
+        if self._client_override is not None:
+            return self._client_override
+        return get_slack_web_client()
+    
+    @client.setter
+    def client(self, value):
+        self._client_override = value
+    
+    @property
+    def bot_identity(self) -> Optional[Dict]:
+        """Bot情報（auth_testの結果をキャッシュ）"""
+        return get_slack_bot_identity()
+    
+    @property
+    def gemini_available(self) -> bool:
+        """Gemini APIが設定されているか（モデルは生成しない）"""
+        return bool(config.GOOGLE_API_KEY)
+    
+    @property
+    def gemini_model(self):
+        """Geminiモデル（質問に回答するときに初めて生成）"""
+        if self._gemini_model is None and self.gemini_available:
+            try:
+                configure_gemini()
+                self._gemini_model = get_model(config.GEMINI_DEFAULT_MODEL)
+            except Exception as e:
+                print(f"Gemini API設定エラー: {e}")
+        return self._gemini_model
     
     def send_investment_advice(self, portfolio_data: Dict, analysis_report: str, execution_type: str = 'daily') -> bool:
         """
@@ -64,23 +345,60 @@ class SlackClient:
             # メッセージを構築
             message = self._build_investment_message(portfolio_summary, analysis_report, execution_type)
             
-            # Slackに送信
-            response = self.client.chat_postMessage(
-                channel=config.SLACK_CHANNEL,
-                text="📊 投資アドバイスレポート",
-                blocks=message
-            )
+            # Slackに送信（レート制限時は再送）
+            queue = SlackDeliveryQueue(self.client)
+            queue.enqueue("📊 投資アドバイスレポート", blocks=message)
+            result = queue.flush()[0]
             
-            print(f"Slack投資アドバイス送信成功: {response['ts']}")
-            return True
+            if result['ok']:
+                print(f"Slack投資アドバイス送信成功: {result['ts']}")
+            else:
+                print(f"Slack送信エラー: {result['error']}")
+            return result['ok']
             
-        except SlackApiError as e:
-            print(f"Slack送信エラー: {e.response['error']}")
-            return False
         except Exception as e:
             print(f"投資アドバイス送信エラー: {e}")
             return False
     
+    def send_report_with_advice(self, portfolio_data: Dict, analysis_report: str, advice: Optional[str] = None,
+                                execution_type: str = 'daily', delivered: Optional[Dict[str, str]] = None,
+                                on_delivered: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+        """
+        分析レポートを送信し、AI投資アドバイスをそのスレッドに分割して返信
+        Args:
+            portfolio_data: ポートフォリオデータ
+            analysis_report: 分析レポート
+            advice: AI投資アドバイス（オプション）
+            execution_type: 実行タイプ（daily/monthly）
+            delivered: 前回の実行で投稿済みのメッセージ（キー → ts）
+            on_delivered: 1件投稿するごとに呼び出す関数（チェックポイントの記録用）
+        Returns:
+            List[Dict]: メッセージごとの送信結果（key: report / advice_1 ...）
+        """
+        if not self.client:
+            print("Slackクライアントが初期化されていません")
+            return []
+        
+        portfolio_summary = self._format_portfolio_summary(portfolio_data)
+        blocks = self._build_investment_message(portfolio_summary, analysis_report, execution_type)
+        
+        queue = SlackDeliveryQueue(self.client, delivered=delivered, on_delivered=on_delivered)
+        queue.enqueue("📊 投資アドバイスレポート", blocks=blocks, key='report')
+        
+        if advice:
+            parts = split_message(advice)
+            for i, part in enumerate(parts, 1):
+                title = "🤖 *AI投資アドバイス*" if len(parts) == 1 else f"🤖 *AI投資アドバイス (Part {i}/{len(parts)})*"
+                queue.enqueue(f"{title}\n```{part}```", in_thread=True, key=f"advice_{i}")
+        
+        results = queue.flush()
+        failed = [result['key'] for result in results if not result['ok']]
+        if failed:
+            print(f"Slack送信失敗: {', '.join(failed)}")
+        else:
+            print(f"Slack送信成功: {len(results)}件（スレッド: {results[0]['ts']}）")
+        return results
+    
     def _format_portfolio_summary(self, portfolio_data: Dict) -> str:
         """ポートフォリオサマリーを作成（円換算対応）"""
         if not portfolio_data:
@@ -158,13 +476,15 @@ class SlackClient:
         
         return blocks
     
-    def handle_user_question(self, question: str, user_id: str, channel_id: str) -> bool:
+    def handle_user_question(self, question: str, user_id: str, channel_id: str,
+                             thread_ts: Optional[str] = None) -> bool:
         """
         ユーザーからの質問をGeminiに送信し、回答をSlackに返す
         Args:
             question: 質問内容
             user_id: ユーザーID
             channel_id: チャンネルID
+            thread_ts: 回答を返すスレッド（質問メッセージのts、スレッド内の質問は親のts）
         Returns:
             bool: 処理成功したかどうか
         """
@@ -172,23 +492,61 @@ class SlackClient:
             return False
         
         try:
+            # 同じスレッドの会話履歴（古い往復は要約済み）
+            # スラッシュコマンドの質問はスレッドがないため、無関係な過去の質問を文脈にしない
+            thread_key = f"{channel_id}:{thread_ts}"
+            use_memory = self.conversation_memory is not None and thread_ts is not None
+            history = ""
+            if use_memory:
+                history = self.conversation_memory.context(user_id, thread_key)
+            history_section = f"これまでの会話:\n{history}\n" if history else ""
+            
             # 投資関連の質問であることを明確にするプロンプト
+            tool_instruction = ""
+            if self.portfolio_tools:
+                tool_instruction = "保有銘柄・株価・指標・リスクに関する質問は、提供されたツールで必要なデータだけを取得してから回答してください。"
             enhanced_prompt = f"""
             あなたは投資アドバイザーです。以下の質問に日本語で回答してください。
             質問が投資や株式に関係ない場合は、「投資関連の質問のみお答えできます」と返答してください。
+            {tool_instruction}
             
+            {history_section}
             質問: {question}
             """
             
-            # Geminiに質問を送信
-            response = self.gemini_model.generate_content(enhanced_prompt)
-            answer = response.text if response and response.text else "申し訳ございません。回答を生成できませんでした。"
+            # 近い質問の回答がキャッシュにあればGeminiを呼ばない
+            answer = None
+            # 会話の続きの質問は文脈に依存するため回答キャッシュを使わない
+            use_answer_cache = self.answer_cache is not None and not history
+            if use_answer_cache:
+                portfolio_version = self.portfolio_tools.portfolio_version() if self.portfolio_tools else 'none'
+                answer = self.answer_cache.lookup(question, portfolio_version)
+                if answer:
+                    print(f"回答キャッシュヒット: {user_id}")
             
-            # Slackに回答を送信
+            if answer is None:
+                # Geminiに質問を送信
+                start = time.monotonic()
+                response = self._generate_answer(enhanced_prompt, question)
+                if response and response.text:
+                    answer = response.text
+                    if use_answer_cache:
+                        self.answer_cache.store(
+                            question, answer,
+                            latency_ms=(time.monotonic() - start) * 1000,
+                            portfolio_version=portfolio_version
+                        )
+                else:
+                    answer = "申し訳ございません。回答を生成できませんでした。"
+                    
+            if use_memory:
+                self.conversation_memory.record(user_id, thread_key, question, answer)
+            
+            # Slackに回答を送信（質問のスレッドに返信）
             self.client.chat_postMessage(
                 channel=channel_id,
                 text=f"<@{user_id}> さんのご質問への回答:\n```{answer}```",
-                thread_ts=None
+                thread_ts=thread_ts
             )
             
             print(f"ユーザー質問への回答送信完了: {user_id}")
@@ -200,12 +558,54 @@ class SlackClient:
             try:
                 self.client.chat_postMessage(
                     channel=channel_id,
-                    text=f"<@{user_id}> 申し訳ございません。処理中にエラーが発生しました。"
+                    text=f"<@{user_id}> 申し訳ございません。処理中にエラーが発生しました。",
+                    thread_ts=thread_ts
                 )
             except:
                 pass
             return False
     
+    def _generate_answer(self, prompt: str, question: str = ""):
+        """
+        Geminiで回答を生成（ツールが有効な場合はFunction Callingで必要なデータを取得）
+        Args:
+            prompt: プロンプト
+            question: 元の質問（モデル選択の複雑さ判定に使用）
+        Returns:
+            GenerateContentResponse: Geminiの応答
+        """
+        stats = ToolCallStats()
+        
+        def call(model_name: Optional[str] = None, timeout: Optional[float] = None):
+            model = get_model(model_name) if model_name else self.gemini_model
+            request_options = {'timeout': timeout} if timeout else None
+            with span('gemini.answer', model=model_name or config.GEMINI_DEFAULT_MODEL):
+                if not self.portfolio_tools:
+                    return model.generate_content(prompt, request_options=request_options)
+                chat = model.start_chat(enable_automatic_function_calling=True)
+                return chat.send_message(
+                    prompt,
+                    tools=self.portfolio_tools.build_tool_functions(stats),
+                    request_options=request_options
+                )
+        
+        try:
+            if not self.router:
+                return call()
+            # 質問の複雑さと時間予算からモデルを選択
+            deadline = time.monotonic() + config.SLACK_QA_TIME_BUDGET_MS / 1000
+            return self.router.generate(
+                call,
+                remaining_ms=lambda: (deadline - time.monotonic()) * 1000,
+                complexity=self.router.question_complexity(question)
+            )
+        finally:
+            if self.portfolio_tools:
+                # 回答ごとのツール呼び出し回数と時間を計測に記録（ワーカースレッド間で共有する属性には残さない）
+                count('tools.calls', stats.count)
+                observe('tools.total_ms', stats.total_ms)
+                print(f"ツール呼び出し: {stats.count}回 / {stats.total_ms:.3f}ms")
+    
     def send_simple_message(self, message: str, channel: str = None) -> bool:
         """
         シンプルなメッセージをSlackに送信
@@ -218,12 +618,28 @@ class SlackClient:
         if not self.client:
             return False
         
+        queue = SlackDeliveryQueue(self.client)
+        queue.enqueue(message, channel=channel)
+        result = queue.flush()[0]
+        if not result['ok']:
+            print(f"メッセージ送信エラー: {result['error']}")
+        return result['ok']
+    
+    def respond_to_command(self, response_url: str, text: str, response_type: str = "in_channel") -> bool:
+        """
+        スラッシュコマンドへの遅延応答をresponse_urlに送信
+        Args:
+            response_url: Slackから渡された応答URL
+            text: 応答内容
+            response_type: in_channel / ephemeral
+        Returns:
+            bool: 送信成功したかどうか
+        """
         try:
-            self.client.chat_postMessage(
-                channel=channel or config.SLACK_CHANNEL,
-                text=message
-            )
-            return True
+            response = WebhookClient(response_url).send(text=text, response_type=response_type)
+            if response.status_code != 200:
+                print(f"スラッシュコマンド応答エラー: {response.status_code} {response.body}")
+            return response.status_code == 200
         except Exception as e:
-            print(f"メッセージ送信エラー: {e}")
+            print(f"スラッシュコマンド応答エラー: {e}")
             return False
@@ -1,17 +1,204 @@
 import json
 import urllib3
 import os
+import time
 from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# 同じアラームが同じ状態のままの通知を抑制する時間（秒）
+DEDUP_WINDOW_SECONDS = int(os.environ.get('ALARM_DEDUP_WINDOW_SECONDS', '300'))
+
+# 1メッセージに含めるアラームの上限（超過分は件数のみ表示）
+MAX_ATTACHMENTS = int(os.environ.get('ALARM_MAX_ATTACHMENTS', '20'))
+
+# コンテナ再利用時も接続を使い回す
+http = urllib3.PoolManager(timeout=urllib3.Timeout(connect=3.0, read=10.0), retries=urllib3.Retry(2, backoff_factor=0.5))
+
+# アラーム名 → (直近に通知した状態, 通知時刻)（ウォームコンテナ内でのみ有効）
+_recently_sent: Dict[str, Tuple[str, float]] = {}
+
+
+def parse_timestamp(timestamp: str) -> datetime:
+    """
+    アラームの状態変化時刻を解析（複数の日時形式に対応）
+    Args:
+        timestamp: StateChangeTime
+    Returns:
+        datetime: UTCの日時
+    """
+    # タイムゾーン情報（+0000 / Z）を除いて解析
+    text = (timestamp or '').split('+')[0].rstrip('Z')
+    for fmt in ('%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S'):
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return datetime.now()  # フォールバック
+
+
+def parse_record(record: Dict) -> Optional[Dict]:
+    """
+    SNSレコードからアラーム情報を抽出
+    Args:
+        record: event['Records'] の要素
+    Returns:
+        Dict: アラーム情報（SNSメッセージでない場合はNone）
+    """
+    sns = record.get('Sns') or {}
+    raw = sns.get('Message')
+    if raw is None:
+        return None
+    try:
+        message = json.loads(raw)
+    except (TypeError, ValueError):
+        message = None
+    if not isinstance(message, dict) or 'AlarmName' not in message:
+        # CloudWatchアラーム以外のメッセージは本文をそのまま通知
+        return {
+            'alarm_name': sns.get('Subject') or 'SNS通知',
+            'description': str(raw)[:500],
+            'new_state': 'INFO',
+            'old_state': '-',
+            'reason': '',
+            'timestamp': sns.get('Timestamp', ''),
+            'region': '',
+            'metric': '-'
+        }
+    trigger = message.get('Trigger') or {}
+    return {
+        'alarm_name': message['AlarmName'],
+        'description': message.get('AlarmDescription') or '',
+        'new_state': message.get('NewStateValue', ''),
+        'old_state': message.get('OldStateValue', ''),
+        'reason': message.get('NewStateReason', ''),
+        'timestamp': message.get('StateChangeTime', ''),
+        'region': message.get('Region', ''),
+        'metric': f"{trigger.get('MetricName', '-')} (閾値: {trigger.get('Threshold', '-')})"
+    }
+
+
+def coalesce_alarms(alarms: List[Dict], now: Optional[float] = None) -> Tuple[List[Dict], int]:
+    """
+    アラーム名と状態でまとめ、時間枠内に同じ状態を通知済みのものを除外
+    （ALARM → OK → ALARM のように状態が戻った場合は、最後に通知した状態と異なるため抑制しない）
+    Args:
+        alarms: parse_record の結果
+        now: 現在時刻（epoch秒、省略時は現在）
+    Returns:
+        Tuple: (まとめたアラームのリスト, 抑制した件数)
+    """
+    now = time.time() if now is None else now
+    for name, (_, sent_at) in list(_recently_sent.items()):
+        if now - sent_at >= DEDUP_WINDOW_SECONDS:
+            del _recently_sent[name]
+
+    # バッチ内で状態が変化したアラームは、通知済みの状態と同じでも抑制しない
+    states: Dict[str, set] = {}
+    for alarm in alarms:
+        states.setdefault(alarm['alarm_name'], set()).add(alarm['new_state'])
+
+    groups: Dict[Tuple[str, str], Dict] = {}
+    suppressed = 0
+    for alarm in alarms:
+        name = alarm['alarm_name']
+        last = _recently_sent.get(name)
+        if last is not None and states[name] == {last[0]}:
+            suppressed += 1
+            continue
+        key = (name, alarm['new_state'])
+        group = groups.get(key)
+        if group is None:
+            groups[key] = dict(alarm, count=1, first_timestamp=alarm['timestamp'])
+            continue
+        group['count'] += 1
+        # 最新の状態変化の内容で更新
+        if alarm['timestamp'] >= group['timestamp']:
+            group.update(reason=alarm['reason'], old_state=alarm['old_state'], timestamp=alarm['timestamp'])
+        else:
+            group['first_timestamp'] = min(group['first_timestamp'], alarm['timestamp'])
+    return list(groups.values()), suppressed
+
+
+def remember_sent(groups: List[Dict], sent_at: Optional[float] = None):
+    """
+    通知したアラームごとに最新の状態を記録（以前に通知した別の状態は上書きする）
+    Args:
+        groups: 通知した coalesce_alarms の結果
+        sent_at: 通知時刻（epoch秒、省略時は現在）
+    """
+    sent_at = time.time() if sent_at is None else sent_at
+    for group in sorted(groups, key=lambda group: group['timestamp']):
+        _recently_sent[group['alarm_name']] = (group['new_state'], sent_at)
+
+
+def _style(alarm_name: str, state: str) -> Tuple[str, str]:
+    """アラームの重要度に応じた色と絵文字"""
+    name = alarm_name.lower()
+    if state == 'OK':
+        return 'good', '✅'
+    if 'error' in name:
+        return 'danger', '🚨'  # 赤
+    if 'timeout' in name:
+        return 'warning', '⏱️'  # 黄
+    if 'throttle' in name:
+        return 'warning', '🛑'  # 黄
+    return 'good', '📊'  # 緑
+
+
+def build_slack_message(groups: List[Dict], suppressed: int = 0) -> Dict:
+    """
+    まとめたアラームから1件のSlackメッセージを構築
+    Args:
+        groups: coalesce_alarms の結果
+        suppressed: 時間枠内で抑制した件数
+    Returns:
+        Dict: Webhookに送るペイロード
+    """
+    attachments = []
+    for group in groups[:MAX_ATTACHMENTS]:
+        color, emoji = _style(group['alarm_name'], group['new_state'])
+        repeat = f" ×{group['count']}" if group['count'] > 1 else ''
+        occurred = group['timestamp']
+        if group['count'] > 1 and group['first_timestamp'] != occurred:
+            occurred = f"{group['first_timestamp']} 〜 {occurred}"
+        fields = [
+            {"title": "状態変化", "value": f"{group['old_state']} → {group['new_state']}", "short": True},
+            {"title": "メトリクス", "value": group['metric'], "short": True},
+            {"title": "リージョン", "value": group['region'], "short": True},
+            {"title": "発生時刻", "value": occurred, "short": True}
+        ]
+        if group['reason']:
+            fields.append({"title": "詳細", "value": group['reason'], "short": False})
+        attachments.append({
+            "color": color,
+            "title": f"{emoji} CloudWatch アラーム: {group['alarm_name']}{repeat}",
+            "text": group['description'],
+            "fields": fields,
+            "footer": "Kabukan Lambda Monitoring",
+            "ts": int(parse_timestamp(group['timestamp']).timestamp())
+        })
+
+    message = {
+        "username": "CloudWatch Alert",
+        "icon_emoji": ":warning:",
+        "attachments": attachments
+    }
+    notes = []
+    if len(groups) > MAX_ATTACHMENTS:
+        notes.append(f"他 {len(groups) - MAX_ATTACHMENTS} 件のアラームは省略しました")
+    if suppressed:
+        notes.append(f"直近 {DEDUP_WINDOW_SECONDS // 60} 分以内に通知済みの {suppressed} 件を抑制しました")
+    if len(groups) > 1 or notes:
+        total = sum(group['count'] for group in groups)
+        message["text"] = "\n".join([f"CloudWatch アラーム {len(groups)} 種類（{total} 件）"] + notes)
+    return message
+
 
 def lambda_handler(event, context):
     """
     CloudWatchアラームからSNS経由で受信したアラート情報をSlackに通知する
+    バッチ内の全レコードをアラーム名と状態でまとめ、1回のWebhook呼び出しで送る
     """
-    
-    # デバッグ: 受信したevent全体をログ出力
-    print(f"DEBUG: Received event: {json.dumps(event, default=str)}")
-    
-    # Slack Webhook URL を環境変数から取得
     slack_webhook_url = os.environ.get('SLACK_WEBHOOK_URL')
     if not slack_webhook_url:
         print("ERROR: SLACK_WEBHOOK_URL environment variable not set")
@@ -19,143 +206,56 @@ def lambda_handler(event, context):
             'statusCode': 400,
             'body': json.dumps('SLACK_WEBHOOK_URL not configured')
         }
-    
-    try:
-        # デバッグ: eventの構造を確認
-        print(f"DEBUG: Event keys: {list(event.keys())}")
-        if 'Records' in event:
-            print(f"DEBUG: Records count: {len(event['Records'])}")
-            print(f"DEBUG: First record: {json.dumps(event['Records'][0], default=str)}")
-        
-        # SNSメッセージを解析
-        print("DEBUG: Attempting to parse SNS message...")
-        sns_message = json.loads(event['Records'][0]['Sns']['Message'])
-        print(f"DEBUG: Parsed SNS message: {json.dumps(sns_message, default=str)}")
-        
-        # アラーム情報を抽出
-        alarm_name = sns_message['AlarmName']
-        alarm_description = sns_message['AlarmDescription']
-        new_state = sns_message['NewStateValue']
-        old_state = sns_message['OldStateValue']
-        reason = sns_message['NewStateReason']
-        timestamp = sns_message['StateChangeTime']
-        region = sns_message['Region']
-        
-        # メトリクス情報
-        metric_name = sns_message['Trigger']['MetricName']
-        namespace = sns_message['Trigger']['Namespace']
-        threshold = sns_message['Trigger']['Threshold']
-        
-        # 日本時間に変換（複数の日時形式に対応）
-        try:
-            # タイムゾーン情報付きの形式を試す
-            if '+' in timestamp:
-                utc_time = datetime.strptime(timestamp.split('+')[0], '%Y-%m-%dT%H:%M:%S.%f')
-            else:
-                utc_time = datetime.strptime(timestamp, '%Y-%m-%dT%H:%M:%S.%fZ')
-        except ValueError:
-            # 別の形式を試す
-            try:
-                utc_time = datetime.strptime(timestamp, '%Y-%m-%dT%H:%M:%SZ')
-            except ValueError:
-                utc_time = datetime.now()  # フォールバック
-        
-        # アラームの重要度に応じて色を設定
-        if 'error' in alarm_name.lower():
-            color = 'danger'  # 赤
-            emoji = '🚨'
-        elif 'timeout' in alarm_name.lower():
-            color = 'warning'  # 黄
-            emoji = '⏱️'
-        elif 'throttle' in alarm_name.lower():
-            color = 'warning'  # 黄
-            emoji = '🛑'
+
+    records = event.get('Records') or []
+    alarms = []
+    skipped = 0
+    for record in records:
+        alarm = parse_record(record)
+        if alarm is None:
+            skipped += 1
         else:
-            color = 'good'  # 緑
-            emoji = '📊'
-        
-        # Slackメッセージを構築
-        slack_message = {
-            "username": "CloudWatch Alert",
-            "icon_emoji": ":warning:",
-            "attachments": [
-                {
-                    "color": color,
-                    "title": f"{emoji} CloudWatch アラーム: {alarm_name}",
-                    "text": alarm_description,
-                    "fields": [
-                        {
-                            "title": "状態変化",
-                            "value": f"{old_state} → {new_state}",
-                            "short": True
-                        },
-                        {
-                            "title": "メトリクス",
-                            "value": f"{metric_name} (閾値: {threshold})",
-                            "short": True
-                        },
-                        {
-                            "title": "リージョン",
-                            "value": region,
-                            "short": True
-                        },
-                        {
-                            "title": "発生時刻",
-                            "value": timestamp,
-                            "short": True
-                        },
-                        {
-                            "title": "詳細",
-                            "value": reason,
-                            "short": False
-                        }
-                    ],
-                    "footer": "Kabukan Lambda Monitoring",
-                    "ts": int(utc_time.timestamp())
-                }
-            ]
+            alarms.append(alarm)
+
+    groups, suppressed = coalesce_alarms(alarms)
+    summary = {
+        'records': len(records),
+        'skipped': skipped,
+        'groups': len(groups),
+        'suppressed': suppressed
+    }
+    if not groups:
+        print(f"INFO: nothing to send {json.dumps(summary)}")
+        return {
+            'statusCode': 200,
+            'body': json.dumps('No new alarms to notify')
         }
-        
-        print(f"DEBUG: Sending message to Slack: {json.dumps(slack_message)}")
-        
-        # Slackに送信
-        http = urllib3.PoolManager()
+
+    try:
         response = http.request(
             'POST',
             slack_webhook_url,
-            body=json.dumps(slack_message),
+            body=json.dumps(build_slack_message(groups, suppressed)),
             headers={'Content-Type': 'application/json'}
         )
-        
-        print(f"DEBUG: Slack response status: {response.status}")
-        print(f"DEBUG: Slack response data: {response.data.decode('utf-8')}")
-        
-        if response.status == 200:
-            print(f"Successfully sent Slack notification for alarm: {alarm_name}")
-            return {
-                'statusCode': 200,
-                'body': json.dumps('Slack notification sent successfully')
-            }
-        else:
-            print(f"Failed to send Slack notification. Status: {response.status}")
-            return {
-                'statusCode': response.status,
-                'body': json.dumps(f'Failed to send Slack notification: {response.status}')
-            }
-            
     except Exception as e:
-        print(f"ERROR: Exception in lambda_handler: {str(e)}")
-        print(f"ERROR: Exception type: {type(e).__name__}")
-        import traceback
-        print(f"ERROR: Traceback: {traceback.format_exc()}")
-        
-        # エラー時もeventの内容を出力
-        try:
-            print(f"ERROR: Event that caused error: {json.dumps(event, default=str)}")
-        except:
-            print(f"ERROR: Could not serialize event: {event}")
-        
+        print(f"ERROR: Slack webhook failed: {type(e).__name__}: {e} {json.dumps(summary)}")
         return {
             'statusCode': 500,
             'body': json.dumps(f'Error: {str(e)}')
-        }
\ No newline at end of file
+        }
+
+    summary['status'] = response.status
+    if response.status == 200:
+        remember_sent(groups)
+        print(f"INFO: sent {json.dumps(summary)} alarms={[group['alarm_name'] for group in groups]}")
+        return {
+            'statusCode': 200,
+            'body': json.dumps('Slack notification sent successfully')
+        }
+
+    print(f"ERROR: Failed to send Slack notification {json.dumps(summary)} response={response.data[:200]!r}")
+    return {
+        'statusCode': response.status,
+        'body': json.dumps(f'Failed to send Slack notification: {response.status}')
+    }
@@ -0,0 +1,288 @@
+import gzip
+import json
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from data_fetcher import build_portfolio_with_prices
+from object_store import get_object_store
+
+JST = timezone(timedelta(hours=9))
+
+SNAPSHOT_VERSION = 1
+
+# 銘柄ごとの値を列単位で保存する（同じキー名を銘柄数だけ繰り返さないため小さく圧縮できる）
+HOLDING_COLUMNS = ['symbol', 'quantity', 'sector']
+PRICE_COLUMNS = ['current_price', 'previous_price', 'change', 'change_percent', 'company_name', 'currency']
+
+
+def today_jst() -> date:
+    """日本時間の今日の日付"""
+    return datetime.now(JST).date()
+
+
+def report_month(today: date) -> Tuple[int, int]:
+    """
+    月次レポートの対象月（1日の実行では前月、それ以外は当月の月初来）
+    Args:
+        today: 実行日
+    Returns:
+        Tuple[int, int]: (年, 月)
+    """
+    target = today - timedelta(days=1)
+    return target.year, target.month
+
+
+def build_snapshot(portfolio_data: Dict, analysis: Dict, snapshot_date: date) -> Dict:
+    """
+    日次スナップショットを列指向の形式で作成
+    Args:
+        portfolio_data: ポートフォリオと株価情報
+        analysis: ポートフォリオ分析結果
+        snapshot_date: スナップショットの日付
+    Returns:
+        Dict: スナップショット
+    """
+    portfolio = portfolio_data.get('portfolio', [])
+    stock_prices = portfolio_data.get('stock_prices', {})
+    columns: Dict[str, List] = {name: [] for name in HOLDING_COLUMNS + PRICE_COLUMNS}
+    for stock in portfolio:
+        price_info = stock_prices.get(stock['symbol'], {})
+        for name in HOLDING_COLUMNS:
+            columns[name].append(stock.get(name))
+        for name in PRICE_COLUMNS:
+            columns[name].append(price_info.get(name))
+
+    performance = analysis.get('performance_summary', {})
+    risk = analysis.get('risk_assessment', {})
+    distribution = analysis.get('portfolio_distribution', {})
+    return {
+        'version': SNAPSHOT_VERSION,
+        'date': snapshot_date.isoformat(),
+        'usd_jpy_rate': portfolio_data.get('usd_jpy_rate'),
+        'columns': columns,
+        'totals': {
+            'total_value_usd': portfolio_data.get('total_value_usd', 0),
+            'total_value_jpy': portfolio_data.get('total_value_jpy', 0),
+            'total_value_jpy_converted': portfolio_data.get('total_value_jpy_converted', 0)
+        },
+        'metrics': {
+            'daily_pnl': performance.get('daily_pnl'),
+            'daily_return_percent': performance.get('daily_return_percent'),
+            'portfolio_volatility': risk.get('portfolio_volatility'),
+            'risk_level': risk.get('risk_level'),
+            'concentration_top5': distribution.get('concentration_top5')
+        }
+    }
+
+
+def snapshot_to_portfolio_data(snapshot: Dict) -> Dict:
+    """
+    スナップショットからポートフォリオと株価情報を復元（DataFetcher.get_portfolio_with_pricesと同じ形式）
+    Args:
+        snapshot: スナップショット
+    Returns:
+        Dict: ポートフォリオと株価情報
+    """
+    columns = snapshot['columns']
+    portfolio = []
+    stock_prices = {}
+    for i, symbol in enumerate(columns['symbol']):
+        stock = {'symbol': symbol, 'quantity': columns['quantity'][i]}
+        if columns['sector'][i] is not None:
+            stock['sector'] = columns['sector'][i]
+        portfolio.append(stock)
+        if columns['current_price'][i] is not None:
+            stock_prices[symbol] = {name: columns[name][i] for name in PRICE_COLUMNS}
+    return build_portfolio_with_prices(portfolio, stock_prices, snapshot['usd_jpy_rate'])
+
+
+def _positions(snapshot: Dict, price_column: str = 'current_price') -> Dict[str, Tuple[float, float]]:
+    """銘柄ごとの (保有数, 円換算の株価)（株価がない銘柄は除く）"""
+    columns = snapshot['columns']
+    rate = snapshot['usd_jpy_rate']
+    positions = {}
+    for i, symbol in enumerate(columns['symbol']):
+        price = columns[price_column][i]
+        if price is None:
+            continue
+        fx = 1.0 if columns['currency'][i] == 'JPY' else rate
+        positions[symbol] = (columns['quantity'][i], price * fx)
+    return positions
+
+
+def compute_month_stats(snapshots: List[Dict]) -> Dict:
+    """
+    月内の日次スナップショットから月初来リターン・ドローダウン・回転率を計算（外部APIの呼び出しなし）
+    リターンは日ごとに前日の保有数で評価した値動きを連結するため、売買による評価額の増減を含まない
+    Args:
+        snapshots: 日付順のスナップショット
+    Returns:
+        Dict: 月次の統計（スナップショットがない場合は空）
+    """
+    if not snapshots:
+        return {}
+
+    # 初日は前日終値（previous_price）からの値動き
+    first_current = _positions(snapshots[0])
+    first_previous = _positions(snapshots[0], 'previous_price')
+    daily_returns = [_period_return(
+        {symbol: (quantity, first_previous[symbol][1]) for symbol, (quantity, _) in first_current.items()
+         if symbol in first_previous},
+        first_current
+    )]
+    turnover_value = 0.0
+    values = [_total(first_current)]
+    for previous, current in zip(snapshots, snapshots[1:]):
+        before = _positions(previous)
+        after = _positions(current)
+        daily_returns.append(_period_return(before, after))
+        values.append(_total(after))
+        # 前日からの保有数の変化を当日の株価で評価した売買金額
+        for symbol in set(before) | set(after):
+            quantity_before = before.get(symbol, (0, 0))[0]
+            quantity_after, price = after.get(symbol, (0, before.get(symbol, (0, 0))[1]))
+            turnover_value += abs(quantity_after - quantity_before) * price
+
+    index = 1.0
+    peak = 1.0
+    max_drawdown = 0.0
+    for daily_return in daily_returns:
+        index *= 1 + daily_return
+        peak = max(peak, index)
+        max_drawdown = min(max_drawdown, index / peak - 1)
+
+    average_value = sum(values) / len(values)
+    return {
+        'start_date': snapshots[0]['date'],
+        'end_date': snapshots[-1]['date'],
+        'days': len(snapshots),
+        'start_value_jpy': values[0],
+        'end_value_jpy': values[-1],
+        'value_change_jpy': values[-1] - values[0],
+        'mtd_return_percent': (index - 1) * 100,
+        'max_drawdown_percent': max_drawdown * 100,
+        'best_day_percent': max(daily_returns) * 100,
+        'worst_day_percent': min(daily_returns) * 100,
+        # 売買金額の片道分を平均評価額で割った回転率
+        'turnover_percent': (turnover_value / 2 / average_value) * 100 if average_value > 0 else 0
+    }
+
+
+def _total(positions: Dict[str, Tuple[float, float]]) -> float:
+    return sum(quantity * price for quantity, price in positions.values())
+
+
+def _period_return(before: Dict[str, Tuple[float, float]], after: Dict[str, Tuple[float, float]]) -> float:
+    """前の保有数を固定して評価した期間リターン（両日に株価がある銘柄のみ）"""
+    start = 0.0
+    end = 0.0
+    for symbol, (quantity, price) in before.items():
+        if symbol in after:
+            start += quantity * price
+            end += quantity * after[symbol][1]
+    return end / start - 1 if start > 0 else 0.0
+
+
+def format_month_summary(stats: Dict) -> str:
+    """
+    月次統計をレポート用のテキストに整形
+    Args:
+        stats: compute_month_statsの結果
+    Returns:
+        str: レポートの追記部分（統計がない場合は空文字）
+    """
+    if not stats:
+        return ""
+    return "\n".join([
+        f"📅 *月次サマリー（{stats['start_date']} 〜 {stats['end_date']}、{stats['days']}営業日）*",
+        f"• 月初来リターン: {stats['mtd_return_percent']:+.2f}%",
+        f"• 評価額: ¥{stats['start_value_jpy']:,.0f} → ¥{stats['end_value_jpy']:,.0f}（{stats['value_change_jpy']:+,.0f}円）",
+        f"• 最大ドローダウン: {stats['max_drawdown_percent']:.2f}%",
+        f"• 最良日 / 最悪日: {stats['best_day_percent']:+.2f}% / {stats['worst_day_percent']:+.2f}%",
+        f"• 回転率: {stats['turnover_percent']:.1f}%"
+    ])
+
+
+class SnapshotStore:
+    """
+    日次スナップショットの保存と読み込み
+    スナップショットは snapshots/YYYY/MM/YYYY-MM-DD.json.gz に、月ごとの索引は snapshots/YYYY/MM/index.json に保存する
+    """
+
+    PREFIX = 'snapshots'
+
+    def __init__(self, store=None):
+        self.store = store or get_object_store()
+
+    def _month_prefix(self, year: int, month: int) -> str:
+        return f"{self.PREFIX}/{year:04d}/{month:02d}"
+
+    def save(self, snapshot: Dict) -> str:
+        """
+        スナップショットを保存し、月の索引を更新
+        Args:
+            snapshot: build_snapshotで作成したスナップショット
+        Returns:
+            str: 保存したキー
+        """
+        snapshot_date = date.fromisoformat(snapshot['date'])
+        prefix = self._month_prefix(snapshot_date.year, snapshot_date.month)
+        key = f"{prefix}/{snapshot['date']}.json.gz"
+        body = gzip.compress(json.dumps(snapshot, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        self.store.put(key, body)
+
+        index = self.load_index(snapshot_date.year, snapshot_date.month)
+        index['days'][snapshot['date']] = {
+            'key': key,
+            'holdings': len(snapshot['columns']['symbol']),
+            'total_value_jpy': snapshot['totals']['total_value_jpy_converted'],
+            'bytes': len(body)
+        }
+        index['days'] = dict(sorted(index['days'].items()))
+        self.store.put(f"{prefix}/index.json", json.dumps(index, ensure_ascii=False).encode('utf-8'))
+        return key
+
+    def load_index(self, year: int, month: int) -> Dict:
+        """
+        月の索引を読み込み
+        Args:
+            year: 年
+            month: 月
+        Returns:
+            Dict: {'days': {日付: {'key', 'holdings', 'total_value_jpy', 'bytes'}}}
+        """
+        body = self.store.get(f"{self._month_prefix(year, month)}/index.json")
+        if body is None:
+            return {'days': {}}
+        return json.loads(body)
+
+    def load(self, key: str) -> Optional[Dict]:
+        """
+        スナップショットを読み込み
+        Args:
+            key: 保存キー
+        Returns:
+            Dict: スナップショット（存在しない場合はNone）
+        """
+        body = self.store.get(key)
+        if body is None:
+            return None
+        return json.loads(gzip.decompress(body))
+
+    def month_snapshots(self, year: int, month: int) -> List[Dict]:
+        """
+        月内のスナップショットを日付順に読み込み
+        Args:
+            year: 年
+            month: 月
+        Returns:
+            List[Dict]: スナップショットのリスト
+        """
+        days = self.load_index(year, month)['days']
+        if days:
+            keys = [entry['key'] for _, entry in sorted(days.items())]
+        else:
+            # 索引がない場合は一覧から探す
+            keys = [key for key in self.store.list(self._month_prefix(year, month)) if key.endswith('.json.gz')]
+        snapshots = [self.load(key) for key in keys]
+        return [snapshot for snapshot in snapshots if snapshot is not None]
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Slack Q&A回答キャッシュのテストファイル
+"""
+
+import unittest
+import sys
+import os
+import tempfile
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from answer_cache import AnswerCache, normalize_question
+from cache import SQLiteCache
+
+
+class TestAnswerCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = AnswerCache(ttl_seconds=600, threshold=0.7)
+        self.cache.store("トヨタは買い増し?", "保有継続を推奨します", latency_ms=4200,
+                         portfolio_version='v1', market_day='2026-10-19')
+
+    def test_normalization(self):
+        """全角半角・記号・メンションの違いを吸収すること"""
+        self.assertEqual(normalize_question("<@U123> トヨタは買い増し？"), normalize_question("トヨタは買い増し?"))
+        self.assertEqual(normalize_question("ＡＡＰＬ  Price!"), "aaplprice")
+
+    def test_near_duplicate_hit(self):
+        """言い回しが近い質問はキャッシュ済みの回答を返すこと"""
+        answer = self.cache.lookup("トヨタは買い増しですか？", 'v1', market_day='2026-10-19')
+
+        self.assertEqual(answer, "保有継続を推奨します")
+        stats = self.cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['saved_latency_ms'], 4200)
+
+    def test_different_question_misses(self):
+        """別銘柄・別内容の質問はヒットしないこと"""
+        self.assertIsNone(self.cache.lookup("ソニーは売却?", 'v1', market_day='2026-10-19'))
+        self.assertIsNone(self.cache.lookup("トヨタは売却?", 'v1', market_day='2026-10-19'))
+
+    def test_scoped_by_market_day_and_portfolio(self):
+        """市場日やポートフォリオが変わった場合は使わないこと"""
+        self.assertIsNone(self.cache.lookup("トヨタは買い増し?", 'v2', market_day='2026-10-19'))
+        self.assertIsNone(self.cache.lookup("トヨタは買い増し?", 'v1', market_day='2026-10-20'))
+
+    def test_expired_answer_is_not_used(self):
+        """有効期限切れの回答は使わないこと"""
+        cache = AnswerCache(ttl_seconds=0, threshold=0.7)
+        cache.store("今日の相場どう?", "回答", portfolio_version='v1', market_day='2026-10-19')
+
+        self.assertIsNone(cache.lookup("今日の相場どう?", 'v1', market_day='2026-10-19'))
+
+    def test_shared_store_is_seen_by_other_workers(self):
+        """共有ストアを使う場合、別ワーカーが保存した回答にヒットすること"""
+        path = os.path.join(tempfile.mkdtemp(), 'cache.sqlite3')
+        worker1 = AnswerCache(ttl_seconds=600, threshold=0.7, shared_store=SQLiteCache('answers', path=path))
+        worker2 = AnswerCache(ttl_seconds=600, threshold=0.7, shared_store=SQLiteCache('answers', path=path))
+        worker1.store("トヨタは買い増し?", "保有継続を推奨します", latency_ms=4200,
+                      portfolio_version='v1', market_day='2026-10-19')
+
+        self.assertEqual(worker2.lookup("トヨタは買い増しですか？", 'v1', market_day='2026-10-19'),
+                         "保有継続を推奨します")
+        self.assertIsNone(worker2.lookup("トヨタは買い増し?", 'v2', market_day='2026-10-19'))
+        self.assertIsNone(worker2.lookup("ソニーは売却?", 'v1', market_day='2026-10-19'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+ログ出力（app_logging）のテストファイル
+"""
+
+import contextlib
+import io
+import json
+import logging
+import os
+import sys
+import unittest
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app_logging
+
+
+class TestAppLogging(unittest.TestCase):
+    def tearDown(self):
+        app_logging.setup_logging()
+
+    def capture(self, func) -> str:
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            func()
+            app_logging.flush()
+        return output.getvalue()
+
+    def test_json_lines_with_fields(self):
+        """JSON形式では fields の内容を1行のJSONに展開すること"""
+        app_logging.setup_logging(level='INFO', fmt='json')
+        logger = app_logging.get_logger('data_fetcher')
+        output = self.capture(lambda: logger.info("株価取得完了", extra={'fields': {'symbols': 3, 'failed': []}}))
+        entry = json.loads(output)
+        self.assertEqual(entry['level'], 'INFO')
+        self.assertEqual(entry['logger'], 'kabukan.data_fetcher')
+        self.assertEqual(entry['message'], "株価取得完了")
+        self.assertEqual((entry['symbols'], entry['failed']), (3, []))
+
+    def test_level_and_sampling_suppress_per_symbol_lines(self):
+        """INFOでは銘柄ごとのDEBUGを出力せず、出力割合0では間引くこと"""
+        logger = app_logging.get_logger('data_fetcher')
+
+        def per_symbol():
+            for symbol in ('7203.T', 'AAPL'):
+                if logger.isEnabledFor(logging.DEBUG) and app_logging.sampled():
+                    logger.debug(symbol)
+            logger.info("要約")
+
+        app_logging.setup_logging(level='INFO', fmt='text')
+        self.assertEqual(self.capture(per_symbol).splitlines(), ["要約"])
+        app_logging.setup_logging(level='DEBUG', fmt='text', sample_rate=0)
+        self.assertEqual(self.capture(per_symbol).splitlines(), ["要約"])
+        app_logging.setup_logging(level='DEBUG', fmt='text', sample_rate=1)
+        self.assertEqual(self.capture(per_symbol).splitlines(), ['7203.T', 'AAPL', "要約"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+キャッシュ（TTLCache / SQLiteCache）のテストファイル
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import SQLiteCache, TTLCache
+
+
+class TestSQLiteCache(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'cache.sqlite3')
+
+    def test_add_is_shared_between_instances(self):
+        """別インスタンス（別ワーカー相当）でも同じキーは1回だけ追加されること"""
+        worker_a = SQLiteCache('slack_events', path=self.path)
+        worker_b = SQLiteCache('slack_events', path=self.path)
+
+        self.assertTrue(worker_a.add('Ev001', 1))
+        self.assertFalse(worker_b.add('Ev001', 1))
+        self.assertIn('Ev001', worker_b)
+
+    def test_expired_entry_can_be_added_again(self):
+        """期限切れのキーは再度追加できること"""
+        cache = SQLiteCache('slack_events', path=self.path)
+        cache.set('Ev001', 1, ttl=-1)
+
+        self.assertIsNone(cache.get('Ev001'))
+        self.assertTrue(cache.add('Ev001', 2))
+        self.assertEqual(cache.get('Ev001'), 2)
+
+    def test_namespaces_are_isolated(self):
+        """名前空間が異なるキャッシュは互いに影響しないこと"""
+        events = SQLiteCache('slack_events', path=self.path)
+        portfolio = SQLiteCache('portfolio', path=self.path)
+        events.set('key', {'a': 1})
+        portfolio.clear()
+
+        self.assertEqual(events.get('key'), {'a': 1})
+        self.assertIsNone(portfolio.get('key'))
+
+    def test_concurrent_appends_are_not_lost(self):
+        """複数インスタンスから同時に追加しても要素が失われないこと"""
+        import threading
+
+        workers = [SQLiteCache('answer_cache', path=self.path) for _ in range(4)]
+
+        def run(index, worker):
+            for n in range(25):
+                worker.append('bucket', f"{index}-{n}", limit=200)
+
+        threads = [threading.Thread(target=run, args=(i, w)) for i, w in enumerate(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(workers[0].get('bucket')), 100)
+
+
+class TestTTLCache(unittest.TestCase):
+    def test_add_only_when_missing(self):
+        cache = TTLCache(ttl_seconds=60)
+        self.assertTrue(cache.add('k', 1))
+        self.assertFalse(cache.add('k', 2))
+        self.assertEqual(cache.get('k'), 1)
+
+    def test_append_keeps_latest_items(self):
+        cache = TTLCache(ttl_seconds=60)
+        for n in range(5):
+            cache.append('bucket', n, limit=3)
+        self.assertEqual(cache.get('bucket'), [2, 3, 4])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+段階ごとのチェックポイント（再試行時の再開・二重投稿防止）のテストファイル
+"""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from slack_sdk.errors import SlackApiError
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import data_fetcher
+import lambda_main
+import mcp_client
+from checkpoint import RunCheckpoint, schedule_date
+from object_store import LocalObjectStore
+from slack_client import SlackClient
+
+
+class FakeResponse(dict):
+    status_code = 500
+    headers = {}
+
+
+class FakeWebClient:
+    """advice を含む投稿を指定回数だけ失敗させるSlackクライアント"""
+
+    def __init__(self, fail_advice_times=0):
+        self.fail_advice_times = fail_advice_times
+        self.posts = []
+
+    def chat_postMessage(self, **kwargs):
+        if 'AI投資アドバイス' in kwargs['text'] and self.fail_advice_times > 0:
+            self.fail_advice_times -= 1
+            raise SlackApiError('internal_error', FakeResponse(ok=False, error='internal_error'))
+        self.posts.append(kwargs)
+        return {'ok': True, 'ts': f"{len(self.posts)}.000"}
+
+
+class FakeDataFetcher:
+    created = 0
+
+    def __init__(self, connect_sheets=True):
+        FakeDataFetcher.created += 1
+
+    def get_portfolio_from_sheets(self):
+        return [{'symbol': '7203.T', 'quantity': 100}]
+
+    def get_stock_prices(self, symbols):
+        return {'7203.T': {'current_price': 3000.0, 'previous_price': 2950.0, 'change': 50.0,
+                           'change_percent': 1.69, 'company_name': 'Toyota', 'currency': 'JPY'}}
+
+    def get_usd_jpy_rate(self):
+        return 150.0
+
+
+class FakeMCPClient:
+    calls = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def get_investment_advice(self, portfolio_data, execution_type='daily', remaining_time_ms=None):
+        FakeMCPClient.calls += 1
+        return "保有を継続"
+
+
+class Context:
+    aws_request_id = 'test'
+
+    def get_remaining_time_in_millis(self):
+        return 300000
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        FakeDataFetcher.created = 0
+        FakeMCPClient.calls = 0
+        self.patches = [
+            patch.dict(os.environ, {
+                'GOOGLE_SHEETS_CREDENTIALS_PATH': os.path.join(self.tmp.name, 'credentials.json'),
+                'SPREADSHEET_ID': 'sheet', 'GOOGLE_API_KEY': 'key',
+                'SLACK_BOT_TOKEN': 'xoxb-test', 'SLACK_CHANNEL': 'C123'
+            }),
+            patch.object(config, 'SNAPSHOT_DIR', self.tmp.name),
+            patch.object(config, 'SNAPSHOT_S3_BUCKET', None),
+            patch.object(config, 'TRACE_DIR', os.path.join(self.tmp.name, 'traces')),
+            patch.object(config, 'SLACK_POST_INTERVAL', 0),
+            patch.object(config, 'SLACK_POST_MAX_RETRIES', 0),
+            patch.object(data_fetcher, 'DataFetcher', FakeDataFetcher),
+            patch.object(mcp_client, 'MCPClient', FakeMCPClient),
+        ]
+        for p in self.patches:
+            p.start()
+        self.web_client = FakeWebClient(fail_advice_times=1)
+        slack = SlackClient()
+        slack.client = self.web_client
+        lambda_main._slack_client = slack
+
+    def tearDown(self):
+        lambda_main._slack_client = None
+        for p in reversed(self.patches):
+            p.stop()
+        self.tmp.cleanup()
+
+    def test_retry_resumes_without_refetch_or_double_post(self):
+        """Slack投稿の途中で失敗した実行の再試行は、取得やGeminiを繰り返さず未投稿分だけを送ること"""
+        event = {'execution_type': 'daily', 'time': '2026-10-19T00:00:00Z'}
+
+        result = lambda_main.lambda_handler(event, Context())
+        self.assertEqual(len(self.web_client.posts), 1)
+        self.assertEqual((FakeDataFetcher.created, FakeMCPClient.calls), (1, 1))
+        # S3が未設定のためローカルのチェックポイントを使ったことが結果に残る
+        self.assertEqual(json.loads(result['body'])['checkpoint'], 'local')
+
+        lambda_main.lambda_handler(event, Context())
+        self.assertEqual((FakeDataFetcher.created, FakeMCPClient.calls), (1, 1))
+        self.assertEqual(len(self.web_client.posts), 2)
+        # 残りのアドバイスは1回目に投稿したレポートのスレッドに返信される
+        self.assertEqual(self.web_client.posts[1]['thread_ts'], '1.000')
+
+        # 完了後の再実行では何も投稿しない
+        lambda_main.lambda_handler(event, Context())
+        self.assertEqual(len(self.web_client.posts), 2)
+
+        checkpoint = RunCheckpoint('daily', '2026-10-19', LocalObjectStore(self.tmp.name))
+        self.assertTrue(checkpoint.completed)
+        self.assertEqual(checkpoint.deliveries(), {'report': '1.000', 'advice_1': '2.000'})
+
+    def test_schedule_date_uses_event_time_in_jst(self):
+        self.assertEqual(schedule_date({'time': '2026-10-19T16:00:00Z'}), '2026-10-20')
+        self.assertEqual(schedule_date({'schedule_date': '2026-10-01'}), '2026-10-01')
+
+
+if __name__ == '__main__':
+    unittest.main()
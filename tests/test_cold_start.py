@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+コールドスタート（遅延インポート）のテストファイル
+"""
+
+import unittest
+import sys
+import os
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from import_profile import ROOT, SCENARIOS, parse_importtime, run_scenario
+
+
+class TestColdStart(unittest.TestCase):
+    def test_health_check_loads_no_sdks(self):
+        """health_checkはGoogle・Slack・AWSのSDKを読み込まないこと"""
+        result = run_scenario(SCENARIOS['health_check'], ROOT)
+
+        self.assertNotIn('error', result)
+        self.assertEqual(result['loaded'], [])
+
+    def test_parse_importtime(self):
+        stderr = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   json.decoder\n"
+            "import time:       300 |        420 | json\n"
+        )
+        rows = parse_importtime(stderr)
+
+        self.assertEqual([row['module'].strip() for row in rows], ['json.decoder', 'json'])
+        self.assertEqual(rows[0]['depth'], 1)
+        self.assertEqual(rows[1]['cumulative_us'], 420)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Slack Q&Aの会話履歴（ConversationMemory）のテストファイル
+"""
+
+import unittest
+import sys
+import os
+import tempfile
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import SQLiteCache
+from conversation_memory import ConversationMemory, compress_text, estimate_tokens
+
+
+class TestConversationMemory(unittest.TestCase):
+    def test_follow_up_sees_previous_turn(self):
+        """同じスレッドの続きの質問には前の往復が含まれ、別スレッドには含まれないこと"""
+        memory = ConversationMemory(max_users=10, max_threads_per_user=3, max_tokens=1000, summary_tokens=200)
+        memory.record('U1', 'C1:100.1', 'トヨタの株価は？', '2,800円です。')
+
+        self.assertIn('トヨタの株価は？', memory.context('U1', 'C1:100.1'))
+        self.assertEqual(memory.context('U1', 'C1:200.1'), '')
+        self.assertEqual(memory.context('U2', 'C1:100.1'), '')
+
+    def test_old_turns_are_summarized_within_token_cap(self):
+        """トークン上限を超えた古い往復は要約に畳み込まれること"""
+        memory = ConversationMemory(max_users=10, max_threads_per_user=3, max_tokens=120, summary_tokens=200)
+        for i in range(10):
+            memory.record('U1', 'T', f"質問{i}です。詳しく教えてください。", f"回答{i}です。" + "補足説明。" * 5)
+
+        stats = memory.stats()
+        context = memory.context('U1', 'T')
+        self.assertLessEqual(stats['tokens'], 120)
+        self.assertGreater(stats['summaries'], 0)
+        self.assertIn('これまでの要約', context)
+        self.assertIn('質問9です', context)
+        self.assertLessEqual(estimate_tokens(context), 120 + 200 + 50)
+
+    def test_memory_stays_flat_with_many_users(self):
+        """ユーザー数が増えても保持数は上限で一定になること"""
+        memory = ConversationMemory(max_users=50, max_threads_per_user=2, max_tokens=200, summary_tokens=50)
+        for user in range(1000):
+            for thread in range(5):
+                memory.record(f"U{user}", f"T{thread}", "質問", "回答")
+
+        stats = memory.stats()
+        self.assertEqual(stats['users'], 50)
+        self.assertEqual(stats['threads'], 100)
+        self.assertEqual(memory.context('U0', 'T4'), '')
+        self.assertIn('質問', memory.context('U999', 'T4'))
+
+    def test_shared_store_keeps_context_across_workers(self):
+        """共有ストアを使う場合、続きの質問が別ワーカーに届いても前の往復が含まれること"""
+        path = os.path.join(tempfile.mkdtemp(), 'cache.sqlite3')
+        worker1 = ConversationMemory(max_tokens=1000, summary_tokens=200,
+                                     shared_store=SQLiteCache('conversation', path=path))
+        worker2 = ConversationMemory(max_tokens=1000, summary_tokens=200,
+                                     shared_store=SQLiteCache('conversation', path=path))
+        worker1.record('U1', 'C1:100.1', 'トヨタの株価は？', '2,800円です。')
+        worker2.record('U1', 'C1:100.1', '配当は？', '年2回です。')
+
+        context = worker1.context('U1', 'C1:100.1')
+        self.assertIn('トヨタの株価は？', context)
+        self.assertIn('配当は？', context)
+        self.assertEqual(worker2.context('U1', 'C1:200.1'), '')
+
+    def test_long_pasted_text_is_compressed(self):
+        """長い貼り付けは先頭と末尾を残して短縮されること"""
+        text = "あ" * 5000 + "末尾"
+        compressed = compress_text(text, 300)
+        self.assertLess(len(compressed), 340)
+        self.assertTrue(compressed.endswith("末尾"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Google認証情報・アクセストークン再利用のテストファイル
+"""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_fetcher
+import lambda_main
+
+SERVICE_ACCOUNT = {'client_email': 'bot@example.iam.gserviceaccount.com', 'private_key': 'dummy'}
+
+
+class TestPrepareGoogleCredentials(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'credentials.json')
+        lambda_main._credentials_state.update({'source': None, 'path': None, 'fetched_at': 0.0})
+        self.env = patch.dict(os.environ, {
+            'GOOGLE_SHEETS_CREDENTIALS_PATH': self.path,
+            'CREDENTIALS_S3_BUCKET': 'bucket',
+            'CREDENTIALS_S3_KEY': 'credentials.json'
+        })
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+
+    def test_warm_invocation_skips_s3_download(self):
+        """取得済みの有効なファイルがあればS3からダウンロードしないこと"""
+        def download(bucket, key, path):
+            with open(path, 'w') as f:
+                json.dump(SERVICE_ACCOUNT, f)
+
+        with patch('boto3.client') as s3_client:
+            s3_client.return_value.download_file.side_effect = download
+            for _ in range(3):
+                self.assertEqual(lambda_main.prepare_google_credentials(), self.path)
+
+        s3_client.return_value.download_file.assert_called_once()
+
+    def test_broken_file_is_downloaded_again(self):
+        """ファイルが壊れている場合は再ダウンロードすること"""
+        lambda_main._credentials_state.update({'source': 's3://bucket/credentials.json', 'path': self.path,
+                                               'fetched_at': 1e18})
+        with open(self.path, 'w') as f:
+            f.write('{')
+
+        with patch('boto3.client') as s3_client:
+            lambda_main.prepare_google_credentials()
+
+        s3_client.return_value.download_file.assert_called_once()
+
+
+class TestSharedSheetsClient(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'credentials.json')
+        with open(self.path, 'w') as f:
+            json.dump(SERVICE_ACCOUNT, f)
+        data_fetcher._sheets_auth.update({'client': None, 'credentials': None, 'path': None, 'mtime': None})
+
+    def tearDown(self):
+        data_fetcher._sheets_auth.update({'client': None, 'credentials': None, 'path': None, 'mtime': None})
+
+    def make_credentials(self, expires_in):
+        credentials = MagicMock()
+        credentials.token = None
+
+        def refresh(request):
+            credentials.token = 'token'
+            credentials.expiry = datetime.utcnow() + expires_in
+
+        credentials.refresh.side_effect = refresh
+        return credentials
+
+    def test_client_and_token_are_reused(self):
+        """有効期限に余裕があるトークンはクライアントごと再利用されること"""
+        credentials = self.make_credentials(timedelta(hours=1))
+        with patch('google.oauth2.service_account.Credentials.from_service_account_file', return_value=credentials) as load, \
+                patch('gspread.authorize') as authorize:
+            clients = [data_fetcher.get_sheets_client(self.path) for _ in range(3)]
+
+        self.assertTrue(all(client is clients[0] for client in clients))
+        load.assert_called_once()
+        authorize.assert_called_once()
+        credentials.refresh.assert_called_once()
+
+    def test_token_is_refreshed_before_expiry(self):
+        """期限切れ間近のトークンは次の利用前に更新されること"""
+        credentials = self.make_credentials(timedelta(seconds=60))
+        with patch('google.oauth2.service_account.Credentials.from_service_account_file', return_value=credentials), \
+                patch('gspread.authorize'):
+            data_fetcher.get_sheets_client(self.path)
+            data_fetcher.get_sheets_client(self.path)
+
+        self.assertEqual(credentials.refresh.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Slackイベント非同期処理（EventDispatcher）のテストファイル
+"""
+
+import threading
+import unittest
+import sys
+import os
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_dispatcher import EventDispatcher, ACCEPTED, DUPLICATE, REJECTED
+
+
+class TestEventDispatcher(unittest.TestCase):
+    def test_retried_event_is_processed_once(self):
+        """同じイベントIDの再送は1回だけ処理されること"""
+        dispatcher = EventDispatcher(workers=2, queue_size=10)
+        processed = []
+
+        statuses = [dispatcher.submit(processed.append, 'q', dedup_key='Ev001') for _ in range(3)]
+        dispatcher.shutdown(wait=True, timeout=5)
+
+        self.assertEqual(statuses, [ACCEPTED, DUPLICATE, DUPLICATE])
+        self.assertEqual(processed, ['q'])
+        self.assertEqual(dispatcher.stats()['duplicates'], 2)
+
+    def test_backpressure_when_queue_is_full(self):
+        """キューが満杯の場合は拒否し、再送で受け付けられること"""
+        dispatcher = EventDispatcher(workers=1, queue_size=1)
+        release = threading.Event()
+        started = threading.Event()
+
+        def blocking():
+            started.set()
+            release.wait(5)
+
+        self.assertEqual(dispatcher.submit(blocking, dedup_key='Ev1'), ACCEPTED)
+        started.wait(5)
+        self.assertEqual(dispatcher.submit(lambda: None, dedup_key='Ev2'), ACCEPTED)
+        self.assertEqual(dispatcher.submit(lambda: None, dedup_key='Ev3'), REJECTED)
+
+        release.set()
+        dispatcher.shutdown(wait=True, timeout=5)
+        # 拒否したイベントは重複扱いにならない
+        self.assertEqual(dispatcher.submit(lambda: None, dedup_key='Ev3'), ACCEPTED)
+        dispatcher.shutdown(wait=True, timeout=5)
+
+    def test_shutdown_drains_queue(self):
+        """停止時にキューに残った処理を実行し終えること"""
+        dispatcher = EventDispatcher(workers=2, queue_size=50)
+        processed = []
+        lock = threading.Lock()
+
+        def work(i):
+            with lock:
+                processed.append(i)
+
+        for i in range(20):
+            dispatcher.submit(work, i)
+        dispatcher.shutdown(wait=True, timeout=5)
+
+        self.assertEqual(sorted(processed), list(range(20)))
+        self.assertEqual(dispatcher.stats()['completed'], 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+計測（Instrumentation）のテストファイル
+"""
+
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import instrumentation
+from instrumentation import Instrumentation
+
+
+class TestInstrumentation(unittest.TestCase):
+    def test_spans_and_counters_are_summarized(self):
+        recorder = Instrumentation(enabled=True)
+        for symbol in ['7203.T', 'AAPL', 'MSFT']:
+            with recorder.span('quote.fetch', symbol=symbol):
+                time.sleep(0.001)
+        recorder.count('quote.cache_miss', 3)
+
+        summary = recorder.summary()
+        self.assertEqual(summary['stages']['quote.fetch']['count'], 3)
+        self.assertGreater(summary['stages']['quote.fetch']['p95_ms'], 0)
+        self.assertEqual(summary['counters']['quote.cache_miss'], 3)
+
+    def test_span_records_error(self):
+        recorder = Instrumentation(enabled=True)
+        with self.assertRaises(ValueError):
+            with recorder.span('gemini.generate'):
+                raise ValueError('boom')
+        self.assertEqual(recorder._spans[0]['attributes']['error'], 'ValueError')
+
+    def test_memory_is_bounded_for_long_running_processes(self):
+        """flushしないプロセスでもスパンと値の保持数が上限を超えず、件数・合計・最大は正確なこと"""
+        recorder = Instrumentation(enabled=True, max_spans=50, reservoir_size=20)
+        for i in range(1000):
+            with recorder.span('quote.fetch', symbol=str(i)):
+                pass
+            recorder.observe('slack.answer', float(i))
+
+        self.assertEqual(len(recorder._spans), 50)
+        self.assertEqual(recorder._spans[-1]['attributes']['symbol'], '999')
+        stage = recorder.summary()['stages']['slack.answer']
+        self.assertEqual((stage['count'], stage['total_ms'], stage['max_ms']), (1000, 499500.0, 999.0))
+        self.assertTrue(all(len(r['StageLatency']) <= 20 for r in recorder.emf_records() if 'Stage' in r))
+
+    def test_emf_records(self):
+        """EMFレコードは区間ごとにStageディメンション付きで値の配列を持つこと"""
+        recorder = Instrumentation(enabled=True, namespace='Test')
+        recorder.set_dimensions(ExecutionType='daily')
+        recorder.observe('sheets.load', 120.0)
+        recorder.observe('sheets.load', 80.0)
+        recorder.count('slack.rate_limited')
+
+        records = recorder.emf_records()
+        stage = next(r for r in records if r.get('Stage') == 'sheets.load')
+        self.assertEqual(stage['StageLatency'], [120.0, 80.0])
+        self.assertEqual(stage['ExecutionType'], 'daily')
+        metric = stage['_aws']['CloudWatchMetrics'][0]
+        self.assertEqual(metric['Namespace'], 'Test')
+        self.assertEqual(metric['Dimensions'], [['ExecutionType', 'Stage']])
+        counters = next(r for r in records if 'slack.rate_limited' in r)
+        self.assertEqual(counters['_aws']['CloudWatchMetrics'][0]['Metrics'][0]['Unit'], 'Count')
+
+    def test_local_flush_writes_json_and_csv(self):
+        recorder = Instrumentation(enabled=True)
+        with recorder.span('analysis'):
+            pass
+        trace_dir = tempfile.mkdtemp()
+        with patch.object(instrumentation.config, 'TRACE_DIR', trace_dir), \
+                patch.dict(os.environ, {}, clear=False):
+            os.environ.pop('AWS_LAMBDA_FUNCTION_NAME', None)
+            path = recorder.flush('run1')
+
+        with open(path) as f:
+            trace = json.load(f)
+        with open(os.path.join(trace_dir, 'run1.csv')) as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(trace['spans'][0]['name'], 'analysis')
+        self.assertEqual(rows[1][0], 'analysis')
+        self.assertEqual(recorder.summary()['stages'], {})
+
+    def test_disabled_is_noop(self):
+        """無効時は何も記録せず、オーバーヘッドがごく小さいこと"""
+        recorder = Instrumentation(enabled=False)
+        start = time.perf_counter()
+        for _ in range(100000):
+            with recorder.span('quote.fetch'):
+                pass
+        per_call_us = (time.perf_counter() - start) / 100000 * 1e6
+
+        self.assertEqual(recorder.summary(), {'stages': {}, 'counters': {}})
+        self.assertIsNone(recorder.flush())
+        self.assertLess(per_call_us, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Slack Bot 負荷試験（loadtest_slack_bot）のテストファイル
+"""
+
+import json
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from loadtest_slack_bot import build_event, deliver_event, parse_latency, signed_headers
+
+
+class TestLoadtestSlackBot(unittest.TestCase):
+    def test_signature_passes_bot_verification(self):
+        """負荷試験の署名がBotの verify_slack_signature で検証を通ること"""
+        from slack_bot import verify_slack_signature
+        body = json.dumps(build_event(1))
+        headers = signed_headers(body, 'loadtest-secret')
+        with patch.object(config, 'SLACK_SIGNING_SECRET', 'loadtest-secret'):
+            self.assertTrue(verify_slack_signature(body, headers['X-Slack-Request-Timestamp'],
+                                                   headers['X-Slack-Signature']))
+            self.assertFalse(verify_slack_signature(body + ' ', headers['X-Slack-Request-Timestamp'],
+                                                    headers['X-Slack-Signature']))
+
+    def test_latency_distributions(self):
+        self.assertEqual(parse_latency('fixed:250')(), 0.25)
+        self.assertTrue(0.1 <= parse_latency('uniform:100:200')() <= 0.2)
+        self.assertGreater(parse_latency('lognormal:2000:0.5')(), 0)
+        with self.assertRaises(ValueError):
+            parse_latency('normal:100')
+
+    def test_retries_like_slack_until_acked_or_dropped(self):
+        """200以外・タイムアウトは再送し、再送し尽くしたら受付失敗とすること"""
+        statuses = iter([{'status': 503, 'latency_ms': 1.0}, {'status': 'timeout', 'latency_ms': 3000.0},
+                         {'status': 200, 'latency_ms': 2.0}])
+        with patch('loadtest_slack_bot.send_event', side_effect=lambda *args, **kwargs: next(statuses)) as send:
+            delivery = deliver_event('http://bot', build_event(2), 'secret', retry_delays=[0, 0, 0])
+        self.assertTrue(delivery['acked'])
+        self.assertEqual(len(delivery['attempts']), 3)
+        self.assertEqual(send.call_args.kwargs['retry_reason'], 'http_timeout')
+
+        with patch('loadtest_slack_bot.send_event', return_value={'status': 503, 'latency_ms': 1.0}) as send:
+            delivery = deliver_event('http://bot', build_event(3), 'secret', retry_delays=[0, 0])
+        self.assertFalse(delivery['acked'])
+        self.assertEqual(send.call_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+取引所カレンダー（market_calendar）のテストファイル
+"""
+
+import unittest
+import sys
+import os
+from datetime import date, datetime
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from market_calendar import (JP, JST, US, cache_ttl, early_closes, holidays, is_open, is_trading_day,
+                             next_open, plan_daily_run, session)
+
+
+def jst(text):
+    return datetime.fromisoformat(text).replace(tzinfo=JST)
+
+
+class TestMarketCalendar(unittest.TestCase):
+    def test_japanese_holidays(self):
+        """振替休日・国民の休日・年末年始の休場を含むこと"""
+        days = holidays(JP, 2026)
+        for day in (date(2026, 1, 2), date(2026, 1, 12), date(2026, 3, 20), date(2026, 5, 6),
+                    date(2026, 9, 22), date(2026, 12, 31)):
+            self.assertIn(day, days)
+        self.assertTrue(is_trading_day(JP, date(2026, 10, 19)))
+
+    def test_us_holidays_and_half_days(self):
+        days = holidays(US, 2026)
+        for day in (date(2026, 1, 19), date(2026, 4, 3), date(2026, 6, 19), date(2026, 7, 3), date(2026, 11, 26)):
+            self.assertIn(day, days)
+        self.assertEqual(early_closes(US, 2026), {date(2026, 11, 27), date(2026, 12, 24)})
+        self.assertEqual(session(US, date(2026, 11, 27)).close, jst('2026-11-28T03:00'))
+
+    def test_us_session_follows_daylight_saving(self):
+        self.assertEqual(session(US, date(2026, 10, 19)).open, jst('2026-10-19T22:30'))
+        self.assertEqual(session(US, date(2026, 12, 1)).open, jst('2026-12-01T23:30'))
+        self.assertTrue(is_open(US, jst('2026-10-20T04:59')))
+        self.assertFalse(is_open(US, jst('2026-10-20T05:00')))
+
+    def test_cache_ttl_expires_at_next_open(self):
+        """引け後のキャッシュは次の立会開始まで、立会中は通常のTTLとすること"""
+        self.assertEqual(cache_ttl(JP, jst('2026-10-19T10:00'), 60), 60)
+        # 金曜の引け後 → 月曜 9:00 まで
+        friday_evening = jst('2026-10-16T18:00')
+        self.assertEqual(next_open(JP, friday_evening), jst('2026-10-19T09:00'))
+        self.assertEqual(cache_ttl(JP, friday_evening, 60), (jst('2026-10-19T09:00') - friday_evening).total_seconds())
+        # 引け直後は終値の確定待ち
+        self.assertEqual(cache_ttl(JP, jst('2026-10-19T15:35'), 60, settle_seconds=1200), 60)
+
+    def test_plan_daily_run(self):
+        # 1/1: 米国の大晦日の終値はあるが日米とも翌日まで休場 → アドバイス省略
+        self.assertEqual(plan_daily_run(jst('2026-01-01T09:00'))['action'], 'short')
+        # 1/2: 前回以降どちらの市場も立会なし → 省略
+        self.assertEqual(plan_daily_run(jst('2026-01-02T09:00'))['action'], 'skip')
+        # 東証が祝日でも米国の終値があり今夜も開く → 通常実行
+        self.assertEqual(plan_daily_run(jst('2026-09-21T09:00'))['action'], 'full')
+        self.assertEqual(plan_daily_run(jst('2026-10-19T09:00'))['action'], 'full')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+MCPClient（map-reduce分析）のテストファイル
+"""
+
+import threading
+import time
+import unittest
+from unittest.mock import Mock, patch
+import sys
+import os
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mcp_client
+from mcp_client import MCPClient
+from model_router import ModelRouter
+
+
+def make_portfolio_data(count):
+    """テスト用のポートフォリオデータを生成"""
+    portfolio = [{'symbol': f"{1000 + i}.T", 'quantity': 100} for i in range(count)]
+    stock_prices = {
+        stock['symbol']: {
+            'current_price': 1000.0 + i,
+            'change_percent': 0.5,
+            'company_name': f"銘柄{i}",
+            'currency': 'JPY'
+        }
+        for i, stock in enumerate(portfolio)
+    }
+    return {
+        'portfolio': portfolio,
+        'stock_prices': stock_prices,
+        'usd_jpy_rate': 150.0,
+        'total_value_usd': 0,
+        'total_value_jpy_converted': sum(p['current_price'] * 100 for p in stock_prices.values())
+    }
+
+
+class FakeModel:
+    """generate_contentの呼び出しを記録するモデル"""
+    model_name = 'models/fake'
+
+    def __init__(self, delay=0.0, fail_symbols=()):
+        self.delay = delay
+        self.fail_symbols = set(fail_symbols)
+        self.prompts = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt):
+        with self._lock:
+            self.prompts.append(prompt)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            if any(symbol in prompt for symbol in self.fail_symbols) and '統合' not in prompt:
+                raise RuntimeError("shard failure")
+            return Mock(text=f"回答{len(self.prompts)}")
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+class TestMapReduceAdvice(unittest.TestCase):
+    def setUp(self):
+        mcp_client._shard_cache.clear()
+        self.client = MCPClient()
+        self.client.connected = True
+
+    def test_concurrency_is_bounded(self):
+        """同時リクエスト数が上限を超えないこと"""
+        self.client.model = FakeModel(delay=0.05)
+        advice = self.client.get_investment_advice_map_reduce(
+            make_portfolio_data(6), shard_by='holding', max_concurrency=3
+        )
+
+        self.assertIsNotNone(advice)
+        self.assertLessEqual(self.client.model.max_active, 3)
+        # 6シャード + 統合1回
+        self.assertEqual(len(self.client.model.prompts), 7)
+
+    def test_retry_only_regenerates_failed_shards(self):
+        """再実行時は失敗したシャードのみ再生成されること"""
+        data = make_portfolio_data(4)
+        self.client.model = FakeModel(fail_symbols=['1002.T'])
+        advice = self.client.get_investment_advice_map_reduce(data, shard_by='holding')
+        self.assertIsNotNone(advice)
+        self.assertIn('1002.T', self.client.model.prompts[-1])
+
+        self.client.model = FakeModel()
+        self.client.get_investment_advice_map_reduce(data, shard_by='holding')
+        shard_prompts = self.client.model.prompts[:-1]
+        self.assertEqual(len(shard_prompts), 1)
+        self.assertIn('1002.T', shard_prompts[0])
+
+    def test_sector_shards_fall_back_to_currency(self):
+        """セクター列がない場合は通貨単位でまとめること"""
+        data = make_portfolio_data(3)
+        data['portfolio'][0]['sector'] = '自動車'
+        shards = self.client._build_shards(data, 'sector')
+
+        self.assertEqual([name for name, _ in shards], ['自動車', 'JPY'])
+        self.assertEqual(len(shards[1][1]), 2)
+
+    def test_shards_from_fallback_model_are_not_cached(self):
+        """シャードはそれを生成したモデルで区別し、フォールバック先のモデルの回答は再利用しないこと"""
+        class TimeoutModel:
+            def generate_content(self, prompt, request_options=None):
+                raise TimeoutError("deadline exceeded")
+
+        class RouterModel(FakeModel):
+            def generate_content(self, prompt, request_options=None):
+                return super().generate_content(prompt)
+
+        data = make_portfolio_data(2)
+        models = {'models/flash': RouterModel(), 'models/lite': RouterModel()}
+        self.client.model = FakeModel()
+        self.client.router = ModelRouter(['models/pro', 'models/flash', 'models/lite'])
+        with patch.object(mcp_client, 'get_model', lambda name: models[name]):
+            # シャードに選ばれるのは最も速い階層で、既定モデルではない
+            self.assertEqual(self.client._shard_model(), 'models/lite')
+            self.client.get_investment_advice_map_reduce(data, shard_by='holding')
+            self.assertEqual(len(models['models/lite'].prompts), 2)
+            self.assertEqual(len(mcp_client._shard_cache), 2)
+
+            # タイムアウトして別のモデルが生成したシャードはキャッシュしない
+            mcp_client._shard_cache.clear()
+            models['models/lite'] = TimeoutModel()
+            with patch.object(self.client.router, 'select', return_value=['models/lite', 'models/flash']):
+                self.client.get_investment_advice_map_reduce(data, shard_by='holding')
+            self.assertEqual(sum('統合' not in prompt for prompt in models['models/flash'].prompts), 2)
+            self.assertEqual(len(mcp_client._shard_cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
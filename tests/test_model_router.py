@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Geminiモデル選択（ModelRouter）のテストファイル
+"""
+
+import unittest
+import sys
+import os
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_router import ModelRouter
+
+TIERS = ['strong', 'standard', 'fast']
+
+
+class DeadlineExceeded(Exception):
+    """google.api_core.exceptions.DeadlineExceeded相当"""
+
+
+class TestModelRouter(unittest.TestCase):
+    def setUp(self):
+        self.router = ModelRouter(tiers=TIERS)
+
+    def test_monthly_prefers_strong_model(self):
+        """時間に余裕がある月次実行は最上位モデルを選ぶこと"""
+        self.assertEqual(self.router.select(280000, execution_type='monthly'), TIERS)
+        self.assertEqual(self.router.select(280000, execution_type='daily'), ['standard', 'fast'])
+
+    def test_short_budget_downgrades(self):
+        """残り時間が短い場合は速いモデルに切り替えること"""
+        for _ in range(5):
+            self.router.record('strong', 90000)
+            self.router.record('standard', 40000)
+            self.router.record('fast', 5000)
+
+        self.assertEqual(self.router.select(50000, execution_type='monthly')[0], 'standard')
+        self.assertEqual(self.router.select(20000, execution_type='monthly')[0], 'fast')
+        self.assertEqual(self.router.percentiles('fast')['p95'], 5000)
+
+    def test_window_applies_to_unlisted_models(self):
+        """階層外のモデルのレイテンシもコンストラクタのwindow件数だけ保持すること"""
+        router = ModelRouter(tiers=TIERS, window=3)
+        for latency in (100, 200, 300, 400, 500):
+            router.record('experimental', latency)
+
+        self.assertEqual(router.percentiles('experimental')['count'], 3)
+
+    def test_complexity_heuristic(self):
+        """単純な株価確認と戦略的な質問を区別すること"""
+        simple = self.router.question_complexity("7203の株価は？")
+        complex_ = self.router.question_complexity("トヨタとソニーを比較して、リスクと今後の見通しからポートフォリオの戦略を教えて")
+
+        self.assertLess(simple, 0.3)
+        self.assertGreaterEqual(complex_, 0.6)
+
+    def test_falls_back_on_timeout(self):
+        """タイムアウト時はより速いモデルで再試行すること"""
+        calls = []
+
+        def generate(model_name, timeout):
+            calls.append((model_name, timeout))
+            if model_name == 'standard':
+                raise DeadlineExceeded("504 Deadline Exceeded")
+            return model_name
+
+        result = self.router.generate(generate, remaining_ms=lambda: 200000, execution_type='daily')
+
+        self.assertEqual(result, 'fast')
+        self.assertEqual([name for name, _ in calls], ['standard', 'fast'])
+        # 1回目のタイムアウトはフォールバック分の時間を残していること
+        self.assertLess(calls[0][1], calls[1][1])
+
+    def test_other_errors_are_raised(self):
+        """タイムアウト以外のエラーはフォールバックせずに送出すること"""
+        def generate(model_name, timeout):
+            raise ValueError("invalid request")
+
+        with self.assertRaises(ValueError):
+            self.router.generate(generate, execution_type='daily')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+性能予算（段階ごとの所要時間・メモリ確保量・上流へのリクエスト数）のテストファイル
+予算とベースラインは benchmarks/budgets.json に保存し、更新は `python benchmark.py --write-baseline` で行う
+"""
+
+import os
+import sys
+import unittest
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark import (FixtureServer, check_budgets, generate_portfolio, load_budgets, measure_local_stages,
+                       offline_config, run_once)
+
+
+class TestPerformanceBudgets(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.budgets = load_budgets()
+
+    def test_local_stages_within_budget(self):
+        """分析・レポート生成・プロンプト生成などが所要時間とメモリ確保量の予算内に収まること"""
+        measured = measure_local_stages(self.budgets['holdings'])
+        violations = check_budgets(measured, self.budgets)
+        if violations:
+            # 一時的な負荷による超過を除くため、超過した場合はもう一度計測する
+            violations = check_budgets(measure_local_stages(self.budgets['holdings']), self.budgets)
+        self.assertFalse(violations, f"\n{self.budgets['holdings']:,}銘柄の性能予算を超過しました:\n" +
+                         '\n'.join(f"  - {violation}" for violation in violations))
+
+    def test_upstream_request_counts_are_locked(self):
+        """1回の実行での上流へのリクエスト数（銘柄ごとのYahoo呼び出しなど）が変わらないこと"""
+        server = FixtureServer()
+        server.start()
+        try:
+            with offline_config(server):
+                for size, expected in self.budgets['requests'].items():
+                    server.set_portfolio(generate_portfolio(int(size)))
+                    with self.subTest(holdings=int(size)):
+                        self.assertEqual(
+                            run_once(server)['requests'], expected,
+                            f"{int(size):,}銘柄の実行で上流へのリクエスト数が benchmarks/budgets.json と異なります"
+                            "（N+1の取得がないか確認し、意図した変更なら予算を更新してください）")
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
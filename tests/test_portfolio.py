@@ -46,17 +46,20 @@ class TestDataFetcher(unittest.TestCase):
                     'company_name': 'Alphabet Inc.',
                     'currency': 'USD'
                 }
-            }):
+            }), patch.object(self.data_fetcher, 'get_usd_jpy_rate', return_value=150.0):
                 result = self.data_fetcher.get_portfolio_with_prices()
                 
                 # 基本構造のチェック
                 self.assertIn('portfolio', result)
                 self.assertIn('stock_prices', result)
-                self.assertIn('total_value', result)
+                self.assertIn('total_value_usd', result)
+                self.assertIn('total_value_jpy_converted', result)
                 
-                # 計算値のチェック
+                # 計算値のチェック（米国株のみなので円換算は為替レートを掛けた値）
                 expected_total = (150.00 * 10) + (2800.00 * 5)
-                self.assertEqual(result['total_value'], expected_total)
+                self.assertEqual(result['total_value_usd'], expected_total)
+                self.assertEqual(result['total_value_jpy'], 0)
+                self.assertEqual(result['total_value_jpy_converted'], expected_total * 150.0)
 
 class TestPortfolioAnalyzer(unittest.TestCase):
     def setUp(self):
@@ -84,7 +87,10 @@ class TestPortfolioAnalyzer(unittest.TestCase):
                     'currency': 'USD'
                 }
             },
-            'total_value': 15500.00
+            'usd_jpy_rate': 150.0,
+            'total_value_usd': 15500.00,
+            'total_value_jpy': 0,
+            'total_value_jpy_converted': 2325000.00
         }
     
     def test_analyze_portfolio(self):
@@ -92,7 +98,8 @@ class TestPortfolioAnalyzer(unittest.TestCase):
         result = self.analyzer.analyze_portfolio(self.sample_data)
         
         # 分析結果の基本構造
-        self.assertIn('total_portfolio_value', result)
+        self.assertIn('total_portfolio_value_jpy', result)
+        self.assertIn('total_portfolio_value_usd', result)
         self.assertIn('number_of_holdings', result)
         self.assertIn('holdings_analysis', result)
         self.assertIn('portfolio_distribution', result)
@@ -100,9 +107,11 @@ class TestPortfolioAnalyzer(unittest.TestCase):
         self.assertIn('risk_assessment', result)
         
         # 計算値の確認
-        self.assertEqual(result['total_portfolio_value'], 15500.00)
+        self.assertEqual(result['total_portfolio_value_jpy'], 2325000.00)
+        self.assertEqual(result['total_portfolio_value_usd'], 15500.00)
         self.assertEqual(result['number_of_holdings'], 2)
         self.assertEqual(len(result['holdings_analysis']), 2)
+        self.assertAlmostEqual(sum(h['portfolio_weight'] for h in result['holdings_analysis']), 100.0)
     
     def test_generate_report(self):
         """レポート生成のテスト"""
@@ -111,8 +120,8 @@ class TestPortfolioAnalyzer(unittest.TestCase):
         
         # レポートの基本的な内容を確認
         self.assertIn('ポートフォリオ分析レポート', report)
-        self.assertIn('総資産価値', report)
-        self.assertIn('保有銘柄数', report)
+        self.assertIn('【パフォーマンス】', report)
+        self.assertIn('【上位保有銘柄】', report)
         self.assertIn('Apple Inc.', report)
         self.assertIn('Alphabet Inc.', report)
 
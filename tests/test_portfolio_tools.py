@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Geminiツール呼び出し用ローカルツールのテストファイル
+"""
+
+import unittest
+from unittest.mock import Mock
+import sys
+import os
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import portfolio_tools
+from portfolio_tools import PortfolioTools, ToolCallStats
+
+
+class TestPortfolioTools(unittest.TestCase):
+    def setUp(self):
+        portfolio_tools._portfolio_cache.clear()
+        self.fetcher = Mock()
+        self.fetcher.get_price_history.return_value = [
+            {'date': f"2026-01-{i + 1:02d}", 'close': 100.0 + i} for i in range(30)
+        ]
+        self.tools = PortfolioTools(data_fetcher=self.fetcher)
+        self.tools.prime({
+            'portfolio': [{'symbol': '7203.T', 'quantity': 100}],
+            'stock_prices': {
+                '7203.T': {
+                    'current_price': 2500.0,
+                    'change_percent': 1.0,
+                    'company_name': 'トヨタ自動車',
+                    'currency': 'JPY'
+                }
+            },
+            'usd_jpy_rate': 150.0,
+            'total_value_usd': 0,
+            'total_value_jpy_converted': 250000.0
+        })
+
+    def test_served_from_primed_cache(self):
+        """キャッシュ済みのデータはDataFetcherを呼ばずに返すこと"""
+        holding = self.tools.get_holding('7203')
+        quote = self.tools.get_quote('7203')
+
+        self.assertEqual(holding['holding_value_jpy'], 250000.0)
+        self.assertEqual(quote['company_name'], 'トヨタ自動車')
+        self.fetcher.get_portfolio_with_prices.assert_not_called()
+        self.fetcher.get_quote.assert_not_called()
+
+    def test_tool_functions_record_stats(self):
+        """ツール関数の呼び出し回数と時間が記録されること"""
+        stats = ToolCallStats()
+        functions = {f.__name__: f for f in self.tools.build_tool_functions(stats)}
+
+        functions['get_risk_metrics']()
+        indicators = functions['get_indicators']('7203')
+        history = functions['get_history']('7203', 5)
+
+        self.assertEqual(stats.count, 3)
+        self.assertGreaterEqual(stats.total_ms, 0)
+        self.assertEqual(indicators['latest_close'], 129.0)
+        self.assertEqual(len(history['history']), 5)
+
+    def test_unknown_holding(self):
+        """保有していない銘柄はエラーを返すこと"""
+        self.assertIn('error', self.tools.get_holding('AAPL'))
+
+    def test_portfolio_version_does_not_fetch_prices(self):
+        """スナップショットが期限切れでも、バージョンは保有銘柄だけから求め株価を取得しないこと"""
+        primed = self.tools.portfolio_version()
+        portfolio_tools._portfolio_cache.clear()
+        self.fetcher.get_portfolio_from_sheets.return_value = [{'symbol': '7203.T', 'quantity': 100}]
+
+        self.assertEqual(self.tools.portfolio_version(), primed)
+        self.assertEqual(self.tools.portfolio_version(), primed)
+        self.fetcher.get_portfolio_from_sheets.assert_called_once()
+        self.fetcher.get_portfolio_with_prices.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
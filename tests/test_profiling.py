@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+実行時プロファイリング（profiling）のテストファイル
+"""
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import profiling
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.patches = [patch.object(config, 'PROFILE_DIR', self.tmp.name), patch.object(profiling, '_mode', None)]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in reversed(self.patches):
+            p.stop()
+        self.tmp.cleanup()
+
+    def test_disabled_is_noop(self):
+        """無効時は何も計測せず、関数もそのまま返すこと"""
+        self.assertIs(profiling.profile('main'), profiling._NOOP_PROFILE)
+        self.assertIs(profiling.wrap('job', busy), busy)
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_cli_flag(self):
+        argv = profiling.consume_cli_flag(['main.py', '--profile=cprofile', '--help'])
+        self.assertEqual(argv, ['main.py', '--help'])
+        self.assertTrue(profiling.enabled())
+        with self.assertRaises(ValueError):
+            profiling.set_mode('perf')
+
+    def test_writes_collapsed_stacks_and_top_functions(self):
+        """sample・cprofileとも、collapsed stackと上位関数の要約を出力すること"""
+        for mode in profiling.MODES:
+            with self.subTest(mode=mode):
+                with profiling.profile('main', mode=mode) as prof:
+                    busy(0.05)
+                result = prof.result
+                with open(result['files']['collapsed'], encoding='utf-8') as f:
+                    lines = f.read().splitlines()
+                self.assertTrue(any('busy (test_profiling.py' in line for line in lines))
+                stack, value = lines[0].rsplit(' ', 1)
+                self.assertGreater(int(value), 0)
+                self.assertTrue(any(row['function'].startswith('busy') for row in result['top']))
+                self.assertTrue(os.path.exists(result['files']['top']))
+
+
+if __name__ == '__main__':
+    unittest.main()
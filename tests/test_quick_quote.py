@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+/stock 即答（QuickQuote）のテストファイル
+"""
+
+import threading
+import time
+import unittest
+import sys
+import os
+from unittest.mock import patch
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import quick_quote
+import config
+from quick_quote import QuickQuote, DEFERRED_FAILED_TEXT, PENDING_TEXT
+
+
+class FakeFetcher:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+        self.price = 2800.0
+
+    def get_quote(self, symbol):
+        self.calls += 1
+        time.sleep(self.delay)
+        return {'current_price': self.price, 'previous_price': 2750.0, 'change': self.price - 2750.0,
+                'change_percent': (self.price - 2750.0) / 2750.0 * 100, 'company_name': 'トヨタ自動車', 'currency': 'JPY'}
+
+
+class FakeTools:
+    normalize_symbol = staticmethod(quick_quote.PortfolioTools.normalize_symbol)
+
+    def __init__(self, fetcher, snapshot_delay=0.0):
+        self.data_fetcher = fetcher
+        self.snapshot_delay = snapshot_delay
+        self.fail = False
+        self.snapshots = 0
+
+    def snapshot(self):
+        self.snapshots += 1
+        time.sleep(self.snapshot_delay)
+        if self.fail:
+            return {'portfolio_data': {}, 'analysis': {}}
+        holdings = [
+            {'symbol': '7203.T', 'company_name': 'トヨタ自動車', 'quantity': 100, 'current_price': 2800.0,
+             'currency': 'JPY', 'holding_value_jpy': 280000.0, 'portfolio_weight': 70.0,
+             'daily_change_percent': 1.8, 'daily_pnl_jpy': 5040.0},
+            {'symbol': 'AAPL', 'company_name': 'Apple', 'quantity': 5, 'current_price': 200.0,
+             'currency': 'USD', 'holding_value_jpy': 120000.0, 'portfolio_weight': 30.0,
+             'daily_change_percent': -0.5, 'daily_pnl_jpy': -600.0},
+        ]
+        portfolio = [{'symbol': h['symbol'], 'quantity': h['quantity']} for h in holdings]
+        return {'portfolio_data': {'portfolio': portfolio}, 'analysis': {
+            'total_portfolio_value_jpy': 400000.0, 'holdings_analysis': holdings,
+            'performance_summary': {'weighted_return': 1.11}}}
+
+
+class TestQuickQuote(unittest.TestCase):
+    def setUp(self):
+        quick_quote._last_known.clear()
+        quick_quote._loading.clear()
+
+    def test_parse_routes_free_form_questions_to_llm(self):
+        """定型コマンドは即答、自由形式の質問はNone（Geminiへ）になること"""
+        self.assertEqual(QuickQuote.parse('7203'), ('quote', ['7203']))
+        self.assertEqual(QuickQuote.parse('AAPL 7203'), ('quote', ['AAPL', '7203']))
+        self.assertEqual(QuickQuote.parse('保有 7203'), ('holding', ['7203']))
+        self.assertEqual(QuickQuote.parse('合計'), ('total', []))
+        self.assertEqual(QuickQuote.parse('movers 5'), ('movers', ['5']))
+        self.assertIsNone(QuickQuote.parse('トヨタ株の今後の見通しは？'))
+        self.assertIsNone(QuickQuote.parse('what about tesla'))
+
+    def test_answers_from_cache(self):
+        """2回目以降はデータ取得せずに回答すること"""
+        fetcher = FakeFetcher()
+        quick = QuickQuote(FakeTools(fetcher))
+
+        first = quick.answer('7203')
+        second = quick.answer('7203')
+
+        self.assertIn('7203.T', first)
+        self.assertEqual(first, second)
+        self.assertEqual(fetcher.calls, 1)
+        self.assertIn('¥400,000', quick.answer('合計'))
+        self.assertIn('Apple', quick.answer('値動き'))
+
+    def test_stale_quote_is_served_and_refreshed_in_background(self):
+        """古い株価は即座に返し、裏で再取得すること"""
+        fetcher = FakeFetcher()
+        quick = QuickQuote(FakeTools(fetcher))
+        quick.answer('7203')
+        quick_quote._last_known.get('quote:7203.T')['fetched_at'] -= 3600
+        fetcher.price = 2900.0
+        fetcher.delay = 0.2
+
+        start = time.perf_counter()
+        stale = quick.answer('7203')
+        self.assertLess(time.perf_counter() - start, 0.1)
+        self.assertIn('2,800.00', stale)
+        self.assertIn('更新中', stale)
+
+        quick_quote._loading['quote:7203.T'].result(timeout=5)
+        self.assertIn('2,900.00', quick.answer('7203'))
+
+    def test_failed_snapshot_is_not_kept(self):
+        """取得に失敗した空のポートフォリオは保持せず、次の問い合わせで取得し直すこと"""
+        tools = FakeTools(FakeFetcher())
+        quick = QuickQuote(tools)
+        tools.fail = True
+        self.assertIn('取得できませんでした', quick.answer('合計'))
+        self.assertIsNone(quick_quote._last_known.get('snapshot'))
+
+        tools.fail = False
+        self.assertIn('¥400,000', quick.answer('合計'))
+        self.assertEqual(tools.snapshots, 2)
+
+    def test_cold_data_answers_later(self):
+        """予算内に取得できない場合は保留応答を返し、後から回答を送ること"""
+        done = threading.Event()
+        answers = []
+        quick = QuickQuote(FakeTools(FakeFetcher(), snapshot_delay=0.3), budget_ms=50)
+
+        def deferred(text):
+            answers.append(text)
+            done.set()
+
+        self.assertEqual(quick.answer('合計', deferred=deferred), PENDING_TEXT)
+        self.assertTrue(done.wait(5))
+        self.assertIn('¥400,000', answers[0])
+
+    def test_concurrent_cold_commands_do_not_wedge_loaders(self):
+        """取得スレッド数以上の複数銘柄コマンドが同時に保留されても、すべて後から回答すること"""
+        answers = []
+        lock = threading.Lock()
+        quick = QuickQuote(FakeTools(FakeFetcher(delay=0.2)), budget_ms=20)
+
+        def deferred(text):
+            with lock:
+                answers.append(text)
+
+        for i in range(quick_quote._executor._max_workers):
+            symbols = ' '.join(str(1000 + i * 3 + j) for j in range(3))
+            self.assertEqual(quick.answer(symbols, deferred=deferred), PENDING_TEXT)
+        deadline = time.monotonic() + 10
+        while len(answers) < 4 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(len(answers), 4)
+        self.assertTrue(all(answer.count('トヨタ自動車') == 3 for answer in answers))
+
+    def test_deferred_answer_gives_up_after_timeout(self):
+        """遅延応答の待ち時間を超えた場合は失敗を知らせること"""
+        done = threading.Event()
+        answers = []
+        quick = QuickQuote(FakeTools(FakeFetcher(), snapshot_delay=1.0), budget_ms=20)
+
+        def deferred(text):
+            answers.append(text)
+            done.set()
+
+        with patch.object(config, 'QUICK_QUOTE_DEFERRED_TIMEOUT', 0.1):
+            self.assertEqual(quick.answer('合計', deferred=deferred), PENDING_TEXT)
+            self.assertTrue(done.wait(5))
+        self.assertEqual(answers, [DEFERRED_FAILED_TEXT])
+        for future in list(quick_quote._loading.values()):
+            future.result(timeout=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
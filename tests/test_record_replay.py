@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+実行全体の記録と再生（record_replay）のテストファイル
+記録済み応答の代替サーバー（benchmark.FixtureServer）に対して記録し、サーバーを止めてから再生する
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import record_replay
+import slack_client
+from analyzer import PortfolioAnalyzer
+from benchmark import FixtureServer, _FixtureSession, generate_portfolio, offline_config
+from data_fetcher import DataFetcher, build_portfolio_with_prices
+from mcp_client import MCPClient
+
+
+class FakeWebClient:
+    def __init__(self):
+        self.posts = []
+
+    def chat_postMessage(self, **kwargs):
+        self.posts.append(kwargs)
+        return {'ok': True, 'ts': f"1700000000.{len(self.posts):06d}"}
+
+
+def run_pipeline(sheets_client):
+    """取得から分析・アドバイス・Slack通知までを実行"""
+    fetcher = DataFetcher(connect_sheets=False)
+    fetcher.sheets_client = sheets_client
+    portfolio = fetcher.get_portfolio_from_sheets()
+    stock_prices = fetcher.get_stock_prices([stock['symbol'] for stock in portfolio])
+    portfolio_data = build_portfolio_with_prices(portfolio, stock_prices, fetcher.get_usd_jpy_rate())
+    analyzer = PortfolioAnalyzer()
+    report = analyzer.generate_report(analyzer.analyze_portfolio(portfolio_data))
+    with MCPClient() as mcp:
+        advice = mcp.get_investment_advice(portfolio_data, 'daily')
+    deliveries = slack_client.SlackClient().send_report_with_advice(portfolio_data, report, advice)
+    return portfolio_data, advice, [delivery['ts'] for delivery in deliveries]
+
+
+class TestRecordReplay(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'run.json.gz')
+        self.web_client = FakeWebClient()
+        self.patches = [
+            patch.dict(slack_client._shared_slack, {'web_client': self.web_client, 'checked': True}),
+            patch.object(config, 'SLACK_POST_INTERVAL', 0)
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in reversed(self.patches):
+            p.stop()
+        self.tmp.cleanup()
+
+    def test_replays_recorded_run_offline(self):
+        """記録した実行を、サーバーに接続せず同じ結果・同じSlack投稿で再生すること"""
+        import gspread
+        server = FixtureServer()
+        server.start()
+        try:
+            server.set_portfolio(generate_portfolio(6))
+            with offline_config(server):
+                with record_replay.recording(self.path):
+                    recorded = run_pipeline(gspread.Client(auth=None, session=_FixtureSession(server.base_url)))
+        finally:
+            server.stop()
+        posts = len(self.web_client.posts)
+        self.assertEqual(len(recorded[0]['portfolio']), 6)
+
+        bundle = record_replay.load_bundle(self.path)
+        self.assertEqual(bundle['summary'], {'sheets': 1, 'yahoo.quote': 6, 'fx': 1, 'gemini': 1, 'slack': posts})
+
+        with record_replay.replaying(bundle) as replayer:
+            replayed = run_pipeline(object())
+        self.assertEqual(replayed, recorded)
+        self.assertEqual(len(self.web_client.posts), posts, "再生時にSlackへ投稿しないこと")
+        summary = replayer.summary()
+        self.assertEqual((summary['issues'], summary['unused'], summary['slack_changed']), ({}, 0, 0))
+
+    def test_cli_flags(self):
+        argv = record_replay.consume_cli_flags(['main.py', '--replay', 'run.json.gz', '--replay-timing=preserved'])
+        self.assertEqual(argv, ['main.py'])
+        self.assertEqual(record_replay._cli['timing'], record_replay.PRESERVED)
+        record_replay._cli.update(record=None, replay=None, timing=record_replay.COLLAPSED)
+
+
+if __name__ == '__main__':
+    unittest.main()
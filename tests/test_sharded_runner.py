@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+分散実行（ShardedRunner）のテストファイル
+"""
+
+import unittest
+import sys
+import os
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analyzer import PortfolioAnalyzer
+from data_fetcher import build_portfolio_with_prices
+from sharded_runner import LocalProcessExecutor, ShardedRunner, split_shards
+
+
+def fake_price(symbol):
+    """銘柄コードから決まる株価（プロセスをまたいでも同じ値）"""
+    seed = sum(ord(ch) for ch in symbol)
+    currency = 'JPY' if symbol.endswith('.T') else 'USD'
+    price = seed * (13.7 if currency == 'JPY' else 0.91)
+    return {'current_price': price, 'previous_price': price * 0.99, 'change': price * 0.01,
+            'change_percent': (seed % 7) - 3.1, 'company_name': symbol, 'currency': currency}
+
+
+def fake_worker(symbols):
+    return {'stock_prices': {symbol: fake_price(symbol) for symbol in symbols if not symbol.startswith('X')}}
+
+
+def failing_worker(symbols):
+    if symbols[0] == 'S10.T':
+        raise RuntimeError('worker crashed')
+    return fake_worker(symbols)
+
+
+class FakeFetcher:
+    def __init__(self, portfolio):
+        self.portfolio = portfolio
+        self.fetched = []
+
+    def get_portfolio_from_sheets(self):
+        return self.portfolio
+
+    def get_stock_prices(self, symbols):
+        self.fetched.extend(symbols)
+        return fake_worker(symbols)['stock_prices']
+
+    def get_usd_jpy_rate(self):
+        return 151.23
+
+    def get_portfolio_with_prices(self):
+        symbols = [stock['symbol'] for stock in self.portfolio]
+        return build_portfolio_with_prices(self.portfolio, self.get_stock_prices(symbols), self.get_usd_jpy_rate())
+
+
+def make_portfolio(size):
+    portfolio = []
+    for i in range(size):
+        symbol = f"S{i}.T" if i % 3 else f"US{i}"
+        portfolio.append({'symbol': symbol, 'quantity': (i % 9 + 1) * 10})
+    portfolio.append({'symbol': 'XDELISTED', 'quantity': 5})
+    return portfolio
+
+
+class TestShardedRunner(unittest.TestCase):
+    def test_split_preserves_order(self):
+        shards = split_shards(list(range(10)), 4)
+        self.assertEqual(shards, [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]])
+
+    def test_merged_result_matches_single_process(self):
+        """プロセスプールで分散した結果と分析が単一プロセス実行と完全に一致すること"""
+        portfolio = make_portfolio(47)
+        single = FakeFetcher(portfolio).get_portfolio_with_prices()
+
+        runner = ShardedRunner(LocalProcessExecutor(max_workers=3, worker=fake_worker), shard_size=10)
+        sharded = runner.get_portfolio_with_prices(FakeFetcher(portfolio))
+
+        self.assertEqual(sharded, single)
+        self.assertEqual(list(sharded['stock_prices']), list(single['stock_prices']))
+        analyzer = PortfolioAnalyzer()
+        self.assertEqual(analyzer.analyze_portfolio(sharded), analyzer.analyze_portfolio(single))
+
+    def test_failed_shard_is_refetched_by_coordinator(self):
+        """ワーカーが失敗したシャードはコーディネーターで取得し、結果が欠けないこと"""
+        portfolio = make_portfolio(30)
+        single = FakeFetcher(portfolio).get_portfolio_with_prices()
+        coordinator = FakeFetcher(portfolio)
+
+        runner = ShardedRunner(LocalProcessExecutor(max_workers=3, worker=failing_worker), shard_size=10)
+        sharded = runner.get_portfolio_with_prices(coordinator)
+
+        self.assertEqual(sharded, single)
+        self.assertEqual(coordinator.fetched[0], 'S10.T')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+SlackClientのテストファイル
+"""
+
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import slack_client
+from slack_client import SlackClient
+
+
+class TestSharedClients(unittest.TestCase):
+    def setUp(self):
+        slack_client._shared_slack.update({'web_client': None, 'identity': None, 'checked': False})
+
+    def tearDown(self):
+        slack_client._shared_slack.update({'web_client': None, 'identity': None, 'checked': False})
+
+    def test_auth_test_runs_once_per_process(self):
+        """auth_testはプロセス内で1回だけ呼ばれ、Bot情報がキャッシュされること"""
+        with patch.object(slack_client.config, 'SLACK_BOT_TOKEN', 'xoxb-test'), \
+                patch.object(slack_client, 'WebClient') as web_client_cls:
+            web_client_cls.return_value.auth_test.return_value = {'user': 'kabukan', 'user_id': 'U0BOT'}
+
+            clients = [SlackClient() for _ in range(3)]
+            web_client_cls.assert_not_called()
+
+            self.assertTrue(all(client.client is not None for client in clients))
+            self.assertEqual(clients[0].bot_identity['user_id'], 'U0BOT')
+            web_client_cls.assert_called_once()
+            web_client_cls.return_value.auth_test.assert_called_once()
+
+    def test_gemini_model_is_created_lazily(self):
+        """Geminiモデルは初回利用時まで生成されないこと"""
+        with patch.object(slack_client, 'get_model') as get_model, \
+                patch.object(slack_client, 'configure_gemini'), \
+                patch.object(slack_client.config, 'GOOGLE_API_KEY', 'key'):
+            client = SlackClient()
+            get_model.assert_not_called()
+            self.assertTrue(client.gemini_available)
+
+            model = client.gemini_model
+            self.assertIs(model, get_model.return_value)
+            self.assertIs(client.gemini_model, model)
+            get_model.assert_called_once()
+
+
+class TestHandleUserQuestion(unittest.TestCase):
+    def test_follow_up_is_threaded_with_history(self):
+        """回答は質問のスレッドに返信され、続きの質問には前の往復が渡されること"""
+        from conversation_memory import ConversationMemory
+        from unittest.mock import MagicMock
+
+        client = SlackClient()
+        client.client = MagicMock()
+        client._gemini_model = MagicMock()
+        client.portfolio_tools = None
+        client.answer_cache = None
+        client.conversation_memory = ConversationMemory(max_users=10, max_threads_per_user=2, max_tokens=500, summary_tokens=100)
+        prompts = []
+
+        def generate(prompt, question=""):
+            prompts.append(prompt)
+            return MagicMock(text=f"回答{len(prompts)}")
+
+        with patch.object(client, '_generate_answer', side_effect=generate):
+            client.handle_user_question("トヨタの株価は？", 'U1', 'C1', '100.1')
+            client.handle_user_question("配当はいくら？", 'U1', 'C1', '100.1')
+
+        self.assertNotIn('これまでの会話', prompts[0])
+        self.assertIn('トヨタの株価は？', prompts[1])
+        self.assertIn('回答1', prompts[1])
+        for call in client.client.chat_postMessage.call_args_list:
+            self.assertEqual(call.kwargs['thread_ts'], '100.1')
+
+    def test_slash_questions_do_not_share_history(self):
+        """スレッドのないスラッシュコマンドの質問は、無関係な過去の質問を文脈にせず回答キャッシュも使うこと"""
+        from answer_cache import AnswerCache
+        from conversation_memory import ConversationMemory
+        from unittest.mock import MagicMock
+
+        client = SlackClient()
+        client.client = MagicMock()
+        client._gemini_model = MagicMock()
+        client.portfolio_tools = None
+        client.answer_cache = AnswerCache(ttl_seconds=600, threshold=0.7)
+        client.conversation_memory = ConversationMemory(max_users=10, max_threads_per_user=2, max_tokens=500, summary_tokens=100)
+        prompts = []
+
+        def generate(prompt, question=""):
+            prompts.append(prompt)
+            return MagicMock(text=f"回答{len(prompts)}")
+
+        with patch.object(client, '_generate_answer', side_effect=generate):
+            client.handle_user_question("トヨタの株価は？", 'U1', 'C1')
+            client.handle_user_question("ソニーの配当はいくら？", 'U1', 'C1')
+            client.handle_user_question("トヨタの株価は?", 'U1', 'C1')
+
+        self.assertEqual(len(prompts), 2)
+        self.assertNotIn('これまでの会話', prompts[1])
+        self.assertNotIn('トヨタ', prompts[1])
+        self.assertEqual(client.answer_cache.stats()['hits'], 1)
+        self.assertEqual(client.conversation_memory.stats()['threads'], 0)
+
+    def test_tool_stats_are_recorded_per_answer(self):
+        """ツール呼び出しの回数と時間を回答ごとに計測へ記録すること"""
+        from unittest.mock import MagicMock
+        from instrumentation import Instrumentation
+
+        client = SlackClient()
+        client._gemini_model = MagicMock()
+        client.router = None
+        client.portfolio_tools = MagicMock()
+
+        def build_tool_functions(stats):
+            stats.record('get_quote', 12.0)
+            stats.record('get_holding', 3.0)
+            return []
+
+        client.portfolio_tools.build_tool_functions.side_effect = build_tool_functions
+        recorder = Instrumentation(enabled=True)
+        with patch('instrumentation._instrumentation', recorder):
+            client._generate_answer("prompt", "トヨタの株価は？")
+            client._generate_answer("prompt", "配当は？")
+
+        summary = recorder.summary()
+        self.assertEqual(summary['counters']['tools.calls'], 4)
+        self.assertEqual(summary['stages']['tools.total_ms']['count'], 2)
+        self.assertEqual(summary['stages']['tools.total_ms']['total_ms'], 30.0)
+        self.assertFalse(hasattr(client, 'last_tool_stats'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Slack送信キュー（SlackDeliveryQueue）のテストファイル
+"""
+
+import socket
+import unittest
+import sys
+import os
+from urllib.error import URLError
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web import SlackResponse
+from slack_client import SlackDeliveryQueue, split_message
+
+
+def rate_limited_error(retry_after='2'):
+    """429応答のSlackApiErrorを生成"""
+    response = SlackResponse(
+        client=None, http_verb='POST', api_url='https://slack.com/api/chat.postMessage',
+        req_args={}, data={'ok': False, 'error': 'ratelimited'},
+        headers={'Retry-After': retry_after}, status_code=429
+    )
+    return SlackApiError('ratelimited', response)
+
+
+class FakeWebClient:
+    """chat_postMessageの呼び出しを記録し、指定回数だけ429を返す"""
+
+    def __init__(self, rate_limited=0):
+        self.rate_limited = rate_limited
+        self.posts = []
+
+    def chat_postMessage(self, **kwargs):
+        if self.rate_limited:
+            self.rate_limited -= 1
+            raise rate_limited_error()
+        self.posts.append(kwargs)
+        return {'ok': True, 'ts': f"1700000000.{len(self.posts):06d}"}
+
+
+class TestSlackDeliveryQueue(unittest.TestCase):
+    def setUp(self):
+        self.sleeps = []
+
+    def make_queue(self, client):
+        return SlackDeliveryQueue(client, min_interval=0, max_retries=3, sleep=self.sleeps.append)
+
+    def test_continuations_are_threaded_under_report(self):
+        """続きのメッセージはレポートのスレッドに投稿されること"""
+        client = FakeWebClient()
+        queue = self.make_queue(client)
+        queue.enqueue("report", channel='C1', key='report')
+        queue.enqueue("part1", channel='C1', in_thread=True)
+        queue.enqueue("part2", channel='C1', in_thread=True)
+
+        results = queue.flush()
+
+        self.assertTrue(all(result['ok'] for result in results))
+        self.assertNotIn('thread_ts', client.posts[0])
+        self.assertEqual(client.posts[1]['thread_ts'], results[0]['ts'])
+        self.assertEqual(client.posts[2]['thread_ts'], results[0]['ts'])
+        self.assertEqual([post['text'] for post in client.posts], ["report", "part1", "part2"])
+
+    def test_honors_retry_after(self):
+        """429の場合はRetry-Afterだけ待って再送し、メッセージを失わないこと"""
+        client = FakeWebClient(rate_limited=2)
+        queue = self.make_queue(client)
+        queue.enqueue("report", channel='C1')
+
+        result = queue.flush()[0]
+
+        self.assertTrue(result['ok'])
+        self.assertEqual(result['attempts'], 3)
+        self.assertEqual(self.sleeps, [2.0, 2.0])
+
+    def test_non_retryable_error_fails_fast(self):
+        """レート制限以外のAPIエラーは再送しないこと"""
+        class FailingClient:
+            def chat_postMessage(self, **kwargs):
+                response = SlackResponse(
+                    client=None, http_verb='POST', api_url='', req_args={},
+                    data={'ok': False, 'error': 'channel_not_found'}, headers={}, status_code=200
+                )
+                raise SlackApiError('channel_not_found', response)
+
+        queue = self.make_queue(FailingClient())
+        queue.enqueue("report", channel='C1')
+        result = queue.flush()[0]
+
+        self.assertFalse(result['ok'])
+        self.assertEqual(result['error'], 'channel_not_found')
+        self.assertEqual(result['attempts'], 1)
+
+    def test_retries_only_when_post_was_not_delivered(self):
+        """接続エラーと5xxは再送し、応答待ちのタイムアウトは二重投稿を避けて再送しないこと"""
+        class FlakyClient(FakeWebClient):
+            def __init__(self, errors):
+                super().__init__()
+                self.errors = list(errors)
+                self.calls = 0
+
+            def chat_postMessage(self, **kwargs):
+                self.calls += 1
+                if self.errors:
+                    raise self.errors.pop(0)
+                return super().chat_postMessage(**kwargs)
+
+        server_error = SlackApiError('internal_error', SlackResponse(
+            client=None, http_verb='POST', api_url='', req_args={},
+            data={'ok': False, 'error': 'internal_error'}, headers={}, status_code=503
+        ))
+        client = FlakyClient([URLError(ConnectionRefusedError()), server_error])
+        queue = self.make_queue(client)
+        queue.enqueue("report", channel='C1')
+        result = queue.flush()[0]
+        self.assertTrue(result['ok'])
+        self.assertEqual(result['attempts'], 3)
+
+        client = FlakyClient([socket.timeout('The read operation timed out')])
+        queue = self.make_queue(client)
+        queue.enqueue("report", channel='C1')
+        result = queue.flush()[0]
+        self.assertFalse(result['ok'])
+        self.assertEqual((result['attempts'], client.calls), (1, 1))
+
+    def test_thread_parts_wait_for_failed_root(self):
+        """親のレポートが投稿できなかった場合、スレッドの続きをスレッド外に投稿しないこと"""
+        class RootFailsOnce(FakeWebClient):
+            def __init__(self):
+                super().__init__()
+                self.failed = False
+
+            def chat_postMessage(self, **kwargs):
+                if not self.failed:
+                    self.failed = True
+                    raise SlackApiError('internal_error', SlackResponse(
+                        client=None, http_verb='POST', api_url='', req_args={},
+                        data={'ok': False, 'error': 'channel_not_found'}, headers={}, status_code=200
+                    ))
+                return super().chat_postMessage(**kwargs)
+
+        client = RootFailsOnce()
+        delivered = {}
+        queue = SlackDeliveryQueue(client, min_interval=0, max_retries=0, sleep=self.sleeps.append,
+                                   on_delivered=lambda result: delivered.update({result['key']: result['ts']}))
+        queue.enqueue("report", channel='C1', key='report')
+        queue.enqueue("part1", channel='C1', in_thread=True, key='advice_1')
+        results = queue.flush()
+
+        self.assertEqual([result['ok'] for result in results], [False, False])
+        self.assertEqual(results[1]['error'], 'thread_root_not_posted')
+        self.assertEqual((client.posts, delivered), ([], {}))
+
+        # 再試行ではレポートを投稿し、続きをそのスレッドに投稿する
+        queue = SlackDeliveryQueue(client, min_interval=0, max_retries=0, sleep=self.sleeps.append, delivered=delivered)
+        queue.enqueue("report", channel='C1', key='report')
+        queue.enqueue("part1", channel='C1', in_thread=True, key='advice_1')
+        results = queue.flush()
+        self.assertTrue(all(result['ok'] for result in results))
+        self.assertEqual(client.posts[1]['thread_ts'], results[0]['ts'])
+
+    def test_split_message_keeps_all_text(self):
+        """分割しても内容が欠けないこと"""
+        text = "\n".join(f"行{i}: " + "あ" * 50 for i in range(200))
+        parts = split_message(text, max_length=3000)
+
+        self.assertTrue(all(len(part) <= 3000 for part in parts))
+        self.assertEqual("".join(parts).replace("\n", ""), text.replace("\n", ""))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+CloudWatchアラーム通知Lambda（slack_notifier_lambda）のテストファイル
+"""
+
+import json
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import slack_notifier_lambda
+
+
+def sns_record(alarm_name, state, timestamp='2026-10-19T00:00:00.000+0000'):
+    message = {
+        'AlarmName': alarm_name, 'AlarmDescription': 'desc', 'NewStateValue': state,
+        'OldStateValue': 'OK' if state == 'ALARM' else 'ALARM', 'NewStateReason': 'reason',
+        'StateChangeTime': timestamp, 'Region': 'Asia Pacific (Tokyo)',
+        'Trigger': {'MetricName': 'Errors', 'Namespace': 'AWS/Lambda', 'Threshold': 1.0}
+    }
+    return {'Sns': {'Message': json.dumps(message)}}
+
+
+class FakeResponse:
+    status = 200
+    data = b'ok'
+
+
+class FakeHttp:
+    def __init__(self):
+        self.bodies = []
+
+    def request(self, method, url, body=None, headers=None):
+        self.bodies.append(json.loads(body))
+        return FakeResponse()
+
+
+class TestSlackNotifierLambda(unittest.TestCase):
+    def setUp(self):
+        self.http = FakeHttp()
+        self.patches = [
+            patch.dict(os.environ, {'SLACK_WEBHOOK_URL': 'https://hooks.example/test'}),
+            patch.object(slack_notifier_lambda, 'http', self.http),
+            patch.dict(slack_notifier_lambda._recently_sent, clear=True),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in reversed(self.patches):
+            p.stop()
+
+    def test_batch_is_coalesced_into_one_message(self):
+        """バッチ内の全レコードをアラーム名と状態でまとめ、1回だけ送信すること"""
+        records = [sns_record('kabukan-errors', 'ALARM', f'2026-10-19T00:0{i}:00.000+0000') for i in range(5)]
+        records += [sns_record('kabukan-timeout', 'ALARM'), {'Sns': {'Message': 'plain text', 'Subject': 'note'}}]
+
+        result = slack_notifier_lambda.lambda_handler({'Records': records}, None)
+
+        self.assertEqual(result['statusCode'], 200)
+        self.assertEqual(len(self.http.bodies), 1)
+        attachments = self.http.bodies[0]['attachments']
+        self.assertEqual(len(attachments), 3)
+        self.assertEqual(attachments[0]['title'], '🚨 CloudWatch アラーム: kabukan-errors ×5')
+        self.assertIn('2026-10-19T00:00:00.000+0000 〜 2026-10-19T00:04:00.000+0000',
+                      [field['value'] for field in attachments[0]['fields']])
+
+    def test_duplicates_within_window_are_suppressed(self):
+        """通知済みの同じアラーム・状態は時間枠内で再送せず、状態が変われば送ること"""
+        slack_notifier_lambda.lambda_handler({'Records': [sns_record('kabukan-errors', 'ALARM')]}, None)
+        slack_notifier_lambda.lambda_handler({'Records': [sns_record('kabukan-errors', 'ALARM')]}, None)
+        self.assertEqual(len(self.http.bodies), 1)
+
+        slack_notifier_lambda.lambda_handler({'Records': [sns_record('kabukan-errors', 'OK')]}, None)
+        self.assertEqual(len(self.http.bodies), 2)
+        self.assertTrue(self.http.bodies[1]['attachments'][0]['title'].startswith('✅'))
+
+    def test_flapping_alarm_is_notified_again(self):
+        """ALARM → OK → ALARM と戻った場合は時間枠内でも再びALARMを通知すること"""
+        for state in ('ALARM', 'OK', 'ALARM'):
+            slack_notifier_lambda.lambda_handler({'Records': [sns_record('kabukan-errors', state)]}, None)
+        self.assertEqual(len(self.http.bodies), 3)
+        self.assertTrue(self.http.bodies[2]['attachments'][0]['title'].startswith('🚨'))
+
+        # 通知済みがALARMでも、同じバッチ内でOKを挟めばALARMを抑制しない
+        records = [sns_record('kabukan-errors', 'OK', '2026-10-19T00:01:00.000+0000'),
+                   sns_record('kabukan-errors', 'ALARM', '2026-10-19T00:02:00.000+0000')]
+        groups, suppressed = slack_notifier_lambda.coalesce_alarms([slack_notifier_lambda.parse_record(r) for r in records])
+        self.assertEqual(([group['new_state'] for group in groups], suppressed), (['OK', 'ALARM'], 0))
+        slack_notifier_lambda.remember_sent(groups)
+        self.assertEqual(slack_notifier_lambda._recently_sent['kabukan-errors'][0], 'ALARM')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+日次スナップショット（SnapshotStore）と月次集計のテストファイル
+"""
+
+import unittest
+import sys
+import os
+import tempfile
+from datetime import date
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analyzer import PortfolioAnalyzer
+from data_fetcher import build_portfolio_with_prices
+from object_store import LocalObjectStore
+from snapshot_store import (SnapshotStore, build_snapshot, compute_month_stats, report_month,
+                            snapshot_to_portfolio_data)
+
+
+def make_portfolio_data(prices, quantities, usd_jpy_rate=150.0):
+    """prices: {銘柄: (前日終値, 現在値)}"""
+    portfolio = [{'symbol': symbol, 'quantity': quantity, 'sector': 'Tech'} for symbol, quantity in quantities.items()]
+    stock_prices = {}
+    for symbol, (previous, current) in prices.items():
+        stock_prices[symbol] = {
+            'current_price': current, 'previous_price': previous, 'change': current - previous,
+            'change_percent': (current - previous) / previous * 100, 'company_name': symbol,
+            'currency': 'JPY' if symbol.endswith('.T') else 'USD'
+        }
+    return build_portfolio_with_prices(portfolio, stock_prices, usd_jpy_rate)
+
+
+def make_snapshot(day, prices, quantities):
+    portfolio_data = make_portfolio_data(prices, quantities)
+    return build_snapshot(portfolio_data, PortfolioAnalyzer().analyze_portfolio(portfolio_data), date(2026, 9, day))
+
+
+class TestSnapshotStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = SnapshotStore(LocalObjectStore(self.tmp.name))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip_restores_portfolio_data(self):
+        """保存したスナップショットから取得時と同じポートフォリオデータを復元できること"""
+        portfolio_data = make_portfolio_data({'7203.T': (2900, 3000), 'AAPL': (200, 210)},
+                                             {'7203.T': 100, 'AAPL': 10, 'XDELISTED': 5})
+        snapshot = build_snapshot(portfolio_data, PortfolioAnalyzer().analyze_portfolio(portfolio_data), date(2026, 9, 1))
+        key = self.store.save(snapshot)
+
+        self.assertEqual(key, 'snapshots/2026/09/2026-09-01.json.gz')
+        self.assertEqual(snapshot_to_portfolio_data(self.store.load(key)), portfolio_data)
+
+    def test_month_index_lists_days_in_order(self):
+        prices = {'7203.T': (2900, 3000)}
+        for day in (3, 1, 2):
+            self.store.save(make_snapshot(day, prices, {'7203.T': 100}))
+
+        index = self.store.load_index(2026, 9)
+        self.assertEqual(list(index['days']), ['2026-09-01', '2026-09-02', '2026-09-03'])
+        self.assertEqual([s['date'] for s in self.store.month_snapshots(2026, 9)],
+                         ['2026-09-01', '2026-09-02', '2026-09-03'])
+        self.assertEqual(self.store.month_snapshots(2026, 10), [])
+
+    def test_month_stats(self):
+        """月初来リターンは売買の影響を除いて連結し、ドローダウンと回転率を計算すること"""
+        snapshots = [
+            make_snapshot(1, {'7203.T': (1000, 1100)}, {'7203.T': 100}),
+            make_snapshot(2, {'7203.T': (1100, 990)}, {'7203.T': 100}),
+            # 買い増し（評価額は増えるがリターンには含めない）
+            make_snapshot(3, {'7203.T': (990, 1089)}, {'7203.T': 200}),
+        ]
+        stats = compute_month_stats(snapshots)
+
+        self.assertEqual(stats['days'], 3)
+        self.assertAlmostEqual(stats['mtd_return_percent'], (1.1 * 0.9 * 1.1 - 1) * 100)
+        self.assertAlmostEqual(stats['max_drawdown_percent'], -10.0)
+        self.assertAlmostEqual(stats['end_value_jpy'], 217800)
+        # 100株 × 1089円 の片道を平均評価額で割る
+        average = (110000 + 99000 + 217800) / 3
+        self.assertAlmostEqual(stats['turnover_percent'], 108900 / 2 / average * 100)
+
+    def test_report_month(self):
+        self.assertEqual(report_month(date(2026, 10, 1)), (2026, 9))
+        self.assertEqual(report_month(date(2026, 10, 19)), (2026, 10))
+
+
+if __name__ == '__main__':
+    unittest.main()
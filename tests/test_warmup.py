@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+寄り付き前のキャッシュウォームアップのテストファイル
+"""
+
+import unittest
+import sys
+import os
+import tempfile
+from datetime import datetime
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from object_store import LocalObjectStore
+from snapshot_store import JST
+from warmup import WarmCache, apply_warm_cache, merge_history, quote_is_final, run_warmup
+
+
+def quote(price, currency):
+    return {'current_price': price, 'previous_price': price, 'change': 0.0, 'change_percent': 0.0,
+            'company_name': 'name', 'currency': currency}
+
+
+class FakeFetcher:
+    def __init__(self):
+        self.quote_requests = []
+        self.history_requests = []
+
+    def get_portfolio_from_sheets(self):
+        return [{'symbol': '7203.T', 'quantity': 100}, {'symbol': 'AAPL', 'quantity': 10}]
+
+    def get_stock_prices(self, symbols):
+        self.quote_requests.append(list(symbols))
+        return {symbol: quote(3000.0 if symbol.endswith('.T') else 200.0, 'JPY' if symbol.endswith('.T') else 'USD')
+                for symbol in symbols}
+
+    def get_usd_jpy_rate(self):
+        return 150.0
+
+    def get_price_history(self, symbol, range_='3mo'):
+        self.history_requests.append((symbol, range_))
+        days = 60 if range_ == '3mo' else 5
+        return [{'date': f"2026-{8 + (i // 30):02d}-{i % 30 + 1:02d}", 'close': 100.0 + i} for i in range(days)]
+
+
+class TestWarmup(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = LocalObjectStore(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_quote_is_final(self):
+        """米国株は引け後に取得していれば朝の実行で再利用し、東証は寄り付き後に取得し直すこと"""
+        warmed = datetime(2026, 10, 20, 6, 15, tzinfo=JST)
+        morning = datetime(2026, 10, 20, 9, 0, tzinfo=JST)
+        self.assertTrue(quote_is_final('AAPL', warmed, morning))
+        self.assertFalse(quote_is_final('7203.T', warmed, morning))
+        # 米国市場の立会中に取得した株価は確定していない
+        self.assertFalse(quote_is_final('AAPL', datetime(2026, 10, 20, 1, 0, tzinfo=JST), morning))
+        # 冬時間（引け 6:00 JST）の 6:15 は確定待ち（20分）の途中のため再利用しない
+        winter_morning = datetime(2026, 12, 1, 9, 0, tzinfo=JST)
+        self.assertFalse(quote_is_final('AAPL', datetime(2026, 12, 1, 6, 15, tzinfo=JST), winter_morning,
+                                        settle_seconds=1200))
+        self.assertTrue(quote_is_final('AAPL', datetime(2026, 12, 1, 6, 30, tzinfo=JST), winter_morning,
+                                       settle_seconds=1200))
+
+    def test_merge_history(self):
+        existing = [{'date': '2026-10-01', 'close': 1.0}, {'date': '2026-10-02', 'close': 2.0}]
+        fresh = [{'date': '2026-10-02', 'close': 2.5}, {'date': '2026-10-03', 'close': 3.0}]
+        self.assertEqual([p['close'] for p in merge_history(existing, fresh, days=2)], [2.5, 3.0])
+
+    def test_morning_run_fetches_only_open_markets(self):
+        """朝の実行はウォームアップ結果を使い、東証の銘柄だけを取得すること"""
+        run_warmup('2026-10-20', data_fetcher=FakeFetcher(), store=self.store)
+        bundle = WarmCache(self.store).load('2026-10-20')
+        bundle['fetched_at'] = datetime(2026, 10, 20, 6, 15, tzinfo=JST).isoformat()
+
+        morning = FakeFetcher()
+        portfolio, stock_prices, usd_jpy_rate, report = apply_warm_cache(
+            bundle, morning, now=datetime(2026, 10, 20, 9, 0, tzinfo=JST))
+
+        self.assertEqual(morning.quote_requests, [['7203.T']])
+        self.assertEqual(len(portfolio), 2)
+        self.assertEqual(usd_jpy_rate, 150.0)
+        self.assertEqual((report['quotes_hit'], report['quotes_fetched']), (1, 1))
+        self.assertIn('rsi_14', stock_prices['AAPL']['indicators'])
+
+    def test_history_gaps_only(self):
+        """保存済みの履歴が新しければ直近分だけを取得すること"""
+        fetcher = FakeFetcher()
+        run_warmup('2026-10-20', data_fetcher=fetcher, store=self.store)
+        history = WarmCache(self.store).load_history()
+        for symbol in history:
+            history[symbol][-1]['date'] = datetime.now(JST).date().isoformat()
+        WarmCache(self.store).save_history(history)
+
+        fetcher = FakeFetcher()
+        run_warmup('2026-10-21', data_fetcher=fetcher, store=self.store)
+        self.assertEqual(sorted(fetcher.history_requests), [('7203.T', '5d'), ('AAPL', '5d')])
+
+
+if __name__ == '__main__':
+    unittest.main()
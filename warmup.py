@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+寄り付き前のキャッシュウォームアップ
+
+前日の取引終了後（米国市場の引け後、日本時間の早朝）に実行し、保有銘柄・終値・銘柄情報・為替・価格履歴を
+取得してテクニカル指標を計算し、永続キャッシュ（オブジェクトストアの warm/ 以下）に保存する。
+朝の通知（lambda_main）はこれを読み込み、ウォームアップ後に取引が始まった市場の銘柄だけを取得し直す。
+
+使用方法:
+    python warmup.py                 # 今日（日本時間）の朝の実行向けにウォームアップ
+    python warmup.py --date 2026-10-20
+"""
+
+import argparse
+import gzip
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import config
+from instrumentation import count, span
+from market_calendar import is_open, market_for_symbol, next_open, previous_close
+from object_store import get_object_store
+from snapshot_store import JST, today_jst
+
+WARMUP_MODE = 'warmup'
+
+# 保持する価格履歴の日数（指標の計算に使う）
+HISTORY_DAYS = 90
+
+
+def quote_is_final(symbol: str, fetched_at: datetime, now: datetime,
+                   settle_seconds: Optional[float] = None) -> bool:
+    """
+    ウォームアップ時に取得した株価がそのまま使えるか
+    取得時点で市場が引けてから終値の確定待ち（QUOTE_SETTLE_SECONDS）を過ぎており、
+    その後に立会が始まっていなければ終値は変わらない
+    Args:
+        symbol: 銘柄コード
+        fetched_at: 取得日時
+        now: 現在日時
+        settle_seconds: 引け後に終値が確定するまでの待ち時間（秒、省略時は設定値）
+    Returns:
+        bool: 再利用できるかどうか
+    """
+    settle_seconds = config.QUOTE_SETTLE_SECONDS if settle_seconds is None else settle_seconds
+    market = market_for_symbol(symbol)
+    if is_open(market, fetched_at):
+        return False
+    try:
+        if (fetched_at - previous_close(market, fetched_at)).total_seconds() < settle_seconds:
+            return False
+        return next_open(market, fetched_at) > now
+    except ValueError:
+        return False
+
+
+def merge_history(existing: List[Dict], fresh: List[Dict], days: int = HISTORY_DAYS) -> List[Dict]:
+    """
+    保存済みの価格履歴に新しく取得した分を統合（同じ日付は新しい値を優先）
+    Args:
+        existing: 保存済みの履歴
+        fresh: 新しく取得した履歴
+        days: 保持する件数
+    Returns:
+        List[Dict]: 日付順の履歴
+    """
+    by_date = {point['date']: point for point in existing}
+    by_date.update({point['date']: point for point in fresh})
+    return [by_date[key] for key in sorted(by_date)][-days:]
+
+
+class WarmCache:
+    """ウォームアップ結果の保存先（日付ごとのバンドルと、銘柄ごとの価格履歴）"""
+
+    PREFIX = 'warm'
+
+    def __init__(self, store=None):
+        self.store = store or get_object_store()
+
+    def _get_json(self, key: str) -> Optional[Dict]:
+        body = self.store.get(key)
+        return None if body is None else json.loads(gzip.decompress(body))
+
+    def _put_json(self, key: str, value: Dict):
+        self.store.put(key, gzip.compress(json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')))
+
+    def load(self, run_date: str) -> Optional[Dict]:
+        """
+        朝の実行向けのバンドルを読み込み
+        Args:
+            run_date: 朝の実行のスケジュール日（YYYY-MM-DD）
+        Returns:
+            Dict: バンドル（ない場合はNone）
+        """
+        return self._get_json(f"{self.PREFIX}/{run_date}.json.gz")
+
+    def save(self, bundle: Dict) -> str:
+        key = f"{self.PREFIX}/{bundle['date']}.json.gz"
+        self._put_json(key, bundle)
+        return key
+
+    def load_history(self) -> Dict[str, List[Dict]]:
+        """銘柄ごとの保存済み価格履歴"""
+        return self._get_json(f"{self.PREFIX}/history.json.gz") or {}
+
+    def save_history(self, history: Dict[str, List[Dict]]):
+        self._put_json(f"{self.PREFIX}/history.json.gz", history)
+
+
+def _update_history(data_fetcher, symbols: List[str], history: Dict[str, List[Dict]],
+                    today: date) -> Tuple[Dict[str, List[Dict]], Dict[str, int]]:
+    """不足している期間だけ価格履歴を取得して統合"""
+    def fetch(symbol: str) -> Tuple[str, List[Dict], str]:
+        existing = history.get(symbol) or []
+        recent = existing and date.fromisoformat(existing[-1]['date']) >= today - timedelta(days=5)
+        range_ = '5d' if recent else '3mo'
+        return symbol, merge_history(existing, data_fetcher.get_price_history(symbol, range_)), range_
+
+    stats = {'gap': 0, 'full': 0}
+    updated = {}
+    with ThreadPoolExecutor(max_workers=min(8, max(1, len(symbols)))) as executor:
+        for symbol, merged, range_ in executor.map(fetch, symbols):
+            updated[symbol] = merged
+            stats['gap' if range_ == '5d' else 'full'] += 1
+    return updated, stats
+
+
+def run_warmup(run_date: Optional[str] = None, data_fetcher=None, store=None) -> Dict:
+    """
+    朝の実行に必要なデータを事前に取得して保存
+    Args:
+        run_date: 朝の実行のスケジュール日（省略時は日本時間の今日）
+        data_fetcher: 使用するDataFetcher（省略時は生成）
+        store: 保存先のオブジェクトストア
+    Returns:
+        Dict: ウォームアップの結果
+    """
+    from analyzer import PortfolioAnalyzer
+    if data_fetcher is None:
+        from data_fetcher import DataFetcher
+        data_fetcher = DataFetcher()
+    run_date = run_date or today_jst().isoformat()
+    cache = WarmCache(store)
+
+    with span('warmup.sheets'):
+        portfolio = data_fetcher.get_portfolio_from_sheets()
+    if not portfolio:
+        print("❌ ウォームアップ: ポートフォリオを取得できませんでした")
+        return {'ok': False, 'date': run_date}
+    symbols = [stock['symbol'] for stock in portfolio]
+
+    fetched_at = datetime.now(JST)
+    with span('warmup.quotes', symbols=len(symbols)):
+        quotes = data_fetcher.get_stock_prices(symbols)
+    with span('fx.fetch'):
+        usd_jpy_rate = data_fetcher.get_usd_jpy_rate()
+
+    with span('warmup.history', symbols=len(symbols)):
+        history, history_stats = _update_history(data_fetcher, symbols, cache.load_history(), fetched_at.date())
+    cache.save_history(history)
+
+    # 前日終値までの履歴から指標を事前計算（朝の実行では再計算しない）
+    analyzer = PortfolioAnalyzer()
+    with span('warmup.indicators'):
+        indicators = {
+            symbol: analyzer.calculate_indicators([point['close'] for point in points])
+            for symbol, points in history.items() if points
+        }
+
+    key = cache.save({
+        'date': run_date,
+        'fetched_at': fetched_at.isoformat(),
+        'portfolio': portfolio,
+        'quotes': quotes,
+        'usd_jpy_rate': usd_jpy_rate,
+        'indicators': indicators
+    })
+    result = {
+        'ok': True,
+        'date': run_date,
+        'key': key,
+        'holdings': len(portfolio),
+        'quotes': len(quotes),
+        'history_gap_fetches': history_stats['gap'],
+        'history_full_fetches': history_stats['full'],
+        'indicators': len(indicators)
+    }
+    print(f"🔥 ウォームアップ完了: {json.dumps(result, ensure_ascii=False)}")
+    return result
+
+
+def apply_warm_cache(bundle: Dict, data_fetcher, now: Optional[datetime] = None) -> Tuple[List[Dict], Dict[str, Dict], float, Dict]:
+    """
+    ウォームアップ結果を使ってポートフォリオと株価を揃える
+    ウォームアップ後に立会が始まった市場の銘柄だけ株価を取得し直す
+    Args:
+        bundle: ウォームアップのバンドル
+        data_fetcher: 株価の取得に使うDataFetcher
+        now: 現在日時（省略時は現在）
+    Returns:
+        Tuple: (保有銘柄, 銘柄ごとの株価情報, USD/JPY為替レート, キャッシュヒットの内訳)
+    """
+    now = now or datetime.now(JST)
+    fetched_at = datetime.fromisoformat(bundle['fetched_at'])
+    portfolio = bundle['portfolio']
+    quotes = bundle['quotes']
+    indicators = bundle.get('indicators', {})
+
+    reused = [stock['symbol'] for stock in portfolio
+              if stock['symbol'] in quotes and quote_is_final(stock['symbol'], fetched_at, now)]
+    reused_symbols = set(reused)
+    refetch = [stock['symbol'] for stock in portfolio if stock['symbol'] not in reused_symbols]
+    fresh = data_fetcher.get_stock_prices(refetch) if refetch else {}
+
+    stock_prices = {}
+    stale = 0
+    for stock in portfolio:
+        symbol = stock['symbol']
+        price_info = fresh.get(symbol) if symbol in refetch else quotes.get(symbol)
+        if price_info is None and symbol in quotes:
+            # 取得に失敗した銘柄は前日終値で代用
+            price_info = quotes[symbol]
+            stale += 1
+        if price_info is None:
+            continue
+        price_info = dict(price_info)
+        if indicators.get(symbol):
+            price_info['indicators'] = indicators[symbol]
+        stock_prices[symbol] = price_info
+
+    count('warm.quote_hit', len(reused))
+    count('warm.quote_miss', len(refetch))
+    report = {
+        'warm_date': bundle['date'],
+        'warmed_at': bundle['fetched_at'],
+        'portfolio': 'hit',
+        'fx': 'hit',
+        'indicators': 'hit' if indicators else 'miss',
+        'quotes_hit': len(reused),
+        'quotes_fetched': len(refetch),
+        'quotes_stale': stale
+    }
+    print(f"♨️ ウォームキャッシュ使用: {json.dumps(report, ensure_ascii=False)}")
+    return portfolio, stock_prices, bundle['usd_jpy_rate'], report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='寄り付き前のキャッシュウォームアップ')
+    parser.add_argument('--date', help='朝の実行のスケジュール日（YYYY-MM-DD、省略時は今日）')
+    args = parser.parse_args()
+    run_warmup(args.date)
+
+
+if __name__ == '__main__':
+    main()